@@ -47,6 +47,7 @@ a = Analysis(
         'charset_normalizer',
         'idna',
         'certifi',
+        'waitress',
     ],
     hookspath=[],
     hooksconfig={},
@@ -1,30 +1,63 @@
 import os
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, send_file
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, send_file, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_bcrypt import Bcrypt
 from flask_mail import Mail, Message
+from sqlalchemy import event, or_, select, tuple_
 from sqlalchemy.orm import DeclarativeBase
-from datetime import datetime, time
+from sqlalchemy.engine import make_url
+from datetime import datetime, time, timedelta
 import pytz
 import qrcode
 from io import BytesIO
 import subprocess
 import sys
+import json
+import hmac
 import threading
 from pathlib import Path
 
 # Import multi-database manager
 from db_manager import (
+    consolidated_storage,
+    qr_payload_version,
     create_teacher_database, 
     get_teacher_db_session, 
     delete_teacher_database,
     find_student_by_email,
     get_available_sections,
+    iter_federated_attendance,
+    iter_history_rows,
+    read_change_feed,
+    upsert_daily_rollup,
     TeacherStudent,
     TeacherAttendance,
+    TeacherAttendanceDaily,
     get_philippine_time as db_get_philippine_time
 )
+import attendance_counters
+import attendance_rollups
+import attendance_export
+import attendance_columnar
+import attendance_bitsets
+import attendance_archive
+import db_backup
+import roster_import
+import teacher_provisioning
+import background_jobs
+import student_search
+import keyset_pagination
+import teacher_reads
+import scan_executor
+import qr_payload
+import scan_dedup
+import scan_batcher
+import teacher_writer
+import change_log
+import delta_sync
+import app_startup
+from keyset_pagination import PagingError
 
 # Philippine timezone
 PHILIPPINE_TZ = pytz.timezone('Asia/Manila')
@@ -159,6 +192,7 @@ class Teacher(UserMixin, db.Model):
     section = db.Column(db.String(50), nullable=True)  # Custom section name
     grade_level = db.Column(db.String(10), nullable=True)  # '11' or '12'
     db_name = db.Column(db.String(100), nullable=True)  # Teacher's database name
+    cloud_id = db.Column(db.Integer, nullable=True, index=True)  # On hybrid desktops: the cloud server's id
     created_at = db.Column(db.DateTime, default=lambda: get_philippine_time())
     
     def get_id(self):
@@ -217,6 +251,80 @@ class AdminConfig(db.Model):
     def __repr__(self):
         return f'<AdminConfig check_in:{self.check_in_start_time}-{self.check_in_end_time}>'
 
+class SectionDailySummary(db.Model):
+    """Per-section, per-day, per-shift attendance totals rolled up from teacher databases"""
+    __tablename__ = 'section_daily_summary'
+    __table_args__ = (db.UniqueConstraint('teacher_id', 'date', 'shift', name='uq_section_daily_summary'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    teacher_id = db.Column(db.Integer, nullable=False, index=True)
+    grade_level = db.Column(db.String(10), nullable=True)
+    section = db.Column(db.String(50), nullable=True)
+    date = db.Column(db.String(10), nullable=False, index=True)  # YYYY-MM-DD
+    shift = db.Column(db.String(10), nullable=False)  # 'morning' or 'afternoon'
+    enrolled = db.Column(db.Integer, default=0)  # Students in the section when the row was built
+    present = db.Column(db.Integer, default=0)
+    absent = db.Column(db.Integer, default=0)
+    late = db.Column(db.Integer, default=0)
+    cutting = db.Column(db.Integer, default=0)
+    excused = db.Column(db.Integer, default=0)
+    
+    def __repr__(self):
+        return f'<SectionDailySummary {self.teacher_id} {self.date} {self.shift}>'
+
+class PasswordSetupToken(db.Model):
+    """One-time token letting an imported student choose their password (see roster_import.py)"""
+    __tablename__ = 'password_setup_tokens'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)  # sha256 of the token
+    db_name = db.Column(db.String(100), nullable=False)
+    student_id = db.Column(db.Integer, nullable=False)
+    email = db.Column(db.String(150), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    used_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<PasswordSetupToken {self.email}>'
+
+class BackgroundJob(db.Model):
+    """A long-running admin operation run by background_jobs.py"""
+    __tablename__ = 'background_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, finished, failed, cancelled
+    params = db.Column(db.Text, nullable=True)  # JSON
+    progress = db.Column(db.Integer, default=0)  # Percent
+    message = db.Column(db.String(255), nullable=True)
+    result = db.Column(db.Text, nullable=True)  # JSON
+    error = db.Column(db.Text, nullable=True)
+    cancel_requested = db.Column(db.Boolean, default=False, nullable=False)
+    created_by = db.Column(db.String(50), nullable=True)  # User id, or None for the scheduler/system
+    owner = db.Column(db.String(100), nullable=True)  # host:pid running the job
+    created_at = db.Column(db.DateTime, default=lambda: get_philippine_time(), index=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<BackgroundJob {self.kind} {self.status}>'
+
+class SyncDesktop(db.Model):
+    """A hybrid desktop allowed to sync, and the sections assigned to it (see delta_sync.py)"""
+    __tablename__ = 'sync_desktops'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    key_hash = db.Column(db.String(64), unique=True, nullable=False)  # sha256 of the desktop's key
+    teacher_ids = db.Column(db.Text, nullable=False, default='[]')  # JSON list of assigned teachers
+    created_at = db.Column(db.DateTime, default=lambda: get_philippine_time())
+    
+    def get_teacher_ids(self):
+        return json.loads(self.teacher_ids or '[]')
+    
+    def __repr__(self):
+        return f'<SyncDesktop {self.name}>'
+
 def is_teacher(user):
     return isinstance(user, Teacher)
 
@@ -474,6 +582,85 @@ def determine_attendance_status(check_in_time, check_in_start, check_in_end, che
     
     return status, f'Status: {status}'
 
+def record_attendance_change(sess, teacher, student_id, date_str, shift, old_status, new_status):
+    """
+    Update dashboard counters, daily rollups and history bitsets for one
+    student's status change.
+    
+    Call before sess.commit(): the teacher-database counters, rollup and
+    bitset are written on sess so they commit atomically with the attendance row. The
+    main-database section summary is staged on db.session, which the caller
+    commits after the teacher database.
+    """
+    attendance_counters.record_status_change(sess, teacher.db_name, date_str, shift, old_status, new_status)
+    upsert_daily_rollup(sess, student_id, date_str, shift, new_status)
+    attendance_bitsets.update_bitset(sess, student_id, date_str, shift, new_status)
+    attendance_rollups.bump_section_summary(
+        db.session, SectionDailySummary, teacher, date_str, shift, old_status, new_status
+    )
+
+def parse_date_arg(value):
+    """Return value if it is a YYYY-MM-DD date string, otherwise None"""
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+        return value
+    except (TypeError, ValueError):
+        return None
+
+def build_attendance_patterns(sections):
+    """
+    Run bitset attendance analytics over sections for the request's school year.
+    
+    Query params: school_year (default current), threshold (missed-shift rate,
+    default CHRONIC_ABSENCE_THRESHOLD), chronic_only=1 to list only flagged students
+    """
+    today = get_philippine_time().date()
+    school_year = request.args.get('school_year', type=int) or attendance_bitsets.school_year_for(today)
+    threshold = request.args.get('threshold', type=float)
+    if threshold is None:
+        threshold = attendance_bitsets.CHRONIC_ABSENCE_THRESHOLD
+    
+    result = attendance_bitsets.analyze_sections(sections, school_year, as_of=today, threshold=threshold)
+    if request.args.get('chronic_only') in ('1', 'true'):
+        result['students'] = [s for s in result['students'] if s['chronic_absence']]
+    result.update({'success': True, 'school_year': school_year, 'threshold': threshold})
+    return result
+
+def get_report_sections(grade=None, section=None):
+    """Get section dicts (db_name, grade_level, section, teacher_id, teacher_name) for reports and exports"""
+    query = Teacher.query.filter(Teacher.db_name.isnot(None))
+    if grade:
+        query = query.filter(Teacher.grade_level == grade)
+    if section:
+        query = query.filter(Teacher.section == section)
+    return [{
+        'db_name': t.db_name,
+        'grade_level': t.grade_level,
+        'section': t.section,
+        'teacher_id': t.id,
+        'teacher_name': t.full_name
+    } for t in query.order_by(Teacher.grade_level, Teacher.section).all()]
+
+def wants_background(data=None):
+    """True if the caller asked for a long action to run as a background job"""
+    value = request.args.get('background')
+    if value is None and isinstance(data, dict):
+        value = data.get('background')
+    return str(value or '').lower() in ('1', 'true', 'yes')
+
+def start_job_response(kind, fn, message, *args, params=None, unique=False):
+    """Queue fn as a background job and build the 202 response pointing at it"""
+    created_by = current_user.get_id() if current_user.is_authenticated else None
+    job_id, created = background_jobs.submit_job(
+        kind, fn, *args, params=params, created_by=created_by, unique=unique
+    )
+    return jsonify({
+        'success': True,
+        'message': message if created else 'This job is already running',
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}'
+    }), 202
+
 @login_manager.user_loader
 def load_user(user_id):
     user_type, user_id = user_id.split('_')
@@ -548,8 +735,20 @@ def migrate_database():
                 except Exception as e:
                     print(f"Could not add column {col_name}: {e}")
                     db.session.rollback()
+    
+    # Check teachers table for missing columns
+    if 'teachers' in inspector.get_table_names():
+        existing_columns = [col['name'] for col in inspector.get_columns('teachers')]
+        if 'cloud_id' not in existing_columns:
+            try:
+                db.session.execute(text('ALTER TABLE teachers ADD COLUMN cloud_id INTEGER DEFAULT NULL'))
+                db.session.commit()
+                print("Added missing column: teachers.cloud_id")
+            except Exception as e:
+                print(f"Could not add column cloud_id: {e}")
+                db.session.rollback()
 
-with app.app_context():
+def init_main_database():
     db.create_all()
     # Migrate existing database to add any missing columns
     migrate_database()
@@ -558,6 +757,56 @@ with app.app_context():
         default_config = AdminConfig()
         db.session.add(default_config)
         db.session.commit()
+    background_jobs.init_jobs(db.engine, BackgroundJob.__table__, app.app_context)
+
+def init_search_index():
+    try:
+        student_search.ensure_index([t.db_name for t in Teacher.query.filter(Teacher.db_name.isnot(None))])
+    except Exception as e:
+        print(f"✗ Could not build student search index: {e}")
+
+def init_attendance_counters():
+    """Rebuild today's dashboard counters for every section from the raw attendance rows"""
+    attendance_counters.rebuild_all([t.db_name for t in Teacher.query.filter(Teacher.db_name.isnot(None))])
+
+def check_scan_batching():
+    """Refuse SCAN_BATCH_MS in a server process that may not be the only writer (see scan_batcher.py)"""
+    scan_batcher.check_process(teacher_writer.enabled())
+
+def check_teacher_writer():
+    """Refuse a TEACHER_WRITER_ADDRESS that isn't local or has no TEACHER_WRITER_AUTHKEY (see teacher_writer.py)"""
+    if teacher_writer.enabled():
+        teacher_writer.check_config()
+
+def run_startup(extra_phases=(), background=False):
+    """
+    One-time setup as app_startup phases: the scan batching and teacher
+    writer checks, the main database (and any extra_phases) before the app
+    is ready, then the search index and the dashboard counters, which can be
+    done without while they build (a section not rebuilt yet is rebuilt on
+    its first read).
+    """
+    app_startup.run(
+        [('scan batching', check_scan_batching), ('teacher writer', check_teacher_writer),
+         ('main database', init_main_database), *extra_phases],
+        [('search index', init_search_index), ('attendance counters', init_attendance_counters)],
+        context=app.app_context,
+        background=background
+    )
+
+if __name__ == '__main__':
+    # The development server is one process: it may batch scans
+    scan_batcher.claim()
+
+if not app_startup.DEFER_STARTUP:
+    run_startup()
+
+def get_main_db_path():
+    """Get the main database file path, or None if it isn't SQLite"""
+    url = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    return url.database if url.get_backend_name() == 'sqlite' else None
+
+db_backup.start_backup_scheduler(get_main_db_path())
 
 def get_db():
     """Return the database object and model classes for interactive use and tests.
@@ -565,6 +814,20 @@ def get_db():
     Returns a tuple: (db, Student, Teacher, Attendance)
     """
     return db, Student, Teacher, Attendance
+
+@app.before_request
+def wait_for_startup():
+    """Until startup has finished (see app_startup.py) only the readiness probe is served"""
+    if not app_startup.is_ready() and request.endpoint != 'startup_ready':
+        return jsonify({'success': False, 'error': 'Server is starting'}), 503, {'Retry-After': '1'}
+
+@app.route('/api/health/ready', methods=['GET'])
+def startup_ready():
+    """Readiness probe: 200 once startup has finished, 503 while it runs, 500 if a phase failed"""
+    status = app_startup.get_status()
+    code = 200 if status['ready'] else (500 if status['error'] else 503)
+    return jsonify({'success': status['ready'], **status}), code
+
 @app.route('/')
 def serve_index():
     return send_file('index.html')
@@ -739,10 +1002,12 @@ def signup():
             
             session.add(new_student)
             session.commit()
+            attendance_counters.record_enrollment(teacher.db_name, 1)
             
             # Generate QR code
             new_student.generate_qr_code()
             session.commit()
+            student_search.index_student(teacher.db_name, new_student)
 
             return jsonify({
                 'success': True,
@@ -756,6 +1021,49 @@ def signup():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/student/set-password', methods=['POST'])
+def set_student_password():
+    """Set an imported student's password with the one-time token from the roster import"""
+    try:
+        data = request.get_json() if request.is_json else request.form
+        token = data.get('token')
+        password = data.get('password')
+        confirm_password = data.get('confirm_password') or data.get('cpwd')
+        
+        if not all([token, password, confirm_password]):
+            return jsonify({'success': False, 'error': 'Token and password are required'}), 400
+        if password != confirm_password:
+            return jsonify({'success': False, 'error': 'Passwords do not match'}), 400
+        
+        setup = PasswordSetupToken.query.filter_by(token_hash=roster_import.hash_token(token)).first()
+        now = get_philippine_time().replace(tzinfo=None)
+        if not setup or setup.used_at or setup.expires_at < now:
+            return jsonify({'success': False, 'error': 'This link is invalid or has expired'}), 400
+        
+        Session = get_teacher_db_session(setup.db_name)
+        sess = Session()
+        try:
+            student = sess.get(TeacherStudent, setup.student_id)
+            if not student or student.email != setup.email:
+                return jsonify({'success': False, 'error': 'Student not found'}), 404
+            student.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+            sess.commit()
+        finally:
+            sess.close()
+        
+        setup.used_at = now
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Password set. You can now log in.',
+            'redirect': '/'
+        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/login', methods=['POST'])
 def login():
     try:
@@ -914,6 +1222,102 @@ def create_teacher():
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/admin/teachers/bulk', methods=['POST'])
+@login_required
+def bulk_create_teachers():
+    """
+    Create many teachers and their section databases at once.
+    
+    Body: {"teachers": [{full_name, email, password, section, grade_level}, ...]}
+    (a bare list also works). Each row succeeds or fails on its own; the
+    response lists the outcome per row in request order.
+    """
+    if not is_teacher(current_user) or current_user.email != 'admin@teacher':
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
+    
+    databases = []
+    try:
+        data = request.get_json(silent=True)
+        raw_rows = data.get('teachers') if isinstance(data, dict) else data
+        if not isinstance(raw_rows, list) or not raw_rows:
+            return jsonify({'success': False, 'error': 'Provide a non-empty list of teachers'}), 400
+        
+        rows = [teacher_provisioning.normalize_teacher(raw, i) for i, raw in enumerate(raw_rows)]
+        
+        # One query finds every email and grade/section already taken
+        emails = [r['email'] for r in rows if r['email']]
+        pairs = [(r['grade_level'], r['section']) for r in rows if r['grade_level'] and r['section']]
+        conflicts = Teacher.query.filter(or_(
+            Teacher.email.in_(emails),
+            tuple_(Teacher.grade_level, Teacher.section).in_(pairs)
+        )).all()
+        valid, errors = teacher_provisioning.validate_teachers(
+            rows,
+            {t.email for t in conflicts},
+            {(t.grade_level, t.section): t.full_name for t in conflicts}
+        )
+        
+        hashes = roster_import.hash_passwords(
+            [r['password'] for r in valid], app.config.get('BCRYPT_LOG_ROUNDS', 12)
+        )
+        teachers = [Teacher(
+            full_name=r['full_name'],
+            email=r['email'],
+            password_hash=password_hash,
+            section=r['section'],
+            grade_level=r['grade_level']
+        ) for r, password_hash in zip(valid, hashes)]
+        db.session.add_all(teachers)
+        db.session.flush()
+        
+        databases = teacher_provisioning.create_databases(
+            [(t.id, t.grade_level, t.section) for t in teachers]
+        )
+        
+        results = [dict(e, success=False) for e in errors]
+        for row, teacher, (db_name, error) in zip(valid, teachers, databases):
+            if db_name:
+                teacher.db_name = db_name
+                results.append({
+                    'index': row['index'],
+                    'email': row['email'],
+                    'success': True,
+                    'teacher': {
+                        'id': teacher.id,
+                        'name': teacher.full_name,
+                        'section': teacher.section,
+                        'grade_level': teacher.grade_level
+                    }
+                })
+            else:
+                db.session.delete(teacher)
+                results.append({
+                    'index': row['index'],
+                    'email': row['email'],
+                    'success': False,
+                    'error': f'Could not create database: {error}'
+                })
+        db.session.commit()
+        
+        results.sort(key=lambda r: r['index'])
+        created = sum(1 for r in results if r['success'])
+        print(f"✓ Provisioned {created} of {len(rows)} teachers")
+        return jsonify({
+            'success': created > 0,
+            'message': f'Created {created} of {len(rows)} teachers',
+            'created': created,
+            'failed': len(rows) - created,
+            'results': results
+        }), 201 if created else 400
+    
+    except Exception as e:
+        db.session.rollback()
+        # Nothing was committed, so don't leave databases behind
+        for db_name, _ in databases:
+            if db_name:
+                delete_teacher_database(db_name)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # ==================== ADMIN CONFIGURATION ENDPOINTS ====================
 
 @app.route('/api/admin/config', methods=['GET'])
@@ -1112,6 +1516,14 @@ def get_dashboard_stats():
             'by_section': {}
         }
         
+        # Counters are kept per shift; report the shift in progress
+        config = AdminConfig.query.first()
+        if not config:
+            config = AdminConfig()
+            db.session.add(config)
+            db.session.commit()
+        shift = select_shift(config, now.time())
+        
         # Get all teachers with their databases
         teachers = Teacher.query.filter(Teacher.db_name.isnot(None)).all()
         
@@ -1122,218 +1534,669 @@ def get_dashboard_stats():
                 stats['by_section'][section_key] = {
                     'total': 0,
                     'present': 0,
-                        'absent': 0,
-                        'late': 0,
-                        'cutting': 0,
-                        'excused': 0
+                    'absent': 0,
+                    'late': 0,
+                    'cutting': 0,
+                    'excused': 0
                 }
             
-            Session = get_teacher_db_session(teacher.db_name)
-            sess = Session()
-            
-            try:
-                # Count students
-                students = sess.query(TeacherStudent).all()
-                student_count = len(students)
-                stats['total_students'] += student_count
-                stats['by_section'][section_key]['total'] += student_count
-                
-                for student in students:
-                    # Get today's attendance
-                    attendance = sess.query(TeacherAttendance).filter(
-                        TeacherAttendance.student_id == student.id,
-                        TeacherAttendance.date == today_str,
-                        TeacherAttendance.shift == shift
-                    ).first()
-                    
-                    if attendance:
-                        status = attendance.attendance_status
-                        if status == 'PRESENT':
-                            stats['present'] += 1
-                            stats['by_section'][section_key]['present'] += 1
-                        elif status == 'ABSENT':
-                            stats['absent'] += 1
-                            stats['by_section'][section_key]['absent'] += 1
-                        elif status == 'LATE':
-                            stats['late'] += 1
-                            stats['by_section'][section_key]['late'] += 1
-                        elif status == 'CUTTING':
-                            stats['cutting'] += 1
-                            stats['by_section'][section_key]['cutting'] += 1
-                        elif status == 'EXCUSED':
-                            stats['excused'] += 1
-                            stats['by_section'][section_key]['excused'] += 1
-                    else:
-                        # No record means not yet marked (could be absent if past deadline)
-                        stats['absent'] += 1
-                        stats['by_section'][section_key]['absent'] += 1
-            finally:
-                sess.close()
+            # Read the section's running totals instead of scanning its students
+            counts = attendance_counters.get_section_counts(teacher.db_name, shift, today_str)
+            stats['total_students'] += counts['total']
+            for key, value in counts.items():
+                stats['by_section'][section_key][key] += value
+                if key != 'total':
+                    stats[key] += value
         
         return jsonify({
             'success': True,
             'stats': stats,
-            'date': today_str
+            'date': today_str,
+            'shift': shift
         }), 200
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/students', methods=['GET'])
+@app.route('/api/admin/attendance-trends', methods=['GET'])
 @login_required
-def get_students():
-    """Get students from teacher's own database"""
-    if not is_teacher(current_user):
-        return jsonify({'success': False, 'error': 'Teacher access required'}), 403
+def get_attendance_trends():
+    """
+    Daily attendance totals read from the section summary rollup.
+    
+    Query params: from, to (YYYY-MM-DD, default the last 30 days), grade,
+    section, and group=section to split each day by section.
+    """
+    if not is_teacher(current_user) or current_user.email != 'admin@teacher':
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
+    
     try:
-        # Admin can see all students from all databases
-        if current_user.email == 'admin@teacher':
-            # Get all teachers and their students
-            all_students = []
-            teachers = Teacher.query.filter(Teacher.db_name.isnot(None)).all()
-            for teacher in teachers:
-                Session = get_teacher_db_session(teacher.db_name)
-                sess = Session()
-                try:
-                    students = sess.query(TeacherStudent).all()
-                    for s in students:
-                        all_students.append({
-                            'id': s.id,
-                            'name': s.full_name,
-                            'email': s.email,
-                            'section': s.section,
-                            'grade_level': s.grade_level,
-                            'teacher_id': s.teacher_id,
-                            'teacher_name': teacher.full_name,
-                            'created_at': s.created_at.isoformat() if s.created_at else None
-                        })
-                finally:
-                    sess.close()
-            return jsonify({'success': True, 'students': all_students}), 200
-        
-        # Regular teacher only sees their own students
-        if not current_user.db_name:
-            return jsonify({'success': True, 'students': []}), 200
+        today = get_philippine_time().date()
+        date_to = parse_date_arg(request.args.get('to') or today.strftime('%Y-%m-%d'))
+        date_from = parse_date_arg(request.args.get('from') or (today - timedelta(days=30)).strftime('%Y-%m-%d'))
+        if not date_from or not date_to:
+            return jsonify({'success': False, 'error': 'Dates must be in YYYY-MM-DD format'}), 400
+        
+        trends = attendance_rollups.trend_query(
+            db.session, SectionDailySummary, date_from, date_to,
+            grade=request.args.get('grade'),
+            section=request.args.get('section'),
+            by_section=request.args.get('group') == 'section'
+        )
         
-        Session = get_teacher_db_session(current_user.db_name)
-        sess = Session()
-        try:
-            students = sess.query(TeacherStudent).all()
-            students_data = [{
-                'id': s.id,
-                'name': s.full_name,
-                'email': s.email,
-                'section': s.section,
-                'grade_level': s.grade_level,
-                'created_at': s.created_at.isoformat() if s.created_at else None
-            } for s in students]
-            return jsonify({'success': True, 'students': students_data}), 200
-        finally:
-            sess.close()
+        return jsonify({'success': True, 'from': date_from, 'to': date_to, 'trends': trends}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/admin/analytics/attendance-patterns', methods=['GET'])
+@login_required
+def get_school_attendance_patterns():
+    """Chronic absence, absence streaks and weekday lateness for the whole school (or a grade/section)"""
+    if not is_teacher(current_user) or current_user.email != 'admin@teacher':
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
+    
+    try:
+        if attendance_bitsets.np is None:
+            return jsonify({'success': False, 'error': 'Attendance analytics require numpy to be installed'}), 501
+        sections = get_report_sections(request.args.get('grade'), request.args.get('section'))
+        return jsonify(build_attendance_patterns(sections)), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/sections', methods=['GET'])
-def get_sections():
-    """Get all available section/grade combinations for student signup"""
+@app.route('/api/admin/reports/attendance', methods=['GET'])
+@login_required
+def get_attendance_report():
+    """
+    School-wide attendance report across all sections.
+    
+    Query params: from, to (YYYY-MM-DD, default today), grade, section,
+    status, shift, and group=summary for per-section counts instead of rows.
+    The response is streamed so large ranges never sit in memory.
+    """
+    if not is_teacher(current_user) or current_user.email != 'admin@teacher':
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
+    
     try:
-        teachers = Teacher.query.filter(
-            Teacher.section.isnot(None),
-            Teacher.grade_level.isnot(None),
-            Teacher.db_name.isnot(None)
-        ).all()
+        today_str = get_philippine_time().date().strftime('%Y-%m-%d')
+        date_from = parse_date_arg(request.args.get('from') or today_str)
+        date_to = parse_date_arg(request.args.get('to') or date_from)
+        if not date_from or not date_to:
+            return jsonify({'success': False, 'error': 'Dates must be in YYYY-MM-DD format'}), 400
+        
+        grade = request.args.get('grade')
+        section = request.args.get('section')
+        status = request.args.get('status')
+        shift = request.args.get('shift')
+        summary = request.args.get('group') == 'summary'
+        
+        rows = iter_federated_attendance(
+            get_report_sections(grade, section), date_from, date_to,
+            status=status.upper() if status else None,
+            shift=shift,
+            summary=summary
+        )
         
-        sections = [{
-            'section': t.section,
-            'grade_level': t.grade_level,
-            'teacher_name': t.full_name,
-            'display': f'Grade {t.grade_level} - {t.section}'
-        } for t in teachers]
+        def generate():
+            yield json.dumps({'success': True, 'from': date_from, 'to': date_to})[:-1] + ', "rows": ['
+            first = True
+            for row in rows:
+                yield ('' if first else ',') + json.dumps(row, default=str)
+                first = False
+            yield ']}'
         
-        return jsonify({'success': True, 'sections': sections}), 200
+        return Response(stream_with_context(generate()), mimetype='application/json')
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-
-@app.route('/api/teachers', methods=['GET'])
+@app.route('/api/admin/export/attendance', methods=['GET'])
 @login_required
-def get_teachers():
-    if not is_teacher(current_user):
-        return jsonify({'success': False, 'error': 'Teacher access required'}), 403
+def export_attendance():
+    """
+    Stream attendance records as a CSV or JSON Lines download.
+    
+    Query params: format (csv or jsonl, default csv), from, to (YYYY-MM-DD,
+    default today), grade, section, source (live or snapshot, default live)
+    """
+    if not is_teacher(current_user) or current_user.email != 'admin@teacher':
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
+    
     try:
-        teachers = Teacher.query.all()
-        teachers_data = [{
-            'id': t.id,
-            'name': t.full_name,
-            'email': t.email,
-            'section': t.section,
-            'grade_level': t.grade_level,
-            'db_name': t.db_name,
-            'created_at': t.created_at.isoformat() if t.created_at else None
-        } for t in teachers]
-
-        return jsonify({'success': True, 'teachers': teachers_data}), 200
+        fmt = request.args.get('format', 'csv').lower()
+        if fmt not in attendance_export.EXPORT_FORMATS:
+            return jsonify({'success': False, 'error': 'Format must be csv or jsonl'}), 400
+        
+        snapshot = request.args.get('source', 'live').lower() == 'snapshot'
+        if snapshot and not db_backup.get_reporting_snapshot():
+            return jsonify({'success': False, 'error': 'No reporting snapshot has been published'}), 409
+        
+        today_str = get_philippine_time().date().strftime('%Y-%m-%d')
+        date_from = parse_date_arg(request.args.get('from') or today_str)
+        date_to = parse_date_arg(request.args.get('to') or date_from)
+        if not date_from or not date_to:
+            return jsonify({'success': False, 'error': 'Dates must be in YYYY-MM-DD format'}), 400
+        
+        sections = get_report_sections(request.args.get('grade'), request.args.get('section'))
+        rows = attendance_export.iter_attendance(sections, date_from, date_to, snapshot=snapshot)
+        
+        mimetype, extension = attendance_export.EXPORT_FORMATS[fmt]
+        return Response(
+            stream_with_context(attendance_export.iter_export(rows, fmt)),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename=attendance_{date_from}_{date_to}.{extension}'}
+        )
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def run_roster_import(text, dry_run=False, skip_invalid=False, reveal_tokens=True):
+    """
+    Validate and import a roster CSV (see roster_import.py).
+    
+    Returns a result dict; raises roster_import.RosterError if the file is
+    unusable, or if any row is invalid and skip_invalid is False. With
+    reveal_tokens False (background jobs, whose results are kept) the
+    set-password tokens are left out; only their emails are listed, and the
+    admin gets the tokens from POST /api/admin/students/setup-tokens.
+    """
+    rows = roster_import.parse_roster(text)
+    sections = get_report_sections()
+    existing = roster_import.get_existing_emails(
+        sections, [t.email for t in Teacher.query.with_entities(Teacher.email)]
+    )
+    valid, errors = roster_import.validate_roster(rows, sections, existing)
+    if errors and not skip_invalid:
+        raise roster_import.RosterError(f'{len(errors)} of {len(rows)} rows are invalid', errors)
+    
+    result = {'rows': len(rows), 'valid': len(valid), 'errors': errors, 'created': 0, 'tokens': []}
+    if dry_run or not valid:
+        return result
+    
+    created, tokens, failed = roster_import.import_roster(valid, app.config.get('BCRYPT_LOG_ROUNDS', 12))
+    if tokens:
+        roster_import.store_password_tokens(db.session, PasswordSetupToken, tokens)
+        db.session.commit()
+    result['created'] = sum(len(students) for students in created.values())
+    result['failed'] = len(failed)
+    result['errors'] = errors + failed
+    if reveal_tokens:
+        result['tokens'] = [{'email': t['email'], 'token': t['token']} for t in tokens]
+    else:
+        result['tokens'] = []
+        result['token_emails'] = [t['email'] for t in tokens]
+    return result
+
+def roster_import_job(job, text, skip_invalid):
+    job.progress(0, message='Hashing passwords and creating students')
+    return run_roster_import(text, skip_invalid=skip_invalid, reveal_tokens=False)
 
-@app.route('/api/teacher/<int:teacher_id>', methods=['GET', 'PUT', 'DELETE'])
+@app.route('/api/admin/students/import', methods=['POST'])
 @login_required
-def manage_teacher(teacher_id):
-    if not is_teacher(current_user):
-        return jsonify({'success': False, 'error': 'Teacher access required'}), 403
+def import_students():
+    """
+    Bulk-create students from a CSV roster.
+    
+    Upload the CSV as the 'file' form field or as the raw request body.
+    Columns: full_name, email, grade_level, section, and optionally
+    password, guardian_name, guardian_email, guardian_phone. Rows without a
+    password get a one-time set-password token (returned in 'tokens').
+    Query params: dry_run (validate only), skip_invalid (import the valid
+    rows even if some are invalid), background (validate, then import as a
+    job; its result lists token_emails, and the tokens themselves come from
+    POST /api/admin/students/setup-tokens)
+    """
+    if not is_teacher(current_user) or current_user.email != 'admin@teacher':
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
+    
     try:
-        teacher = Teacher.query.get_or_404(teacher_id)
-
-        if request.method == 'GET':
-            return jsonify({
-                'success': True,
-                'teacher': {
-                    'id': teacher.id,
-                    'name': teacher.full_name,
-                    'email': teacher.email,
-                    'section': teacher.section,
-                    'grade_level': teacher.grade_level
-                }
-            }), 200
-
-        elif request.method == 'PUT':
-            data = request.get_json() if request.is_json else request.form
-            teacher.full_name = data.get('name', teacher.full_name)
-            teacher.email = data.get('email', teacher.email)
-            if 'grade_level' in data and data['grade_level']:
-                teacher.grade_level = data.get('grade_level', teacher.grade_level)
-            if 'section' in data and data['section']:
-                teacher.section = data.get('section', teacher.section)
-
-            db.session.commit()
-            return jsonify({'success': True, 'message': 'Teacher updated successfully'}), 200
-
-        elif request.method == 'DELETE':
-            db.session.delete(teacher)
-            db.session.commit()
-            return jsonify({'success': True, 'message': 'Teacher deleted successfully'}), 200
-
+        upload = request.files.get('file')
+        text = upload.read().decode('utf-8-sig') if upload else request.get_data(as_text=True)
+        if not text.strip():
+            return jsonify({'success': False, 'error': 'Upload a CSV file'}), 400
+        
+        flag = lambda name: request.args.get(name, '').lower() in ('1', 'true', 'yes')
+        if wants_background() and not flag('dry_run'):
+            # Validate now so problems come back at once; the import itself runs as a job
+            checked = run_roster_import(text, dry_run=True, skip_invalid=flag('skip_invalid'))
+            return start_job_response(
+                'roster_import', roster_import_job, f"Importing {checked['valid']} students",
+                text, flag('skip_invalid'), params={'rows': checked['rows'], 'valid': checked['valid']}
+            )
+        
+        result = run_roster_import(text, dry_run=flag('dry_run'), skip_invalid=flag('skip_invalid'))
+        
+        return jsonify({
+            'success': True,
+            'message': f"Imported {result['created']} of {result['rows']} students",
+            **result
+        }), 200 if flag('dry_run') else 201
+    
+    except roster_import.RosterError as e:
+        return jsonify({'success': False, 'error': str(e), 'errors': e.errors}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
-# ==================== TEACHER STUDENT STATUS MANAGEMENT ====================
-
-@app.route('/api/teacher/students', methods=['GET'])
+@app.route('/api/admin/students/setup-tokens', methods=['POST'])
 @login_required
-def get_teacher_students():
-    """Get all students for the current teacher with their attendance status"""
-    if not is_teacher(current_user):
-        return jsonify({'success': False, 'error': 'Teacher access required'}), 403
+def reissue_setup_tokens():
+    """
+    Issue new set-password tokens for imported students who haven't set a
+    password yet, e.g. after a background import.
+    
+    JSON body: emails (optional; default every unused token). Tokens are
+    stored hashed, so they are only readable in this response; reissuing
+    replaces any earlier token of the same student.
+    """
+    if not is_teacher(current_user) or current_user.email != 'admin@teacher':
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
     
     try:
-        if not current_user.db_name:
-            return jsonify({'success': False, 'error': 'Teacher database not configured'}), 400
-        
-        now = get_philippine_time()
-        today_str = now.date().strftime('%Y-%m-%d')
+        data = request.get_json(silent=True) or {}
+        emails = data.get('emails')
+        if emails is not None and not isinstance(emails, list):
+            return jsonify({'success': False, 'error': 'emails must be a list'}), 400
+        tokens = roster_import.reissue_password_tokens(db.session, PasswordSetupToken, emails)
+        db.session.commit()
+        return jsonify({'success': True, 'tokens': tokens}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/export/columnar', methods=['POST'])
+@login_required
+def start_columnar_export():
+    """
+    Start a background Parquet/Arrow export of attendance and rosters.
+    
+    Body: format (parquet or arrow, default parquet), from, to (YYYY-MM-DD,
+    default today), grade, section, source (live or snapshot, default live).
+    Returns a job id to poll.
+    """
+    if not is_teacher(current_user) or current_user.email != 'admin@teacher':
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
+    
+    try:
+        if attendance_columnar.pa is None:
+            return jsonify({'success': False, 'error': 'Columnar export requires pyarrow to be installed'}), 501
+        
+        data = (request.get_json(silent=True) if request.is_json else request.form) or {}
+        fmt = (data.get('format') or 'parquet').lower()
+        if fmt not in attendance_columnar.COLUMNAR_FORMATS:
+            return jsonify({'success': False, 'error': 'Format must be parquet or arrow'}), 400
+        
+        today_str = get_philippine_time().date().strftime('%Y-%m-%d')
+        date_from = parse_date_arg(data.get('from') or today_str)
+        date_to = parse_date_arg(data.get('to') or date_from)
+        if not date_from or not date_to:
+            return jsonify({'success': False, 'error': 'Dates must be in YYYY-MM-DD format'}), 400
+        
+        snapshot = (data.get('source') or 'live').lower() == 'snapshot'
+        if snapshot and not db_backup.get_reporting_snapshot():
+            return jsonify({'success': False, 'error': 'No reporting snapshot has been published'}), 409
+        
+        sections = get_report_sections(data.get('grade'), data.get('section'))
+        return start_job_response(
+            'columnar_export', attendance_columnar.columnar_export_job,
+            f'Columnar export started for {len(sections)} sections',
+            sections, date_from, date_to, fmt, snapshot,
+            params={'format': fmt, 'from': date_from, 'to': date_to, 'snapshot': snapshot,
+                    'sections': len(sections)}
+        )
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/export/columnar/<job_id>', methods=['GET'])
+@login_required
+def get_columnar_export_status(job_id):
+    """Poll the status of a background columnar export (same as /api/jobs/<job_id>)"""
+    if not is_teacher(current_user) or current_user.email != 'admin@teacher':
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
+    
+    job = background_jobs.get_job(job_id)
+    if not job or job['kind'] != 'columnar_export':
+        return jsonify({'success': False, 'error': 'Export job not found'}), 404
+    return jsonify({'success': True, 'job': job}), 200
+
+# Lets a scheduler poll job status (never results) with X-Jobs-Secret; unset disables it
+JOBS_SECRET = os.environ.get('JOBS_SECRET', '')
+
+def can_view_job(job):
+    """Admin sees every job; other users only their own"""
+    if not current_user.is_authenticated:
+        return False
+    if is_teacher(current_user) and current_user.email == 'admin@teacher':
+        return True
+    return job is not None and job['created_by'] == current_user.get_id()
+
+def is_job_scheduler():
+    """True for a request carrying JOBS_SECRET (status only, see job_status_only)"""
+    header_secret = request.headers.get('X-Jobs-Secret')
+    return bool(JOBS_SECRET) and header_secret is not None and hmac.compare_digest(header_secret, JOBS_SECRET)
+
+def job_status_only(job):
+    """A job without its result, for callers that may only follow progress"""
+    return {key: value for key, value in job.items() if key != 'result'}
+
+@app.route('/api/jobs', methods=['GET'])
+def list_background_jobs():
+    """List recent background jobs. Query params: kind, status, limit (default 50)"""
+    scheduler = not can_view_job(None)
+    if scheduler and not is_job_scheduler():
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    try:
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+        jobs = background_jobs.list_jobs(request.args.get('kind'), request.args.get('status'), limit)
+        if scheduler:
+            jobs = [job_status_only(job) for job in jobs]
+        return jsonify({'success': True, 'jobs': jobs}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_background_job(job_id):
+    """Poll a background job: status, progress (percent), message, result, error"""
+    try:
+        job = background_jobs.get_job(job_id)
+        if not can_view_job(job):
+            if not is_job_scheduler():
+                return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+            job = job and job_status_only(job)
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        return jsonify({'success': True, 'job': job}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_background_job(job_id):
+    """Ask a queued or running job to stop"""
+    try:
+        job = background_jobs.get_job(job_id)
+        if not can_view_job(job):
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        if not background_jobs.cancel_job(job_id):
+            return jsonify({'success': False, 'error': f"Job already {job['status']}"}), 409
+        return jsonify({'success': True, 'message': 'Cancellation requested'}), 202
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+STUDENT_LIST_COLUMNS = ('id', 'name', 'email', 'section', 'grade_level', 'teacher_id', 'created_at')
+STUDENT_LIST_FIELDS = list(STUDENT_LIST_COLUMNS) + ['teacher_name']
+
+def format_list_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+@app.route('/api/students', methods=['GET'])
+@login_required
+def get_students():
+    """
+    Get students, one page at a time: admin sees every section (ordered by
+    section database, then id), a teacher their own.
+    
+    Query params: limit (default 100, max 500), cursor (next_cursor from the
+    previous page), fields (comma-separated, e.g. id,name,email).
+    """
+    if not is_teacher(current_user):
+        return jsonify({'success': False, 'error': 'Teacher access required'}), 403
+    try:
+        is_admin = current_user.email == 'admin@teacher'
+        default_fields = ['id', 'name', 'email', 'section', 'grade_level', 'created_at']
+        if is_admin:
+            default_fields[5:5] = ['teacher_id', 'teacher_name']
+        fields = keyset_pagination.parse_fields(request.args.get('fields'), STUDENT_LIST_FIELDS, default_fields)
+        limit, cursor = keyset_pagination.parse_page_args(request.args, key_size=2)
+        
+        # Admin can see all students from all databases; regular teachers only their own
+        query = Teacher.query.with_entities(Teacher.db_name, Teacher.full_name).filter(Teacher.db_name.isnot(None))
+        if not is_admin:
+            query = query.filter(Teacher.id == current_user.id)
+        if cursor:
+            query = query.filter(Teacher.db_name >= cursor[0])
+        sections = query.order_by(Teacher.db_name).all()
+        
+        # Only the columns the requested fields need (teacher_reads adds the id for the cursor)
+        selected = [f for f in fields if f in STUDENT_LIST_COLUMNS]
+        
+        students = []
+        for db_name, teacher_name in sections:
+            after_id = cursor[1] if cursor and db_name == cursor[0] else None
+            for item in teacher_reads.list_students(db_name, selected, after_id, limit + 1 - len(students)):
+                item['teacher_name'] = teacher_name
+                students.append((db_name, item))
+            if len(students) > limit:
+                break
+        
+        page, next_cursor = keyset_pagination.finish_page(students, limit, lambda s: (s[0], s[1]['id']))
+        return jsonify({
+            'success': True,
+            'students': [keyset_pagination.project(item, fields) for _, item in page],
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        }), 200
+    except PagingError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/students/search', methods=['GET'])
+@login_required
+def search_students():
+    """
+    Search students by name, email or guardian name across every section.
+    
+    Query params: q (words, each matched as a prefix), grade, section,
+    limit (default 20, max 100), offset. Admin searches every section; a
+    teacher only their own. Hits are ranked best first.
+    """
+    if not is_teacher(current_user):
+        return jsonify({'success': False, 'error': 'Teacher access required'}), 403
+    
+    try:
+        query = (request.args.get('q') or '').strip()
+        if not query:
+            return jsonify({'success': False, 'error': 'Enter something to search for'}), 400
+        limit = request.args.get('limit', 20, type=int)
+        offset = request.args.get('offset', 0, type=int)
+        
+        if current_user.email == 'admin@teacher':
+            db_names = None
+        else:
+            db_names = [current_user.db_name] if current_user.db_name else []
+        
+        hits, total = student_search.search(
+            query, limit, offset, db_names, request.args.get('grade'), request.args.get('section')
+        )
+        teacher_names = {
+            t.db_name: t.full_name
+            for t in Teacher.query.filter(Teacher.db_name.in_({h['db_name'] for h in hits}))
+        }
+        
+        return jsonify({
+            'success': True,
+            'query': query,
+            'total': total,
+            'offset': offset,
+            'students': [{
+                'id': h['student_id'],
+                'name': h['full_name'],
+                'email': h['email'],
+                'guardian_name': h['guardian_name'],
+                'grade_level': h['grade_level'],
+                'section': h['section'],
+                'teacher_name': teacher_names.get(h['db_name'])
+            } for h in hits]
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def reindex_students_job(job, db_names):
+    total = student_search.rebuild_index(db_names, progress=job.progress)
+    return {'sections': len(db_names), 'students': total}
+
+@app.route('/api/admin/students/reindex', methods=['POST'])
+def reindex_students():
+    """Rebuild the student search index from every teacher database (runs as a job)"""
+    header_secret = request.headers.get('X-Scanner-Secret')
+    is_admin = current_user.is_authenticated and is_teacher(current_user) and current_user.email == 'admin@teacher'
+    if not is_admin and header_secret != SCANNER_SECRET:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    
+    try:
+        db_names = [t.db_name for t in Teacher.query.filter(Teacher.db_name.isnot(None))]
+        return start_job_response(
+            'reindex_students', reindex_students_job, f'Reindexing students from {len(db_names)} sections',
+            db_names, unique=True
+        )
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/sections', methods=['GET'])
+def get_sections():
+    """Get all available section/grade combinations for student signup"""
+    try:
+        teachers = Teacher.query.filter(
+            Teacher.section.isnot(None),
+            Teacher.grade_level.isnot(None),
+            Teacher.db_name.isnot(None)
+        ).all()
+        
+        sections = [{
+            'section': t.section,
+            'grade_level': t.grade_level,
+            'teacher_name': t.full_name,
+            'display': f'Grade {t.grade_level} - {t.section}'
+        } for t in teachers]
+        
+        return jsonify({'success': True, 'sections': sections}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+TEACHER_LIST_COLUMNS = {
+    'id': Teacher.id,
+    'name': Teacher.full_name,
+    'email': Teacher.email,
+    'section': Teacher.section,
+    'grade_level': Teacher.grade_level,
+    'db_name': Teacher.db_name,
+    'created_at': Teacher.created_at
+}
+
+@app.route('/api/teachers', methods=['GET'])
+@login_required
+def get_teachers():
+    """
+    Get teachers one page at a time, ordered by id.
+    Query params: limit, cursor, fields (see /api/students)
+    """
+    if not is_teacher(current_user):
+        return jsonify({'success': False, 'error': 'Teacher access required'}), 403
+    try:
+        fields = keyset_pagination.parse_fields(
+            request.args.get('fields'), list(TEACHER_LIST_COLUMNS), list(TEACHER_LIST_COLUMNS)
+        )
+        limit, cursor = keyset_pagination.parse_page_args(request.args)
+        
+        selected = ['id'] + [f for f in fields if f != 'id']
+        columns = [TEACHER_LIST_COLUMNS[f].label(f) for f in selected]
+        statement = select(*columns).order_by(Teacher.id).limit(limit + 1)
+        if cursor:
+            statement = statement.where(Teacher.id > cursor[0])
+        
+        rows = [
+            {key: format_list_value(value) for key, value in row._mapping.items()}
+            for row in db.session.execute(statement)
+        ]
+        page, next_cursor = keyset_pagination.finish_page(rows, limit, lambda t: (t['id'],))
+        return jsonify({
+            'success': True,
+            'teachers': [keyset_pagination.project(t, fields) for t in page],
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        }), 200
+    except PagingError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/teacher/<int:teacher_id>', methods=['GET', 'PUT', 'DELETE'])
+@login_required
+def manage_teacher(teacher_id):
+    if not is_teacher(current_user):
+        return jsonify({'success': False, 'error': 'Teacher access required'}), 403
+    try:
+        teacher = Teacher.query.get_or_404(teacher_id)
+
+        if request.method == 'GET':
+            return jsonify({
+                'success': True,
+                'teacher': {
+                    'id': teacher.id,
+                    'name': teacher.full_name,
+                    'email': teacher.email,
+                    'section': teacher.section,
+                    'grade_level': teacher.grade_level
+                }
+            }), 200
+
+        elif request.method == 'PUT':
+            data = request.get_json() if request.is_json else request.form
+            teacher.full_name = data.get('name', teacher.full_name)
+            teacher.email = data.get('email', teacher.email)
+            if 'grade_level' in data and data['grade_level']:
+                teacher.grade_level = data.get('grade_level', teacher.grade_level)
+            if 'section' in data and data['section']:
+                teacher.section = data.get('section', teacher.section)
+
+            db.session.commit()
+            return jsonify({'success': True, 'message': 'Teacher updated successfully'}), 200
+
+        elif request.method == 'DELETE':
+            db.session.delete(teacher)
+            db.session.commit()
+            if teacher.db_name:
+                attendance_counters.forget_section(teacher.db_name)
+                student_search.remove_section(teacher.db_name)
+            return jsonify({'success': True, 'message': 'Teacher deleted successfully'}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ==================== TEACHER STUDENT STATUS MANAGEMENT ====================
+
+TEACHER_STUDENT_COLUMNS = (
+    'id', 'full_name', 'email', 'section', 'grade_level', 'guardian_name', 'guardian_email', 'guardian_phone'
+)
+TEACHER_STUDENT_ATTENDANCE_FIELDS = ('attendance_status', 'check_in_time', 'check_out_time')
+TEACHER_STUDENT_FIELDS = [f for f in TEACHER_STUDENT_COLUMNS if f != 'guardian_phone'] + list(TEACHER_STUDENT_ATTENDANCE_FIELDS)
+
+@app.route('/api/teacher/students', methods=['GET'])
+@login_required
+def get_teacher_students():
+    """
+    Get the current teacher's students with their attendance status for the
+    current shift, one page at a time (ordered by id).
+    
+    Query params: limit, cursor, fields (see /api/students). The first page
+    also carries 'summary': status counts for the whole section.
+    """
+    if not is_teacher(current_user):
+        return jsonify({'success': False, 'error': 'Teacher access required'}), 403
+    
+    try:
+        if not current_user.db_name:
+            return jsonify({'success': False, 'error': 'Teacher database not configured'}), 400
+        
+        available = list(TEACHER_STUDENT_COLUMNS) + list(TEACHER_STUDENT_ATTENDANCE_FIELDS)
+        fields = keyset_pagination.parse_fields(request.args.get('fields'), available, TEACHER_STUDENT_FIELDS)
+        limit, cursor = keyset_pagination.parse_page_args(request.args)
+        
+        now = get_philippine_time()
+        today_str = now.date().strftime('%Y-%m-%d')
 
         # Determine current shift based on admin config
         config = AdminConfig.query.first()
@@ -1343,42 +2206,35 @@ def get_teacher_students():
             db.session.commit()
         shift = select_shift(config, now.time())
 
-        Session = get_teacher_db_session(current_user.db_name)
-        sess = Session()
+        db_name = current_user.db_name
+        selected = [f for f in fields if f in TEACHER_STUDENT_COLUMNS]
+        rows = teacher_reads.list_students(db_name, selected, cursor[0] if cursor else None, limit + 1)
+        page, next_cursor = keyset_pagination.finish_page(rows, limit, lambda s: (s['id'],))
+        
+        # Today's attendance for the whole page in one query
+        if any(f in TEACHER_STUDENT_ATTENDANCE_FIELDS for f in fields) and page:
+            attendance = teacher_reads.shift_attendance(db_name, today_str, shift, [s['id'] for s in page])
+            for student in page:
+                status, check_in, check_out = attendance.get(student['id'], ('ABSENT', None, None))
+                student['attendance_status'] = status
+                student['check_in_time'] = check_in
+                student['check_out_time'] = check_out
+        
+        result = {
+            'success': True,
+            'students': [keyset_pagination.project(s, fields) for s in page],
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+            'date': today_str,
+            'shift': shift
+        }
+        if not cursor:
+            result['summary'] = teacher_reads.shift_summary(db_name, today_str, shift)
         
-        try:
-            students = sess.query(TeacherStudent).all()
-            
-            students_data = []
-            for student in students:
-                # Get today's attendance for the current shift
-                attendance = sess.query(TeacherAttendance).filter(
-                    TeacherAttendance.student_id == student.id,
-                    TeacherAttendance.date == today_str,
-                    TeacherAttendance.shift == shift
-                ).first()
-                
-                students_data.append({
-                    'id': student.id,
-                    'full_name': student.full_name,
-                    'email': student.email,
-                    'section': student.section,
-                    'grade_level': student.grade_level,
-                    'guardian_name': student.guardian_name,
-                    'guardian_email': student.guardian_email,
-                    'attendance_status': attendance.attendance_status if attendance else 'ABSENT',
-                    'check_in_time': attendance.check_in_time.strftime('%I:%M %p') if attendance and attendance.check_in_time else None,
-                    'check_out_time': attendance.check_out_time.strftime('%I:%M %p') if attendance and attendance.check_out_time else None
-                })
-            
-            return jsonify({
-                'success': True,
-                'students': students_data,
-                'date': today_str
-            }), 200
-        finally:
-            sess.close()
-            
+        return jsonify(result), 200
+    
+    except PagingError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1416,78 +2272,137 @@ def update_student_status(student_id):
             db.session.commit()
         shift = select_shift(config, now.time())
 
+        result = teacher_writer.set_status(current_user.db_name, student_id, today_str, shift, new_status)
+        if result is None:
+            return jsonify({'success': False, 'error': 'Student not found'}), 404
+        student, previous_status = result
+        old_status = previous_status or 'ABSENT'
+        
+        attendance_rollups.bump_section_summary(
+            db.session, SectionDailySummary, current_user, today_str, shift, previous_status, new_status
+        )
+        db.session.commit()
+        # A repeat scan must not replay the status from before this change
+        scan_dedup.forget_student(current_user.id, student_id)
+        
+        # Send notification to guardian
+        if student['guardian_email'] and config and config.email_notifications_enabled:
+            send_attendance_notification(
+                guardian_email=student['guardian_email'],
+                guardian_name=student['guardian_name'] or 'Parent/Guardian',
+                student_name=student['full_name'],
+                status=f'{new_status} (Updated by Teacher: {reason})',
+                timestamp=now,
+                check_in_end_time=config.check_in_end_time if config else '08:00',
+                check_out_end_time=config.check_out_end_time if config else '17:00'
+            )
+        
+        return jsonify({
+            'success': True,
+            'message': f'Status updated from {old_status} to {new_status}',
+            'student_name': student['full_name'],
+            'old_status': old_status,
+            'new_status': new_status
+        }), 200
+            
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/teacher/student/<int:student_id>/history', methods=['GET'])
+@login_required
+def get_student_history(student_id):
+    """
+    Get a student's day-by-day attendance history from the daily rollup.
+    
+    Query params: from, to (YYYY-MM-DD, default the last 30 days)
+    """
+    if not is_teacher(current_user):
+        return jsonify({'success': False, 'error': 'Teacher access required'}), 403
+    
+    try:
+        if not current_user.db_name:
+            return jsonify({'success': False, 'error': 'Teacher database not configured'}), 400
+        
+        today = get_philippine_time().date()
+        date_to = parse_date_arg(request.args.get('to') or today.strftime('%Y-%m-%d'))
+        date_from = parse_date_arg(request.args.get('from') or (today - timedelta(days=30)).strftime('%Y-%m-%d'))
+        if not date_from or not date_to:
+            return jsonify({'success': False, 'error': 'Dates must be in YYYY-MM-DD format'}), 400
+        
         Session = get_teacher_db_session(current_user.db_name)
         sess = Session()
         
         try:
-            student = sess.query(TeacherStudent).get(student_id)
-            if not student:
-                return jsonify({'success': False, 'error': 'Student not found'}), 404
-            
-            # Get or create today's attendance record for this shift
-            attendance = sess.query(TeacherAttendance).filter(
-                TeacherAttendance.student_id == student_id,
-                TeacherAttendance.date == today_str,
-                TeacherAttendance.shift == shift
-            ).first()
-            
-            old_status = attendance.attendance_status if attendance else 'ABSENT'
-            
-            if not attendance:
-                attendance = TeacherAttendance(
-                    student_id=student_id,
-                    status='manual',
-                    attendance_status=new_status,
-                    date=today_str,
-                    shift=shift
-                )
-                sess.add(attendance)
-            else:
-                attendance.attendance_status = new_status
-            
-            sess.commit()
-            
-            # Send notification to guardian
-            if student.guardian_email and config and config.email_notifications_enabled:
-                send_attendance_notification(
-                    guardian_email=student.guardian_email,
-                    guardian_name=student.guardian_name or 'Parent/Guardian',
-                    student_name=student.full_name,
-                    status=f'{new_status} (Updated by Teacher: {reason})',
-                    timestamp=now,
-                    check_in_end_time=config.check_in_end_time if config else '08:00',
-                    check_out_end_time=config.check_out_end_time if config else '17:00'
-                )
+            # Closed terms live in archive databases, attached only if the range reaches them
+            rows = list(iter_history_rows(current_user.db_name, date_from, date_to, (
+                'SELECT date, morning_status, afternoon_status FROM {src}.attendance_daily '
+                'WHERE student_id = :student_id AND date BETWEEN :date_from AND :date_to'
+            ), {'student_id': student_id}, include_live=False, order_by='date'))
+            rows += sess.query(
+                TeacherAttendanceDaily.date,
+                TeacherAttendanceDaily.morning_status,
+                TeacherAttendanceDaily.afternoon_status
+            ).filter(
+                TeacherAttendanceDaily.student_id == student_id,
+                TeacherAttendanceDaily.date.between(date_from, date_to)
+            ).order_by(TeacherAttendanceDaily.date).all()
             
             return jsonify({
                 'success': True,
-                'message': f'Status updated from {old_status} to {new_status}',
-                'student_name': student.full_name,
-                'old_status': old_status,
-                'new_status': new_status
+                'student_id': student_id,
+                'from': date_from,
+                'to': date_to,
+                'days': [{
+                    'date': date_str,
+                    'morning': morning,
+                    'afternoon': afternoon
+                } for date_str, morning, afternoon in rows],
+                'totals': attendance_rollups.summarize_student_days(rows)
             }), 200
         finally:
             sess.close()
-            
+    
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/teacher/student/<int:student_id>/guardian', methods=['PUT'])
+@app.route('/api/teacher/analytics/attendance-patterns', methods=['GET'])
 @login_required
-def update_student_guardian(student_id):
-    """Update student guardian information"""
+def get_section_attendance_patterns():
+    """Chronic absence, absence streaks and weekday lateness for the teacher's own section"""
     if not is_teacher(current_user):
         return jsonify({'success': False, 'error': 'Teacher access required'}), 403
     
     try:
         if not current_user.db_name:
             return jsonify({'success': False, 'error': 'Teacher database not configured'}), 400
+        if attendance_bitsets.np is None:
+            return jsonify({'success': False, 'error': 'Attendance analytics require numpy to be installed'}), 501
+        sections = [{
+            'db_name': current_user.db_name,
+            'grade_level': current_user.grade_level,
+            'section': current_user.section
+        }]
+        return jsonify(build_attendance_patterns(sections)), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/teacher/student/<int:student_id>/guardian', methods=['PUT'])
+@login_required
+def update_student_guardian(student_id):
+    """Update student guardian information"""
+    if not is_teacher(current_user):
+        return jsonify({'success': False, 'error': 'Teacher access required'}), 403
+    
+    try:
+        if not current_user.db_name:
+            return jsonify({'success': False, 'error': 'Teacher database not configured'}), 400
+        
+        data = request.get_json() if request.is_json else request.form
+        
+        Session = get_teacher_db_session(current_user.db_name)
+        sess = Session()
         
-        data = request.get_json() if request.is_json else request.form
-        
-        Session = get_teacher_db_session(current_user.db_name)
-        sess = Session()
-        
         try:
             student = sess.query(TeacherStudent).get(student_id)
             if not student:
@@ -1506,6 +2421,7 @@ def update_student_guardian(student_id):
                 student.notify_on_checkout = 1 if data['notify_on_checkout'] else 0
             
             sess.commit()
+            student_search.index_student(current_user.db_name, student)
             
             return jsonify({
                 'success': True,
@@ -1525,37 +2441,73 @@ def update_student_guardian(student_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+ATTENDANCE_LIST_COLUMNS = {
+    'id': Attendance.id,
+    'student_id': Attendance.student_id,
+    'student_name': Student.full_name,
+    'student_email': Student.email,
+    'timestamp': Attendance.timestamp,
+    'status': Attendance.status
+}
+
+# Where rows without a timestamp sort in /api/attendance (last, newest first);
+# the page key is coalesce(timestamp, this), id so they are paged like the rest
+UNKNOWN_ATTENDANCE_TIME = datetime(1970, 1, 1)
+
 @app.route('/api/attendance', methods=['GET'])
 @login_required
 def get_attendance():
+    """
+    Get attendance records, newest first, one page at a time.
+    Query params: date (YYYY-MM-DD), limit, cursor, fields (see /api/students)
+    """
     if not is_teacher(current_user):
         return jsonify({'success': False, 'error': 'Teacher access required'}), 403
     try:
-        # Get optional date filter from query params (format: YYYY-MM-DD)
-        date_filter = request.args.get('date')
+        fields = keyset_pagination.parse_fields(
+            request.args.get('fields'), list(ATTENDANCE_LIST_COLUMNS), list(ATTENDANCE_LIST_COLUMNS)
+        )
+        limit, cursor = keyset_pagination.parse_page_args(request.args, key_size=2)
         
-        query = Attendance.query.join(Student).order_by(Attendance.timestamp.desc())
+        sort_time = db.func.coalesce(Attendance.timestamp, UNKNOWN_ATTENDANCE_TIME)
+        selected = ['id', 'timestamp'] + [f for f in fields if f not in ('id', 'timestamp')]
+        statement = select(*[ATTENDANCE_LIST_COLUMNS[f].label(f) for f in selected]) \
+            .join(Student, Student.id == Attendance.student_id) \
+            .order_by(sort_time.desc(), Attendance.id.desc()).limit(limit + 1)
         
+        # Get optional date filter from query params (format: YYYY-MM-DD)
+        date_filter = request.args.get('date')
         if date_filter:
-            from datetime import datetime as dt
             try:
-                filter_date = dt.strptime(date_filter, '%Y-%m-%d').date()
-                query = query.filter(db.func.date(Attendance.timestamp) == filter_date)
+                filter_date = datetime.strptime(date_filter, '%Y-%m-%d').date()
+                statement = statement.where(db.func.date(Attendance.timestamp) == filter_date)
             except ValueError:
                 pass
         
-        records = query.all()
-        
-        attendance_data = [{
-            'id': a.id,
-            'student_id': a.student_id,
-            'student_name': a.student.full_name,
-            'student_email': a.student.email,
-            'timestamp': a.timestamp.isoformat() if a.timestamp else None,
-            'status': a.status
-        } for a in records]
+        if cursor:
+            try:
+                after = [datetime.fromisoformat(cursor[0]), cursor[1]]
+            except (TypeError, ValueError):
+                raise PagingError('Invalid cursor')
+            statement = statement.where(keyset_pagination.after_key(
+                [sort_time, Attendance.id], after, descending=True
+            ))
+        
+        rows = [dict(row._mapping) for row in db.session.execute(statement)]
+        page, next_cursor = keyset_pagination.finish_page(
+            rows, limit, lambda a: ((a['timestamp'] or UNKNOWN_ATTENDANCE_TIME).isoformat(), a['id'])
+        )
+        for a in page:
+            a['timestamp'] = a['timestamp'].isoformat() if a['timestamp'] else None
         
-        return jsonify({'success': True, 'attendance': attendance_data}), 200
+        return jsonify({
+            'success': True,
+            'attendance': [keyset_pagination.project(a, fields) for a in page],
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        }), 200
+    except PagingError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1653,33 +2605,47 @@ def scan_attendance():
         if not qr_data:
             return jsonify({'success': False, 'error': 'QR code data is required'}), 400
 
-        # Parse QR data - supports two formats:
-        # New format: STUDENT_{id}_{teacher_id}_{email}
+        # Parse QR data - supports three formats:
+        # Signed format: S1.{id}.{teacher_id}.{signature} (S2 in consolidated storage, see qr_payload.py)
+        # Legacy format: STUDENT_{id}_{teacher_id}_{email}
         # Old format: STUDENT_{id}_{email} (for backwards compatibility)
-        if not qr_data.startswith('STUDENT_'):
-            return jsonify({'success': False, 'error': 'Invalid QR code format'}), 400
-
-        parts = qr_data.split('_')
-        
-        if len(parts) >= 4 and parts[2].isdigit():
-            # New format: STUDENT_{id}_{teacher_id}_{email}
-            student_id = int(parts[1])
-            teacher_id = int(parts[2])
-            email = '_'.join(parts[3:])  # Email might have underscores
-        elif len(parts) >= 3:
-            # Old format: STUDENT_{id}_{email} - need to find teacher from logged in user
-            student_id = int(parts[1])
-            email = '_'.join(parts[2:])
-            # Get teacher from current logged in user
-            if current_user.is_authenticated and is_teacher(current_user):
-                teacher_id = current_user.id
-            else:
-                return jsonify({'success': False, 'error': 'Cannot determine teacher for old QR format'}), 400
+        if qr_payload.is_signed(qr_data):
+            # Checked before any database work
+            try:
+                student_id, teacher_id = qr_payload.decode(qr_data, qr_payload_version())
+            except qr_payload.QRPayloadError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+        elif qr_payload.QR_REQUIRE_SIGNED or consolidated_storage():
+            # Legacy codes carry section-file ids, which consolidated storage renumbered
+            return jsonify({'success': False, 'error': 'This QR code is no longer accepted, please get a new one'}), 400
         else:
-            return jsonify({'success': False, 'error': 'Invalid QR code format'}), 400
+            if not qr_data.startswith('STUDENT_'):
+                return jsonify({'success': False, 'error': 'Invalid QR code format'}), 400
+            
+            parts = qr_data.split('_')
+            
+            if len(parts) >= 4 and parts[2].isdigit():
+                # New format: STUDENT_{id}_{teacher_id}_{email}
+                student_id = int(parts[1])
+                teacher_id = int(parts[2])
+                email = '_'.join(parts[3:])  # Email might have underscores
+            elif len(parts) >= 3:
+                # Old format: STUDENT_{id}_{email} - need to find teacher from logged in user
+                student_id = int(parts[1])
+                email = '_'.join(parts[2:])
+                # Get teacher from current logged in user
+                if current_user.is_authenticated and is_teacher(current_user):
+                    teacher_id = current_user.id
+                else:
+                    return jsonify({'success': False, 'error': 'Cannot determine teacher for old QR format'}), 400
+            else:
+                return jsonify({'success': False, 'error': 'Invalid QR code format'}), 400
         
         # Get teacher and their database
-        teacher = Teacher.query.get(teacher_id)
+        if scan_executor.SCAN_FAST_PATH:
+            teacher = scan_executor.get_teacher(teacher_id)
+        else:
+            teacher = find_code_teacher(teacher_id)
         if not teacher or not teacher.db_name:
             return jsonify({'success': False, 'error': 'Invalid teacher reference'}), 404
 
@@ -1687,7 +2653,7 @@ def scan_attendance():
         authorized = False
         if current_user.is_authenticated and is_teacher(current_user):
             # Teachers can only scan their own students (or admin can scan any)
-            if current_user.email == 'admin@teacher' or current_user.id == teacher_id:
+            if current_user.email == 'admin@teacher' or current_user.id == teacher.id:
                 authorized = True
         else:
             header_secret = request.headers.get('X-Scanner-Secret')
@@ -1698,135 +2664,315 @@ def scan_attendance():
             return jsonify({'success': False, 'error': 'Unauthorized'}), 401
         
         # Get admin config for time settings
-        config = AdminConfig.query.first()
-        if not config:
-            config = AdminConfig()
-            db.session.add(config)
-            db.session.commit()
+        config = scan_executor.get_settings() if scan_executor.SCAN_FAST_PATH else load_admin_config()
         
-        # Get student from teacher's database
-        Session = get_teacher_db_session(teacher.db_name)
-        sess = Session()
+        # Get current Philippine time
+        now = get_philippine_time()
+        today_str = now.date().strftime('%Y-%m-%d')
+
+        # Determine shift for this scan
+        shift = select_shift(config, now.time())
         
+        # Repeat reads of the same code within the window are answered from memory
+        if not scan_dedup.enabled():
+            result, code = complete_scan(teacher, config, student_id, now, today_str, shift)
+            return jsonify(result), code
+
+        dedup_key = scan_dedup.scan_key(teacher.id, student_id, today_str, shift)
+        previous = scan_dedup.begin(dedup_key, json.dumps, json.loads)
+        if previous is not None:
+            return jsonify(dict(previous, duplicate=True)), 201
         try:
-            student = sess.query(TeacherStudent).get(student_id)
-            if not student:
-                return jsonify({'success': False, 'error': 'Student not found'}), 404
-            
-            # Get current Philippine time
-            now = get_philippine_time()
-            today = now.date()
-            today_str = today.strftime('%Y-%m-%d')
-            current_time = now.time()
+            result, code = complete_scan(teacher, config, student_id, now, today_str, shift)
+        except Exception:
+            scan_dedup.abandon(dedup_key)
+            raise
+        if code == 201:
+            scan_dedup.finish(dedup_key, result, json.dumps)
+        else:
+            scan_dedup.abandon(dedup_key)
+        return jsonify(result), code
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-            # Determine shift for this scan
-            shift = select_shift(config, current_time)
-            
-            from sqlalchemy import func
-            
-            # Get today's attendance record for this student and shift
-            today_attendance = sess.query(TeacherAttendance).filter(
-                TeacherAttendance.student_id == student_id,
-                TeacherAttendance.date == today_str,
-                TeacherAttendance.shift == shift
-            ).first()
-            
-            # Parse configured times for the selected shift
-            if shift == 'afternoon':
-                check_in_end_time = datetime.strptime(config.afternoon_check_in_end_time, '%H:%M').time()
-                check_out_end_time = datetime.strptime(config.afternoon_check_out_end_time, '%H:%M').time()
+def complete_scan(teacher, config, student_id, now, today_str, shift):
+    """
+    Record a scan, then update the section summary and send the guardian
+    notification (see finish_scan).
+
+    Returns:
+        (response body, HTTP status)
+    """
+    if scan_executor.SCAN_FAST_PATH:
+        def on_saved(saved):
+            # Called by scan_batcher once a queued scan commits
+            with app.app_context():
+                finish_scan(teacher, config, saved, now, today_str, shift, True)
+
+        # Through the writer process if there is one; group commit when SCAN_BATCH_MS is set
+        try:
+            outcome = teacher_writer.record_scan(teacher, config, student_id, now, shift, on_saved)
+        except LookupError:
+            scan_executor.invalidate()
+            return {'success': False, 'error': 'Invalid teacher reference'}, 404
+        if outcome and not outcome.pending:
+            finish_scan(teacher, config, outcome, now, today_str, shift, True)
+    else:
+        outcome = record_scan_orm(teacher, config, student_id, now, shift)
+        if outcome:
+            finish_scan(teacher, config, outcome, now, today_str, shift, False)
+    
+    if outcome is None:
+        return {'success': False, 'error': 'Student not found'}, 404
+    
+    student = outcome.student
+    attendance_status = outcome.attendance_status
+    if outcome.status == 'check_in':
+        message = f'{attendance_status}: {student["full_name"]} checked in at {now.strftime("%I:%M %p")}'
+    elif outcome.status == 'check_out':
+        message = f'{student["full_name"]} checked out at {now.strftime("%I:%M %p")}'
+    else:
+        # Already checked in and out today
+        message = f'{student["full_name"]} has already completed attendance for today'
+    
+    return {
+        'success': True,
+        'message': message,
+        'student_name': student['full_name'],
+        'status': outcome.status,
+        'attendance_status': attendance_status,
+        'timestamp': now.isoformat()
+    }, 201
+
+def finish_scan(teacher, config, outcome, now, today_str, shift, bump_summary):
+    """
+    What follows a saved scan: the section summary for a check-in (staged
+    already by record_scan_orm, so bumped here only if bump_summary) and the
+    guardian notification.
+    """
+    student = outcome.student
+    attendance_status = outcome.attendance_status
+    if outcome.status == 'check_in':
+        if bump_summary:
+            attendance_rollups.bump_section_summary(
+                db.session, SectionDailySummary, teacher, today_str, shift, None, attendance_status
+            )
+        db.session.commit()
+        
+        # Send notification to guardian
+        if student['guardian_email'] and student['notify_on_checkin']:
+            send_attendance_notification(
+                guardian_email=student['guardian_email'],
+                guardian_name=student['guardian_name'] or 'Parent/Guardian',
+                student_name=student['full_name'],
+                status=attendance_status,
+                timestamp=now,
+                check_in_end_time=config.check_in_end_time,
+                check_out_end_time=config.check_out_end_time
+            )
+        
+    elif outcome.status == 'check_out':
+        # Send checkout notification to guardian
+        if student['guardian_email'] and student['notify_on_checkout']:
+            send_attendance_notification(
+                guardian_email=student['guardian_email'],
+                guardian_name=student['guardian_name'] or 'Parent/Guardian',
+                student_name=student['full_name'],
+                status=f'{attendance_status} (Checked Out)',
+                timestamp=now,
+                check_in_end_time=config.check_in_end_time,
+                check_out_end_time=config.check_out_end_time
+            )
+
+def load_admin_config():
+    """Get the AdminConfig row, creating it with defaults if missing"""
+    config = AdminConfig.query.first()
+    if not config:
+        config = AdminConfig()
+        db.session.add(config)
+        db.session.commit()
+    return config
+
+def find_code_teacher(teacher_id):
+    """
+    The teacher a QR code's teacher id names: on a hybrid desktop the synced
+    teacher with that cloud id (see apply_synced_sections), else by id.
+    """
+    return Teacher.query.filter_by(cloud_id=teacher_id).first() or db.session.get(Teacher, teacher_id)
+
+scan_executor.init_scan_executor(find_code_teacher, load_admin_config)
+
+@event.listens_for(db.session, 'after_flush')
+def note_scan_cache_changes(session, flush_context):
+    """Remember that a teacher or the admin config changed, for refresh_scan_caches"""
+    changed = list(session.new) + list(session.dirty) + list(session.deleted)
+    if any(isinstance(obj, (Teacher, AdminConfig)) for obj in changed):
+        session.info['scan_cache_stale'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def refresh_scan_caches(session):
+    if session.info.pop('scan_cache_stale', False):
+        scan_executor.invalidate()
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_scan_cache_changes(session):
+    session.info.pop('scan_cache_stale', None)
+
+def record_scan_orm(teacher, config, student_id, now, shift):
+    """
+    Record one scan in the teacher database through the ORM (the path used
+    when SCAN_FAST_PATH=0; scan_executor.record_scan is the fast one).
+    
+    Stages the section summary on db.session for a check-in; the caller
+    commits it. Returns a scan_executor.ScanOutcome, or None if the student
+    isn't in this section.
+    """
+    Session = get_teacher_db_session(teacher.db_name)
+    sess = Session()
+    
+    try:
+        student = sess.query(TeacherStudent).get(student_id)
+        if not student:
+            return None
+        student_info = {
+            'full_name': student.full_name,
+            'guardian_email': student.guardian_email,
+            'guardian_name': student.guardian_name,
+            'notify_on_checkin': student.notify_on_checkin,
+            'notify_on_checkout': student.notify_on_checkout
+        }
+        
+        today_str = now.date().strftime('%Y-%m-%d')
+        current_time = now.time()
+        
+        # Get today's attendance record for this student and shift
+        today_attendance = sess.query(TeacherAttendance).filter(
+            TeacherAttendance.student_id == student_id,
+            TeacherAttendance.date == today_str,
+            TeacherAttendance.shift == shift
+        ).order_by(TeacherAttendance.id).first()
+        
+        # Parse configured check-in deadline for the selected shift
+        if shift == 'afternoon':
+            check_in_end_time = datetime.strptime(config.afternoon_check_in_end_time, '%H:%M').time()
+        else:
+            check_in_end_time = datetime.strptime(config.check_in_end_time, '%H:%M').time()
+        
+        # Determine what type of scan this is (check-in or check-out)
+        if today_attendance is None:
+            # First scan of the day - this is check-in
+            # Determine attendance status based on time
+            if current_time <= check_in_end_time:
+                attendance_status = 'PRESENT'
             else:
-                check_in_end_time = datetime.strptime(config.check_in_end_time, '%H:%M').time()
-                check_out_end_time = datetime.strptime(config.check_out_end_time, '%H:%M').time()
+                attendance_status = 'LATE'
             
-            # Determine what type of scan this is (check-in or check-out)
-            if today_attendance is None:
-                # First scan of the day - this is check-in
-                new_status = 'check_in'
-                
-                # Determine attendance status based on time
-                if current_time <= check_in_end_time:
-                    attendance_status = 'PRESENT'
-                else:
-                    attendance_status = 'LATE'
-                
-                # Create new attendance record
-                attendance = TeacherAttendance(
-                    student_id=student_id, 
+            # Create new attendance record
+            attendance = TeacherAttendance(
+                student_id=student_id, 
+                status='check_in',
+                attendance_status=attendance_status,
+                check_in_time=now,
+                date=today_str,
+                shift=shift
+            )
+            sess.add(attendance)
+            record_attendance_change(
+                sess, teacher, student_id, today_str, shift, None, attendance_status
+            )
+            sess.commit()
+            return scan_executor.ScanOutcome('check_in', attendance_status, student_info)
+        
+        if today_attendance.check_out_time is None:
+            # Second scan - this is check-out, keeping the existing status (PRESENT or LATE)
+            today_attendance.check_out_time = now
+            today_attendance.status = 'check_out'
+            sess.commit()
+            return scan_executor.ScanOutcome('check_out', today_attendance.attendance_status, student_info)
+        
+        return scan_executor.ScanOutcome('completed', today_attendance.attendance_status, student_info)
+    finally:
+        sess.close()
+
+def run_auto_mark(job=None):
+    """
+    Mark students ABSENT (not checked in by the deadline) or CUTTING (checked
+    in but not out) for today's shifts across every section.
+    
+    Each section is marked in one transaction, by the writer process when
+    there is one (teacher_writer.auto_mark). Runs in the request or as a
+    background job (job is a JobContext). Returns counts of students marked.
+    """
+    config = AdminConfig.query.first()
+    if not config:
+        raise ValueError('Admin config not found')
+    
+    now = get_philippine_time()
+    today_str = now.date().strftime('%Y-%m-%d')
+    current_time = now.time()
+    
+    # Prepare shift-specific configured times
+    deadlines = {
+        'morning': (datetime.strptime(config.check_in_end_time, '%H:%M').time(),
+                    datetime.strptime(config.check_out_end_time, '%H:%M').time()),
+        'afternoon': (datetime.strptime(config.afternoon_check_in_end_time, '%H:%M').time(),
+                      datetime.strptime(config.afternoon_check_out_end_time, '%H:%M').time())
+    }
+    shifts = [
+        (shift_name, bool(config.auto_mark_absent_enabled) and current_time > cin_end,
+         bool(config.auto_mark_cutting_enabled) and current_time > cout_end)
+        for shift_name, (cin_end, cout_end) in deadlines.items()
+    ]
+
+    marked_absent = 0
+    marked_cutting = 0
+
+    # Get all teachers
+    teachers = Teacher.query.filter(Teacher.db_name.isnot(None)).all()
+
+    for done, teacher in enumerate(teachers):
+        if job:
+            job.progress(done, len(teachers), f'Grade {teacher.grade_level} - {teacher.section}')
+        changes = teacher_writer.auto_mark(teacher.db_name, today_str, shifts)
+        for student, shift_name, old_status, new_status in changes:
+            attendance_rollups.bump_section_summary(
+                db.session, SectionDailySummary, teacher, today_str, shift_name, old_status, new_status
+            )
+        db.session.commit()
+
+        for student, shift_name, old_status, new_status in changes:
+            if new_status == 'ABSENT':
+                marked_absent += 1
+            else:
+                marked_cutting += 1
+
+            # Send notification
+            if student['guardian_email']:
+                cin_end, cout_end = deadlines[shift_name]
+                send_attendance_notification(
+                    guardian_email=student['guardian_email'],
+                    guardian_name=student['guardian_name'] or 'Parent/Guardian',
+                    student_name=student['full_name'],
                     status=new_status,
-                    attendance_status=attendance_status,
-                    check_in_time=now,
-                    date=today_str,
-                    shift=shift
+                    timestamp=now,
+                    check_in_end_time=cin_end.strftime('%H:%M'),
+                    check_out_end_time=cout_end.strftime('%H:%M')
                 )
-                sess.add(attendance)
-                sess.commit()
-                
-                # Send notification to guardian
-                if student.guardian_email and student.notify_on_checkin:
-                    send_attendance_notification(
-                        guardian_email=student.guardian_email,
-                        guardian_name=student.guardian_name or 'Parent/Guardian',
-                        student_name=student.full_name,
-                        status=attendance_status,
-                        timestamp=now,
-                        check_in_end_time=config.check_in_end_time,
-                        check_out_end_time=config.check_out_end_time
-                    )
-                
-                message = f'{attendance_status}: {student.full_name} checked in at {now.strftime("%I:%M %p")}'
-                
-            elif today_attendance.check_out_time is None:
-                # Second scan - this is check-out
-                new_status = 'check_out'
-                today_attendance.check_out_time = now
-                today_attendance.status = new_status
-                
-                # Keep the existing attendance status (PRESENT or LATE)
-                attendance_status = today_attendance.attendance_status
-                
-                sess.commit()
-                
-                # Send checkout notification to guardian
-                if student.guardian_email and student.notify_on_checkout:
-                    send_attendance_notification(
-                        guardian_email=student.guardian_email,
-                        guardian_name=student.guardian_name or 'Parent/Guardian',
-                        student_name=student.full_name,
-                        status=f'{attendance_status} (Checked Out)',
-                        timestamp=now,
-                        check_in_end_time=config.check_in_end_time,
-                        check_out_end_time=config.check_out_end_time
-                    )
-                
-                message = f'{student.full_name} checked out at {now.strftime("%I:%M %p")}'
-                
-            else:
-                # Already checked in and out today
-                message = f'{student.full_name} has already completed attendance for today'
-                attendance_status = today_attendance.attendance_status
-                new_status = 'completed'
-            
-            return jsonify({
-                'success': True,
-                'message': message,
-                'student_name': student.full_name,
-                'status': new_status,
-                'attendance_status': attendance_status,
-                'timestamp': now.isoformat()
-            }), 201
-        finally:
-            sess.close()
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    return {
+        'message': f'Auto-marked {marked_absent} students as ABSENT and {marked_cutting} as CUTTING',
+        'marked_absent': marked_absent,
+        'marked_cutting': marked_cutting
+    }
 
 @app.route('/api/attendance/auto-mark', methods=['POST'])
 def auto_mark_attendance():
     """
     Auto-mark students as ABSENT (if not checked in by deadline) or CUTTING (if not checked out)
     This should be called by a scheduled task or admin manually
+    Body (optional): background (bool, run as a job and return its id)
     """
     try:
         # Authorization: only admin or system
@@ -1836,107 +2982,495 @@ def auto_mark_attendance():
         if not is_admin and header_secret != SCANNER_SECRET:
             return jsonify({'success': False, 'error': 'Unauthorized'}), 401
         
-        config = AdminConfig.query.first()
-        if not config:
+        if AdminConfig.query.first() is None:
             return jsonify({'success': False, 'error': 'Admin config not found'}), 500
         
-        now = get_philippine_time()
-        today_str = now.date().strftime('%Y-%m-%d')
-        current_time = now.time()
+        if wants_background(request.get_json(silent=True)):
+            return start_job_response('auto_mark', run_auto_mark, 'Auto-mark started', unique=True)
+        
+        result = run_auto_mark()
+        return jsonify({'success': True, **result}), 200
         
-        # Prepare shift-specific configured times
-        morning_check_in_end = datetime.strptime(config.check_in_end_time, '%H:%M').time()
-        morning_check_out_end = datetime.strptime(config.check_out_end_time, '%H:%M').time()
-        afternoon_check_in_end = datetime.strptime(config.afternoon_check_in_end_time, '%H:%M').time()
-        afternoon_check_out_end = datetime.strptime(config.afternoon_check_out_end_time, '%H:%M').time()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        marked_absent = 0
-        marked_cutting = 0
+def run_rollup_compaction(job, date_from, date_to):
+    """Rebuild daily rollups and history bitsets for every section (job may be None)"""
+    # History bitsets are rebuilt per school year touched by the range
+    school_years = sorted({
+        attendance_bitsets.school_year_for(datetime.strptime(d, '%Y-%m-%d').date())
+        for d in (date_from, date_to)
+    })
+    school_years = list(range(school_years[0], school_years[-1] + 1))
+    
+    student_days = 0
+    summary_rows = 0
+    teachers = Teacher.query.filter(Teacher.db_name.isnot(None)).all()
+    for done, teacher in enumerate(teachers):
+        if job:
+            job.progress(done, len(teachers), f'Grade {teacher.grade_level} - {teacher.section}')
+        result = attendance_rollups.compact_section(
+            db.session, SectionDailySummary, teacher, date_from, date_to
+        )
+        db.session.commit()
+        student_days += result['student_days']
+        summary_rows += result['summary_rows']
+        for school_year in school_years:
+            attendance_bitsets.rebuild_section_bitsets(teacher.db_name, school_year)
+    
+    return {
+        'message': f'Compacted rollups for {len(teachers)} sections from {date_from} to {date_to}',
+        'sections': len(teachers),
+        'student_days': student_days,
+        'summary_rows': summary_rows
+    }
 
-        # Get all teachers
-        teachers = Teacher.query.filter(Teacher.db_name.isnot(None)).all()
+@app.route('/api/admin/rollups/compact', methods=['POST'])
+def compact_rollups():
+    """
+    Rebuild the daily attendance rollups from raw attendance rows.
+    This should be called nightly by a scheduled task or by admin manually.
+    Body (optional): from, to (YYYY-MM-DD, default yesterday through today),
+    background (bool, run as a job and return its id)
+    """
+    try:
+        # Authorization: only admin or system
+        header_secret = request.headers.get('X-Scanner-Secret')
+        is_admin = current_user.is_authenticated and is_teacher(current_user) and current_user.email == 'admin@teacher'
+        
+        if not is_admin and header_secret != SCANNER_SECRET:
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        
+        data = (request.get_json(silent=True) if request.is_json else request.form) or {}
+        default_from, default_to = attendance_rollups.default_compaction_range(get_philippine_time().date())
+        date_from = parse_date_arg(data.get('from') or default_from)
+        date_to = parse_date_arg(data.get('to') or default_to)
+        if not date_from or not date_to:
+            return jsonify({'success': False, 'error': 'Dates must be in YYYY-MM-DD format'}), 400
+        
+        if wants_background(data):
+            return start_job_response(
+                'compact_rollups', run_rollup_compaction, f'Compaction started for {date_from} to {date_to}',
+                date_from, date_to, params={'from': date_from, 'to': date_to}, unique=True
+            )
+        
+        result = run_rollup_compaction(None, date_from, date_to)
+        return jsonify({'success': True, **result}), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        for teacher in teachers:
-            Session = get_teacher_db_session(teacher.db_name)
-            sess = Session()
+def run_archive_rollover(job, db_names, compress):
+    """Move closed terms out of each teacher database (job may be None)"""
+    archived = []
+    failed = []
+    rows = 0
+    for done, db_name in enumerate(db_names):
+        if job:
+            job.progress(done, len(db_names), db_name)
+        try:
+            result = attendance_archive.archive_closed_terms(db_name, compress=compress)
+            if result['terms']:
+                print(f"✓ Archived {result['rows']} rows from {db_name}: {', '.join(result['terms'])}")
+                archived.append(result)
+                rows += result['rows']
+        except Exception as e:
+            print(f"✗ Archiving {db_name} failed: {e}")
+            failed.append({'db_name': db_name, 'error': str(e)})
+    return {'sections': len(db_names), 'rows': rows, 'archived': archived, 'failed': failed}
 
-            try:
-                # Get all students for this teacher
-                students = sess.query(TeacherStudent).all()
-
-                for student in students:
-                    # Check both shifts separately
-                    for shift_name, cin_end, cout_end in (
-                        ('morning', morning_check_in_end, morning_check_out_end),
-                        ('afternoon', afternoon_check_in_end, afternoon_check_out_end)
-                    ):
-                        # Get today's attendance record for this shift
-                        attendance = sess.query(TeacherAttendance).filter(
-                            TeacherAttendance.student_id == student.id,
-                            TeacherAttendance.date == today_str,
-                            TeacherAttendance.shift == shift_name
-                        ).first()
-
-                        # Mark ABSENT if past check-in time and no attendance record for this shift
-                        if config.auto_mark_absent_enabled and current_time > cin_end:
-                            if attendance is None:
-                                # Create absence record for this shift
-                                attendance = TeacherAttendance(
-                                    student_id=student.id,
-                                    status='absent',
-                                    attendance_status='ABSENT',
-                                    date=today_str,
-                                    shift=shift_name
-                                )
-                                sess.add(attendance)
-                                sess.commit()
-                                marked_absent += 1
-
-                                # Send notification
-                                if student.guardian_email:
-                                    send_attendance_notification(
-                                        guardian_email=student.guardian_email,
-                                        guardian_name=student.guardian_name or 'Parent/Guardian',
-                                        student_name=student.full_name,
-                                        status='ABSENT',
-                                        timestamp=now,
-                                        check_in_end_time=cin_end.strftime('%H:%M'),
-                                        check_out_end_time=cout_end.strftime('%H:%M')
-                                    )
-
-                        # Mark CUTTING if past checkout time and checked in but not out for this shift
-                        if config.auto_mark_cutting_enabled and current_time > cout_end:
-                            if attendance and attendance.check_in_time and not attendance.check_out_time:
-                                # Do not overwrite teacher-set EXCUSED status; only set to CUTTING
-                                if attendance.attendance_status not in ('CUTTING', 'EXCUSED'):
-                                    attendance.attendance_status = 'CUTTING'
-                                    sess.commit()
-                                    marked_cutting += 1
-
-                                    # Send notification
-                                    if student.guardian_email:
-                                        send_attendance_notification(
-                                            guardian_email=student.guardian_email,
-                                            guardian_name=student.guardian_name or 'Parent/Guardian',
-                                            student_name=student.full_name,
-                                            status='CUTTING',
-                                            timestamp=now,
-                                            check_in_end_time=cin_end.strftime('%H:%M'),
-                                            check_out_end_time=cout_end.strftime('%H:%M')
-                                        )
-            finally:
-                sess.close()
+@app.route('/api/admin/archive/rollover', methods=['POST'])
+def archive_rollover():
+    """
+    Move attendance from closed terms into per-term archive databases.
+    Run at the start of each term by a scheduled task or by admin manually.
+    Body (optional): compress (bool, gzip the archives)
+    """
+    try:
+        # Authorization: only admin or system
+        header_secret = request.headers.get('X-Scanner-Secret')
+        is_admin = current_user.is_authenticated and is_teacher(current_user) and current_user.email == 'admin@teacher'
+        
+        if not is_admin and header_secret != SCANNER_SECRET:
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        
+        if consolidated_storage():
+            return jsonify({'success': False, 'error': 'Term archives need per-teacher database files (TEACHER_STORAGE=files)'}), 409
+        
+        data = (request.get_json(silent=True) if request.is_json else request.form) or {}
+        compress = str(data.get('compress', '')).lower() in ('1', 'true', 'yes')
+        
+        db_names = [t.db_name for t in Teacher.query.filter(Teacher.db_name.isnot(None)).all()]
+        return start_job_response(
+            'archive_rollover', run_archive_rollover, f'Archiving closed terms for {len(db_names)} sections',
+            db_names, compress, params={'sections': len(db_names), 'compress': compress}, unique=True
+        )
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def run_backup_job(job, publish):
+    result = db_backup.run_backup(get_main_db_path(), publish=publish)
+    if result is None:
+        raise RuntimeError('A backup is already running')
+    return result
+
+@app.route('/api/admin/backups', methods=['GET', 'POST'])
+def admin_backups():
+    """
+    GET: list backup snapshots and the published reporting snapshot.
+    POST: take a backup now. Body (optional): publish (bool, make it the
+    reporting snapshot), background (bool, run as a job and return its id).
+    Admin or scheduled task (X-Scanner-Secret).
+    """
+    try:
+        # Authorization: only admin or system
+        header_secret = request.headers.get('X-Scanner-Secret')
+        is_admin = current_user.is_authenticated and is_teacher(current_user) and current_user.email == 'admin@teacher'
+        
+        if not is_admin and header_secret != SCANNER_SECRET:
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        
+        if request.method == 'GET':
+            return jsonify({
+                'success': True,
+                'snapshots': db_backup.list_snapshots(),
+                'reporting_snapshot': db_backup.get_reporting_snapshot(),
+                'backup_dir': db_backup.get_backup_dir()
+            }), 200
         
+        data = (request.get_json(silent=True) if request.is_json else request.form) or {}
+        publish = str(data.get('publish', '')).lower() in ('1', 'true', 'yes')
+        if wants_background(data):
+            return start_job_response(
+                'backup', run_backup_job, 'Backup started', publish,
+                params={'publish': publish}, unique=True
+            )
+        
+        result = db_backup.run_backup(get_main_db_path(), publish=publish)
+        if result is None:
+            return jsonify({'success': False, 'error': 'A backup is already running'}), 409
+        
+        return jsonify({
+            'success': True,
+            'message': f"Backup {result['snapshot']} created",
+            **result
+        }), 201
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/backups/<snapshot_id>/publish', methods=['POST'])
+@login_required
+def publish_backup(snapshot_id):
+    """Make a backup snapshot the read-only copy used by reporting exports"""
+    if not is_teacher(current_user) or current_user.email != 'admin@teacher':
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
+    
+    try:
+        db_backup.publish_reporting_snapshot(snapshot_id)
+        return jsonify({'success': True, 'reporting_snapshot': snapshot_id}), 200
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/writer-stats', methods=['GET'])
+@login_required
+def writer_stats():
+    """Throughput and queue latency of the teacher-database writer process (see teacher_writer.py)"""
+    if not is_teacher(current_user) or current_user.email != 'admin@teacher':
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
+
+    if not teacher_writer.enabled():
+        return jsonify({'success': True, 'enabled': False}), 200
+    try:
+        return jsonify({'success': True, 'enabled': True, **teacher_writer.get_stats()}), 200
+    except teacher_writer.WriterUnavailable as e:
+        return jsonify({'success': False, 'enabled': True, 'error': f'Writer not reachable: {e}'}), 503
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ==================== CHANGE FEED ====================
+
+# Most changes returned per /api/changes request
+CHANGE_FEED_MAX_LIMIT = 1000
+
+@app.route('/api/changes', methods=['GET'])
+def change_feed():
+    """
+    Changes to a section's students and attendance after a change log seq
+    (see change_log.py), for consumers that keep up incrementally: call with
+    ?since=<next_since of the previous response>, starting from 0.
+    Query: since, limit (default 500), tables (students,attendance), rows (1
+    adds each row's current values), db_name (admin or X-Scanner-Secret;
+    teachers get their own section).
+    """
+    try:
+        is_admin = current_user.is_authenticated and is_teacher(current_user) and current_user.email == 'admin@teacher'
+        if is_admin or request.headers.get('X-Scanner-Secret') == SCANNER_SECRET:
+            db_name = request.args.get('db_name', '')
+            if not Teacher.query.filter_by(db_name=db_name).first():
+                return jsonify({'success': False, 'error': 'Section not found'}), 404
+        elif current_user.is_authenticated and is_teacher(current_user):
+            db_name = current_user.db_name
+            if not db_name:
+                return jsonify({'success': False, 'error': 'Teacher database not configured'}), 400
+        else:
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+
+        if consolidated_storage():
+            return jsonify({'success': False, 'error': 'The change log needs per-teacher database files (TEACHER_STORAGE=files)'}), 409
+
+        since = request.args.get('since', 0, type=int)
+        limit = request.args.get('limit', 500, type=int)
+        if since < 0 or limit < 1:
+            return jsonify({'success': False, 'error': 'since must be >= 0 and limit >= 1'}), 400
+        tables = [t for t in request.args.get('tables', '').split(',') if t]
+        unknown = [t for t in tables if t not in change_log.LOGGED_TABLES]
+        if unknown:
+            return jsonify({'success': False, 'error': f'Unknown table: {", ".join(unknown)}'}), 400
+        include_rows = request.args.get('rows', '').lower() in ('1', 'true', 'yes')
+
+        feed = read_change_feed(db_name, since, min(limit, CHANGE_FEED_MAX_LIMIT), tables, include_rows)
+        return jsonify({'success': True, 'db_name': db_name, 'since': since, **feed}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ==================== DELTA SYNC (HYBRID DESKTOPS) ====================
+
+def sync_desktop():
+    """
+    The hybrid desktop making a sync request (see delta_sync.py), found by
+    its X-Sync-Secret key.
+
+    Returns:
+        (SyncDesktop, None), or (None, error response)
+    """
+    key = request.headers.get('X-Sync-Secret')
+    desktop = SyncDesktop.query.filter_by(key_hash=delta_sync.hash_desktop_key(key)).first() if key else None
+    if desktop is None:
+        return None, (jsonify({'success': False, 'error': 'Unauthorized'}), 401)
+    return desktop, None
+
+def synced_teacher(desktop, db_name):
+    """The teacher of a section assigned to desktop, or None"""
+    teacher = Teacher.query.filter_by(db_name=db_name).first() if db_name else None
+    if teacher is None or teacher.id not in desktop.get_teacher_ids():
+        return None
+    return teacher
+
+@app.route('/api/sync/sections', methods=['GET'])
+def sync_sections():
+    """The calling desktop's sections and their teachers' logins"""
+    desktop, denied = sync_desktop()
+    if denied:
+        return denied
+    try:
+        teachers = Teacher.query.filter(
+            Teacher.db_name.isnot(None),
+            Teacher.id.in_(desktop.get_teacher_ids())
+        ).order_by(Teacher.id).all()
         return jsonify({
             'success': True,
-            'message': f'Auto-marked {marked_absent} students as ABSENT and {marked_cutting} as CUTTING',
-            'marked_absent': marked_absent,
-            'marked_cutting': marked_cutting
+            'sections': [{
+                'id': t.id,
+                'full_name': t.full_name,
+                'email': t.email,
+                'password_hash': t.password_hash,
+                'grade_level': t.grade_level,
+                'section': t.section,
+                'db_name': t.db_name
+            } for t in teachers]
         }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/sync/roster', methods=['GET'])
+def sync_roster():
+    """Students of a section changed after ?since= (a change log seq); gzip-compressed"""
+    desktop, denied = sync_desktop()
+    if denied:
+        return denied
+    try:
+        db_name = request.args.get('db_name', '')
+        if not synced_teacher(desktop, db_name):
+            return jsonify({'success': False, 'error': 'Section not found'}), 404
+        since = request.args.get('since', 0, type=int)
+        body = delta_sync.encode_body({'success': True, **delta_sync.roster_since(db_name, since)})
+        return Response(body, mimetype='application/json', headers={'Content-Encoding': 'gzip'})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/sync/push', methods=['POST'])
+def sync_push():
+    """
+    Attendance rows recorded on a hybrid desktop. Body (JSON, optionally
+    Content-Encoding: gzip): db_name, changes (see delta_sync.merge_attendance).
+    """
+    desktop, denied = sync_desktop()
+    if denied:
+        return denied
+    try:
+        data = delta_sync.decode_body(request.get_data(), request.headers.get('Content-Encoding'))
+        teacher = synced_teacher(desktop, data.get('db_name'))
+        if not teacher:
+            return jsonify({'success': False, 'error': 'Section not found'}), 404
+
+        def on_status_change(date_str, shift, old_status, new_status, student_id):
+            attendance_rollups.bump_section_summary(
+                db.session, SectionDailySummary, teacher, date_str, shift, old_status, new_status
+            )
+            scan_dedup.forget_student(teacher.id, student_id)
+
+        result = delta_sync.merge_attendance(teacher.db_name, data.get('changes') or [], on_status_change)
+        db.session.commit()
+        return jsonify({'success': True, **result}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def read_desktop_teacher_ids(data):
+    """
+    The teacher_ids of a sync desktop request body.
+
+    Raises:
+        ValueError: Not a list of ids of teachers with a section
+    """
+    teacher_ids = data.get('teacher_ids')
+    if not isinstance(teacher_ids, list) or not all(isinstance(i, int) for i in teacher_ids):
+        raise ValueError('teacher_ids must be a list of teacher ids')
+    found = {t.id for t in Teacher.query.filter(Teacher.id.in_(teacher_ids), Teacher.db_name.isnot(None))}
+    missing = [i for i in teacher_ids if i not in found]
+    if missing:
+        raise ValueError(f'No section for teacher ids: {", ".join(map(str, missing))}')
+    return sorted(found)
+
+def sync_desktop_dict(desktop):
+    return {
+        'id': desktop.id,
+        'name': desktop.name,
+        'teacher_ids': desktop.get_teacher_ids(),
+        'created_at': desktop.created_at.isoformat() if desktop.created_at else None
+    }
+
+@app.route('/api/admin/sync-desktops', methods=['GET', 'POST'])
+@login_required
+def sync_desktops():
+    """
+    List the hybrid desktops allowed to sync (GET), or add one (POST).
+
+    JSON body for POST: name, teacher_ids (the sections it syncs). The
+    response holds the desktop's key, its desktop_config.json sync_secret;
+    only a hash is stored, so it can't be read again (delete the desktop and
+    add it again for a new key).
+    """
+    if not is_teacher(current_user) or current_user.email != 'admin@teacher':
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
+    
+    try:
+        if request.method == 'GET':
+            desktops = SyncDesktop.query.order_by(SyncDesktop.id).all()
+            return jsonify({'success': True, 'desktops': [sync_desktop_dict(d) for d in desktops]}), 200
+        
+        data = request.get_json(silent=True) or {}
+        name = (data.get('name') or '').strip()
+        if not name:
+            return jsonify({'success': False, 'error': 'name is required'}), 400
+        if SyncDesktop.query.filter_by(name=name).first():
+            return jsonify({'success': False, 'error': 'A desktop with this name already exists'}), 400
+        try:
+            teacher_ids = read_desktop_teacher_ids(data)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
+        key = delta_sync.new_desktop_key()
+        desktop = SyncDesktop(name=name, key_hash=delta_sync.hash_desktop_key(key), teacher_ids=json.dumps(teacher_ids))
+        db.session.add(desktop)
+        db.session.commit()
+        return jsonify({'success': True, 'desktop': sync_desktop_dict(desktop), 'key': key}), 201
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/admin/sync-desktops/<int:desktop_id>', methods=['PUT', 'DELETE'])
+@login_required
+def sync_desktop_detail(desktop_id):
+    """Change a hybrid desktop's sections (PUT, JSON body: teacher_ids) or stop it syncing (DELETE)"""
+    if not is_teacher(current_user) or current_user.email != 'admin@teacher':
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
+    
+    try:
+        desktop = db.session.get(SyncDesktop, desktop_id)
+        if not desktop:
+            return jsonify({'success': False, 'error': 'Desktop not found'}), 404
+        if request.method == 'DELETE':
+            db.session.delete(desktop)
+            db.session.commit()
+            return jsonify({'success': True}), 200
+        
+        try:
+            desktop.teacher_ids = json.dumps(read_desktop_teacher_ids(request.get_json(silent=True) or {}))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        db.session.commit()
+        return jsonify({'success': True, 'desktop': sync_desktop_dict(desktop)}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def apply_synced_sections(sections):
+    """
+    Mirror the cloud's teachers on a hybrid desktop (cloud values win) and
+    create their databases; returns the db_names to sync.
+
+    A cloud teacher is matched by cloud_id, then by the email of an account
+    not synced yet. A new one keeps the cloud's id if it is free here, else
+    gets another (QR codes are resolved through cloud_id, see
+    find_code_teacher). Accounts made on this desktop are never removed: an
+    email or a section database one of them holds stays theirs.
+    """
+    with app.app_context():
+        db_names = []
+        for values in sections:
+            cloud_id = values['id']
+            teacher = (Teacher.query.filter_by(cloud_id=cloud_id).first()
+                       or Teacher.query.filter_by(email=values['email'], cloud_id=None).first())
+            own_id = teacher.id if teacher else None
+            email_taken = Teacher.query.filter(Teacher.email == values['email'], Teacher.id != own_id).first()
+            database_taken = Teacher.query.filter(Teacher.db_name == values['db_name'], Teacher.id != own_id).first()
+            if database_taken:
+                print(f"✗ Section {values['db_name']} not synced: its database belongs to {database_taken.email} here")
+                continue
+            if teacher is None:
+                if email_taken:
+                    print(f"✗ Section {values['db_name']} not synced: {values['email']} is another account here")
+                    continue
+                teacher = Teacher(id=None if db.session.get(Teacher, cloud_id) else cloud_id, email=values['email'])
+                db.session.add(teacher)
+            elif email_taken:
+                print(f"✗ {teacher.email} keeps its email: {values['email']} is another account here")
+            else:
+                teacher.email = values['email']
+            is_new = teacher.db_name != values['db_name']
+            teacher.cloud_id = cloud_id
+            for field in ('full_name', 'password_hash', 'grade_level', 'section', 'db_name'):
+                setattr(teacher, field, values[field])
+            db.session.commit()
+            if is_new:
+                # Named after the cloud's id, like values['db_name']
+                create_teacher_database(cloud_id, teacher.grade_level, teacher.section)
+            db_names.append(teacher.db_name)
+        return db_names
+
+def start_delta_sync(cloud_url, secret, interval):
+    """Start syncing this (hybrid desktop) server with the cloud; returns the DeltaSyncClient"""
+    client = delta_sync.DeltaSyncClient(cloud_url, secret, interval, apply_synced_sections)
+    client.start()
+    return client
+
 @app.route('/api/student/<int:student_id>/status', methods=['GET'])
 @login_required
 def get_student_status(student_id):
@@ -0,0 +1,91 @@
+"""
+Startup phases and readiness
+
+app.py's one-time setup (creating and migrating the main database, the
+admin settings row, the job runner, the student search index) runs as named
+phases through run(). A server process runs them when app.py is imported,
+as it always has. The desktop window sets QR_DEFER_STARTUP=1 before
+importing app.py, starts its server straight away and runs the phases from a
+background thread; until they finish every request but the readiness probe
+(GET /api/health/ready) is answered 503, so the window polls the probe and
+loads the page as soon as it reports ready.
+
+Phases that aren't needed to answer requests (background_phases) run after
+the server is marked ready, in a daemon thread when background is set.
+Each phase's duration is kept for the probe and desktop_main.py's
+--measure-startup report.
+"""
+
+import os
+import threading
+import time
+
+DEFER_STARTUP = os.environ.get('QR_DEFER_STARTUP', '0').lower() in ('1', 'true', 'yes')
+
+_lock = threading.Lock()
+_state = {
+    'ready': False,
+    'phase': None,  # Phase running now
+    'error': None,  # '<phase>: <error>' if a phase failed
+    'phases': []  # [{'name', 'seconds', 'background'}] in completion order
+}
+
+
+def _run_phase(name, phase, context, background):
+    with _lock:
+        _state['phase'] = name
+    started = time.perf_counter()
+    try:
+        if context is not None:
+            with context():
+                phase()
+        else:
+            phase()
+    except Exception as e:
+        with _lock:
+            _state['error'] = f'{name}: {e}'
+        print(f"✗ Startup phase '{name}' failed: {e}")
+        raise
+    with _lock:
+        _state['phase'] = None
+        _state['phases'].append({'name': name, 'seconds': round(time.perf_counter() - started, 3),
+                                 'background': background})
+
+
+def run(phases, background_phases=(), context=None, background=False):
+    """
+    Run (name, function) phases in order and mark the process ready, then the
+    background phases: in a daemon thread if background is set, else inline.
+    context, if given, is a context manager factory each phase runs in
+    (app.app_context). A failing phase raises; the process stays not ready.
+    """
+    for name, phase in phases:
+        _run_phase(name, phase, context, False)
+    with _lock:
+        _state['ready'] = True
+
+    def run_background():
+        for name, phase in background_phases:
+            try:
+                _run_phase(name, phase, context, True)
+            except Exception:
+                pass  # Logged; the server keeps running without it
+
+    if background and background_phases:
+        threading.Thread(target=run_background, name='startup', daemon=True).start()
+    else:
+        run_background()
+
+
+def is_ready():
+    return _state['ready']
+
+
+def get_status():
+    with _lock:
+        return {
+            'ready': _state['ready'],
+            'phase': _state['phase'],
+            'error': _state['error'],
+            'phases': [dict(p) for p in _state['phases']]
+        }
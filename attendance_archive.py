@@ -0,0 +1,243 @@
+"""
+Per-term archiving of closed attendance history
+
+Hot-path queries only touch today's rows, so attendance from terms that
+have ended is moved out of each teacher database into one read-only SQLite
+file per term:
+
+    <instance>/archive/<db_name>/<school_year>-t<term>.db[.gz]
+
+An archive holds the term's attendance rows (in v1 form whatever the live
+schema), its attendance_daily rollups and a snapshot of the students they
+refer to, plus an attendance_v1 view so it can be queried exactly like a
+live database. The attendance_archives table in the live database lists
+what has been archived; readers in db_manager ATTACH an archive only when a
+requested date range overlaps it.
+
+Terms split the school year (see attendance_bitsets.SCHOOL_YEAR_START_MONTH)
+into TERMS_PER_YEAR equal runs of months; SHS semesters are the default.
+"""
+
+import gzip
+import os
+import shutil
+import sqlite3
+import stat
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+import attendance_bitsets
+from db_manager import (
+    consolidated_storage,
+    get_archive_dir,
+    get_philippine_time,
+    get_teacher_db_path,
+    get_teacher_db_session
+)
+
+TERMS_PER_YEAR = int(os.environ.get('TERMS_PER_YEAR', '2'))
+
+ARCHIVE_DDL = [
+    '''CREATE TABLE IF NOT EXISTS attendance (
+        id INTEGER PRIMARY KEY,
+        student_id INTEGER NOT NULL,
+        timestamp DATETIME,
+        check_in_time DATETIME,
+        check_out_time DATETIME,
+        attendance_status VARCHAR(20),
+        status VARCHAR(20),
+        date VARCHAR(10),
+        shift VARCHAR(10)
+    )''',
+    'CREATE INDEX IF NOT EXISTS ix_attendance_date_shift ON attendance (date, shift)',
+    '''CREATE TABLE IF NOT EXISTS attendance_daily (
+        student_id INTEGER NOT NULL,
+        date VARCHAR(10) NOT NULL,
+        morning_status VARCHAR(20),
+        afternoon_status VARCHAR(20),
+        PRIMARY KEY (student_id, date)
+    )''',
+    'CREATE INDEX IF NOT EXISTS ix_attendance_daily_date ON attendance_daily (date)',
+    '''CREATE TABLE IF NOT EXISTS students (
+        id INTEGER PRIMARY KEY,
+        full_name VARCHAR(200),
+        email VARCHAR(150),
+        section VARCHAR(50),
+        grade_level VARCHAR(10)
+    )''',
+    'CREATE VIEW IF NOT EXISTS attendance_v1 AS SELECT * FROM attendance',
+]
+
+
+def _add_months(day, months):
+    month_index = day.month - 1 + months
+    return date(day.year + month_index // 12, month_index % 12 + 1, 1)
+
+
+def term_for(day):
+    """Get the (school_year, term) a date belongs to; terms are numbered from 1"""
+    school_year = attendance_bitsets.school_year_for(day)
+    start = attendance_bitsets.school_year_start(school_year)
+    months = (day.year - start.year) * 12 + day.month - start.month
+    return school_year, months * TERMS_PER_YEAR // 12 + 1
+
+
+def term_bounds(school_year, term):
+    """Get the first and last day of a term"""
+    start = attendance_bitsets.school_year_start(school_year)
+    first = _add_months(start, (term - 1) * 12 // TERMS_PER_YEAR)
+    next_first = _add_months(start, term * 12 // TERMS_PER_YEAR)
+    return first, next_first - timedelta(days=1)
+
+
+def term_key(school_year, term):
+    return f'{school_year}-t{term}'
+
+
+def closed_terms(db_name, today=None):
+    """
+    List the (school_year, term) pairs that have ended and still have rows
+    in the live database, oldest first.
+    """
+    today = today or get_philippine_time().date()
+    current_start = term_bounds(*term_for(today))[0]
+
+    Session = get_teacher_db_session(db_name)
+    sess = Session()
+    try:
+        dates = sess.execute(text(
+            'SELECT DISTINCT date FROM attendance_v1 WHERE date < :current_start'
+        ), {'current_start': current_start.strftime('%Y-%m-%d')}).scalars().all()
+    finally:
+        sess.close()
+
+    return sorted({term_for(date.fromisoformat(d)) for d in dates if d})
+
+
+def _make_writable(path):
+    if os.path.exists(path):
+        os.chmod(path, os.stat(path).st_mode | stat.S_IWUSR)
+
+
+def _make_read_only(path):
+    os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+
+def _compress(path):
+    """Gzip an archive in place, returning the new file name"""
+    gz_path = f'{path}.gz'
+    tmp_path = f'{gz_path}.tmp'
+    with open(path, 'rb') as src, gzip.open(tmp_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp_path, gz_path)
+    _make_read_only(gz_path)
+    return os.path.basename(gz_path)
+
+
+def archive_term(db_name, school_year, term, compress=False):
+    """
+    Move one closed term's attendance out of a teacher database.
+
+    The copy into the archive, the delete from the live database and the
+    manifest update commit in one transaction across both files, so a crash
+    leaves the rows in exactly one place. Re-running for a term that is
+    already archived merges any rows added to it since.
+
+    Returns the number of attendance rows moved.
+    """
+    if consolidated_storage():
+        raise RuntimeError('Term archives need per-teacher database files (TEACHER_STORAGE=files)')
+    get_teacher_db_session(db_name)  # Makes sure the views and manifest table exist
+    key = term_key(school_year, term)
+    first, last = term_bounds(school_year, term)
+    bounds = {'date_from': first.strftime('%Y-%m-%d'), 'date_to': last.strftime('%Y-%m-%d')}
+
+    archive_dir = get_archive_dir(db_name)
+    path = os.path.join(archive_dir, f'{key}.db')
+    gz_path = f'{path}.gz'
+    if os.path.exists(gz_path) and not os.path.exists(path):
+        # Merge into an existing compressed archive
+        with gzip.open(gz_path, 'rb') as src, open(path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+    _make_writable(path)
+
+    conn = sqlite3.connect(get_teacher_db_path(db_name), timeout=30, isolation_level=None)
+    try:
+        conn.execute('ATTACH DATABASE ? AS arc', (path,))
+        for statement in ARCHIVE_DDL:
+            conn.execute(statement.replace('EXISTS ', 'EXISTS arc.', 1))
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            moved = conn.execute(
+                'INSERT OR REPLACE INTO arc.attendance '
+                'SELECT id, student_id, timestamp, check_in_time, check_out_time, '
+                'attendance_status, status, date, shift FROM main.attendance_v1 '
+                'WHERE date BETWEEN :date_from AND :date_to', bounds
+            ).rowcount
+            conn.execute(
+                'INSERT OR REPLACE INTO arc.attendance_daily '
+                'SELECT student_id, date, morning_status, afternoon_status FROM main.attendance_daily '
+                'WHERE date BETWEEN :date_from AND :date_to', bounds
+            )
+            conn.execute(
+                'INSERT OR REPLACE INTO arc.students '
+                'SELECT id, full_name, email, section, grade_level FROM main.students_v1 '
+                'WHERE id IN (SELECT DISTINCT student_id FROM arc.attendance)'
+            )
+            total = conn.execute('SELECT COUNT(*) FROM arc.attendance').fetchone()[0]
+
+            # Delete by id so this works for either live schema version
+            conn.execute('DELETE FROM main.attendance WHERE id IN (SELECT id FROM arc.attendance)')
+            conn.execute('DELETE FROM main.attendance_daily WHERE date BETWEEN :date_from AND :date_to', bounds)
+            conn.execute('DELETE FROM main.attendance_counters WHERE date BETWEEN :date_from AND :date_to', bounds)
+            conn.execute(
+                'INSERT INTO main.attendance_archives (term, date_from, date_to, file_name, row_count, archived_at) '
+                'VALUES (:term, :date_from, :date_to, :file_name, :row_count, :archived_at) '
+                'ON CONFLICT(term) DO UPDATE SET file_name = excluded.file_name, '
+                'row_count = excluded.row_count, archived_at = excluded.archived_at',
+                dict(bounds, term=key, file_name=os.path.basename(path), row_count=total,
+                     archived_at=get_philippine_time().isoformat())
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('DETACH DATABASE arc')
+
+        if compress:
+            file_name = _compress(path)
+            conn.execute('UPDATE attendance_archives SET file_name = ? WHERE term = ?', (file_name, key))
+            os.remove(path)
+        else:
+            _make_read_only(path)
+            if os.path.exists(gz_path):
+                os.remove(gz_path)
+        return moved
+    finally:
+        conn.close()
+
+
+def archive_closed_terms(db_name, today=None, compress=False, vacuum=True):
+    """
+    Archive every closed term of a teacher database, then VACUUM it.
+
+    Returns a dict with the terms archived and the rows moved.
+    """
+    terms = []
+    moved = 0
+    for school_year, term in closed_terms(db_name, today):
+        rows = archive_term(db_name, school_year, term, compress)
+        if rows:
+            terms.append(term_key(school_year, term))
+            moved += rows
+
+    if moved and vacuum:
+        conn = sqlite3.connect(get_teacher_db_path(db_name), timeout=30, isolation_level=None)
+        try:
+            conn.execute('VACUUM')
+        finally:
+            conn.close()
+
+    return {'db_name': db_name, 'terms': terms, 'rows': moved}
@@ -0,0 +1,297 @@
+"""
+Compact bitset attendance history with vectorized analytics
+
+Each student's attendance for a school year is packed into a fixed-width
+blob in the attendance_bitsets table of their teacher database: 2 bits per
+shift per day, 2 shifts per day, 366 days -> 183 bytes per student-year.
+
+Codes (2 bits):
+    0 - no record, or EXCUSED (counts neither as attended nor missed)
+    1 - attended (PRESENT)
+    2 - attended late (LATE)
+    3 - missed (ABSENT, CUTTING)
+
+Slot layout: slot = day_index * 2 + shift_index, stored little-endian within
+each byte (slot % 4 selects the bit pair). day_index counts from the first
+day of the school year (June 1 unless SCHOOL_YEAR_START_MONTH says otherwise).
+
+Blobs are updated incrementally on every attendance write and rebuilt during
+nightly rollup compaction. Analytics load a whole section or school into one
+uint8 matrix and compute over it with NumPy.
+"""
+
+import os
+from datetime import date, datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency - only needed for analytics
+    np = None
+
+from sqlalchemy import text
+
+from db_manager import get_teacher_db_session, iter_history_rows, section_condition, section_students_condition
+
+SCHOOL_YEAR_START_MONTH = int(os.environ.get('SCHOOL_YEAR_START_MONTH', '6'))
+
+# Share of recorded shifts missed at which a student is flagged chronically absent
+CHRONIC_ABSENCE_THRESHOLD = float(os.environ.get('CHRONIC_ABSENCE_THRESHOLD', '0.10'))
+
+DAYS_PER_YEAR = 366
+SHIFTS = ('morning', 'afternoon')
+BITSET_BYTES = DAYS_PER_YEAR * len(SHIFTS) * 2 // 8
+
+CODE_NONE = 0
+CODE_PRESENT = 1
+CODE_LATE = 2
+CODE_MISSED = 3
+
+STATUS_CODES = {
+    'PRESENT': CODE_PRESENT,
+    'LATE': CODE_LATE,
+    'ABSENT': CODE_MISSED,
+    'CUTTING': CODE_MISSED,
+    'EXCUSED': CODE_NONE,
+}
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def school_year_for(day):
+    """Get the school year (the calendar year it starts in) that a date belongs to"""
+    return day.year if day.month >= SCHOOL_YEAR_START_MONTH else day.year - 1
+
+
+def school_year_start(school_year):
+    return date(school_year, SCHOOL_YEAR_START_MONTH, 1)
+
+
+def locate_slot(date_str, shift):
+    """
+    Map a date and shift to (school_year, slot), or None for an unknown shift.
+    """
+    if shift not in SHIFTS:
+        return None
+    day = datetime.strptime(date_str, '%Y-%m-%d').date()
+    school_year = school_year_for(day)
+    day_index = (day - school_year_start(school_year)).days
+    return school_year, day_index * len(SHIFTS) + SHIFTS.index(shift)
+
+
+def set_code(bits, slot, code):
+    """Set the 2-bit code for a slot in a bytearray"""
+    byte_index, offset = divmod(slot, 4)
+    offset *= 2
+    bits[byte_index] = (bits[byte_index] & ~(0b11 << offset) & 0xFF) | (code << offset)
+
+
+def get_code(bits, slot):
+    byte_index, offset = divmod(slot, 4)
+    return (bits[byte_index] >> (offset * 2)) & 0b11
+
+
+def update_bitset(sess, student_id, date_str, shift, status):
+    """
+    Record one shift's status in a student's bitset.
+
+    Runs on the caller's session so the blob commits together with the
+    attendance row it reflects.
+    """
+    located = locate_slot(date_str, shift)
+    if located is None:
+        return
+    school_year, slot = located
+    params = {'student_id': student_id, 'school_year': school_year}
+
+    current = sess.execute(text(
+        'SELECT bits FROM attendance_bitsets WHERE student_id = :student_id AND school_year = :school_year'
+    ), params).scalar()
+    bits = bytearray(current) if current else bytearray(BITSET_BYTES)
+    set_code(bits, slot, STATUS_CODES.get(status, CODE_NONE))
+
+    sess.execute(text(
+        'INSERT INTO attendance_bitsets (student_id, school_year, bits) '
+        'VALUES (:student_id, :school_year, :bits) '
+        'ON CONFLICT(student_id, school_year) DO UPDATE SET bits = excluded.bits'
+    ), dict(params, bits=bytes(bits)))
+
+
+def rebuild_section_bitsets(db_name, school_year):
+    """
+    Rebuild every student's bitset for a school year from raw attendance rows,
+    including terms already moved to archives.
+
+    Returns the number of students written.
+    """
+    start = school_year_start(school_year)
+    end = school_year_start(school_year + 1) - timedelta(days=1)
+
+    rows = iter_history_rows(db_name, start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'), (
+        'SELECT student_id, date, shift, attendance_status, id FROM {src}.attendance_v1 '
+        'WHERE date BETWEEN :date_from AND :date_to AND {scope}'
+    ), order_by='5')
+
+    Session = get_teacher_db_session(db_name)
+    sess = Session()
+    try:
+        blobs = {}
+        for student_id, date_str, shift, status, _ in rows:
+            located = locate_slot(date_str, shift)
+            if located is None:
+                continue
+            bits = blobs.setdefault(student_id, bytearray(BITSET_BYTES))
+            set_code(bits, located[1], STATUS_CODES.get(status, CODE_NONE))
+
+        sess.execute(text('DELETE FROM attendance_bitsets WHERE school_year = :school_year '
+                          f'AND {section_students_condition(db_name)}'),
+                     {'school_year': school_year})
+        if blobs:
+            sess.execute(text(
+                'INSERT INTO attendance_bitsets (student_id, school_year, bits) '
+                'VALUES (:student_id, :school_year, :bits)'
+            ), [{'student_id': sid, 'school_year': school_year, 'bits': bytes(bits)}
+                for sid, bits in blobs.items()])
+        sess.commit()
+        return len(blobs)
+    finally:
+        sess.close()
+
+
+def load_section_matrix(db_name, school_year):
+    """
+    Load a section's bitsets for a school year.
+
+    Returns (students, matrix) where students is a list of
+    (student_id, full_name) and matrix is a (students, BITSET_BYTES) uint8
+    array. Students with no attendance yet get an all-zero row.
+    """
+    Session = get_teacher_db_session(db_name)
+    sess = Session()
+    try:
+        rows = sess.execute(text(
+            'SELECT s.id, s.full_name, b.bits FROM students s '
+            'LEFT JOIN attendance_bitsets b ON b.student_id = s.id AND b.school_year = :school_year '
+            f'WHERE {section_condition(db_name, "s.teacher_id")} ORDER BY s.id'
+        ), {'school_year': school_year}).fetchall()
+    finally:
+        sess.close()
+
+    students = [(row[0], row[1]) for row in rows]
+    buffer = b''.join(row[2] if row[2] and len(row[2]) == BITSET_BYTES else bytes(BITSET_BYTES)
+                      for row in rows)
+    matrix = np.frombuffer(buffer, dtype=np.uint8).reshape(len(rows), BITSET_BYTES)
+    return students, matrix
+
+
+def unpack_codes(matrix):
+    """Unpack a (students, BITSET_BYTES) matrix into (students, days, shifts) codes"""
+    shifts = np.array([0, 2, 4, 6], dtype=np.uint8)
+    codes = (matrix[:, :, None] >> shifts) & 0b11
+    return codes.reshape(matrix.shape[0], DAYS_PER_YEAR, len(SHIFTS))
+
+
+def _longest_runs(flags):
+    """Longest and trailing run of True per row of a (students, days) bool array"""
+    longest = np.zeros(flags.shape[0], dtype=np.int32)
+    current = np.zeros(flags.shape[0], dtype=np.int32)
+    for day in range(flags.shape[1]):
+        current = (current + 1) * flags[:, day]
+        np.maximum(longest, current, out=longest)
+    return longest, current
+
+
+def analyze(matrix, school_year, as_of=None, threshold=CHRONIC_ABSENCE_THRESHOLD):
+    """
+    Compute attendance patterns for every student in a matrix at once.
+
+    Args:
+        matrix: (students, BITSET_BYTES) uint8 array from load_section_matrix
+        school_year: School year the matrix covers
+        as_of: Last date to include (default today)
+        threshold: Missed-shift rate at which a student is chronically absent
+
+    Returns:
+        Dict of NumPy arrays keyed by metric, one entry per student, plus
+        'late_by_weekday' as a (students, 7) array
+    """
+    start = school_year_start(school_year)
+    as_of = as_of or date.today()
+    days = max(0, min(DAYS_PER_YEAR, (as_of - start).days + 1))
+
+    codes = unpack_codes(matrix)[:, :days, :]
+    attended = np.count_nonzero(codes == CODE_PRESENT, axis=(1, 2))
+    late = np.count_nonzero(codes == CODE_LATE, axis=(1, 2))
+    missed = np.count_nonzero(codes == CODE_MISSED, axis=(1, 2))
+    recorded = attended + late + missed
+    missed_rate = np.divide(missed, recorded, out=np.zeros(len(recorded), dtype=np.float64),
+                            where=recorded > 0)
+
+    # A day is missed when it has a record and every recorded shift was missed
+    day_recorded = (codes != CODE_NONE).any(axis=2)
+    day_missed = day_recorded & ((codes == CODE_MISSED) | (codes == CODE_NONE)).all(axis=2)
+    # Days without any record (weekends, holidays) don't break a streak
+    school_days = day_recorded.any(axis=0)
+    longest_streak, current_streak = _longest_runs(day_missed[:, school_days])
+
+    weekday_index = (np.arange(days) + start.weekday()) % 7
+    late_days = (codes == CODE_LATE).any(axis=2)
+    late_by_weekday = np.stack(
+        [late_days[:, weekday_index == wd].sum(axis=1) for wd in range(7)], axis=1
+    ) if days else np.zeros((matrix.shape[0], 7), dtype=np.int64)
+
+    return {
+        'attended': attended,
+        'late': late,
+        'missed': missed,
+        'missed_rate': missed_rate,
+        'chronic': (missed_rate >= threshold) & (recorded > 0),
+        'longest_absence_streak': longest_streak,
+        'current_absence_streak': current_streak,
+        'late_by_weekday': late_by_weekday,
+    }
+
+
+def analyze_sections(sections, school_year, as_of=None, threshold=CHRONIC_ABSENCE_THRESHOLD):
+    """
+    Analyze many sections as one matrix.
+
+    Args:
+        sections: List of dicts with 'db_name', 'grade_level' and 'section'
+
+    Returns:
+        Dict with per-student rows and school-wide per-weekday lateness
+    """
+    students = []
+    matrices = []
+    for section in sections:
+        if not section.get('db_name'):
+            continue
+        section_students, matrix = load_section_matrix(section['db_name'], school_year)
+        students += [(section, sid, name) for sid, name in section_students]
+        matrices.append(matrix)
+
+    matrix = np.concatenate(matrices) if matrices else np.zeros((0, BITSET_BYTES), dtype=np.uint8)
+    metrics = analyze(matrix, school_year, as_of, threshold)
+
+    rows = []
+    for idx, (section, student_id, full_name) in enumerate(students):
+        rows.append({
+            'student_id': int(student_id),
+            'full_name': full_name,
+            'grade_level': section.get('grade_level'),
+            'section': section.get('section'),
+            'attended': int(metrics['attended'][idx]),
+            'late': int(metrics['late'][idx]),
+            'missed': int(metrics['missed'][idx]),
+            'missed_rate': round(float(metrics['missed_rate'][idx]), 4),
+            'chronic_absence': bool(metrics['chronic'][idx]),
+            'longest_absence_streak': int(metrics['longest_absence_streak'][idx]),
+            'current_absence_streak': int(metrics['current_absence_streak'][idx]),
+        })
+
+    weekday_totals = metrics['late_by_weekday'].sum(axis=0)
+    return {
+        'students': rows,
+        'chronic_count': int(metrics['chronic'].sum()),
+        'late_by_weekday': {WEEKDAYS[wd]: int(weekday_totals[wd]) for wd in range(7)},
+    }
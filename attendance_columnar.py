@@ -0,0 +1,193 @@
+"""
+Columnar (Parquet / Arrow IPC) export for analytics tools
+
+Writes attendance and roster data from every teacher database into a
+directory that pandas, DuckDB or Arrow can read as a partitioned dataset:
+
+    <export dir>/<format>/attendance/date=YYYY-MM-DD/<db_name>.<format>
+    <export dir>/<format>/roster/<db_name>.<format>
+
+Attendance is partitioned by date (directory) and section (file), so
+re-exporting a day only rewrites that day's files. Shift, status, grade and
+section columns are dictionary-encoded. Exports from the API run as
+background jobs; see columnar_export_job().
+
+Requires pyarrow.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional dependency - only needed for columnar exports
+    pa = None
+    pq = None
+
+from db_manager import (
+    get_instance_dir,
+    TeacherStudent
+)
+from attendance_export import get_export_session, iter_section_rows
+
+COLUMNAR_FORMATS = {
+    'parquet': 'parquet',
+    'arrow': 'arrow',
+}
+
+def get_columnar_export_dir(fmt='parquet'):
+    """Get the dataset directory for columnar exports in one format"""
+    root = os.environ.get('COLUMNAR_EXPORT_DIR') or os.path.join(get_instance_dir(), 'exports')
+    export_dir = os.path.join(root, fmt)
+    os.makedirs(export_dir, exist_ok=True)
+    return export_dir
+
+
+def _dict_array(values):
+    return pa.array(values, type=pa.string()).dictionary_encode()
+
+
+def _write_table(table, path, fmt):
+    """Write a table atomically so readers never see a half-written file"""
+    tmp_path = f'{path}.tmp'
+    if fmt == 'arrow':
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    else:
+        pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+
+def _attendance_table(section, rows):
+    count = len(rows)
+    return pa.table({
+        'shift': _dict_array([r[1] for r in rows]),
+        'grade_level': _dict_array([section.get('grade_level')] * count),
+        'section': _dict_array([section.get('section')] * count),
+        'student_id': pa.array([r[2] for r in rows], type=pa.int32()),
+        'full_name': pa.array([r[3] for r in rows], type=pa.string()),
+        'email': pa.array([r[4] for r in rows], type=pa.string()),
+        'attendance_status': _dict_array([r[5] for r in rows]),
+        'check_in_time': pa.array([r[6] for r in rows], type=pa.timestamp('us')),
+        'check_out_time': pa.array([r[7] for r in rows], type=pa.timestamp('us')),
+    })
+
+
+def _roster_table(section, students):
+    count = len(students)
+    return pa.table({
+        'student_id': pa.array([s[0] for s in students], type=pa.int32()),
+        'full_name': pa.array([s[1] for s in students], type=pa.string()),
+        'email': pa.array([s[2] for s in students], type=pa.string()),
+        'grade_level': _dict_array([section.get('grade_level')] * count),
+        'section': _dict_array([section.get('section')] * count),
+        'teacher_name': _dict_array([section.get('teacher_name')] * count),
+        'guardian_name': pa.array([s[3] for s in students], type=pa.string()),
+        'created_at': pa.array([s[4] for s in students], type=pa.timestamp('us')),
+    })
+
+
+def _clear_section_partitions(attendance_dir, file_name, date_from, date_to):
+    """Remove a section's files for the days being re-exported so deleted rows don't linger"""
+    day = datetime.strptime(date_from, '%Y-%m-%d').date()
+    last = datetime.strptime(date_to, '%Y-%m-%d').date()
+    while day <= last:
+        path = os.path.join(attendance_dir, f'date={day.strftime("%Y-%m-%d")}', file_name)
+        if os.path.exists(path):
+            os.remove(path)
+        day += timedelta(days=1)
+
+
+def export_section(section, date_from, date_to, export_dir, fmt='parquet', snapshot=False):
+    """
+    Export one section's roster and its attendance partitions for a date range,
+    from the live database or the published reporting snapshot.
+
+    Returns the number of attendance rows written.
+    """
+    extension = COLUMNAR_FORMATS[fmt]
+    file_name = f"{section['db_name']}.{extension}"
+    attendance_dir = os.path.join(export_dir, 'attendance')
+    _clear_section_partitions(attendance_dir, file_name, date_from, date_to)
+
+    Session = get_export_session(section['db_name'], snapshot)
+    sess = Session()
+    try:
+        students = sess.query(
+            TeacherStudent.id,
+            TeacherStudent.full_name,
+            TeacherStudent.email,
+            TeacherStudent.guardian_name,
+            TeacherStudent.created_at
+        ).order_by(TeacherStudent.id).all()
+        roster_dir = os.path.join(export_dir, 'roster')
+        os.makedirs(roster_dir, exist_ok=True)
+        _write_table(_roster_table(section, students),
+                     os.path.join(roster_dir, file_name), fmt)
+
+        written = 0
+        current_date = None
+        rows = []
+
+        def flush():
+            partition = os.path.join(attendance_dir, f'date={current_date}')
+            os.makedirs(partition, exist_ok=True)
+            _write_table(_attendance_table(section, rows), os.path.join(partition, file_name), fmt)
+
+        # Rows arrive ordered by date, so only one day is held at a time
+        for row in iter_section_rows(sess, section['db_name'], date_from, date_to):
+            if row[0] != current_date:
+                if rows:
+                    flush()
+                    written += len(rows)
+                current_date = row[0]
+                rows = []
+            rows.append(row)
+        if rows:
+            flush()
+            written += len(rows)
+        return written
+    finally:
+        sess.close()
+
+
+def run_columnar_export(sections, date_from, date_to, fmt='parquet', export_dir=None, progress=None,
+                        snapshot=False):
+    """
+    Export every section for a date range, rewriting only that range's partitions.
+
+    Args:
+        sections: List of dicts with 'db_name', 'grade_level', 'section' and 'teacher_name'
+        progress: Optional callback(done, total) called after each section
+        snapshot: Read the published reporting snapshot instead of the live databases
+
+    Returns:
+        Dict with export_dir, sections and rows
+    """
+    if pa is None:
+        raise RuntimeError('pyarrow is required for columnar exports (pip install pyarrow)')
+    if fmt not in COLUMNAR_FORMATS:
+        raise ValueError(f'Unknown columnar format: {fmt}')
+
+    export_dir = export_dir or get_columnar_export_dir(fmt)
+
+    total_rows = 0
+    sections = [s for s in sections if s.get('db_name')]
+    for done, section in enumerate(sections, start=1):
+        total_rows += export_section(section, date_from, date_to, export_dir, fmt, snapshot)
+        if progress:
+            progress(done, len(sections))
+
+    return {'export_dir': export_dir, 'sections': len(sections), 'rows': total_rows}
+
+
+def columnar_export_job(job, sections, date_from, date_to, fmt='parquet', snapshot=False):
+    """Background job (see background_jobs.py) wrapping run_columnar_export"""
+    def report(done, total):
+        job.progress(done, total, f'{done} of {total} sections')
+
+    result = run_columnar_export(sections, date_from, date_to, fmt, progress=report, snapshot=snapshot)
+    print(f"✓ Columnar export finished: {result['rows']} rows")
+    return result
@@ -0,0 +1,153 @@
+"""
+Incremental attendance counters for the admin dashboard
+
+Every teacher database keeps an `attendance_counters` table that is updated in
+the same transaction as the attendance row it counts (see
+db_manager.bump_attendance_counter). This module keeps an in-memory copy of
+those totals per section so the dashboard can answer from memory:
+
+- Local writes apply their delta to memory right after committing
+- Writes made by other gunicorn workers are picked up when a section's
+  snapshot is older than COUNTER_REFRESH_SECONDS (a single tiny query)
+- Counters are rebuilt from the raw attendance rows at startup (rebuild_all,
+  a startup phase in app.py) and on day rollover, the first time a section
+  is read on the new day; a section not rebuilt at startup is rebuilt on its
+  first read
+"""
+
+import os
+import threading
+import time
+
+from db_manager import (
+    bump_attendance_counter,
+    rebuild_attendance_counters,
+    read_attendance_counters,
+    get_philippine_time
+)
+
+# How long a section snapshot may be served before re-reading the shared table
+COUNTER_REFRESH_SECONDS = float(os.environ.get('COUNTER_REFRESH_SECONDS', '5'))
+
+# Statuses tracked on the dashboard (ABSENT is derived from the student total)
+COUNTED_STATUSES = ('PRESENT', 'LATE', 'CUTTING', 'EXCUSED')
+
+_lock = threading.Lock()
+_state = {
+    'date': None,  # Day the cached sections belong to (YYYY-MM-DD)
+    'sections': {}  # db_name -> {'total': int, 'shifts': {shift: {status: int}}, 'loaded_at': float}
+}
+
+
+def _today_str():
+    return get_philippine_time().date().strftime('%Y-%m-%d')
+
+
+def _roll_over(date_str):
+    """Drop cached sections when the day changes (caller holds the lock)"""
+    if _state['date'] != date_str:
+        _state['date'] = date_str
+        _state['sections'] = {}
+        return True
+    return False
+
+
+def _load_section(db_name, date_str, rebuild):
+    if rebuild:
+        total, shifts = rebuild_attendance_counters(db_name, date_str)
+    else:
+        total, shifts = read_attendance_counters(db_name, date_str)
+    return {'total': total, 'shifts': shifts, 'loaded_at': time.monotonic()}
+
+
+def record_status_change(sess, db_name, date_str, shift, old_status, new_status):
+    """
+    Record that one student's status for a shift moved from old_status to new_status.
+
+    Must be called before sess.commit() so the shared counter row is written in
+    the same transaction as the attendance change. The in-memory copy is
+    updated optimistically; if the commit fails the next refresh corrects it.
+    """
+    bump_attendance_counter(sess, date_str, shift, old_status, new_status)
+    apply_status_change(db_name, date_str, shift, old_status, new_status)
+
+
+def apply_status_change(db_name, date_str, shift, old_status, new_status):
+    """Apply a status change to the in-memory copy only (the table is written by the caller)"""
+    if old_status == new_status:
+        return
+    with _lock:
+        if _state['date'] != date_str:
+            return
+        section = _state['sections'].get(db_name)
+        if section is None:
+            return
+        counts = section['shifts'].setdefault(shift, {})
+        if old_status:
+            counts[old_status] = counts.get(old_status, 0) - 1
+        if new_status:
+            counts[new_status] = counts.get(new_status, 0) + 1
+
+
+def record_enrollment(db_name, delta):
+    """Adjust a section's student total after a signup (+1) or removal (-1)"""
+    with _lock:
+        section = _state['sections'].get(db_name)
+        if section is not None:
+            section['total'] = max(0, section['total'] + delta)
+
+
+def forget_section(db_name):
+    """Drop a section from the cache, e.g. after its teacher is deleted"""
+    with _lock:
+        _state['sections'].pop(db_name, None)
+
+
+def rebuild_all(db_names, date_str=None):
+    """Rebuild counters for every section from the raw attendance rows"""
+    date_str = date_str or _today_str()
+    loaded = {}
+    for db_name in db_names:
+        try:
+            loaded[db_name] = _load_section(db_name, date_str, rebuild=True)
+        except Exception as e:
+            print(f"✗ Could not rebuild counters for {db_name}: {e}")
+    with _lock:
+        _roll_over(date_str)
+        _state['sections'].update(loaded)
+    return len(loaded)
+
+
+def get_section_counts(db_name, shift, date_str=None):
+    """
+    Get today's totals for one section and shift.
+
+    Returns a dict with total, present, absent, late, cutting and excused.
+    Students without a record for the shift are counted as absent, matching
+    the original dashboard behaviour.
+    """
+    date_str = date_str or _today_str()
+
+    with _lock:
+        rolled_over = _roll_over(date_str)
+        section = _state['sections'].get(db_name)
+        stale = section is None or time.monotonic() - section['loaded_at'] > COUNTER_REFRESH_SECONDS
+
+    if stale:
+        # First read after startup or rollover rebuilds from raw rows,
+        # later refreshes only re-read the shared counters table
+        fresh = _load_section(db_name, date_str, rebuild=section is None or rolled_over)
+        with _lock:
+            if _state['date'] == date_str:
+                _state['sections'][db_name] = fresh
+        section = fresh
+
+    counts = section['shifts'].get(shift, {})
+    result = {'total': section['total']}
+    marked = 0
+    for status in COUNTED_STATUSES:
+        value = max(0, counts.get(status, 0))
+        result[status.lower()] = value
+        marked += value
+    result['absent'] = max(0, section['total'] - marked)
+    return result
@@ -0,0 +1,167 @@
+"""
+Streaming attendance export
+
+Rows are read from each teacher database in chunks with yield_per and
+written out one line at a time, so memory use stays flat whether the export
+covers a single day or a whole school year. Used by the
+/api/admin/export/attendance endpoint and tools/export_attendance.py.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+
+from db_manager import (
+    get_teacher_db_session,
+    iter_history_rows,
+    TeacherStudent,
+    TeacherAttendance
+)
+from db_backup import get_reporting_db_session
+
+# Rows fetched from a teacher database per round trip
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_COLUMNS = [
+    'date', 'shift', 'grade_level', 'section', 'teacher_name',
+    'student_id', 'full_name', 'email', 'attendance_status',
+    'check_in_time', 'check_out_time'
+]
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+
+
+def _format_time(value):
+    return value.isoformat(sep=' ') if value else None
+
+
+def query_section_attendance(sess, date_from, date_to, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Build a chunked query over a teacher database's attendance joined to students.
+
+    Yields tuples of (date, shift, student_id, full_name, email,
+    attendance_status, check_in_time, check_out_time) ordered by date.
+    """
+    return sess.query(
+        TeacherAttendance.date,
+        TeacherAttendance.shift,
+        TeacherStudent.id,
+        TeacherStudent.full_name,
+        TeacherStudent.email,
+        TeacherAttendance.attendance_status,
+        TeacherAttendance.check_in_time,
+        TeacherAttendance.check_out_time
+    ).join(
+        TeacherStudent, TeacherStudent.id == TeacherAttendance.student_id
+    ).filter(
+        TeacherAttendance.date.between(date_from, date_to)
+    ).order_by(
+        TeacherAttendance.date, TeacherAttendance.id
+    ).execution_options(stream_results=True).yield_per(chunk_size)
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def iter_archived_attendance(db_name, date_from, date_to):
+    """
+    Yield rows shaped like query_section_attendance() from the term archives
+    overlapping a date range (nothing if the range is all live).
+    """
+    rows = iter_history_rows(db_name, date_from, date_to, (
+        'SELECT a.date, a.shift, st.id, st.full_name, st.email, a.attendance_status, '
+        'a.check_in_time, a.check_out_time '
+        'FROM {src}.attendance_v1 a JOIN {src}.students st ON st.id = a.student_id '
+        'WHERE a.date BETWEEN :date_from AND :date_to'
+    ), include_live=False, order_by='1')
+    for date_str, shift, student_id, full_name, email, status, check_in, check_out in rows:
+        yield date_str, shift, student_id, full_name, email, status, _parse_time(check_in), _parse_time(check_out)
+
+
+def iter_section_rows(sess, db_name, date_from, date_to, chunk_size=EXPORT_CHUNK_SIZE):
+    """Archived rows (older terms, by date) followed by the live database's rows"""
+    yield from iter_archived_attendance(db_name, date_from, date_to)
+    yield from query_section_attendance(sess, date_from, date_to, chunk_size)
+
+
+def get_export_session(db_name, snapshot=False):
+    """
+    Get the sessionmaker an export reads a section through: the published
+    reporting snapshot when snapshot is True, otherwise the live database.
+    """
+    if snapshot:
+        Session = get_reporting_db_session(db_name)
+        if Session is None:
+            raise LookupError(f'No reporting snapshot of {db_name} has been published')
+        return Session
+    return get_teacher_db_session(db_name)
+
+
+def iter_section_attendance(section, date_from, date_to, chunk_size=EXPORT_CHUNK_SIZE, snapshot=False):
+    """
+    Yield one export row dict per attendance record in a section.
+
+    Args:
+        section: Dict with 'db_name', 'grade_level', 'section' and 'teacher_name'
+        date_from, date_to: Inclusive date range as YYYY-MM-DD strings
+        snapshot: Read the published reporting snapshot instead of the live database
+    """
+    Session = get_export_session(section['db_name'], snapshot)
+    sess = Session()
+    try:
+        query = iter_section_rows(sess, section['db_name'], date_from, date_to, chunk_size)
+        for date_str, shift, student_id, full_name, email, status, check_in, check_out in query:
+            yield {
+                'date': date_str,
+                'shift': shift,
+                'grade_level': section.get('grade_level'),
+                'section': section.get('section'),
+                'teacher_name': section.get('teacher_name'),
+                'student_id': student_id,
+                'full_name': full_name,
+                'email': email,
+                'attendance_status': status,
+                'check_in_time': _format_time(check_in),
+                'check_out_time': _format_time(check_out)
+            }
+    finally:
+        sess.close()
+
+
+def iter_attendance(sections, date_from, date_to, chunk_size=EXPORT_CHUNK_SIZE, snapshot=False):
+    """Yield export rows for every section in turn"""
+    for section in sections:
+        if not section.get('db_name'):
+            continue
+        yield from iter_section_attendance(section, date_from, date_to, chunk_size, snapshot)
+
+
+def iter_csv(rows):
+    """Encode export rows as CSV text, one line per chunk"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    yield buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        yield buffer.getvalue()
+
+
+def iter_jsonl(rows):
+    """Encode export rows as JSON Lines"""
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+def iter_export(rows, fmt):
+    """Encode export rows in the given format ('csv' or 'jsonl')"""
+    if fmt == 'jsonl':
+        return iter_jsonl(rows)
+    return iter_csv(rows)
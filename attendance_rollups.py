@@ -0,0 +1,215 @@
+"""
+Daily attendance rollups for history and trend queries
+
+Two materialized rollups keep history reads independent of how many raw
+attendance rows are stored:
+- attendance_daily in each teacher database: one row per student per day
+  holding the status of both shifts (see db_manager.upsert_daily_rollup)
+- section_daily_summary in the main database: one row per section, day and
+  shift with status totals (SectionDailySummary in app.py)
+
+Both are updated incrementally on every attendance write. compact_section()
+recomputes them from the raw rows and is run nightly through
+/api/admin/rollups/compact to repair any drift.
+"""
+
+from datetime import date, timedelta
+
+from sqlalchemy import func, text
+from sqlalchemy.exc import IntegrityError
+
+from db_manager import (
+    get_archived_through,
+    get_teacher_db_session,
+    rebuild_daily_rollups,
+    section_condition
+)
+
+# attendance_status -> SectionDailySummary column
+SUMMARY_COLUMNS = {
+    'PRESENT': 'present',
+    'ABSENT': 'absent',
+    'LATE': 'late',
+    'CUTTING': 'cutting',
+    'EXCUSED': 'excused',
+}
+
+
+def _count_students(db_name):
+    Session = get_teacher_db_session(db_name)
+    sess = Session()
+    try:
+        return sess.execute(text(f'SELECT COUNT(*) FROM students WHERE {section_condition(db_name)}')).scalar() or 0
+    finally:
+        sess.close()
+
+
+def bump_section_summary(main_session, SectionDailySummary, teacher, date_str, shift, old_status, new_status):
+    """
+    Move one student between status totals in the main-database section summary.
+
+    The change is made on main_session but not committed; callers commit it
+    after the teacher database write succeeds.
+
+    Args:
+        main_session: SQLAlchemy session for the main database
+        SectionDailySummary: Summary model class from the main app
+        teacher: Teacher owning the section
+    """
+    if old_status == new_status or not shift:
+        return
+
+    deltas = {}
+    if old_status in SUMMARY_COLUMNS:
+        deltas[SUMMARY_COLUMNS[old_status]] = deltas.get(SUMMARY_COLUMNS[old_status], 0) - 1
+    if new_status in SUMMARY_COLUMNS:
+        deltas[SUMMARY_COLUMNS[new_status]] = deltas.get(SUMMARY_COLUMNS[new_status], 0) + 1
+    if not deltas:
+        return
+
+    key = {'teacher_id': teacher.id, 'date': date_str, 'shift': shift}
+    values = {getattr(SectionDailySummary, col): getattr(SectionDailySummary, col) + delta
+              for col, delta in deltas.items()}
+
+    updated = main_session.query(SectionDailySummary).filter_by(**key).update(
+        values, synchronize_session=False
+    )
+    if updated:
+        return
+
+    # First write for this section/day/shift - create the row
+    row = SectionDailySummary(
+        grade_level=teacher.grade_level,
+        section=teacher.section,
+        enrolled=_count_students(teacher.db_name),
+        **key
+    )
+    for col in SUMMARY_COLUMNS.values():
+        setattr(row, col, max(0, deltas.get(col, 0)))
+    try:
+        with main_session.begin_nested():
+            main_session.add(row)
+    except IntegrityError:
+        # Another worker created it first; apply the delta to theirs
+        main_session.query(SectionDailySummary).filter_by(**key).update(
+            values, synchronize_session=False
+        )
+
+
+def compact_section(main_session, SectionDailySummary, teacher, date_from, date_to):
+    """
+    Recompute both rollups for one section over a date range from raw rows.
+
+    Returns a dict with the number of student-days and summary rows written.
+    The main-database changes are committed by the caller. Days already moved
+    to a term archive are frozen and skipped.
+    """
+    archived_through = get_archived_through(teacher.db_name)
+    if archived_through and date_from <= archived_through:
+        date_from = (date.fromisoformat(archived_through) + timedelta(days=1)).strftime('%Y-%m-%d')
+        if date_from > date_to:
+            return {'student_days': 0, 'summary_rows': 0}
+
+    student_days = rebuild_daily_rollups(teacher.db_name, date_from, date_to)
+
+    Session = get_teacher_db_session(teacher.db_name)
+    sess = Session()
+    try:
+        section = section_condition(teacher.db_name)
+        enrolled = sess.execute(text(f'SELECT COUNT(*) FROM students WHERE {section}')).scalar() or 0
+        rows = sess.execute(text(
+            'SELECT date, shift, attendance_status, COUNT(*) FROM attendance_v1 '
+            f'WHERE date BETWEEN :date_from AND :date_to AND shift IS NOT NULL AND {section} '
+            'GROUP BY date, shift, attendance_status'
+        ), {'date_from': date_from, 'date_to': date_to}).fetchall()
+    finally:
+        sess.close()
+
+    totals = {}
+    for date_str, shift, status, count in rows:
+        counts = totals.setdefault((date_str, shift), {})
+        column = SUMMARY_COLUMNS.get(status)
+        if column:
+            counts[column] = counts.get(column, 0) + count
+
+    main_session.query(SectionDailySummary).filter(
+        SectionDailySummary.teacher_id == teacher.id,
+        SectionDailySummary.date.between(date_from, date_to)
+    ).delete(synchronize_session=False)
+
+    for (date_str, shift), counts in totals.items():
+        row = SectionDailySummary(
+            teacher_id=teacher.id,
+            grade_level=teacher.grade_level,
+            section=teacher.section,
+            date=date_str,
+            shift=shift,
+            enrolled=enrolled
+        )
+        for col in SUMMARY_COLUMNS.values():
+            setattr(row, col, counts.get(col, 0))
+        main_session.add(row)
+
+    return {'student_days': student_days, 'summary_rows': len(totals)}
+
+
+def summarize_student_days(rows):
+    """
+    Total a student's attendance_daily rows.
+
+    Args:
+        rows: Iterable of (date, morning_status, afternoon_status)
+
+    Returns:
+        Dict with per-status shift counts and per-status day counts (a day
+        counts once for a status if either shift had it)
+    """
+    shifts = {status: 0 for status in SUMMARY_COLUMNS}
+    days = {status: 0 for status in SUMMARY_COLUMNS}
+    for _, morning, afternoon in rows:
+        for status in (morning, afternoon):
+            if status in shifts:
+                shifts[status] += 1
+        for status in {morning, afternoon}:
+            if status in days:
+                days[status] += 1
+    return {'shifts': shifts, 'days': days}
+
+
+def trend_query(main_session, SectionDailySummary, date_from, date_to, grade=None, section=None, by_section=False):
+    """
+    Aggregate section summaries into per-day (optionally per-section) totals.
+
+    Returns a list of dicts ordered by date.
+    """
+    columns = [SectionDailySummary.date, SectionDailySummary.shift]
+    if by_section:
+        columns += [SectionDailySummary.grade_level, SectionDailySummary.section]
+
+    query = main_session.query(
+        *columns,
+        func.sum(SectionDailySummary.enrolled),
+        *[func.sum(getattr(SectionDailySummary, col)) for col in SUMMARY_COLUMNS.values()]
+    ).filter(SectionDailySummary.date.between(date_from, date_to))
+    if grade:
+        query = query.filter(SectionDailySummary.grade_level == grade)
+    if section:
+        query = query.filter(SectionDailySummary.section == section)
+    query = query.group_by(*columns).order_by(*columns)
+
+    results = []
+    key_names = [c.key for c in columns]
+    for row in query.all():
+        entry = dict(zip(key_names, row[:len(columns)]))
+        entry['enrolled'] = int(row[len(columns)] or 0)
+        for idx, col in enumerate(SUMMARY_COLUMNS.values()):
+            entry[col] = int(row[len(columns) + 1 + idx] or 0)
+        results.append(entry)
+    return results
+
+
+def default_compaction_range(today):
+    """Nightly compaction covers yesterday and today"""
+    yesterday = today - timedelta(days=1)
+    return yesterday.strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')
+
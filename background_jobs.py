@@ -0,0 +1,313 @@
+"""
+Background job runner
+
+Long admin operations (auto-mark, exports, roster imports, compaction,
+archiving, backups) run here instead of inside the request, so the request
+returns at once with a job id and no web worker hits its timeout.
+
+Jobs are rows in the main database's background_jobs table (the
+BackgroundJob model in app.py), so any worker process can answer
+GET /api/jobs/<id>. Each process runs its own jobs on a small pool of daemon
+threads (JOB_WORKERS). A job function receives a JobContext as its first
+argument and calls job.progress(done, total, message) as it goes; that
+records progress and raises JobCancelled once a cancel has been requested.
+Whatever the function returns is stored as the job's JSON result.
+
+Jobs don't survive a restart: when a process starts, jobs left running by
+a process on this host that no longer exists are marked failed.
+"""
+
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from sqlalchemy import delete, insert, select, update
+
+from db_manager import get_philippine_time
+
+# Threads running jobs in each process
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+
+# Finished jobs are deleted after this many days
+JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', '7'))
+
+# Seconds between checks of the database for a cancel request
+CANCEL_CHECK_INTERVAL = 1.0
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+_engine = None
+_table = None
+_app_context = None
+_owner = f'{socket.gethostname()}:{os.getpid()}'
+
+_job_queue = queue.Queue()
+_workers = []
+_workers_lock = threading.Lock()
+_cancelled = set()  # Cancel requests made in this process
+
+
+class JobCancelled(Exception):
+    """Raised inside a job by JobContext.progress() once it has been cancelled"""
+
+
+class JobContext:
+    """Handed to a running job function to report progress and notice cancellation"""
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self._last_percent = None
+        self._last_message = None
+        self._last_cancel_check = 0.0
+
+    @property
+    def cancelled(self):
+        if self.id in _cancelled:
+            return True
+        now = time.monotonic()
+        if now - self._last_cancel_check < CANCEL_CHECK_INTERVAL:
+            return False
+        self._last_cancel_check = now
+        with _engine.connect() as conn:
+            return bool(conn.execute(
+                select(_table.c.cancel_requested).where(_table.c.id == self.id)
+            ).scalar())
+
+    def progress(self, done, total=None, message=None):
+        """
+        Record progress as done/total (or a percentage if total is None).
+
+        Only writes when the percentage or message changes. Raises
+        JobCancelled if the job has been cancelled.
+        """
+        if total is not None:
+            percent = int(done * 100 / total) if total else 100
+        else:
+            percent = int(done)
+        percent = max(0, min(percent, 100))
+        if percent != self._last_percent or (message is not None and message != self._last_message):
+            values = {'progress': percent}
+            if message is not None:
+                values['message'] = message[:255]
+            _update(self.id, **values)
+            self._last_percent = percent
+            self._last_message = message
+        if self.cancelled:
+            raise JobCancelled()
+
+
+# ==================== SETUP ====================
+
+def _owner_is_gone(owner):
+    """True if owner names a process on this host that has exited"""
+    host, _, pid = (owner or '').rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+def init_jobs(engine, table, app_context=None):
+    """
+    Point the runner at the jobs table.
+
+    Args:
+        engine: Engine for the main database
+        table: The background_jobs Table
+        app_context: Callable returning a context manager each job runs in
+            (app.app_context), so jobs can use Flask-SQLAlchemy and mail
+    """
+    global _engine, _table, _app_context
+    _engine = engine
+    _table = table
+    _app_context = app_context
+
+    now = get_philippine_time()
+    with _engine.begin() as conn:
+        stale = [
+            job_id for job_id, owner in conn.execute(
+                select(_table.c.id, _table.c.owner).where(_table.c.status.in_(ACTIVE_STATUSES))
+            )
+            if _owner_is_gone(owner)
+        ]
+        if stale:
+            conn.execute(update(_table).where(_table.c.id.in_(stale)).values(
+                status='failed', error='Interrupted by a restart', finished_at=now
+            ))
+            print(f"✗ Marked {len(stale)} interrupted background jobs as failed")
+        conn.execute(delete(_table).where(
+            _table.c.status.notin_(ACTIVE_STATUSES),
+            _table.c.finished_at < now - timedelta(days=JOB_RETENTION_DAYS)
+        ))
+
+
+def _update(job_id, **values):
+    with _engine.begin() as conn:
+        conn.execute(update(_table).where(_table.c.id == job_id).values(**values))
+
+
+def _to_dict(row):
+    job = dict(row._mapping)
+    for key in ('params', 'result'):
+        job[key] = json.loads(job[key]) if job[key] else None
+    for key in ('created_at', 'started_at', 'finished_at'):
+        job[key] = job[key].isoformat() if job[key] else None
+    job['cancel_requested'] = bool(job['cancel_requested'])
+    return job
+
+
+# ==================== WORKERS ====================
+
+def _run_job(job_id, fn, args, kwargs):
+    with _engine.begin() as conn:
+        claimed = conn.execute(
+            update(_table).where(_table.c.id == job_id, _table.c.status == 'queued',
+                                 _table.c.cancel_requested.is_(False))
+            .values(status='running', started_at=get_philippine_time())
+        ).rowcount
+    if not claimed:
+        _update(job_id, status='cancelled', finished_at=get_philippine_time())
+        return
+
+    job = JobContext(job_id)
+    try:
+        if _app_context is not None:
+            with _app_context():
+                result = fn(job, *args, **kwargs)
+        else:
+            result = fn(job, *args, **kwargs)
+        _update(job_id, status='finished', progress=100, finished_at=get_philippine_time(),
+                result=json.dumps(result, default=str) if result is not None else None)
+        print(f"✓ Job {job_id} finished")
+    except JobCancelled:
+        _update(job_id, status='cancelled', finished_at=get_philippine_time())
+        print(f"✓ Job {job_id} cancelled")
+    except Exception as e:
+        traceback.print_exc()
+        _update(job_id, status='failed', error=str(e) or type(e).__name__,
+                finished_at=get_philippine_time())
+        print(f"✗ Job {job_id} failed: {e}")
+    finally:
+        _cancelled.discard(job_id)
+
+
+def _worker():
+    while True:
+        job_id, fn, args, kwargs = _job_queue.get()
+        try:
+            _run_job(job_id, fn, args, kwargs)
+        except Exception as e:
+            print(f"✗ Job {job_id} could not be run: {e}")
+        finally:
+            _job_queue.task_done()
+
+
+def _ensure_workers():
+    with _workers_lock:
+        _workers[:] = [t for t in _workers if t.is_alive()]
+        while len(_workers) < max(1, JOB_WORKERS):
+            thread = threading.Thread(target=_worker)
+            thread.daemon = True
+            thread.start()
+            _workers.append(thread)
+
+
+# ==================== API ====================
+
+def submit_job(kind, fn, *args, params=None, created_by=None, unique=False, **kwargs):
+    """
+    Queue fn(job, *args, **kwargs) to run in the background.
+
+    Args:
+        kind: Short job type name, e.g. 'auto_mark'
+        params: JSON-serializable description of the job shown to pollers
+        created_by: User id (current_user.get_id()) or None for system jobs
+        unique: If a job of this kind is already queued or running, return
+            its id instead of starting another
+
+    Returns:
+        (job_id, created) where created is False if unique matched a job
+    """
+    if _engine is None:
+        raise RuntimeError('Background jobs are not initialised')
+
+    with _engine.begin() as conn:
+        if unique:
+            existing = conn.execute(
+                select(_table.c.id).where(_table.c.kind == kind, _table.c.status.in_(ACTIVE_STATUSES))
+            ).scalar()
+            if existing:
+                return existing, False
+        job_id = uuid.uuid4().hex
+        conn.execute(insert(_table).values(
+            id=job_id,
+            kind=kind,
+            status='queued',
+            params=json.dumps(params, default=str) if params is not None else None,
+            progress=0,
+            cancel_requested=False,
+            created_by=created_by,
+            owner=_owner,
+            created_at=get_philippine_time()
+        ))
+
+    _ensure_workers()
+    _job_queue.put((job_id, fn, args, kwargs))
+    return job_id, True
+
+
+def get_job(job_id):
+    """Get a job as a dict, or None if unknown"""
+    with _engine.connect() as conn:
+        row = conn.execute(select(_table).where(_table.c.id == job_id)).first()
+    return _to_dict(row) if row else None
+
+
+def list_jobs(kind=None, status=None, limit=50):
+    """Most recent jobs first"""
+    query = select(_table).order_by(_table.c.created_at.desc()).limit(limit)
+    if kind:
+        query = query.where(_table.c.kind == kind)
+    if status:
+        query = query.where(_table.c.status == status)
+    with _engine.connect() as conn:
+        return [_to_dict(row) for row in conn.execute(query)]
+
+
+def cancel_job(job_id):
+    """
+    Ask a job to stop. A queued job is cancelled before it starts; a running
+    one stops at its next progress() call. Returns False if the job has
+    already ended or doesn't exist.
+    """
+    with _engine.begin() as conn:
+        changed = conn.execute(
+            update(_table).where(_table.c.id == job_id, _table.c.status.in_(ACTIVE_STATUSES))
+            .values(cancel_requested=True)
+        ).rowcount
+    if changed:
+        _cancelled.add(job_id)
+    return bool(changed)
+
+
+def wait_for_job(job_id, timeout=None, interval=0.2):
+    """Poll until a job ends (used by CLIs and tests); returns the job dict"""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        job = get_job(job_id)
+        if job is None or job['status'] not in ACTIVE_STATUSES:
+            return job
+        if deadline is not None and time.monotonic() > deadline:
+            return job
+        time.sleep(interval)
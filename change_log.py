@@ -0,0 +1,151 @@
+"""
+Change log for teacher databases
+
+Every teacher database file keeps an append-only change_log: one row per
+insert, update or delete of a student or attendance row, written by SQLite
+triggers in the same transaction as the change, whatever wrote it (the ORM,
+scan_executor, scan_batcher, roster imports). seq only grows, so a reader
+remembers the last seq it has seen (its high-water mark) and asks for what
+came after it. delta_sync.py uses it to send a desktop's scans to the cloud
+server and to pull roster changes back; GET /api/changes serves it to any
+other consumer (db_manager.read_change_feed).
+
+The log holds which row changed and when, not the row itself; readers join
+the current row, so several changes to one row collapse into one.
+"""
+
+import os
+import sqlite3
+import time
+
+# Tables whose changes are logged
+LOGGED_TABLES = ('students', 'attendance')
+
+# Days of changes kept; older entries are pruned when a database is first
+# opened. 0 (default) keeps everything. A consumer that falls further behind
+# than this must re-read the tables (see read_changes).
+CHANGE_LOG_RETENTION_DAYS = float(os.environ.get('CHANGE_LOG_RETENTION_DAYS', '0'))
+
+CHANGE_LOG_DDL = (
+    'CREATE TABLE IF NOT EXISTS change_log ('
+    '    seq INTEGER PRIMARY KEY AUTOINCREMENT,'
+    '    table_name VARCHAR(20) NOT NULL,'
+    '    row_id INTEGER NOT NULL,'
+    '    op VARCHAR(6) NOT NULL,'
+    '    changed_at REAL NOT NULL'  # Epoch seconds (UTC)
+    ')'
+)
+
+CHANGE_LOG_INDEX_DDL = 'CREATE INDEX IF NOT EXISTS ix_change_log_row ON change_log (table_name, row_id)'
+
+_NOW_SQL = "(julianday('now') - 2440587.5) * 86400.0"
+
+
+def _trigger_name(table, op):
+    return f'change_log_{table}_{op}'
+
+
+def _trigger_ddl(table, op):
+    row = 'OLD' if op == 'delete' else 'NEW'
+    return (
+        f'CREATE TRIGGER {_trigger_name(table, op)} AFTER {op.upper()} ON {table} BEGIN '
+        f"INSERT INTO change_log (table_name, row_id, op, changed_at) VALUES ('{table}', {row}.id, '{op}', {_NOW_SQL}); "
+        'END'
+    )
+
+
+def install(conn):
+    """
+    Create the change_log table and its triggers on a DB-API connection.
+
+    A trigger follows its table when it is renamed (migrate_to_v2 keeps the
+    old tables as *_v1_backup), so one found on another table is moved back.
+    """
+    conn.execute(CHANGE_LOG_DDL)
+    conn.execute(CHANGE_LOG_INDEX_DDL)
+    triggers = dict(conn.execute(
+        "SELECT name, tbl_name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'change_log_%'"
+    ).fetchall())
+    for table in LOGGED_TABLES:
+        for op in ('insert', 'update', 'delete'):
+            name = _trigger_name(table, op)
+            if triggers.get(name) == table:
+                continue
+            if name in triggers:
+                conn.execute(f'DROP TRIGGER {name}')
+            conn.execute(_trigger_ddl(table, op))
+
+
+def latest_seq(conn):
+    """Highest seq handed out so far (0 if none); AUTOINCREMENT never reuses one"""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+
+def oldest_seq(conn):
+    """Lowest seq still in the log, or None if it is empty"""
+    return conn.execute('SELECT MIN(seq) FROM change_log').fetchone()[0]
+
+
+def read_changes(conn, since, limit, tables=None):
+    """
+    Log entries after seq `since`, in seq order.
+
+    Returns:
+        List of (seq, table_name, row_id, op, changed_at)
+    """
+    sql = 'SELECT seq, table_name, row_id, op, changed_at FROM change_log WHERE seq > ?'
+    params = [since]
+    if tables:
+        sql += f' AND table_name IN ({", ".join("?" * len(tables))})'
+        params.extend(tables)
+    sql += ' ORDER BY seq LIMIT ?'
+    params.append(limit)
+    return conn.execute(sql, params).fetchall()
+
+
+def covers(conn, since):
+    """
+    Whether the log holds every change after seq `since`: False once older
+    entries were pruned, or if `since` is ahead of this database (replaced by
+    an older copy)
+    """
+    latest = latest_seq(conn)
+    oldest = oldest_seq(conn)
+    return (latest if oldest is None else oldest - 1) <= since <= latest
+
+
+def prune(conn, retention_days=None):
+    """Delete entries older than the retention period; returns how many"""
+    days = CHANGE_LOG_RETENTION_DAYS if retention_days is None else retention_days
+    if days <= 0:
+        return 0
+    cursor = conn.execute('DELETE FROM change_log WHERE changed_at < ?', (time.time() - days * 86400,))
+    return cursor.rowcount
+
+
+def changed_rows(conn, table, since, limit=None):
+    """
+    Rows of one table changed after seq `since`, oldest change first.
+
+    Returns:
+        List of (row_id, last seq, last changed_at); a row changed several
+        times appears once
+    """
+    sql = ('SELECT row_id, MAX(seq), MAX(changed_at) FROM change_log '
+           'WHERE table_name = ? AND seq > ? GROUP BY row_id ORDER BY MAX(seq)')
+    params = [table, since]
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    return conn.execute(sql, params).fetchall()
+
+
+def row_changed_at(conn, table, row_id):
+    """When a row was last changed according to the log, or None"""
+    try:
+        return conn.execute(
+            'SELECT MAX(changed_at) FROM change_log WHERE table_name = ? AND row_id = ?', (table, row_id)
+        ).fetchone()[0]
+    except sqlite3.OperationalError:
+        return None  # No log yet
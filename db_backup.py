@@ -0,0 +1,432 @@
+"""
+Online backups and read-only reporting snapshots
+
+Backups use SQLite's online backup API, copying a few pages per step and
+sleeping in between so scans keep writing while a backup runs. Every run
+produces a complete snapshot directory:
+
+    <backup dir>/<YYYYmmdd-HHMMSS>/attendance.db
+                                  /teacher_<id>_<grade>_<section>.db
+                                  /archive/<db_name>/<term>.db[.gz]
+                                  /manifest.json
+
+Databases unchanged since the previous snapshot are hard-linked from it
+instead of copied, so frequent runs stay cheap. A database written too
+often to finish a stepped copy is never copied in one blocking step: the
+backup backs off and retries, and if it is still busy the snapshot keeps
+the previous snapshot's copy of it (marked stale in the manifest) until
+the next run. Old snapshots are pruned to
+BACKUP_KEEP_LAST recent ones plus one per day for BACKUP_KEEP_DAILY days.
+
+A snapshot can be published as the reporting copy: heavy exports opened
+with get_reporting_db_session() read it read-only instead of the live
+databases.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import stat
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+import teacher_storage
+from db_manager import (
+    consolidated_storage,
+    get_instance_dir,
+    get_philippine_time,
+    list_teacher_databases,
+    apply_teacher_schema_meta,
+    readonly_uri
+)
+
+# Pages copied per backup step, and the pause between steps
+BACKUP_PAGES_PER_STEP = int(os.environ.get('BACKUP_PAGES_PER_STEP', '256'))
+BACKUP_STEP_SLEEP = float(os.environ.get('BACKUP_STEP_SLEEP', '0.01'))
+
+# A write from another connection restarts a stepped backup; after this many
+# restarts the attempt is abandoned, and after BACKUP_ATTEMPTS attempts (with
+# BACKUP_RETRY_SECONDS, then twice that, ... in between) the database is
+# skipped until the next run
+BACKUP_MAX_RESTARTS = 3
+BACKUP_ATTEMPTS = int(os.environ.get('BACKUP_ATTEMPTS', '3'))
+BACKUP_RETRY_SECONDS = float(os.environ.get('BACKUP_RETRY_SECONDS', '1'))
+
+BACKUP_KEEP_LAST = int(os.environ.get('BACKUP_KEEP_LAST', '24'))
+BACKUP_KEEP_DAILY = int(os.environ.get('BACKUP_KEEP_DAILY', '14'))
+
+# Minutes between scheduled backups; 0 disables the scheduler
+BACKUP_INTERVAL_MINUTES = int(os.environ.get('BACKUP_INTERVAL_MINUTES', '0'))
+
+# A backup lock older than this is assumed left behind by a crashed process
+BACKUP_LOCK_STALE_SECONDS = 2 * 60 * 60
+
+MANIFEST_NAME = 'manifest.json'
+REPORTING_POINTER = 'REPORTING'
+
+_reporting_sessions = {}
+_reporting_lock = threading.Lock()
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
+class BackupBusy(Exception):
+    """A database kept being written during every backup attempt"""
+
+
+def get_backup_dir():
+    """Get the directory holding backup snapshots"""
+    backup_dir = os.environ.get('BACKUP_DIR') or os.path.join(get_instance_dir(), 'backups')
+    os.makedirs(backup_dir, exist_ok=True)
+    return backup_dir
+
+
+def list_snapshots():
+    """List snapshot ids, oldest first"""
+    backup_dir = get_backup_dir()
+    return sorted(
+        name for name in os.listdir(backup_dir)
+        if not name.startswith('.') and os.path.exists(os.path.join(backup_dir, name, MANIFEST_NAME))
+    )
+
+
+def read_manifest(snapshot_id):
+    with open(os.path.join(get_backup_dir(), snapshot_id, MANIFEST_NAME), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _signature(path):
+    """Size and mtime of a database and its WAL, to tell whether it changed"""
+    parts = []
+    for candidate in (path, f'{path}-wal'):
+        if os.path.exists(candidate):
+            st = os.stat(candidate)
+            parts.append([st.st_size, st.st_mtime_ns])
+    return parts
+
+
+def backup_database(src_path, dst_path, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP):
+    """
+    Copy a live SQLite database with the online backup API.
+
+    Copies `pages` pages per step so writers are only blocked for one step
+    at a time. Returns the number of pages copied.
+
+    Raises:
+        BackupBusy: Writes restarted the copy too often in every attempt
+    """
+    tmp_path = f'{dst_path}.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    src = sqlite3.connect(readonly_uri(src_path), uri=True, timeout=30)
+    dst = sqlite3.connect(tmp_path)
+    try:
+        state = {'remaining': None, 'restarts': 0, 'total': 0}
+
+        def progress(status, remaining, total):
+            # remaining jumps back up when a concurrent write restarts the copy
+            if state['remaining'] is not None and remaining > state['remaining']:
+                state['restarts'] += 1
+                if state['restarts'] > BACKUP_MAX_RESTARTS:
+                    raise _BackupRestarted()
+            state['remaining'] = remaining
+            state['total'] = total
+
+        total = None
+        for attempt in range(BACKUP_ATTEMPTS):
+            state.update(remaining=None, restarts=0)
+            try:
+                src.backup(dst, pages=pages, progress=progress, sleep=sleep)
+            except _BackupRestarted:
+                # A full copy in one step would block writers; wait for a quieter moment
+                if attempt + 1 < BACKUP_ATTEMPTS:
+                    time.sleep(BACKUP_RETRY_SECONDS * 2 ** attempt)
+                continue
+            total = state['total'] or dst.execute('PRAGMA page_count').fetchone()[0]
+            break
+    finally:
+        dst.close()
+        src.close()
+
+    if total is None:
+        os.remove(tmp_path)
+        raise BackupBusy(f'{os.path.basename(src_path)} kept changing during {BACKUP_ATTEMPTS} attempts')
+    os.replace(tmp_path, dst_path)
+    return total
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _collect_sources(main_db_path):
+    """(relative name, path, is_sqlite) for everything a snapshot covers"""
+    sources = []
+    if main_db_path and os.path.exists(main_db_path):
+        sources.append((os.path.basename(main_db_path), main_db_path, True))
+    if consolidated_storage():
+        # One shared database; a server database is backed up by its own tooling
+        storage_path = teacher_storage.get_storage_path()
+        if storage_path and os.path.exists(storage_path):
+            sources.append((os.path.basename(storage_path), storage_path, True))
+    for info in list_teacher_databases():
+        if info['path']:
+            sources.append((f"{info['db_name']}.db", info['path'], True))
+
+    # Term archives are closed files; they are copied rather than backed up
+    archive_root = os.path.join(get_instance_dir(), 'archive')
+    if os.path.isdir(archive_root):
+        for db_name in sorted(os.listdir(archive_root)):
+            archive_dir = os.path.join(archive_root, db_name)
+            if not os.path.isdir(archive_dir):
+                continue
+            for file_name in sorted(os.listdir(archive_dir)):
+                if file_name.endswith('.db') or file_name.endswith('.db.gz'):
+                    sources.append((f'archive/{db_name}/{file_name}',
+                                    os.path.join(archive_dir, file_name), False))
+    return sources
+
+
+def _acquire_lock(backup_dir):
+    lock_path = os.path.join(backup_dir, '.lock')
+    try:
+        if time.time() - os.path.getmtime(lock_path) > BACKUP_LOCK_STALE_SECONDS:
+            os.remove(lock_path)
+    except OSError:
+        pass
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return None
+    os.write(fd, str(os.getpid()).encode())
+    os.close(fd)
+    return lock_path
+
+
+def _fill_snapshot(work_dir, main_db_path, previous, previous_dir, files, skipped):
+    """
+    Back up or link every source into work_dir; busy databases are added to
+    skipped. Returns (copied, linked, pages)
+    """
+    copied = linked = pages = 0
+    for name, path, is_sqlite in _collect_sources(main_db_path):
+        dst = os.path.join(work_dir, name)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        signature = _signature(path)
+        old = previous['files'].get(name)
+        if previous_dir and old and old['signature'] == signature:
+            _link_or_copy(os.path.join(previous_dir, name), dst)
+            linked += 1
+        elif is_sqlite:
+            try:
+                pages += backup_database(path, dst)
+            except BackupBusy as e:
+                print(f"✗ Backup skipped {name} until the next run: {e}")
+                skipped.append(name)
+                if previous_dir and old:
+                    # Keep the last good copy; its old signature makes the next run copy it again
+                    _link_or_copy(os.path.join(previous_dir, name), dst)
+                    files[name] = dict(old, source=path, stale=True)
+                continue
+            os.chmod(dst, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            copied += 1
+        else:
+            shutil.copy2(path, dst)
+            copied += 1
+        files[name] = {'signature': signature, 'source': path}
+    return copied, linked, pages
+
+
+def run_backup(main_db_path=None, publish=False, keep_last=None, keep_daily=None):
+    """
+    Take a snapshot of the main database, every teacher database and the
+    term archives, prune old snapshots, and optionally publish it for
+    reporting.
+
+    Args:
+        main_db_path: Path of the main SQLite database (None if it isn't SQLite)
+
+    Returns:
+        Dict with snapshot id, files copied and linked, pages, skipped (busy
+        databases, see backup_database) and pruned ids; or None if another
+        backup is already running
+    """
+    backup_dir = get_backup_dir()
+    lock_path = _acquire_lock(backup_dir)
+    if lock_path is None:
+        return None
+
+    try:
+        snapshots = list_snapshots()
+        previous = read_manifest(snapshots[-1]) if snapshots else {'files': {}}
+        previous_dir = os.path.join(backup_dir, snapshots[-1]) if snapshots else None
+
+        base_id = get_philippine_time().strftime('%Y%m%d-%H%M%S')
+        snapshot_id = base_id
+        suffix = 0
+        while os.path.exists(os.path.join(backup_dir, snapshot_id)):
+            suffix += 1
+            snapshot_id = f'{base_id}-{suffix}'
+        work_dir = os.path.join(backup_dir, f'.{snapshot_id}.tmp')
+        shutil.rmtree(work_dir, ignore_errors=True)
+        os.makedirs(work_dir)
+
+        files = {}
+        skipped = []
+        try:
+            copied, linked, pages = _fill_snapshot(work_dir, main_db_path, previous, previous_dir, files, skipped)
+        except Exception:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+
+        manifest = {
+            'id': snapshot_id,
+            'created_at': get_philippine_time().isoformat(),
+            'main_db': os.path.basename(main_db_path) if main_db_path else None,
+            'files': files
+        }
+        with open(os.path.join(work_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(work_dir, os.path.join(backup_dir, snapshot_id))
+
+        if publish:
+            publish_reporting_snapshot(snapshot_id)
+        pruned = prune_snapshots(keep_last, keep_daily)
+
+        return {
+            'snapshot': snapshot_id,
+            'copied': copied,
+            'linked': linked,
+            'pages': pages,
+            'skipped': skipped,
+            'pruned': pruned
+        }
+    finally:
+        os.remove(lock_path)
+
+
+def prune_snapshots(keep_last=None, keep_daily=None):
+    """
+    Delete snapshots outside the retention policy: the newest keep_last,
+    plus the newest of each of the last keep_daily days, plus the published
+    reporting snapshot are kept. Returns the deleted ids.
+    """
+    keep_last = BACKUP_KEEP_LAST if keep_last is None else keep_last
+    keep_daily = BACKUP_KEEP_DAILY if keep_daily is None else keep_daily
+
+    snapshots = list_snapshots()
+    keep = set(snapshots[-keep_last:]) if keep_last > 0 else set()
+    days = {}
+    for snapshot_id in snapshots:
+        days[snapshot_id[:8]] = snapshot_id  # Newest of the day wins
+    keep.update(sorted(days.values())[-keep_daily:] if keep_daily > 0 else [])
+    published = get_reporting_snapshot()
+    if published:
+        keep.add(published)
+
+    pruned = []
+    for snapshot_id in snapshots:
+        if snapshot_id not in keep:
+            shutil.rmtree(os.path.join(get_backup_dir(), snapshot_id), ignore_errors=True)
+            pruned.append(snapshot_id)
+    return pruned
+
+
+# ==================== REPORTING SNAPSHOT ====================
+
+def publish_reporting_snapshot(snapshot_id):
+    """Make a snapshot the read-only copy that reporting exports use"""
+    if snapshot_id not in list_snapshots():
+        raise ValueError(f'Unknown snapshot: {snapshot_id}')
+    pointer = os.path.join(get_backup_dir(), REPORTING_POINTER)
+    tmp_path = f'{pointer}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(snapshot_id)
+    os.replace(tmp_path, pointer)
+
+
+def get_reporting_snapshot():
+    """Get the published reporting snapshot id, or None"""
+    pointer = os.path.join(get_backup_dir(), REPORTING_POINTER)
+    try:
+        with open(pointer, encoding='utf-8') as f:
+            snapshot_id = f.read().strip()
+    except OSError:
+        return None
+    if not os.path.exists(os.path.join(get_backup_dir(), snapshot_id, MANIFEST_NAME)):
+        return None
+    return snapshot_id
+
+
+def get_reporting_db_session(db_name):
+    """
+    Get a read-only sessionmaker for a teacher database in the published
+    reporting snapshot, or None if there is no snapshot or it lacks the
+    database.
+    """
+    snapshot_id = get_reporting_snapshot()
+    if not snapshot_id:
+        return None
+    path = os.path.join(get_backup_dir(), snapshot_id, f'{db_name}.db')
+    if not os.path.exists(path):
+        return None
+
+    with _reporting_lock:
+        Session = _reporting_sessions.get(path)
+        if Session is None:
+            # sqlite3 opens the URI itself: in a SQLAlchemy URL the path would be
+            # URL-decoded (breaking on % and #) and a missing file created
+            uri = readonly_uri(path)
+            engine = create_engine(
+                'sqlite://',
+                creator=lambda: sqlite3.connect(uri, uri=True, check_same_thread=False),
+                poolclass=QueuePool
+            )
+
+            @event.listens_for(engine, 'connect')
+            def configure(dbapi_conn, connection_record):
+                apply_teacher_schema_meta(engine.dialect, dbapi_conn)
+
+            Session = sessionmaker(bind=engine)
+            _reporting_sessions[path] = Session
+    return Session
+
+
+# ==================== SCHEDULER ====================
+
+def start_backup_scheduler(main_db_path, interval_minutes=None, publish=True):
+    """
+    Back up every interval_minutes in a daemon thread (BACKUP_INTERVAL_MINUTES
+    by default; 0 disables). The backup lock keeps several worker processes
+    from backing up at once. Returns True if the scheduler was started.
+    """
+    interval = BACKUP_INTERVAL_MINUTES if interval_minutes is None else interval_minutes
+    if interval <= 0:
+        return False
+
+    def run():
+        while True:
+            time.sleep(interval * 60)
+            try:
+                result = run_backup(main_db_path, publish=publish)
+                if result:
+                    print(f"✓ Backup {result['snapshot']}: {result['copied']} copied, {result['linked']} unchanged")
+            except Exception as e:
+                print(f"✗ Scheduled backup failed: {e}")
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    print(f"✓ Backups scheduled every {interval} minutes in {get_backup_dir()}")
+    return True
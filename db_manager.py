@@ -11,13 +11,36 @@ Sections: Custom names entered by admin
 
 import os
 import sys
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, LargeBinary, ForeignKey, text
+import gzip
+import heapq
+import shutil
+import sqlite3
+from urllib.parse import quote
+from sqlalchemy import create_engine, event, Column, Integer, String, LargeBinary, ForeignKey, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 from datetime import datetime
 import pytz
 import qrcode
 from io import BytesIO
 
+import change_log
+import qr_payload
+
+from db_schema_v2 import (
+    SCHEMA_V1,
+    SCHEMA_V2,
+    SHIFT_CODES,
+    ATTENDANCE_STATUS_CODES,
+    RECORD_STATUS_CODES,
+    DayNumber,
+    EpochDateTime,
+    CodedString,
+    SectionString,
+    create_v2_tables,
+    read_schema_meta,
+    v1_view_ddl
+)
+
 # Philippine timezone
 PHILIPPINE_TZ = pytz.timezone('Asia/Manila')
 
@@ -37,6 +60,11 @@ def get_instance_dir():
     os.makedirs(instance_dir, exist_ok=True)
     return instance_dir
 
+# Where sections are stored: 'files' (default, one SQLite file per teacher) or
+# 'consolidated' (one shared database, see teacher_storage.py). Read at import:
+# the attendance model depends on it.
+TEACHER_STORAGE = os.environ.get('TEACHER_STORAGE', 'files').lower()
+
 # Base for teacher-specific database models
 TeacherDBBase = declarative_base()
 
@@ -48,11 +76,11 @@ class TeacherStudent(TeacherDBBase):
     full_name = Column(String(200), nullable=False)
     email = Column(String(150), unique=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
-    section = Column(String(50), nullable=False)
-    grade_level = Column(String(10), nullable=False)
+    section = Column(SectionString('section', 50), nullable=False)
+    grade_level = Column(SectionString('grade_level', 10), nullable=False)
     qr_code = Column(LargeBinary)
     teacher_id = Column(Integer, nullable=False)  # Reference to main DB teacher
-    created_at = Column(DateTime, default=get_philippine_time)
+    created_at = Column(EpochDateTime, default=get_philippine_time)
     
     # Guardian information
     guardian_name = Column(String(200), nullable=True)
@@ -69,7 +97,8 @@ class TeacherStudent(TeacherDBBase):
             box_size=10,
             border=4,
         )
-        qr_data = f'STUDENT_{self.id}_{self.teacher_id}_{self.email}'
+        # Signed compact payload (see qr_payload.py); fits a version 1 symbol
+        qr_data = qr_payload.encode(self.id, self.teacher_id, qr_payload_version())
         qr.add_data(qr_data)
         qr.make(fit=True)
         
@@ -86,20 +115,83 @@ class TeacherAttendance(TeacherDBBase):
     
     id = Column(Integer, primary_key=True)
     student_id = Column(Integer, ForeignKey('students.id'), nullable=False)
-    timestamp = Column(DateTime, default=get_philippine_time)
-    check_in_time = Column(DateTime, nullable=True)  # Actual check-in time
-    check_out_time = Column(DateTime, nullable=True)  # Actual check-out time
+    timestamp = Column(EpochDateTime, default=get_philippine_time)
+    check_in_time = Column(EpochDateTime, nullable=True)  # Actual check-in time
+    check_out_time = Column(EpochDateTime, nullable=True)  # Actual check-out time
     
     # Attendance status: PRESENT, ABSENT, LATE, CUTTING
-    attendance_status = Column(String(20), default='ABSENT')  # PRESENT, ABSENT, LATE, CUTTING
+    attendance_status = Column(CodedString(ATTENDANCE_STATUS_CODES, 20), default='ABSENT')  # PRESENT, ABSENT, LATE, CUTTING
     
     # Record type for tracking: 'check_in' or 'check_out' (for compatibility)
-    status = Column(String(20), default='check_in')  # 'check_in' or 'check_out'
+    status = Column(CodedString(RECORD_STATUS_CODES, 20), default='check_in')  # 'check_in' or 'check_out'
     
-    date = Column(String(10), nullable=True)  # Date in YYYY-MM-DD format for querying
+    date = Column(DayNumber, nullable=True)  # Date in YYYY-MM-DD format for querying
     # Shift for the attendance record: 'morning' or 'afternoon'
-    shift = Column(String(10), nullable=True)
+    shift = Column(CodedString(SHIFT_CODES, 10), nullable=True)
+    
+    if TEACHER_STORAGE == 'consolidated':
+        # Owning section in the shared table (see teacher_storage.py); section files don't have it
+        teacher_id = Column(Integer, nullable=True)
+
+
+class TeacherSchemaMeta(TeacherDBBase):
+    """Per-database settings: schema_version, and the section/grade in v2 (see db_schema_v2.py)"""
+    __tablename__ = 'schema_meta'
+    
+    key = Column(String(50), primary_key=True)
+    value = Column(String(200), nullable=True)
+
+
+class TeacherAttendanceCounter(TeacherDBBase):
+    """Running per-day, per-shift attendance status totals for the dashboard"""
+    __tablename__ = 'attendance_counters'
+    
+    date = Column(String(10), primary_key=True)  # YYYY-MM-DD
+    shift = Column(String(10), primary_key=True)  # 'morning' or 'afternoon'
+    attendance_status = Column(String(20), primary_key=True)  # PRESENT, ABSENT, LATE, CUTTING, EXCUSED
+    count = Column(Integer, nullable=False, default=0)
+
+
+class TeacherAttendanceDaily(TeacherDBBase):
+    """Per-student, per-day rollup of both shifts for history queries"""
+    __tablename__ = 'attendance_daily'
+    
+    student_id = Column(Integer, primary_key=True)
+    date = Column(String(10), primary_key=True, index=True)  # YYYY-MM-DD
+    morning_status = Column(String(20), nullable=True)  # PRESENT, ABSENT, LATE, CUTTING, EXCUSED
+    afternoon_status = Column(String(20), nullable=True)
+
+
+class TeacherAttendanceBitset(TeacherDBBase):
+    """Packed per-student attendance history for one school year (see attendance_bitsets.py)"""
+    __tablename__ = 'attendance_bitsets'
+    
+    student_id = Column(Integer, primary_key=True)
+    school_year = Column(Integer, primary_key=True)  # Year the school year starts in
+    bits = Column(LargeBinary, nullable=False)  # 2 bits per shift per day
+
 
+class TeacherAttendanceArchive(TeacherDBBase):
+    """Manifest of closed terms moved to archive databases (see attendance_archive.py)"""
+    __tablename__ = 'attendance_archives'
+    
+    term = Column(String(20), primary_key=True)  # e.g. '2025-t1'
+    date_from = Column(String(10), nullable=False)  # First day of the term
+    date_to = Column(String(10), nullable=False)  # Last day of the term
+    file_name = Column(String(100), nullable=False)  # In get_archive_dir(db_name); .gz if compressed
+    row_count = Column(Integer, nullable=False, default=0)
+    archived_at = Column(String(32), nullable=True)  # ISO timestamp of the last rollover
+
+
+# Shift name -> rollup column in attendance_daily
+ROLLUP_SHIFT_COLUMNS = {
+    'morning': 'morning_status',
+    'afternoon': 'afternoon_status',
+}
+
+
+# Schema for newly created teacher databases: 'v1' (default) or 'v2' (see db_schema_v2.py)
+TEACHER_DB_SCHEMA = os.environ.get('TEACHER_DB_SCHEMA', 'v1').lower()
 
 # Database session cache
 _db_sessions = {}
@@ -119,17 +211,61 @@ def get_teacher_db_path(db_name):
     instance_dir = get_instance_dir()
     return os.path.join(instance_dir, f"{db_name}.db")
 
+def consolidated_storage():
+    """True when sections share one database instead of a file each"""
+    return TEACHER_STORAGE == 'consolidated'
+
+def qr_payload_version():
+    """Signed QR payload version for this storage layout (its ids differ per layout)"""
+    return qr_payload.CONSOLIDATED_VERSION if consolidated_storage() else qr_payload.PAYLOAD_VERSION
+
+def _storage():
+    # Imported on first use: teacher_storage builds on the models above
+    import teacher_storage
+    return teacher_storage
+
+def get_section_teacher_id(db_name):
+    """Get the teacher id a database name was made from (teacher_{id}_{grade}_{section})"""
+    return int(db_name.split('_')[1])
+
+def section_condition(db_name, column='teacher_id'):
+    """
+    SQL condition limiting a raw query on students, attendance, attendance_v1
+    or attendance_counters to one section. Always true for a section file; in
+    consolidated storage it matches the section's teacher_id.
+    """
+    if not consolidated_storage():
+        return '1 = 1'
+    return f'{column} = {get_section_teacher_id(db_name)}'
+
+def section_students_condition(db_name, column='student_id'):
+    """section_condition() for tables keyed only by student (attendance_daily, attendance_bitsets)"""
+    if not consolidated_storage():
+        return '1 = 1'
+    return f'{column} IN (SELECT id FROM students WHERE teacher_id = {get_section_teacher_id(db_name)})'
+
 def create_teacher_database(teacher_id, grade_level, section):
     """
     Create a new database for a teacher.
     Returns the database name.
     """
     db_name = get_teacher_db_name(teacher_id, grade_level, section)
+    if consolidated_storage():
+        return _storage().create_section(db_name, teacher_id, grade_level, section)
     db_path = get_teacher_db_path(db_name)
     
-    # Create engine and tables
+    if TEACHER_DB_SCHEMA == 'v2' and not os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            with conn:
+                create_v2_tables(conn, section, grade_level)
+        finally:
+            conn.close()
+    
+    # Create engine and tables (existing v2 tables are left as they are)
     engine = create_engine(f"sqlite:///{db_path}")
     TeacherDBBase.metadata.create_all(engine)
+    engine.dispose()
     
     print(f"Created teacher database: {db_path}")
     return db_name
@@ -142,6 +278,10 @@ def get_teacher_db_session(db_name):
     if db_name in _db_sessions:
         return _db_sessions[db_name]
     
+    if consolidated_storage():
+        Session = _db_sessions[db_name] = _storage().section_sessionmaker(db_name)
+        return Session
+    
     db_path = get_teacher_db_path(db_name)
     
     if not os.path.exists(db_path):
@@ -150,13 +290,62 @@ def get_teacher_db_session(db_name):
         TeacherDBBase.metadata.create_all(engine)
     else:
         engine = create_engine(f"sqlite:///{db_path}")
+        # Create any tables added since the database was made
+        TeacherDBBase.metadata.create_all(engine)
         # Migrate existing database to add missing columns
         migrate_teacher_database(engine)
     
+    configure_teacher_engine(engine)
     Session = sessionmaker(bind=engine)
     _db_sessions[db_name] = Session
     return Session
 
+def apply_teacher_schema_meta(dialect, dbapi_conn):
+    """Point the adaptive column types at the schema this database uses"""
+    meta = read_schema_meta(dbapi_conn)
+    dialect.teacher_schema_meta = meta
+    dialect.teacher_schema_version = SCHEMA_V2 if meta.get('schema_version') == str(SCHEMA_V2) else SCHEMA_V1
+
+def configure_teacher_engine(engine):
+    """
+    Set up an engine for the teacher database's schema version.
+    
+    Each engine has its own dialect, which the column types in db_schema_v2
+    read to decide whether to encode values. The schema cookie is checked on
+    every pool checkout so a database migrated to v2 by another process is
+    picked up without a restart.
+    """
+    state = {'cookie': None}
+    
+    @event.listens_for(engine, 'checkout')
+    def check_schema(dbapi_conn, connection_record, connection_proxy):
+        cookie = dbapi_conn.execute('PRAGMA schema_version').fetchone()[0]
+        if cookie != state['cookie']:
+            apply_teacher_schema_meta(engine.dialect, dbapi_conn)
+            state['cookie'] = cookie
+    
+    with engine.begin() as conn:
+        apply_teacher_schema_meta(engine.dialect, conn.connection.dbapi_connection)
+        # v1-shaped views for raw SQL readers
+        for statement in v1_view_ddl(engine.dialect.teacher_schema_version):
+            conn.exec_driver_sql(statement)
+        change_log.install(conn.connection.dbapi_connection)
+        change_log.prune(conn.connection.dbapi_connection)
+    # The views and triggers changed the schema cookie; re-read it on next checkout
+    state['cookie'] = None
+
+def get_teacher_schema_version(db_name):
+    """Get the schema version (1 or 2) of a teacher database"""
+    Session = get_teacher_db_session(db_name)
+    return getattr(Session.kw['bind'].dialect, 'teacher_schema_version', SCHEMA_V1)
+
+def reset_teacher_db_session(db_name):
+    """Drop a cached session factory, e.g. after converting the database to v2"""
+    Session = _db_sessions.pop(db_name, None)
+    # The consolidated engine is shared by every section
+    if Session is not None and not consolidated_storage():
+        Session.kw['bind'].dispose()
+
 def migrate_teacher_database(engine):
     """Add missing columns to existing teacher database"""
     with engine.connect() as conn:
@@ -200,13 +389,151 @@ def migrate_teacher_database(engine):
                 except Exception as e:
                     pass  # Column might already exist
 
+        # Every scan looks up the student's row for today's shift
+        conn.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_attendance_student_day_shift ON attendance (student_id, date, shift)'
+        ))
+        conn.commit()
+
+def bump_attendance_counter(sess, date_str, shift, old_status, new_status):
+    """
+    Move one student between status counters for a day/shift.
+    
+    Runs on the caller's session so the counter change commits in the same
+    transaction as the attendance row it describes. Either status may be None
+    (e.g. old_status is None for a student's first record of the shift).
+    """
+    if old_status == new_status:
+        return
+    teacher_id = sess.info.get('teacher_id')
+    if teacher_id is None:
+        upsert = text(
+            'INSERT INTO attendance_counters (date, shift, attendance_status, count) '
+            'VALUES (:date, :shift, :status, :delta) '
+            'ON CONFLICT(date, shift, attendance_status) DO UPDATE SET count = count + excluded.count'
+        )
+    else:
+        upsert = text(
+            'INSERT INTO attendance_counters (teacher_id, date, shift, attendance_status, count) '
+            'VALUES (:teacher_id, :date, :shift, :status, :delta) '
+            'ON CONFLICT(teacher_id, date, shift, attendance_status) '
+            'DO UPDATE SET count = attendance_counters.count + excluded.count'
+        )
+    params = {'teacher_id': teacher_id, 'date': date_str, 'shift': shift}
+    if old_status:
+        sess.execute(upsert, dict(params, status=old_status, delta=-1))
+    if new_status:
+        sess.execute(upsert, dict(params, status=new_status, delta=1))
+
+def upsert_daily_rollup(sess, student_id, date_str, shift, status):
+    """
+    Set one student's status for a shift in the attendance_daily rollup.
+    
+    Runs on the caller's session so the rollup commits together with the
+    attendance row it summarizes.
+    """
+    column = ROLLUP_SHIFT_COLUMNS.get(shift)
+    if not column:
+        return
+    sess.execute(text(
+        f'INSERT INTO attendance_daily (student_id, date, {column}) '
+        f'VALUES (:student_id, :date, :status) '
+        f'ON CONFLICT(student_id, date) DO UPDATE SET {column} = excluded.{column}'
+    ), {'student_id': student_id, 'date': date_str, 'status': status})
+
+def rebuild_daily_rollups(db_name, date_from, date_to):
+    """
+    Recompute attendance_daily for a date range from the raw attendance rows.
+    
+    Returns the number of student-days written.
+    """
+    Session = get_teacher_db_session(db_name)
+    sess = Session()
+    try:
+        params = {'date_from': date_from, 'date_to': date_to}
+        section = section_condition(db_name)
+        sess.execute(text(
+            'DELETE FROM attendance_daily WHERE date BETWEEN :date_from AND :date_to '
+            f'AND {section_students_condition(db_name)}'
+        ), params)
+        # The latest row wins if a shift was ever recorded twice
+        result = sess.execute(text(
+            'INSERT INTO attendance_daily (student_id, date, morning_status, afternoon_status) '
+            'SELECT student_id, date, '
+            "MAX(CASE WHEN shift = 'morning' THEN attendance_status END), "
+            "MAX(CASE WHEN shift = 'afternoon' THEN attendance_status END) "
+            'FROM (SELECT student_id, date, shift, attendance_status FROM attendance_v1 '
+            '      WHERE date BETWEEN :date_from AND :date_to AND id IN ('
+            '          SELECT MAX(id) FROM attendance_v1 '
+            f'          WHERE date BETWEEN :date_from AND :date_to AND {section} '
+            '          GROUP BY student_id, date, shift)) latest '
+            'GROUP BY student_id, date'
+        ), params)
+        sess.commit()
+        return result.rowcount
+    finally:
+        sess.close()
+
+def rebuild_attendance_counters(db_name, date_str):
+    """
+    Recompute a day's counters in a teacher database from its raw attendance rows.
+    
+    Returns a tuple of (student_count, {shift: {status: count}}).
+    """
+    Session = get_teacher_db_session(db_name)
+    sess = Session()
+    try:
+        section = section_condition(db_name)
+        sess.execute(text(f'DELETE FROM attendance_counters WHERE date = :date AND {section}'), {'date': date_str})
+        # The section's teacher_id is part of the key in consolidated storage
+        key = 'teacher_id, ' if consolidated_storage() else ''
+        sess.execute(text(
+            f'INSERT INTO attendance_counters ({key}date, shift, attendance_status, count) '
+            f'SELECT {key}date, shift, attendance_status, COUNT(*) FROM attendance_v1 '
+            f'WHERE date = :date AND shift IS NOT NULL AND attendance_status IS NOT NULL AND {section} '
+            f'GROUP BY {key}date, shift, attendance_status'
+        ), {'date': date_str})
+        sess.commit()
+    finally:
+        sess.close()
+    return read_attendance_counters(db_name, date_str)
+
+def read_attendance_counters(db_name, date_str):
+    """
+    Read a day's counters from a teacher database.
+    
+    Returns a tuple of (student_count, {shift: {status: count}}).
+    """
+    Session = get_teacher_db_session(db_name)
+    sess = Session()
+    try:
+        section = section_condition(db_name)
+        student_count = sess.execute(text(f'SELECT COUNT(*) FROM students WHERE {section}')).scalar() or 0
+        rows = sess.execute(text(
+            f'SELECT shift, attendance_status, count FROM attendance_counters WHERE date = :date AND {section}'
+        ), {'date': date_str}).fetchall()
+    finally:
+        sess.close()
+    
+    shifts = {}
+    for shift, status, count in rows:
+        shifts.setdefault(shift, {})[status] = count
+    return student_count, shifts
+
 def delete_teacher_database(db_name):
     """Delete a teacher's database file"""
     db_path = get_teacher_db_path(db_name)
     
     # Remove from cache
-    if db_name in _db_sessions:
-        del _db_sessions[db_name]
+    reset_teacher_db_session(db_name)
+    
+    if consolidated_storage():
+        return _storage().delete_section(db_name)
+    
+    # Term archives go with it
+    archive_dir = os.path.join(get_instance_dir(), 'archive', db_name)
+    if os.path.isdir(archive_dir):
+        shutil.rmtree(archive_dir, ignore_errors=True)
     
     # Delete file
     if os.path.exists(db_path):
@@ -226,6 +553,9 @@ def find_student_by_email(email, teachers_list):
     Returns:
         Tuple of (student, teacher_db_name) or (None, None) if not found
     """
+    if consolidated_storage():
+        return _storage().find_student_by_email(email, [t['db_name'] for t in teachers_list if t.get('db_name')])
+    
     for teacher in teachers_list:
         db_name = teacher.get('db_name')
         if not db_name:
@@ -276,6 +606,9 @@ def get_available_sections(main_db_session, Teacher):
 
 def list_teacher_databases():
     """List all teacher databases in the instance directory"""
+    if consolidated_storage():
+        return _storage().list_sections()
+    
     instance_dir = get_instance_dir()
     databases = []
     
@@ -292,6 +625,360 @@ def list_teacher_databases():
     return databases
 
 
+# ==================== CHANGE LOG ====================
+
+# Student fields in change feeds (no password hash or QR image)
+CHANGE_FEED_STUDENT_FIELDS = ('id', 'full_name', 'email', 'section', 'grade_level', 'guardian_name',
+                              'guardian_email', 'guardian_phone', 'notify_on_checkin', 'notify_on_checkout')
+
+CHANGE_FEED_ATTENDANCE_FIELDS = ('id', 'student_id', 'date', 'shift', 'attendance_status', 'status',
+                                 'timestamp', 'check_in_time', 'check_out_time')
+
+def open_change_log(db_name):
+    """
+    Pooled DB-API connection to a teacher database's change log (see
+    change_log.py), or None in consolidated storage, which has no log.
+    The caller closes it.
+    """
+    if consolidated_storage():
+        return None
+    return get_teacher_db_session(db_name).kw['bind'].raw_connection()
+
+def _change_feed_row(obj, fields):
+    row = {}
+    for field in fields:
+        value = getattr(obj, field)
+        row[field] = value.isoformat() if isinstance(value, datetime) else value
+    return row
+
+def read_change_feed(db_name, since, limit, tables=None, include_rows=False):
+    """
+    Changes to a teacher database's students and attendance after seq `since`.
+    
+    Args:
+        tables: Only these of change_log.LOGGED_TABLES (default all)
+        include_rows: Add each row's current values ('row', None once deleted)
+    
+    Returns:
+        {'latest_seq', 'next_since', 'has_more', 'reset', 'changes': [...]}.
+        reset is True when entries after `since` were pruned: no changes are
+        returned and the consumer re-reads the tables, then continues from
+        next_since. Raises RuntimeError in consolidated storage.
+    """
+    conn = open_change_log(db_name)
+    if conn is None:
+        raise RuntimeError('The change log needs per-teacher database files (TEACHER_STORAGE=files)')
+    try:
+        latest = change_log.latest_seq(conn)
+        if not change_log.covers(conn, since):
+            return {'latest_seq': latest, 'next_since': latest, 'has_more': False, 'reset': True, 'changes': []}
+        entries = change_log.read_changes(conn, since, limit + 1, tables)
+    finally:
+        conn.close()
+    
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    changes = [{'seq': seq, 'table': table, 'row_id': row_id, 'op': op, 'changed_at': changed_at}
+               for seq, table, row_id, op, changed_at in entries]
+    if include_rows and changes:
+        sess = get_teacher_db_session(db_name)()
+        try:
+            rows = {}
+            for table, model, fields in (('students', TeacherStudent, CHANGE_FEED_STUDENT_FIELDS),
+                                         ('attendance', TeacherAttendance, CHANGE_FEED_ATTENDANCE_FIELDS)):
+                ids = list({c['row_id'] for c in changes if c['table'] == table})
+                if ids:
+                    for obj in sess.query(model).filter(model.id.in_(ids)):
+                        rows[table, obj.id] = _change_feed_row(obj, fields)
+        finally:
+            sess.close()
+        for change in changes:
+            change['row'] = rows.get((change['table'], change['row_id']))
+    return {
+        'latest_seq': latest,
+        'next_since': changes[-1]['seq'] if changes else max(since, latest),
+        'has_more': has_more,
+        'reset': False,
+        'changes': changes
+    }
+
+
+# ==================== TERM ARCHIVES ====================
+
+def get_archive_dir(db_name):
+    """Get the directory holding a teacher database's term archives"""
+    archive_dir = os.path.join(get_instance_dir(), 'archive', db_name)
+    os.makedirs(archive_dir, exist_ok=True)
+    return archive_dir
+
+def get_archived_through(db_name):
+    """Get the last date moved to an archive, or None if nothing is archived"""
+    if consolidated_storage():
+        return None
+    Session = get_teacher_db_session(db_name)
+    sess = Session()
+    try:
+        return sess.execute(text('SELECT MAX(date_to) FROM attendance_archives')).scalar()
+    finally:
+        sess.close()
+
+def materialize_archive(db_name, file_name):
+    """
+    Get a plain SQLite path for an archive, decompressing .gz archives into
+    a cache next to them the first time they are needed.
+    """
+    archive_dir = get_archive_dir(db_name)
+    path = os.path.join(archive_dir, file_name)
+    if not file_name.endswith('.gz'):
+        return path
+    
+    cache_dir = os.path.join(archive_dir, '.cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    cached = os.path.join(cache_dir, file_name[:-3])
+    if not os.path.exists(cached) or os.path.getmtime(cached) < os.path.getmtime(path):
+        tmp_path = f'{cached}.tmp'
+        with gzip.open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, cached)
+    return cached
+
+def get_archive_paths(db_name, date_from, date_to):
+    """Get plain paths of the archives overlapping a date range, oldest first"""
+    if consolidated_storage():
+        return []
+    Session = get_teacher_db_session(db_name)
+    sess = Session()
+    try:
+        rows = sess.execute(text(
+            'SELECT file_name FROM attendance_archives '
+            'WHERE date_from <= :date_to AND date_to >= :date_from ORDER BY date_from'
+        ), {'date_from': date_from, 'date_to': date_to}).fetchall()
+    finally:
+        sess.close()
+    return [materialize_archive(db_name, file_name) for (file_name,) in rows]
+
+def iter_history_rows(db_name, date_from, date_to, select, params=None, include_live=True,
+                      order_by=None, fetch_size=500):
+    """
+    Run a query against a teacher database and the archives covering a date range.
+    
+    Archives are ATTACHed read-only only when the range overlaps them. The
+    query is run once per source and combined with UNION ALL.
+    
+    Args:
+        select: SELECT with a {src} placeholder for the schema, e.g.
+            'SELECT date, shift FROM {src}.attendance_v1 WHERE date BETWEEN :date_from AND :date_to'.
+            It may not contain ORDER BY; use order_by instead. A query of
+            the live attendance_v1 adds a {scope} condition for consolidated
+            storage (see section_condition).
+        include_live: Also query the live database (schema 'main')
+        order_by: Optional ORDER BY terms, e.g. 'date'. Sources are queried
+            oldest first, so ordering by date gives date order overall.
+    
+    Yields:
+        Result tuples
+    """
+    params = dict(params or {}, date_from=date_from, date_to=date_to)
+    if consolidated_storage():
+        # No archives; the live rows are the section's part of the shared tables
+        if include_live:
+            yield from _iter_consolidated_rows(db_name, select, params, order_by, fetch_size)
+        return
+    
+    archives = get_archive_paths(db_name, date_from, date_to)
+    if not archives and not include_live:
+        return
+    
+    live_path = get_teacher_db_path(db_name)
+    conn = sqlite3.connect(readonly_uri(live_path), uri=True)
+    try:
+        sources = [('archive', path) for path in archives]
+        if include_live:
+            sources.append(('main', None))
+        group_size = max(1, get_attach_limit(conn))
+        for start in range(0, len(sources), group_size):
+            group = sources[start:start + group_size]
+            aliases = []
+            selects = []
+            for idx, (kind, path) in enumerate(group):
+                if kind == 'main':
+                    selects.append(select.format(src='main', scope='1 = 1'))
+                    continue
+                alias = f'arc{idx}'
+                conn.execute(f'ATTACH DATABASE ? AS {alias}', (readonly_uri(path),))
+                aliases.append(alias)
+                selects.append(select.format(src=alias, scope='1 = 1'))
+            try:
+                order = f' ORDER BY {order_by}' if order_by else ''
+                cursor = conn.execute(' UNION ALL '.join(selects) + order, params)
+                while True:
+                    rows = cursor.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    yield from rows
+                cursor.close()
+            finally:
+                for alias in aliases:
+                    conn.execute(f'DETACH DATABASE {alias}')
+    finally:
+        conn.close()
+
+def _iter_consolidated_rows(db_name, select, params, order_by, fetch_size):
+    sql = select.format(src=_storage().source_schema(), scope=section_condition(db_name))
+    if order_by:
+        sql += f' ORDER BY {order_by}'
+    with _storage().get_engine().connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(text(sql), params)
+        while True:
+            rows = result.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield from rows
+
+
+# ==================== FEDERATED CROSS-SECTION QUERIES ====================
+
+# SQLite's default SQLITE_MAX_ATTACHED; used when the runtime limit can't be read
+DEFAULT_ATTACH_LIMIT = 10
+
+def readonly_uri(path):
+    """Build a read-only SQLite URI for a file path (%, ? and # in it are escaped)"""
+    return f'file:{quote(path)}?mode=ro'
+
+def open_federated_connection():
+    """Open a read-only scratch connection that teacher databases can be attached to"""
+    conn = sqlite3.connect('file::memory:', uri=True, check_same_thread=False)
+    conn.execute('PRAGMA query_only = ON')
+    return conn
+
+def get_attach_limit(conn):
+    """Get how many databases may be attached to one connection"""
+    try:
+        return conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    except AttributeError:
+        # Python < 3.11 has no getlimit()
+        return DEFAULT_ATTACH_LIMIT
+
+def _attendance_select(alias, idx, status, shift, summary):
+    """Build the per-database SELECT used inside a UNION ALL"""
+    where = ['a.date BETWEEN :date_from AND :date_to']
+    if status:
+        where.append('a.attendance_status = :status')
+    if shift:
+        where.append('a.shift = :shift')
+    
+    if summary:
+        return (
+            f'SELECT :grade_{idx} AS grade_level, :section_{idx} AS section, '
+            f'a.date AS date, a.shift AS shift, a.attendance_status AS attendance_status, '
+            f'COUNT(*) AS count '
+            f'FROM {alias}.attendance_v1 a '
+            f'WHERE {" AND ".join(where)} '
+            f'GROUP BY a.date, a.shift, a.attendance_status'
+        )
+    return (
+        f'SELECT :grade_{idx} AS grade_level, :section_{idx} AS section, '
+        f':teacher_{idx} AS teacher_name, st.id AS student_id, st.full_name AS full_name, '
+        f'st.email AS email, a.date AS date, a.shift AS shift, '
+        f'a.attendance_status AS attendance_status, '
+        f'a.check_in_time AS check_in_time, a.check_out_time AS check_out_time '
+        f'FROM {alias}.attendance_v1 a JOIN {alias}.students st ON st.id = a.student_id '
+        f'WHERE {" AND ".join(where)}'
+    )
+
+def iter_federated_attendance(sections, date_from, date_to, status=None, shift=None,
+                              summary=False, fetch_size=500):
+    """
+    Stream attendance across many teacher databases using SQLite ATTACH.
+    
+    Teacher databases are attached read-only in groups that fit within the
+    attach limit, and each group is answered by a single UNION ALL query on
+    its own connection. Term archives covering the range are attached
+    alongside their section. The groups' sorted streams are merged, so rows
+    come out ordered by date, grade, section and shift overall.
+    
+    Args:
+        sections: List of dicts with 'db_name', 'grade_level', 'section' and
+            'teacher_name' (see get_available_sections)
+        date_from, date_to: Inclusive date range as YYYY-MM-DD strings
+        status: Optional attendance_status filter (PRESENT, LATE, ...)
+        shift: Optional shift filter ('morning' or 'afternoon')
+        summary: If True yield per-section/day/shift/status counts instead of rows
+        fetch_size: Rows fetched from SQLite per round trip
+    
+    Yields:
+        One dict per result row
+    """
+    if consolidated_storage():
+        yield from _storage().iter_attendance(sections, date_from, date_to, status, shift, summary, fetch_size)
+        return
+    
+    sections = [
+        s for s in sections
+        if s.get('db_name') and os.path.exists(get_teacher_db_path(s['db_name']))
+    ]
+    if not sections:
+        return
+    # Each section is queried in its live database plus any archives the range needs
+    # (opening the database also makes sure its attendance_v1 view exists)
+    sources = []
+    for section in sections:
+        get_teacher_db_session(section['db_name'])
+        for path in get_archive_paths(section['db_name'], date_from, date_to):
+            sources.append((section, path))
+        sources.append((section, get_teacher_db_path(section['db_name'])))
+    
+    if summary:
+        order = ['date', 'grade_level', 'section', 'shift', 'attendance_status']
+    else:
+        order = ['date', 'grade_level', 'section', 'shift', 'full_name']
+    
+    conn = open_federated_connection()
+    try:
+        group_size = max(1, get_attach_limit(conn))
+    finally:
+        conn.close()
+    groups = [
+        _iter_federated_group(sources[start:start + group_size], date_from, date_to,
+                              status, shift, summary, order, fetch_size)
+        for start in range(0, len(sources), group_size)
+    ]
+    if len(groups) == 1:
+        yield from groups[0]
+        return
+    # Each group is sorted on its own; merge them so the stream stays in
+    # date order overall (SQLite sorts NULL first, so None does too here)
+    yield from heapq.merge(
+        *groups, key=lambda row: tuple((row[c] is not None, row[c]) for c in order)
+    )
+
+def _iter_federated_group(group, date_from, date_to, status, shift, summary, order, fetch_size):
+    """Stream one attach group's UNION ALL query on its own connection"""
+    params = {'date_from': date_from, 'date_to': date_to, 'status': status, 'shift': shift}
+    selects = []
+    conn = open_federated_connection()
+    try:
+        for idx, (section, path) in enumerate(group):
+            alias = f's{idx}'
+            conn.execute(f'ATTACH DATABASE ? AS {alias}', (readonly_uri(path),))
+            params[f'grade_{idx}'] = section.get('grade_level')
+            params[f'section_{idx}'] = section.get('section')
+            params[f'teacher_{idx}'] = section.get('teacher_name')
+            selects.append(_attendance_select(alias, idx, status, shift, summary))
+        
+        sql = ' UNION ALL '.join(selects) + ' ORDER BY ' + ', '.join(order)
+        cursor = conn.execute(sql, params)
+        columns = [c[0] for c in cursor.description]
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(columns, row))
+        cursor.close()
+    finally:
+        conn.close()
+
 def init_db_manager(app):
     """
     Initialize the database manager for the Flask app.
@@ -305,6 +992,11 @@ def init_db_manager(app):
         instance_dir = get_instance_dir()
         print(f"✓ Multi-database manager initialized. Instance dir: {instance_dir}")
         
+        if consolidated_storage():
+            _storage().get_engine()
+            print(f"✓ {len(list_teacher_databases())} section(s) in consolidated storage")
+            return True
+        
         # List existing teacher databases
         existing_dbs = list_teacher_databases()
         if existing_dbs:
@@ -0,0 +1,495 @@
+"""
+Compact v2 schema for teacher databases (opt-in)
+
+v1 stores attendance dates as 'YYYY-MM-DD' strings, shift and statuses as
+free text and timestamps as datetime strings, and repeats section/grade on
+every student row. v2 keeps the same tables and column names but stores:
+
+- date as an integer day number (days since 1970-01-01)
+- shift, status and attendance_status as small integer codes
+- timestamp, check_in_time, check_out_time and created_at as epoch seconds
+- students.section / grade_level as NULL when equal to the section recorded
+  once in schema_meta
+
+The ORM models in db_manager use the adaptive column types below, which
+pass values through unchanged on v1 databases and encode/decode on v2 ones,
+so every query and JSON API keeps its shape. Raw-SQL readers use the
+attendance_v1 / students_v1 views, which present both schemas in v1 form.
+
+Values with no code (e.g. a free-text status) are stored as text in the
+INTEGER column, which SQLite allows, so nothing is lost. Timestamps are kept
+to whole seconds.
+
+New teacher databases are created as v2 when TEACHER_DB_SCHEMA=v2;
+existing ones are converted online with migrate_to_v2()
+(tools/migrate_teacher_db_v2.py).
+"""
+
+import sqlite3
+from datetime import date, datetime
+
+import pytz
+from sqlalchemy.types import TypeDecorator, String, DateTime
+
+import change_log
+
+PHILIPPINE_TZ = pytz.timezone('Asia/Manila')
+
+SCHEMA_V1 = 1
+SCHEMA_V2 = 2
+
+SHIFT_CODES = {'morning': 1, 'afternoon': 2}
+ATTENDANCE_STATUS_CODES = {'PRESENT': 1, 'ABSENT': 2, 'LATE': 3, 'CUTTING': 4, 'EXCUSED': 5}
+RECORD_STATUS_CODES = {'check_in': 1, 'check_out': 2, 'manual': 3, 'absent': 4}
+
+# date.toordinal() of 1970-01-01
+_EPOCH_ORDINAL = 719163
+
+# Rows copied per transaction during online migration
+MIGRATION_BATCH_SIZE = 2000
+
+
+def schema_version(dialect):
+    """Get the teacher schema version an engine's dialect was configured for"""
+    return getattr(dialect, 'teacher_schema_version', SCHEMA_V1)
+
+
+# ==================== VALUE ENCODING ====================
+
+def encode_day(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date().toordinal() - _EPOCH_ORDINAL
+    except (TypeError, ValueError):
+        return value  # Kept verbatim
+
+
+def decode_day(value):
+    if isinstance(value, int):
+        return date.fromordinal(value + _EPOCH_ORDINAL).strftime('%Y-%m-%d')
+    return value
+
+
+def encode_epoch(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        # v1 stores Philippine wall-clock time without an offset
+        value = PHILIPPINE_TZ.localize(value)
+    return int(value.timestamp())
+
+
+def decode_epoch(value):
+    if isinstance(value, int):
+        return datetime.fromtimestamp(value, PHILIPPINE_TZ).replace(tzinfo=None)
+    return value
+
+
+def encode_code(value, codes):
+    return codes.get(value, value)
+
+
+def decode_code(value, names):
+    if isinstance(value, int):
+        return names.get(value, value)
+    return value
+
+
+# ==================== SCHEMA-ADAPTIVE COLUMN TYPES ====================
+
+class _SchemaAdaptive(TypeDecorator):
+    """
+    Column type that behaves like its impl on v1 databases and applies
+    encode()/decode() on v2 databases.
+
+    The version is read from the dialect on every value rather than when the
+    processor is built, so an engine follows an online migration without
+    being recreated.
+    """
+    cache_ok = True
+
+    def encode(self, value, dialect):
+        raise NotImplementedError
+
+    def decode(self, value, dialect):
+        raise NotImplementedError
+
+    def bind_processor(self, dialect):
+        impl_process = self.impl_instance.bind_processor(dialect)
+
+        def process(value):
+            if schema_version(dialect) == SCHEMA_V2:
+                return self.encode(value, dialect)
+            return impl_process(value) if impl_process else value
+        return process
+
+    def result_processor(self, dialect, coltype):
+        impl_process = self.impl_instance.result_processor(dialect, coltype)
+
+        def process(value):
+            if schema_version(dialect) == SCHEMA_V2 and not isinstance(value, str):
+                return self.decode(value, dialect)
+            return impl_process(value) if impl_process and value is not None else value
+        return process
+
+
+class DayNumber(_SchemaAdaptive):
+    """'YYYY-MM-DD' string in v1, integer day number in v2"""
+    impl = String(10)
+    cache_ok = True
+
+    def encode(self, value, dialect):
+        return None if value is None else encode_day(value)
+
+    def decode(self, value, dialect):
+        return decode_day(value)
+
+
+class EpochDateTime(_SchemaAdaptive):
+    """Datetime string in v1, integer epoch seconds in v2"""
+    impl = DateTime
+    cache_ok = True
+
+    def encode(self, value, dialect):
+        return None if value is None else encode_epoch(value)
+
+    def decode(self, value, dialect):
+        return decode_epoch(value)
+
+
+class CodedString(_SchemaAdaptive):
+    """Free text in v1, small integer code (or the text itself if uncoded) in v2"""
+    impl = String(20)
+    cache_ok = True
+
+    def __init__(self, codes, length=20):
+        super().__init__(length)
+        # Kept as a tuple so the type can be part of a statement cache key
+        self.codes = tuple(codes.items())
+        self._code_of = dict(codes)
+        self._name_of = {code: name for name, code in codes.items()}
+
+    def encode(self, value, dialect):
+        return encode_code(value, self._code_of)
+
+    def decode(self, value, dialect):
+        return decode_code(value, self._name_of)
+
+
+class SectionString(_SchemaAdaptive):
+    """Stored per row in v1; in v2 stored only when it differs from schema_meta"""
+    impl = String(50)
+    cache_ok = True
+
+    def __init__(self, meta_key, length=50):
+        super().__init__(length)
+        self.meta_key = meta_key
+
+    def _default(self, dialect):
+        return getattr(dialect, 'teacher_schema_meta', {}).get(self.meta_key)
+
+    def encode(self, value, dialect):
+        return None if value == self._default(dialect) else value
+
+    def decode(self, value, dialect):
+        return self._default(dialect) if value is None else value
+
+
+# ==================== DDL ====================
+
+def _epoch_check(column):
+    return f"CHECK ({column} IS NULL OR typeof({column}) = 'integer')"
+
+
+def v2_table_ddl(students='students', attendance='attendance'):
+    """CREATE statements for the v2 students and attendance tables"""
+    return [
+        f'''CREATE TABLE {students} (
+            id INTEGER PRIMARY KEY,
+            full_name VARCHAR(200) NOT NULL,
+            email VARCHAR(150) NOT NULL UNIQUE,
+            password_hash VARCHAR(255) NOT NULL,
+            section VARCHAR(50),
+            grade_level VARCHAR(10),
+            qr_code BLOB,
+            teacher_id INTEGER NOT NULL,
+            created_at INTEGER {_epoch_check('created_at')},
+            guardian_name VARCHAR(200),
+            guardian_email VARCHAR(150),
+            guardian_phone VARCHAR(20),
+            notify_on_checkin INTEGER DEFAULT 1,
+            notify_on_checkout INTEGER DEFAULT 1
+        )''',
+        f'''CREATE TABLE {attendance} (
+            id INTEGER PRIMARY KEY,
+            student_id INTEGER NOT NULL REFERENCES {students}(id),
+            timestamp INTEGER {_epoch_check('timestamp')},
+            check_in_time INTEGER {_epoch_check('check_in_time')},
+            check_out_time INTEGER {_epoch_check('check_out_time')},
+            attendance_status INTEGER DEFAULT {ATTENDANCE_STATUS_CODES['ABSENT']},
+            status INTEGER DEFAULT {RECORD_STATUS_CODES['check_in']},
+            date INTEGER {_epoch_check('date')},
+            shift INTEGER
+        )''',
+        f'CREATE INDEX ix_attendance_day_shift_student ON {attendance} (date, shift, student_id)',
+    ]
+
+
+def _case(column, codes):
+    whens = ' '.join(f"WHEN {code} THEN '{name}'" for name, code in codes.items())
+    return f'CASE {column} {whens} ELSE {column} END'
+
+
+def _epoch_sql(column):
+    return (f"CASE WHEN typeof({column}) = 'integer' "
+            f"THEN datetime({column}, 'unixepoch', '+8 hours') ELSE {column} END")
+
+
+V1_ATTENDANCE_COLUMNS = ['id', 'student_id', 'timestamp', 'check_in_time', 'check_out_time',
+                         'attendance_status', 'status', 'date', 'shift']
+V1_STUDENT_COLUMNS = ['id', 'full_name', 'email', 'password_hash', 'section', 'grade_level',
+                      'qr_code', 'teacher_id', 'created_at', 'guardian_name', 'guardian_email',
+                      'guardian_phone', 'notify_on_checkin', 'notify_on_checkout']
+
+
+def v1_view_ddl(version):
+    """CREATE statements for the attendance_v1 / students_v1 views"""
+    if version == SCHEMA_V1:
+        return [
+            f'CREATE VIEW IF NOT EXISTS attendance_v1 AS SELECT {", ".join(V1_ATTENDANCE_COLUMNS)} FROM attendance',
+            f'CREATE VIEW IF NOT EXISTS students_v1 AS SELECT {", ".join(V1_STUDENT_COLUMNS)} FROM students',
+        ]
+    return [
+        'CREATE VIEW IF NOT EXISTS attendance_v1 AS SELECT id, student_id, '
+        f'{_epoch_sql("timestamp")} AS timestamp, '
+        f'{_epoch_sql("check_in_time")} AS check_in_time, '
+        f'{_epoch_sql("check_out_time")} AS check_out_time, '
+        f'{_case("attendance_status", ATTENDANCE_STATUS_CODES)} AS attendance_status, '
+        f'{_case("status", RECORD_STATUS_CODES)} AS status, '
+        "CASE WHEN typeof(date) = 'integer' THEN date(date * 86400, 'unixepoch') ELSE date END AS date, "
+        f'{_case("shift", SHIFT_CODES)} AS shift '
+        'FROM attendance',
+        'CREATE VIEW IF NOT EXISTS students_v1 AS SELECT id, full_name, email, password_hash, '
+        "COALESCE(section, (SELECT value FROM schema_meta WHERE key = 'section')) AS section, "
+        "COALESCE(grade_level, (SELECT value FROM schema_meta WHERE key = 'grade_level')) AS grade_level, "
+        f'qr_code, teacher_id, {_epoch_sql("created_at")} AS created_at, guardian_name, guardian_email, '
+        'guardian_phone, notify_on_checkin, notify_on_checkout '
+        'FROM students',
+    ]
+
+
+def read_schema_meta(conn):
+    """Read schema_meta from a DB-API connection as a dict (empty if the table is missing)"""
+    try:
+        return dict(conn.execute('SELECT key, value FROM schema_meta').fetchall())
+    except sqlite3.OperationalError:
+        return {}
+
+
+def write_schema_meta(conn, meta):
+    conn.execute('CREATE TABLE IF NOT EXISTS schema_meta (key VARCHAR(50) PRIMARY KEY, value VARCHAR(200))')
+    conn.executemany(
+        'INSERT INTO schema_meta (key, value) VALUES (?, ?) '
+        'ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+        list(meta.items())
+    )
+
+
+def create_v2_tables(conn, section, grade_level):
+    """Create the v2 students/attendance tables in a new, empty teacher database"""
+    for statement in v2_table_ddl():
+        conn.execute(statement)
+    write_schema_meta(conn, {
+        'schema_version': str(SCHEMA_V2),
+        'section': section,
+        'grade_level': str(grade_level)
+    })
+
+
+# ==================== ONLINE MIGRATION ====================
+
+def _encode_student(row, meta):
+    row = dict(row)
+    for key in ('section', 'grade_level'):
+        if row[key] == meta.get(key):
+            row[key] = None
+    if row['created_at'] is not None:
+        row['created_at'] = encode_epoch(row['created_at'])
+    return row
+
+
+def _encode_attendance(row):
+    row = dict(row)
+    for key in ('timestamp', 'check_in_time', 'check_out_time'):
+        if row[key] is not None:
+            row[key] = encode_epoch(row[key])
+    row['date'] = None if row['date'] is None else encode_day(row['date'])
+    row['shift'] = encode_code(row['shift'], SHIFT_CODES)
+    row['status'] = encode_code(row['status'], RECORD_STATUS_CODES)
+    row['attendance_status'] = encode_code(row['attendance_status'], ATTENDANCE_STATUS_CODES)
+    return row
+
+
+def _truncate_seconds(value):
+    if value is None:
+        return None
+    return datetime.fromisoformat(value).replace(microsecond=0)
+
+
+def _decoded_matches(v1_row, v2_row, meta, table):
+    """Check a migrated row decodes back to its v1 source"""
+    names = {
+        'shift': {c: n for n, c in SHIFT_CODES.items()},
+        'status': {c: n for n, c in RECORD_STATUS_CODES.items()},
+        'attendance_status': {c: n for n, c in ATTENDANCE_STATUS_CODES.items()},
+    }
+    for key in v1_row.keys():
+        old, new = v1_row[key], v2_row[key]
+        if key in ('timestamp', 'check_in_time', 'check_out_time', 'created_at'):
+            decoded = decode_epoch(new)
+            if _truncate_seconds(old) != decoded:
+                return False
+        elif table == 'attendance' and key == 'date':
+            if decode_day(new) != old:
+                return False
+        elif table == 'attendance' and key in names:
+            if decode_code(new, names[key]) != old:
+                return False
+        elif table == 'students' and key in ('section', 'grade_level'):
+            if (meta.get(key) if new is None else new) != old:
+                return False
+        elif old != new:
+            return False
+    return True
+
+
+def _copy_rows(conn, table, target, ids, meta):
+    """Copy (or re-copy) specific v1 rows into the v2 table"""
+    columns = V1_STUDENT_COLUMNS if table == 'students' else V1_ATTENDANCE_COLUMNS
+    placeholders = ', '.join(f':{c}' for c in columns)
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        marks = ', '.join('?' * len(chunk))
+        conn.execute(f'DELETE FROM {target} WHERE id IN ({marks})', chunk)
+        rows = conn.execute(
+            f'SELECT {", ".join(columns)} FROM {table} WHERE id IN ({marks})', chunk
+        ).fetchall()
+        encoded = [_encode_student(r, meta) if table == 'students' else _encode_attendance(r) for r in rows]
+        conn.executemany(f'INSERT INTO {target} ({", ".join(columns)}) VALUES ({placeholders})', encoded)
+
+
+def _verify_rows(conn, table, target, meta, ids=None):
+    columns = V1_STUDENT_COLUMNS if table == 'students' else V1_ATTENDANCE_COLUMNS
+    where = ''
+    params = []
+    if ids is not None:
+        if not ids:
+            return
+        where = f' WHERE id IN ({", ".join("?" * len(ids))})'
+        params = list(ids)
+    old_rows = conn.execute(f'SELECT {", ".join(columns)} FROM {table}{where} ORDER BY id', params)
+    new_rows = conn.execute(f'SELECT {", ".join(columns)} FROM {target}{where} ORDER BY id', params)
+    for old, new in zip(old_rows, new_rows):
+        if old['id'] != new['id'] or not _decoded_matches(old, new, meta, table):
+            raise RuntimeError(f'Verification failed for {table} row {old["id"]}')
+    old_count = conn.execute(f'SELECT COUNT(*) FROM {table}{where}', params).fetchone()[0]
+    new_count = conn.execute(f'SELECT COUNT(*) FROM {target}{where}', params).fetchone()[0]
+    if old_count != new_count:
+        raise RuntimeError(f'Verification failed for {table}: {old_count} rows vs {new_count} migrated')
+
+
+def migrate_to_v2(db_path, drop_backup=False, batch_size=MIGRATION_BATCH_SIZE):
+    """
+    Convert a v1 teacher database to v2 while the app keeps using it.
+
+    Rows are copied into new tables in short batches; triggers record rows
+    changed meanwhile, and a final brief exclusive transaction re-copies
+    those, verifies them and swaps the tables. Every migrated row is checked
+    to decode back to its source before the swap. The v1 tables are kept as
+    students_v1_backup / attendance_v1_backup unless drop_backup is set.
+
+    Returns a dict with the number of students and attendance rows migrated.
+    """
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        meta = read_schema_meta(conn)
+        if meta.get('schema_version') == str(SCHEMA_V2):
+            return {'students': 0, 'attendance': 0, 'already_v2': True}
+
+        # Section and grade are recorded once; rows that differ keep their own value
+        first = conn.execute('SELECT section, grade_level FROM students ORDER BY id LIMIT 1').fetchone()
+        meta = {
+            'section': meta.get('section') or (first['section'] if first else None),
+            'grade_level': meta.get('grade_level') or (first['grade_level'] if first else None),
+        }
+
+        conn.execute('BEGIN IMMEDIATE')
+        for table in ('attendance_v2new', 'students_v2new', '_v2_dirty'):
+            conn.execute(f'DROP TABLE IF EXISTS {table}')
+        for statement in v2_table_ddl(students='students_v2new', attendance='attendance_v2new'):
+            conn.execute(statement)
+        conn.execute('CREATE TABLE _v2_dirty (tbl VARCHAR(20), id INTEGER, PRIMARY KEY (tbl, id))')
+        for table in ('students', 'attendance'):
+            for event, ref in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+                conn.execute(
+                    f'CREATE TRIGGER IF NOT EXISTS _v2_track_{table}_{event.lower()} AFTER {event} ON {table} '
+                    f"BEGIN INSERT OR IGNORE INTO _v2_dirty (tbl, id) VALUES ('{table}', {ref}.id); END"
+                )
+        conn.execute('COMMIT')
+
+        # Bulk copy in short transactions so scans keep flowing
+        for table, target in (('students', 'students_v2new'), ('attendance', 'attendance_v2new')):
+            last_id = 0
+            while True:
+                ids = [r[0] for r in conn.execute(
+                    f'SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?', (last_id, batch_size)
+                ).fetchall()]
+                if not ids:
+                    break
+                conn.execute('BEGIN IMMEDIATE')
+                _copy_rows(conn, table, target, ids, meta)
+                conn.execute('COMMIT')
+                last_id = ids[-1]
+            _verify_rows(conn, table, target, meta)
+
+        # Final catch-up and swap under an exclusive lock
+        conn.execute('BEGIN EXCLUSIVE')
+        try:
+            counts = {}
+            for table, target in (('students', 'students_v2new'), ('attendance', 'attendance_v2new')):
+                dirty = [r[0] for r in conn.execute('SELECT id FROM _v2_dirty WHERE tbl = ?', (table,))]
+                _copy_rows(conn, table, target, dirty, meta)
+                _verify_rows(conn, table, target, meta, dirty)
+                counts[table] = conn.execute(f'SELECT COUNT(*) FROM {target}').fetchone()[0]
+
+            for table in ('students', 'attendance'):
+                for event in ('insert', 'update', 'delete'):
+                    conn.execute(f'DROP TRIGGER IF EXISTS _v2_track_{table}_{event}')
+            conn.execute('DROP TABLE _v2_dirty')
+            conn.execute('DROP VIEW IF EXISTS attendance_v1')
+            conn.execute('DROP VIEW IF EXISTS students_v1')
+            conn.execute('DROP TABLE IF EXISTS students_v1_backup')
+            conn.execute('DROP TABLE IF EXISTS attendance_v1_backup')
+            # Rename students first so attendance_v2new's foreign key follows it
+            conn.execute('ALTER TABLE students RENAME TO students_v1_backup')
+            conn.execute('ALTER TABLE students_v2new RENAME TO students')
+            conn.execute('ALTER TABLE attendance RENAME TO attendance_v1_backup')
+            conn.execute('ALTER TABLE attendance_v2new RENAME TO attendance')
+            write_schema_meta(conn, dict(meta, schema_version=str(SCHEMA_V2)))
+            for statement in v1_view_ddl(SCHEMA_V2):
+                conn.execute(statement)
+            # The change log triggers moved with the old tables
+            change_log.install(conn)
+            if drop_backup:
+                conn.execute('DROP TABLE attendance_v1_backup')
+                conn.execute('DROP TABLE students_v1_backup')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        if drop_backup:
+            conn.execute('VACUUM')
+        return {'students': counts['students'], 'attendance': counts['attendance'], 'already_v2': False}
+    finally:
+        conn.close()
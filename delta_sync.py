@@ -0,0 +1,438 @@
+"""
+Delta sync between a hybrid desktop and the cloud server
+
+In hybrid mode the desktop runs its own server and databases, so scanning
+keeps working when the school's internet drops, and a background thread
+(DeltaSyncClient) trades changes with the cloud server whenever it can
+reach it:
+
+- sections and teacher logins are pulled from GET /api/sync/sections
+- each section's roster is pulled from GET /api/sync/roster, only the
+  students changed after the last roster seq seen (a full snapshot the first
+  time, or when the server's log no longer reaches back that far)
+- attendance rows changed locally after the last pushed seq are sent to
+  POST /api/sync/push in gzip-compressed batches of SYNC_BATCH_SIZE
+
+Both directions read change_log.py's per-database log; the high-water marks
+are kept in <instance>/sync_state.json and only move once the other side has
+the data, so a failed round is simply retried. The roster is the cloud's:
+students are added and edited there. Attendance is merged per student, day
+and shift (merge_attendance): the earliest check-in and latest check-out
+win, and the attendance status is the one changed last.
+
+Requests carry X-Sync-Secret, the key the cloud's admin created for this
+desktop (POST /api/admin/sync-desktops); the cloud only hands a desktop the
+sections assigned to its key, and only takes attendance for those.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import datetime
+
+import attendance_bitsets
+import attendance_counters
+import change_log
+import student_search
+import teacher_writer
+from db_manager import (
+    TeacherAttendance,
+    TeacherAttendanceBitset,
+    TeacherAttendanceDaily,
+    TeacherStudent,
+    get_instance_dir,
+    get_teacher_db_session,
+    open_change_log,
+    upsert_daily_rollup
+)
+from db_schema_v2 import encode_epoch
+
+# Attendance rows per push request
+SYNC_BATCH_SIZE = int(os.environ.get('SYNC_BATCH_SIZE', '500'))
+
+# Seconds to wait for the cloud server on each request
+SYNC_TIMEOUT = float(os.environ.get('SYNC_TIMEOUT', '20'))
+
+# Student fields sent with the roster (QR images are drawn again locally)
+ROSTER_FIELDS = ('id', 'full_name', 'email', 'password_hash', 'section', 'grade_level', 'teacher_id',
+                 'guardian_name', 'guardian_email', 'guardian_phone', 'notify_on_checkin', 'notify_on_checkout')
+
+_TIME_FIELDS = ('timestamp', 'check_in_time', 'check_out_time')
+
+
+def encode_body(payload):
+    """gzip-compressed JSON for a request or response body"""
+    return gzip.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+
+
+def decode_body(data, content_encoding=None):
+    if content_encoding == 'gzip':
+        data = gzip.decompress(data)
+    return json.loads(data.decode('utf-8'))
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def _datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def _student_dict(student):
+    values = {field: getattr(student, field) for field in ROSTER_FIELDS}
+    values['created_at'] = _iso(student.created_at)
+    return values
+
+
+# ==================== SERVER ====================
+
+def new_desktop_key():
+    """A hybrid desktop's sync key; the server keeps only its hash"""
+    return secrets.token_urlsafe(32)
+
+
+def hash_desktop_key(key):
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def roster_since(db_name, since):
+    """
+    Students of a section changed after seq `since`.
+
+    Returns:
+        {'seq': high-water mark for the next call, 'full': True if `students`
+        is the whole roster (anything not in it is gone), 'students': [...],
+        'deleted': [ids]}
+    """
+    conn = open_change_log(db_name)
+    try:
+        seq, changed = 0, None
+        if conn is not None:
+            seq = change_log.latest_seq(conn)
+            if since and change_log.covers(conn, since):
+                changed = [row[0] for row in change_log.changed_rows(conn, 'students', since)]
+    finally:
+        if conn is not None:
+            conn.close()
+
+    sess = get_teacher_db_session(db_name)()
+    try:
+        query = sess.query(TeacherStudent)
+        if changed is None:
+            return {'seq': seq, 'full': True, 'students': [_student_dict(s) for s in query.order_by(TeacherStudent.id)],
+                    'deleted': []}
+        students = query.filter(TeacherStudent.id.in_(changed)).all() if changed else []
+        present = {s.id for s in students}
+        return {'seq': seq, 'full': False, 'students': [_student_dict(s) for s in students],
+                'deleted': [student_id for student_id in changed if student_id not in present]}
+    finally:
+        sess.close()
+
+
+def _server_changed_at(conn, row):
+    """When the server's copy of an attendance row last changed (epoch seconds)"""
+    changed_at = change_log.row_changed_at(conn, 'attendance', row.id) if conn is not None else None
+    if changed_at is None:
+        times = [value for value in (row.check_out_time, row.check_in_time, row.timestamp) if value is not None]
+        changed_at = encode_epoch(max(times)) if times else 0
+    return changed_at
+
+
+def merge_attendance(db_name, changes, on_status_change=None):
+    """
+    Merge attendance rows pushed by a desktop into a section.
+
+    A row is matched on (student_id, date, shift): check-in keeps the
+    earliest time, check-out the latest, and the pushed attendance status
+    replaces the server's if it was changed later (changed_at, epoch seconds).
+    Counters, rollups and bitsets follow status changes; on_status_change
+    (date, shift, old status, new status, student_id) is called for each once
+    committed.
+
+    Returns:
+        {'applied': rows inserted or changed, 'skipped': rows of students not in the section}
+    """
+    # Queued scans first (in the writer process if there is one), so a merged
+    # row can't be overwritten by an older one
+    teacher_writer.flush(db_name)
+    conn = open_change_log(db_name)
+    sess = get_teacher_db_session(db_name)()
+    status_changes = []
+    applied = skipped = 0
+    try:
+        student_ids = {s.id for s in sess.query(TeacherStudent.id).filter(
+            TeacherStudent.id.in_({change['student_id'] for change in changes})
+        )} if changes else set()
+        for change in changes:
+            student_id, date_str, shift = change['student_id'], change['date'], change['shift']
+            if student_id not in student_ids or not date_str:
+                skipped += 1
+                continue
+            check_in = _datetime(change.get('check_in_time'))
+            check_out = _datetime(change.get('check_out_time'))
+            row = sess.query(TeacherAttendance).filter(
+                TeacherAttendance.student_id == student_id,
+                TeacherAttendance.date == date_str,
+                TeacherAttendance.shift == shift
+            ).first()
+
+            if row is None:
+                old_status, new_status = None, change['attendance_status']
+                sess.add(TeacherAttendance(
+                    student_id=student_id,
+                    timestamp=_datetime(change.get('timestamp')) or check_in,
+                    check_in_time=check_in,
+                    check_out_time=check_out,
+                    attendance_status=new_status,
+                    status=change.get('status') or 'check_in',
+                    date=date_str,
+                    shift=shift
+                ))
+            else:
+                old_status = new_status = row.attendance_status
+                changed = False
+                if check_in is not None and (row.check_in_time is None or check_in < row.check_in_time):
+                    row.check_in_time = check_in
+                    changed = True
+                if check_out is not None and (row.check_out_time is None or check_out > row.check_out_time):
+                    row.check_out_time = check_out
+                    row.status = 'check_out'
+                    changed = True
+                if (change['attendance_status'] != old_status
+                        and change.get('changed_at', 0) > _server_changed_at(conn, row)):
+                    new_status = row.attendance_status = change['attendance_status']
+                    changed = True
+                if not changed:
+                    continue
+
+            if new_status != old_status:
+                attendance_counters.record_status_change(sess, db_name, date_str, shift, old_status, new_status)
+                upsert_daily_rollup(sess, student_id, date_str, shift, new_status)
+                attendance_bitsets.update_bitset(sess, student_id, date_str, shift, new_status)
+                status_changes.append((date_str, shift, old_status, new_status, student_id))
+            applied += 1
+            # Later rows may be for the same student, day and shift
+            sess.flush()
+        sess.commit()
+    except Exception:
+        sess.rollback()
+        raise
+    finally:
+        sess.close()
+        if conn is not None:
+            conn.close()
+
+    if on_status_change is not None:
+        for status_change in status_changes:
+            on_status_change(*status_change)
+    return {'applied': applied, 'skipped': skipped}
+
+
+# ==================== CLIENT ====================
+
+def get_state_path():
+    return os.path.join(get_instance_dir(), 'sync_state.json')
+
+
+class DeltaSyncClient:
+    """
+    Background sync of a hybrid desktop with the cloud server.
+
+    apply_sections is called with the cloud's section list and must create
+    or update the matching local teachers (and their databases), returning
+    the db_names to sync; it runs on the sync thread.
+    """
+
+    def __init__(self, cloud_url, secret, interval, apply_sections):
+        self.cloud_url = cloud_url.rstrip('/')
+        self.secret = secret
+        self.interval = interval
+        self.apply_sections = apply_sections
+        self._stop = threading.Event()
+        self._lock = threading.Lock()  # One sync round at a time
+        self._thread = None
+        self._http = None
+        self.state = self._load_state()
+        self.status = {'last_sync': None, 'last_error': None, 'pushed': 0, 'pending': 0}
+
+    def _load_state(self):
+        try:
+            with open(get_state_path(), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        path = get_state_path()
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.state, f)
+        os.replace(path + '.tmp', path)
+
+    def _marks(self, db_name):
+        return self.state.setdefault(db_name, {'roster_seq': 0, 'pushed_seq': 0})
+
+    def _request(self, method, path, **kwargs):
+        import requests  # Only the desktop build syncs
+        if self._http is None:
+            self._http = requests.Session()
+            self._http.headers['X-Sync-Secret'] = self.secret
+        response = self._http.request(method, self.cloud_url + path, timeout=SYNC_TIMEOUT, **kwargs)
+        if response.status_code != 200:
+            try:
+                error = response.json().get('error')
+            except ValueError:
+                error = None
+            raise RuntimeError(f'{path}: HTTP {response.status_code} {error or ""}'.strip())
+        return response.json()
+
+    # ---------- roster ----------
+
+    def pull_roster(self, db_name):
+        marks = self._marks(db_name)
+        roster = self._request('GET', '/api/sync/roster', params={'db_name': db_name, 'since': marks['roster_seq']})
+        sess = get_teacher_db_session(db_name)()
+        try:
+            incoming = {s['id']: s for s in roster['students']}
+            if roster['full']:
+                removed = [row.id for row in sess.query(TeacherStudent.id) if row.id not in incoming]
+            else:
+                removed = roster['deleted']
+            if removed:
+                # Drop the removed students first so their emails can be reused
+                for model in (TeacherAttendance, TeacherAttendanceDaily, TeacherAttendanceBitset):
+                    sess.query(model).filter(model.student_id.in_(removed)).delete(synchronize_session=False)
+                deleted = sess.query(TeacherStudent).filter(TeacherStudent.id.in_(removed)).delete(
+                    synchronize_session=False)
+                sess.flush()
+            else:
+                deleted = 0
+
+            added = []
+            for values in incoming.values():
+                student = sess.get(TeacherStudent, values['id'])
+                if student is None:
+                    student = TeacherStudent(id=values['id'])
+                    sess.add(student)
+                    added.append(student)
+                for field in ROSTER_FIELDS[1:]:
+                    setattr(student, field, values[field])
+                student.created_at = _datetime(values['created_at'])
+                student.qr_code = None  # Drawn again with this server's key on next view
+            sess.commit()
+
+            if added or deleted:
+                attendance_counters.record_enrollment(db_name, len(added) - deleted)
+            for student_id in removed:
+                student_search.remove_student(db_name, student_id)
+            if incoming:
+                student_search.index_students(db_name, sess.query(TeacherStudent).filter(
+                    TeacherStudent.id.in_(list(incoming))).all())
+        except Exception:
+            sess.rollback()
+            raise
+        finally:
+            sess.close()
+
+        if added or deleted:
+            # Section totals changed; read them again
+            attendance_counters.forget_section(db_name)
+        marks['roster_seq'] = roster['seq']
+        self._save_state()
+        return len(incoming), len(removed)
+
+    # ---------- attendance ----------
+
+    def _pending_changes(self, db_name, since):
+        """Up to SYNC_BATCH_SIZE attendance rows changed after `since`, and the seq of the last"""
+        conn = open_change_log(db_name)
+        try:
+            changed = change_log.changed_rows(conn, 'attendance', since, limit=SYNC_BATCH_SIZE)
+        finally:
+            conn.close()
+        if not changed:
+            return [], since
+
+        changed_at = {row_id: at for row_id, _, at in changed}
+        sess = get_teacher_db_session(db_name)()
+        try:
+            # Deleted rows aren't sent: the cloud keeps its copy
+            rows = sess.query(TeacherAttendance).filter(TeacherAttendance.id.in_(list(changed_at))).all()
+            changes = [{
+                'student_id': row.student_id,
+                'date': row.date,
+                'shift': row.shift,
+                'attendance_status': row.attendance_status,
+                'status': row.status,
+                'changed_at': changed_at[row.id],
+                **{field: _iso(getattr(row, field)) for field in _TIME_FIELDS}
+            } for row in rows]
+        finally:
+            sess.close()
+        return changes, changed[-1][1]
+
+    def count_pending(self, db_name):
+        conn = open_change_log(db_name)
+        try:
+            return len(change_log.changed_rows(conn, 'attendance', self._marks(db_name)['pushed_seq']))
+        finally:
+            conn.close()
+
+    def push_attendance(self, db_name):
+        marks = self._marks(db_name)
+        pushed = 0
+        while True:
+            changes, seq = self._pending_changes(db_name, marks['pushed_seq'])
+            if seq == marks['pushed_seq']:
+                return pushed
+            if changes:
+                self._request('POST', '/api/sync/push', data=encode_body({'db_name': db_name, 'changes': changes}),
+                              headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+                pushed += len(changes)
+            marks['pushed_seq'] = seq
+            self._save_state()
+
+    # ---------- rounds ----------
+
+    def sync_once(self):
+        """One full round; returns the number of attendance rows pushed"""
+        with self._lock:
+            try:
+                sections = self._request('GET', '/api/sync/sections')['sections']
+                pushed = 0
+                pending = 0
+                for db_name in self.apply_sections(sections):
+                    self.pull_roster(db_name)
+                    pushed += self.push_attendance(db_name)
+                    pending += self.count_pending(db_name)
+            except Exception as e:
+                self.status['last_error'] = str(e)
+                print(f"✗ Sync with {self.cloud_url} failed: {e}")
+                return 0
+            self.status.update(last_sync=time.time(), last_error=None, pending=pending,
+                               pushed=self.status['pushed'] + pushed)
+            if pushed:
+                print(f"✓ Synced {pushed} attendance changes to {self.cloud_url}")
+            return pushed
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sync_once()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='delta-sync', daemon=True)
+        self._thread.start()
+        print(f"✓ Delta sync to {self.cloud_url} every {self.interval:g}s")
+
+    def stop(self, final_sync=True):
+        """Stop the thread, then try one last round so recent scans reach the cloud"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=SYNC_TIMEOUT)
+        if final_sync:
+            self.sync_once()
@@ -2,9 +2,16 @@
 QR Attendance System - Desktop Application
 PyQt6-based native desktop window with embedded Flask server
 
-Supports two modes:
+Supports three modes:
 - OFFLINE: Runs local Flask server with SQLite database
 - ONLINE: Connects to remote cloud server (shared database)
+- HYBRID: Runs the local server like OFFLINE and syncs its changes with the
+  cloud server in the background (see delta_sync.py)
+
+The window opens at once; the app is imported, served and started up in a
+background thread, and the page loads as soon as the readiness probe says
+so. Run with --measure-startup to print the cold-start timeline, append it
+to startup_times.jsonl in the instance directory and exit.
 """
 
 import os
@@ -14,6 +21,9 @@ import threading
 import time
 from pathlib import Path
 
+# Cold-start clock for --measure-startup
+STARTUP_T0 = time.perf_counter()
+
 import requests
 from PyQt6.QtWidgets import QApplication, QMainWindow, QMessageBox
 from PyQt6.QtWebEngineWidgets import QWebEngineView
@@ -24,8 +34,15 @@ from PyQt6.QtGui import QIcon
 app_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, app_dir)
 
-from app import app as flask_app, db
-from db_manager import init_db_manager
+# app.py's startup phases run in the boot thread once the server is listening
+# (see app_startup.py); the app is imported there too
+os.environ.setdefault('QR_DEFER_STARTUP', '1')
+
+MEASURE_STARTUP = '--measure-startup' in sys.argv
+
+# Milliseconds between readiness probes, and seconds before giving up
+READY_POLL_MS = 100
+READY_TIMEOUT_SECONDS = 120
 
 
 def resource_path(relative_path: str) -> Path:
@@ -33,6 +50,8 @@ def resource_path(relative_path: str) -> Path:
     base_path = getattr(sys, '_MEIPASS', Path(__file__).parent)
     return Path(base_path) / relative_path
 
+MODE_LABELS = {'online': 'ONLINE', 'hybrid': 'HYBRID'}
+
 class QRAttendanceApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -42,8 +61,15 @@ class QRAttendanceApp(QMainWindow):
         self.config = self.load_config()
         self.mode = self.config.get('mode', 'offline')
         self.server_url = self.get_server_url()
-        self.server_thread = None
+        self.server = None
         self.server_running = False
+        self.sync_client = None
+        self.boot_error = None
+        self.startup_marks = []  # (label, seconds since STARTUP_T0)
+        self.ready_deadline = None
+        self.ready_timer = QTimer(self)
+        self.ready_timer.setInterval(READY_POLL_MS)
+        self.ready_timer.timeout.connect(self.check_ready)
 
         # Apply app icon early so window and taskbar pick it up
         icon_file = resource_path('LYFJRSHS_logo.ico')
@@ -53,7 +79,7 @@ class QRAttendanceApp(QMainWindow):
         self.setWindowIcon(app_icon)
         
         # Set window properties FIRST
-        mode_label = "ONLINE" if self.mode == "online" else "OFFLINE"
+        mode_label = MODE_LABELS.get(self.mode, 'OFFLINE')
         self.setWindowTitle(f'QR Attendance System [{mode_label}] - Starting...')
         self.setGeometry(100, 100, 1200, 800)
         
@@ -65,11 +91,10 @@ class QRAttendanceApp(QMainWindow):
         if self.mode == 'online':
             # Online mode: just connect to remote server
             print(f"✓ Online mode - Connecting to: {self.server_url}")
-            QTimer.singleShot(500, self.load_page)
+            QTimer.singleShot(0, self.load_page)
         else:
-            # Offline mode: start local Flask server first
+            # Offline and hybrid modes: start local Flask server, load the page once it is ready
             self.start_flask_server()
-            QTimer.singleShot(2000, self.load_page)  # Wait 2 seconds for server to start
     
     def load_config(self):
         """Load configuration from file"""
@@ -87,8 +112,21 @@ class QRAttendanceApp(QMainWindow):
             return self.config.get('cloud_url', 'https://your-app.railway.app')
         return self.config.get('server_url', 'http://localhost:5000')
     
+    def mark(self, label):
+        """Record a point on the startup timeline"""
+        seconds = time.perf_counter() - STARTUP_T0
+        self.startup_marks.append((label, seconds))
+        if MEASURE_STARTUP:
+            print(f"  {seconds:6.2f}s  {label}")
+    
     def start_flask_server(self):
-        """Start Flask server in background thread"""
+        """Start Flask server in background thread; check_ready loads the page once it is up"""
+        threading.Thread(target=self.boot_local_server, name='boot', daemon=True).start()
+        self.ready_deadline = time.monotonic() + READY_TIMEOUT_SECONDS
+        self.ready_timer.start()
+    
+    def boot_local_server(self):
+        """Import the app, start serving (503 until ready) and run its startup phases"""
         try:
             # Extract port from server URL
             port = 5000
@@ -98,33 +136,87 @@ class QRAttendanceApp(QMainWindow):
                 except:
                     port = 5000
             
-            # Create database if needed and initialize db_manager
-            with flask_app.app_context():
-                db.create_all()
-                # Initialize the multi-database manager
-                init_db_manager(flask_app)
+            # The app's only process, so it may batch scans (SCAN_BATCH_MS)
+            import scan_batcher
+            scan_batcher.claim()
+            
+            from app import app as flask_app, run_startup, start_delta_sync
+            from db_manager import init_db_manager
+            from desktop_server import DESKTOP_SERVER_THREADS, EmbeddedServer
+            self.mark('app imported')
             
-            # Start server in daemon thread
-            self.server_thread = threading.Thread(
-                target=lambda: flask_app.run(
-                    host='localhost',
-                    port=port,
-                    debug=False,
-                    use_reloader=False
-                ),
-                daemon=True
+            # Serve from a daemon thread (Werkzeug unless "server" picks waitress)
+            self.server = EmbeddedServer(
+                flask_app,
+                host='localhost',
+                port=port,
+                threads=int(self.config.get('server_threads', DESKTOP_SERVER_THREADS)),
+                backend=self.config.get('server') or None
             )
-            self.server_thread.start()
+            self.server.start()
             self.server_running = True
+            self.mark('server listening')
             print(f"✓ Flask server started on {self.server_url}")
             
+            # Main database, then the teacher databases; the search index builds after ready
+            run_startup([('teacher databases', lambda: init_db_manager(flask_app))], background=True)
+            self.mark('startup phases done')
+            if self.mode == 'hybrid':
+                self.start_sync(start_delta_sync)
+            
         except Exception as e:
             print(f"✗ Error starting Flask server: {e}")
+            self.boot_error = str(e)
             self.server_running = False
     
+    def check_ready(self):
+        """Poll the readiness probe; load the page as soon as the server is ready"""
+        error = self.boot_error
+        if error is None:
+            try:
+                response = requests.get(f"{self.server_url.rstrip('/')}/api/health/ready", timeout=0.5)
+            except requests.RequestException:
+                response = None  # Not listening yet
+            if response is not None and response.status_code == 200:
+                self.ready_timer.stop()
+                self.mark('ready')
+                self.load_page()
+                return
+            if response is not None and response.status_code == 500:
+                error = response.json().get('error')
+            elif time.monotonic() < self.ready_deadline:
+                return
+            else:
+                error = f'not ready after {READY_TIMEOUT_SECONDS} seconds'
+        
+        self.ready_timer.stop()
+        print(f"✗ Local server failed to start: {error}")
+        QMessageBox.warning(
+            self, 'Startup Error',
+            f'The local server at {self.server_url} failed to start:\n{error}\n\n'
+            'Please check that port 5000 is available.'
+        )
+        if MEASURE_STARTUP:
+            self.close()
+    
+    def start_sync(self, start_delta_sync):
+        """Sync the local databases with the cloud server in the background (hybrid mode)"""
+        secret = self.config.get('sync_secret')
+        if not secret:
+            print("✗ Hybrid mode needs 'sync_secret' in desktop_config.json; running offline only")
+            return
+        try:
+            self.sync_client = start_delta_sync(
+                self.config.get('cloud_url', 'https://your-app.railway.app'),
+                secret,
+                float(self.config.get('sync_interval_seconds', 30))
+            )
+        except Exception as e:
+            print(f"✗ Error starting sync: {e}")
+    
     def load_page(self):
         """Load the Flask app in the browser view"""
-        mode_label = "ONLINE" if self.mode == "online" else "OFFLINE"
+        mode_label = MODE_LABELS.get(self.mode, 'OFFLINE')
         self.setWindowTitle(f'QR Attendance System [{mode_label}]')
         self.browser.setUrl(QUrl(self.server_url))
         self.browser.loadFinished.connect(self.on_load_finished)
@@ -153,10 +245,51 @@ class QRAttendanceApp(QMainWindow):
             print(f"✗ Failed to load: {self.server_url}")
         else:
             print(f"✓ Successfully loaded: {self.server_url}")
+        
+        if MEASURE_STARTUP and self.startup_marks[-1][0] != 'page loaded':
+            self.mark('page loaded')
+            self.report_startup()
+            QTimer.singleShot(0, self.close)
+    
+    def report_startup(self):
+        """Print the cold-start timeline and append it to startup_times.jsonl (--measure-startup)"""
+        from db_manager import get_instance_dir
+        phases = []
+        if self.mode != 'online':
+            import app_startup
+            phases = app_startup.get_status()['phases']
+        total = self.startup_marks[-1][1]
+        print("=" * 60)
+        print(f"Cold start ({self.mode}): {total:.2f}s to page loaded")
+        for phase in phases:
+            suffix = ' (background)' if phase['background'] else ''
+            print(f"  startup phase {phase['name']}: {phase['seconds']:.2f}s{suffix}")
+        
+        entry = {
+            'at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'mode': self.mode,
+            'total_seconds': round(total, 3),
+            'marks': {label: round(seconds, 3) for label, seconds in self.startup_marks},
+            'phases': phases
+        }
+        log_path = Path(get_instance_dir()) / 'startup_times.jsonl'
+        try:
+            with open(log_path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+            print(f"✓ Saved to {log_path}")
+        except OSError as e:
+            print(f"✗ Could not save startup time: {e}")
     
     def closeEvent(self, event):
         """Handle window close event"""
         print("✓ Closing application...")
+        if self.server is not None:
+            # Finish in-flight requests; no new scans after this
+            self.server.stop()
+            self.server_running = False
+        if self.sync_client is not None:
+            # Send the last scans before the window goes away
+            self.sync_client.stop()
         event.accept()
 
 def main():
@@ -176,6 +309,7 @@ def main():
     # Create and show main window
     window = QRAttendanceApp()
     window.show()
+    window.mark('window shown')
     
     print("✓ Application window opened")
     print("=" * 60)
@@ -0,0 +1,97 @@
+"""
+Embedded WSGI server for the desktop build
+
+The desktop window, the in-process scanner and the page's polling timers all
+call the local server at once. EmbeddedServer serves the Flask app with
+Werkzeug's threaded server (what flask_app.run used, one thread per request)
+or, if chosen, waitress, a production WSGI server with a fixed pool of
+worker threads. Either runs in a daemon thread and stops cleanly: waitress
+finishes in-flight requests before its threads exit, then its loop is woken
+through its trigger to close its sockets.
+
+Werkzeug stays the default: tools/bench_desktop_server.py, warmed up, shows
+no consistent latency win for waitress at the desktop's load (1-8 scanners).
+DESKTOP_SERVER=waitress (or "server" in desktop_config.json) chooses it;
+DESKTOP_SERVER_THREADS (or "server_threads") sets its pool size.
+"""
+
+import logging
+import os
+import threading
+
+from werkzeug.serving import make_server
+
+try:
+    import waitress
+except ImportError:  # Optional: only needed if chosen
+    waitress = None
+
+DESKTOP_SERVER = os.environ.get('DESKTOP_SERVER', '').lower()
+
+DESKTOP_SERVER_THREADS = int(os.environ.get('DESKTOP_SERVER_THREADS', '8'))
+
+BACKENDS = ('waitress', 'werkzeug')
+
+
+def default_backend():
+    return DESKTOP_SERVER if DESKTOP_SERVER in BACKENDS else 'werkzeug'
+
+
+class EmbeddedServer:
+    """A WSGI app served from a background thread; start() binds the port, stop() shuts it down"""
+
+    def __init__(self, app, host='localhost', port=5000, threads=None, backend=None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.threads = threads or DESKTOP_SERVER_THREADS
+        self.backend = backend or default_backend()
+        if self.backend == 'waitress' and waitress is None:
+            raise RuntimeError('waitress is not installed (pip install waitress)')
+        self._server = None
+        self._thread = None
+        self._map = {}
+
+    def _close_sockets(self):
+        # Runs on the loop's thread (a trigger thunk): closing sockets under
+        # its select() from another thread fails. An empty map ends run()
+        for dispatcher in list(self._map.values()):
+            dispatcher.close()
+
+    def start(self):
+        """Bind and start serving; raises if the port can't be bound"""
+        self._map = {}
+        if self.backend == 'waitress':
+            # A briefly full thread pool is expected when scans arrive together
+            logging.getLogger('waitress.queue').setLevel(logging.ERROR)
+            self._server = waitress.create_server(self.app, map=self._map, host=self.host, port=self.port,
+                                                  threads=self.threads)
+            serve = self._server.run
+        else:
+            self._server = make_server(self.host, self.port, self.app, threaded=True)
+            serve = self._server.serve_forever
+        self._thread = threading.Thread(target=serve, name='desktop-server', daemon=True)
+        self._thread.start()
+        if self.backend == 'waitress':
+            print(f"✓ Serving on http://{self.host}:{self.port} (waitress, {self.threads} threads)")
+        else:
+            print(f"✓ Serving on http://{self.host}:{self.port} (werkzeug, thread per request)")
+
+    def stop(self, timeout=5):
+        """Stop accepting requests and wait (up to timeout seconds) for the server thread"""
+        if self._server is None:
+            return
+        if self.backend == 'waitress':
+            # Workers finish their current request; the loop keeps sending responses meanwhile
+            self._server.task_dispatcher.shutdown(timeout=timeout)
+            self._server.trigger.pull_trigger(self._close_sockets)
+        else:
+            self._server.shutdown()
+            self._server.server_close()
+        self._thread.join(timeout)
+        self._server = None
+        print("✓ Server stopped")
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
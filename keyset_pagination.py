@@ -0,0 +1,103 @@
+"""
+Keyset (cursor) pagination and field projection for list endpoints
+
+List endpoints return one page at a time instead of every row:
+
+    GET /api/students?limit=100&fields=id,name,email
+    -> {"students": [...], "next_cursor": "WzEyXQ", "has_more": true}
+    GET /api/students?cursor=WzEyXQ
+
+A cursor is the sort key of the last row sent, base64-encoded, so the next
+page is an indexed range scan (WHERE key > last key) rather than an OFFSET
+that rereads everything before it. Rows added or removed between requests
+don't cause skipped or repeated rows.
+
+fields= picks which response fields to return; endpoints select only the
+columns those fields need.
+"""
+
+import base64
+import json
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+class PagingError(ValueError):
+    """Bad limit, cursor or fields parameter (reported as a 400)"""
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':'), default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Decode a cursor holding `size` key values, or None if no cursor was given"""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise PagingError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise PagingError('Invalid cursor')
+    return values
+
+
+def parse_page_args(args, key_size=1, default_limit=DEFAULT_PAGE_SIZE):
+    """Read limit and cursor from request args; returns (limit, cursor values or None)"""
+    try:
+        limit = int(args.get('limit') or default_limit)
+    except ValueError:
+        raise PagingError('limit must be a number')
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    return limit, decode_cursor(args.get('cursor'), key_size)
+
+
+def parse_fields(raw, available, default):
+    """
+    Parse a comma-separated fields= value.
+
+    Args:
+        available: Every field the endpoint can return
+        default: Fields returned when fields= is absent
+    """
+    if not raw:
+        return list(default)
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in available]
+    if unknown:
+        raise PagingError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}")
+    return fields
+
+
+def after_key(columns, values, descending=False):
+    """
+    WHERE clause selecting rows after a key, for ORDER BY columns (all
+    ascending or all descending). Written as OR/AND rather than a row-value
+    comparison so any database can use the index.
+    """
+    clauses = []
+    for i, column in enumerate(columns):
+        beyond = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*[columns[j] == values[j] for j in range(i)], beyond))
+    return or_(*clauses)
+
+
+def finish_page(rows, limit, key):
+    """
+    Trim a query result fetched with LIMIT limit + 1.
+
+    Returns (rows, next_cursor) where next_cursor is None on the last page.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key(rows[-1]))
+
+
+def project(item, fields):
+    return {field: item[field] for field in fields}
@@ -0,0 +1,136 @@
+"""
+Signed compact QR payloads
+
+Student QR codes used to carry STUDENT_{id}_{teacher_id}_{email}: long
+enough to need a bigger QR version, and a forged or mistyped code was only
+rejected after database work. New codes carry
+
+    S1.{student id}.{teacher id}.{signature}
+
+- S1 is the payload version: S1 codes carry the ids of section files, S2
+  the ids of consolidated storage (teacher_storage.py). Students get new
+  ids when sections move between the two, so a code from the other layout
+  is refused rather than marking whichever student now has its id
+- ids are base 36, the teacher id being the shard key that names the
+  teacher database the student lives in
+- the signature is the first 64 bits of an HMAC-SHA256 of everything
+  before it, base32
+
+Everything is uppercase letters, digits and '.', so the code is encoded in
+QR alphanumeric mode. The prefix and signature take 18 characters, so a
+code stays within a version 1 symbol (25 characters at error correction
+level L) while the two ids together need at most 5 + 2 base 36 digits, e.g.
+student ids below 36^5 with teacher ids below 36^2; larger ids still encode,
+in a bigger symbol. Checking the signature is a single HMAC, done before
+any database access.
+
+The signing key is QR_SIGNING_KEY, falling back to FLASK_SECRET_KEY.
+Changing it invalidates every printed signed code. Legacy STUDENT_ codes
+are still accepted by the scan endpoint unless QR_REQUIRE_SIGNED=1 or
+storage is consolidated.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+
+PAYLOAD_VERSION = 'S1'
+
+# Payload version of codes whose ids are in consolidated storage
+CONSOLIDATED_VERSION = 'S2'
+
+VERSIONS = (PAYLOAD_VERSION, CONSOLIDATED_VERSION)
+
+QR_REQUIRE_SIGNED = os.environ.get('QR_REQUIRE_SIGNED', '0').lower() in ('1', 'true', 'yes')
+
+SIGNATURE_BYTES = 8
+
+_DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+class QRPayloadError(ValueError):
+    """Malformed payload or bad signature"""
+
+
+def _signing_key():
+    key = os.environ.get('QR_SIGNING_KEY') or os.environ.get('FLASK_SECRET_KEY', 'dev-secret-key-change-in-production')
+    return key.encode('utf-8')
+
+
+_key = _signing_key()
+
+
+def _base36(number):
+    if number < 0:
+        raise ValueError('ids must not be negative')
+    digits = ''
+    while True:
+        number, remainder = divmod(number, 36)
+        digits = _DIGITS[remainder] + digits
+        if not number:
+            return digits
+
+
+def _sign(body):
+    digest = hmac.new(_key, body.encode('ascii'), hashlib.sha256).digest()[:SIGNATURE_BYTES]
+    return base64.b32encode(digest).decode('ascii').rstrip('=')
+
+
+def encode(student_id, teacher_id, version=PAYLOAD_VERSION):
+    """Build the signed payload for a student of a teacher's section"""
+    if version not in VERSIONS:
+        raise ValueError(f'Unknown payload version {version}')
+    body = f'{version}.{_base36(int(student_id))}.{_base36(int(teacher_id))}'
+    return f'{body}.{_sign(body)}'
+
+
+def is_signed(data):
+    """True if data claims to be a signed payload (it may still fail decode)"""
+    return data[:3].upper() in [version + '.' for version in VERSIONS]
+
+
+def decode(data, version=None):
+    """
+    Verify a signed payload.
+
+    Args:
+        version: Payload version the caller's storage issues; a validly
+            signed code of another version is refused. None accepts any.
+
+    Returns:
+        (student_id, teacher_id)
+
+    Raises:
+        QRPayloadError: Malformed payload or bad signature
+    """
+    # Some scanners report alphanumeric-mode text in lowercase
+    parts = data.strip().upper().split('.')
+    if len(parts) != 4 or parts[0] not in VERSIONS:
+        raise QRPayloadError('Invalid QR code format')
+    code_version, student_part, teacher_part, signature = parts
+    if not hmac.compare_digest(_sign(f'{code_version}.{student_part}.{teacher_part}'), signature):
+        raise QRPayloadError('Invalid QR code signature')
+    if version is not None and code_version != version:
+        raise QRPayloadError('This QR code is out of date, please get a new one')
+    try:
+        return int(student_part, 36), int(teacher_part, 36)
+    except ValueError:
+        raise QRPayloadError('Invalid QR code format')
+
+
+def precheck(data):
+    """
+    Cheap filter for scanner clients: False for text that can't be an
+    attendance code. Signed codes are only verified when QR_SIGNING_KEY is
+    set on the scanner too; otherwise the server checks them.
+    """
+    if is_signed(data):
+        if not os.environ.get('QR_SIGNING_KEY'):
+            return data.count('.') == 3
+        try:
+            decode(data)
+        except QRPayloadError:
+            return False
+        return True
+    return data.startswith('STUDENT_')
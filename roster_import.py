@@ -0,0 +1,354 @@
+"""
+Bulk roster import from CSV
+
+Onboards whole sections at once instead of one /api/signup per student:
+
+1. parse_roster() reads the CSV and validate_roster() checks every row:
+   required fields, grade level, an assigned teacher for the section, and
+   email uniqueness within the file and across every existing account.
+2. Passwords given in the CSV are hashed on a process pool. Rows without a
+   password get a one-time set-password token instead, which is cheap.
+3. Each teacher database receives its students in one bulk INSERT. One
+   that fails is reported without undoing the others.
+4. QR codes are rendered afterwards by a background worker. The QR
+   endpoints still render on demand if a student asks first.
+
+Used by POST /api/admin/students/import and tools/import_roster.py.
+"""
+
+import csv
+import hashlib
+import io
+import os
+import queue
+import secrets
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+
+import bcrypt as bcrypt_lib
+from sqlalchemy import insert, select
+
+import attendance_counters
+import student_search
+from db_manager import get_philippine_time, get_teacher_db_session, TeacherStudent
+
+ROSTER_COLUMNS = [
+    'full_name', 'email', 'grade_level', 'section', 'password',
+    'guardian_name', 'guardian_email', 'guardian_phone'
+]
+REQUIRED_COLUMNS = ['full_name', 'email', 'grade_level', 'section']
+GRADE_LEVELS = ('11', '12')
+
+# Processes used to hash passwords; defaults to one per CPU
+HASH_WORKERS = int(os.environ.get('HASH_WORKERS', '0')) or os.cpu_count() or 1
+
+# How long a set-password token from an import stays valid
+PASSWORD_TOKEN_TTL_HOURS = int(os.environ.get('PASSWORD_TOKEN_TTL_HOURS', '72'))
+
+# Students saved per commit by the QR worker
+QR_BATCH_SIZE = 50
+
+_qr_queue = queue.Queue()
+_qr_worker = None
+_qr_worker_lock = threading.Lock()
+
+
+class RosterError(Exception):
+    """Raised when a roster can't be imported; .errors lists the problems per row"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+# ==================== PASSWORD HASHING ====================
+
+def _hash_password(args):
+    password, rounds = args
+    return bcrypt_lib.hashpw(password.encode('utf-8'), bcrypt_lib.gensalt(rounds)).decode('utf-8')
+
+
+def hash_passwords(passwords, rounds=12, workers=None):
+    """
+    Hash many passwords in parallel, in order.
+
+    Uses a process pool; frozen desktop builds, where spawning the app
+    executable again isn't safe, use threads instead (bcrypt releases the
+    GIL while hashing, so they still run in parallel).
+    """
+    if not passwords:
+        return []
+    workers = min(workers or HASH_WORKERS, len(passwords))
+    jobs = [(password, rounds) for password in passwords]
+    if workers == 1:
+        return [_hash_password(job) for job in jobs]
+
+    pool_class = ThreadPoolExecutor if getattr(sys, 'frozen', False) else ProcessPoolExecutor
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with pool_class(max_workers=workers) as pool:
+        if pool_class is ProcessPoolExecutor:
+            return list(pool.map(_hash_password, jobs, chunksize=chunksize))
+        return list(pool.map(_hash_password, jobs))
+
+
+def hash_token(token):
+    """Tokens are stored hashed so a leaked database can't be used to set passwords"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+# ==================== PARSING AND VALIDATION ====================
+
+def parse_roster(text):
+    """
+    Parse roster CSV text into a list of row dicts (with 'line' numbers).
+
+    Raises RosterError if required columns are missing.
+    """
+    reader = csv.DictReader(io.StringIO(text.lstrip('﻿')))
+    header = [(name or '').strip().lower() for name in (reader.fieldnames or [])]
+    missing = [c for c in REQUIRED_COLUMNS if c not in header]
+    if missing:
+        raise RosterError(f"Missing required columns: {', '.join(missing)}")
+
+    rows = []
+    for line, raw in enumerate(reader, start=2):
+        row = {c: '' for c in ROSTER_COLUMNS}
+        for key, value in raw.items():
+            key = (key or '').strip().lower()
+            if key in row:
+                row[key] = (value or '').strip()
+        if not any(row.values()):
+            continue  # Blank line
+        row['email'] = row['email'].lower()
+        row['line'] = line
+        rows.append(row)
+    return rows
+
+
+def get_existing_emails(sections, main_emails=()):
+    """Collect every student email across teacher databases, plus main-DB accounts"""
+    emails = {e.lower() for e in main_emails if e}
+    for section in sections:
+        if not section.get('db_name'):
+            continue
+        Session = get_teacher_db_session(section['db_name'])
+        sess = Session()
+        try:
+            emails.update(e.lower() for e in sess.execute(select(TeacherStudent.email)).scalars() if e)
+        finally:
+            sess.close()
+    return emails
+
+
+def validate_roster(rows, sections, existing_emails):
+    """
+    Check rows and attach each to its section.
+
+    Args:
+        sections: List of dicts with 'db_name', 'grade_level', 'section' and 'teacher_id'
+        existing_emails: Set of lower-cased emails already in use
+
+    Returns:
+        (valid_rows, errors) where errors is a list of {'line', 'email', 'error'}
+    """
+    by_section = {
+        (str(s['grade_level']), s['section'].strip().lower()): s
+        for s in sections if s.get('db_name') and s.get('section')
+    }
+    seen = set()
+    valid = []
+    errors = []
+
+    for row in rows:
+        problem = None
+        missing = [c for c in REQUIRED_COLUMNS if not row[c]]
+        section = by_section.get((row['grade_level'], row['section'].lower()))
+        if missing:
+            problem = f"Missing {', '.join(missing)}"
+        elif '@' not in row['email']:
+            problem = 'Invalid email address'
+        elif row['grade_level'] not in GRADE_LEVELS:
+            problem = 'Invalid grade level. Must be 11 or 12.'
+        elif section is None:
+            problem = f"No teacher assigned to Grade {row['grade_level']} - {row['section']}"
+        elif row['email'] in seen:
+            problem = 'Email appears more than once in the file'
+        elif row['email'] in existing_emails:
+            problem = 'Email already registered'
+
+        if problem:
+            errors.append({'line': row['line'], 'email': row['email'], 'error': problem})
+        else:
+            seen.add(row['email'])
+            valid.append(dict(row, target=section))
+    return valid, errors
+
+
+# ==================== IMPORT ====================
+
+def import_roster(rows, rounds=12):
+    """
+    Insert validated rows, one transaction per teacher database.
+
+    A teacher database that fails is rolled back and reported; the others
+    are still imported, so the tokens of every committed student are
+    returned.
+
+    Returns:
+        (created, tokens, failed) where created maps db_name -> list of
+        (student_id, email), tokens is a list of dicts with 'db_name',
+        'student_id', 'email' and 'token' for committed rows that had no
+        password, and failed lists {'line', 'email', 'error'} for the rows
+        of databases that could not be written
+    """
+    with_password = [r for r in rows if r['password']]
+    hashes = dict(zip(
+        (r['email'] for r in with_password),
+        hash_passwords([r['password'] for r in with_password], rounds)
+    ))
+    # Token-only accounts get a hash of a secret nobody knows, so password login
+    # is impossible until the token is used; one hash serves every such row
+    locked_hash = _hash_password((secrets.token_urlsafe(32), rounds)) if len(hashes) < len(rows) else None
+
+    groups = {}
+    for row in rows:
+        groups.setdefault(row['target']['db_name'], []).append(row)
+
+    created = {}
+    tokens = []
+    failed = []
+    for db_name, group in groups.items():
+        target = group[0]['target']
+        now = get_philippine_time()
+        values = [{
+            'full_name': r['full_name'],
+            'email': r['email'],
+            'password_hash': hashes.get(r['email']) or locked_hash,
+            'section': target['section'],
+            'grade_level': str(target['grade_level']),
+            'teacher_id': target['teacher_id'],
+            'created_at': now,
+            'guardian_name': r['guardian_name'] or None,
+            'guardian_email': r['guardian_email'] or None,
+            'guardian_phone': r['guardian_phone'] or None,
+            'notify_on_checkin': 1,
+            'notify_on_checkout': 1
+        } for r in group]
+
+        Session = get_teacher_db_session(db_name)
+        sess = Session()
+        try:
+            sess.execute(insert(TeacherStudent), values)
+            emails = [r['email'] for r in group]
+            ids = {}
+            for start in range(0, len(emails), 500):
+                chunk = emails[start:start + 500]
+                ids.update((email, sid) for sid, email in sess.execute(
+                    select(TeacherStudent.id, TeacherStudent.email).where(TeacherStudent.email.in_(chunk))
+                ))
+            sess.commit()
+        except Exception as e:
+            sess.rollback()
+            print(f"✗ Roster import into {db_name} failed: {e}")
+            failed.extend(
+                {'line': r['line'], 'email': r['email'], 'error': f'Could not be saved: {e}'} for r in group
+            )
+            continue
+        finally:
+            sess.close()
+
+        attendance_counters.record_enrollment(db_name, len(group))
+        try:
+            student_search.index_students(db_name, [dict(v, id=ids[v['email']]) for v in values])
+        except Exception as e:
+            print(f"✗ Could not index imported students in {db_name}: {e}")
+        created[db_name] = [(ids[email], email) for email in emails]
+        for r in group:
+            if not r['password']:
+                tokens.append({
+                    'db_name': db_name,
+                    'student_id': ids[r['email']],
+                    'email': r['email'],
+                    'token': secrets.token_urlsafe(24)
+                })
+        queue_qr_generation(db_name, [ids[email] for email in emails])
+
+    return created, tokens, failed
+
+
+def store_password_tokens(main_session, PasswordSetupToken, tokens, ttl_hours=None):
+    """Stage set-password token rows in the main database; the caller commits"""
+    ttl = PASSWORD_TOKEN_TTL_HOURS if ttl_hours is None else ttl_hours
+    expires_at = get_philippine_time() + timedelta(hours=ttl)
+    main_session.bulk_insert_mappings(PasswordSetupToken, [{
+        'token_hash': hash_token(t['token']),
+        'db_name': t['db_name'],
+        'student_id': t['student_id'],
+        'email': t['email'],
+        'expires_at': expires_at
+    } for t in tokens])
+
+
+def reissue_password_tokens(main_session, PasswordSetupToken, emails=None, ttl_hours=None):
+    """
+    Replace the unused set-password tokens (of some emails, or all) with new
+    ones and return them as [{'email', 'token'}]. Only hashes are stored, so
+    this is the one time the new tokens can be read; earlier ones stop
+    working. The caller commits.
+    """
+    ttl = PASSWORD_TOKEN_TTL_HOURS if ttl_hours is None else ttl_hours
+    expires_at = get_philippine_time() + timedelta(hours=ttl)
+    query = main_session.query(PasswordSetupToken).filter(PasswordSetupToken.used_at.is_(None))
+    if emails is not None:
+        query = query.filter(PasswordSetupToken.email.in_([e.lower() for e in emails]))
+    issued = []
+    for setup in query.order_by(PasswordSetupToken.id):
+        token = secrets.token_urlsafe(24)
+        setup.token_hash = hash_token(token)
+        setup.expires_at = expires_at
+        issued.append({'email': setup.email, 'token': token})
+    return issued
+
+
+# ==================== QR GENERATION QUEUE ====================
+
+def _run_qr_worker():
+    while True:
+        db_name, student_ids = _qr_queue.get()
+        try:
+            Session = get_teacher_db_session(db_name)
+            for start in range(0, len(student_ids), QR_BATCH_SIZE):
+                sess = Session()
+                try:
+                    students = sess.query(TeacherStudent).filter(
+                        TeacherStudent.id.in_(student_ids[start:start + QR_BATCH_SIZE]),
+                        TeacherStudent.qr_code.is_(None)
+                    ).all()
+                    for student in students:
+                        student.generate_qr_code()
+                    sess.commit()
+                finally:
+                    sess.close()
+            print(f"✓ Generated QR codes for {len(student_ids)} imported students in {db_name}")
+        except Exception as e:
+            print(f"✗ QR generation failed for {db_name}: {e}")
+        finally:
+            _qr_queue.task_done()
+
+
+def queue_qr_generation(db_name, student_ids):
+    """Render QR codes for students in a background thread"""
+    global _qr_worker
+    with _qr_worker_lock:
+        if _qr_worker is None or not _qr_worker.is_alive():
+            _qr_worker = threading.Thread(target=_run_qr_worker)
+            _qr_worker.daemon = True
+            _qr_worker.start()
+    _qr_queue.put((db_name, list(student_ids)))
+
+
+def wait_for_qr_generation():
+    """Block until every queued QR code has been rendered (used by the CLI)"""
+    _qr_queue.join()
@@ -0,0 +1,363 @@
+"""
+Group commit for scans (write-behind)
+
+On the fast path every scan is its own transaction on the teacher database,
+and every commit waits for the disk to sync, so sync latency caps how fast
+a section can check in. With SCAN_BATCH_MS > 0 scans are decided in memory
+and queued for a writer thread per teacher database, which commits what has
+accumulated every SCAN_BATCH_MS milliseconds, or as soon as SCAN_BATCH_SIZE
+scans are waiting, in one transaction.
+
+SCAN_BATCH_DURABILITY decides when a scan is acknowledged:
+
+- commit (default): once the batch holding it is committed. Nothing
+  acknowledged is lost; the gain is that one sync covers every scan
+  waiting on it.
+- enqueue: as soon as it is queued, for callers that pass on_saved. What
+  must only follow a saved scan (the section summary, the guardian email)
+  is done by on_saved once the batch commits; a scan skipped or lost there
+  never gets it. A crash loses the scans of the batch not yet committed (at
+  most SCAN_BATCH_MS of them). Callers without on_saved, such as requests
+  relayed by the writer process, always wait for the commit.
+
+A scan is decided from the database plus the scans still queued for it, so
+quick repeat scans check in then out as before. Writes are conditional (a
+check-in only inserts if the shift has no row yet, a check-out only fills
+an empty check_out_time), so rows written meanwhile by another worker or a
+teacher are never overwritten; a check-in skipped that way is logged, and
+fails its scan in commit durability. flush_all() commits everything queued;
+it runs at interpreter exit, and app.py calls it before editing attendance
+outside the scan path. tools/bench_scan_batching.py measures throughput.
+Like scan_executor it is for section files; consolidated storage leaves
+commits to the database server.
+
+The queues live in one process, and a flush can't reach another process's,
+so batching only runs in a process that has called claim(): the writer
+process (TEACHER_WRITER_ADDRESS, see teacher_writer.py), the desktop app
+and `python app.py`, each the only one writing its teacher databases. A web
+server started any other way (gunicorn, with any number of workers) refuses
+to start with SCAN_BATCH_MS set unless its scans go to a writer process.
+"""
+
+import atexit
+import os
+import threading
+import time
+
+import attendance_counters
+from db_manager import consolidated_storage, get_teacher_db_path, get_teacher_db_session
+from db_schema_v2 import ATTENDANCE_STATUS_CODES, RECORD_STATUS_CODES, SCHEMA_V2, schema_version
+from scan_executor import (
+    ScanOutcome,
+    check_in_status,
+    db_time,
+    lookup_scan,
+    scan_keys,
+    write_check_in_side_tables
+)
+
+SCAN_BATCH_MS = float(os.environ.get('SCAN_BATCH_MS', '0'))
+
+SCAN_BATCH_SIZE = int(os.environ.get('SCAN_BATCH_SIZE', '64'))
+
+SCAN_BATCH_DURABILITY = os.environ.get('SCAN_BATCH_DURABILITY', 'commit').lower()
+
+DURABILITY_MODES = ('enqueue', 'commit')
+
+# Attempts at committing a batch before its scans are given up
+FLUSH_ATTEMPTS = 3
+
+_CHECK_IN_SQL = (
+    'INSERT INTO attendance (student_id, timestamp, check_in_time, attendance_status, status, date, shift) '
+    'SELECT ?, ?, ?, ?, ?, ?, ? WHERE NOT EXISTS ('
+    '    SELECT 1 FROM attendance WHERE student_id = ? AND date = ? AND shift = ?)'
+)
+
+_CHECK_OUT_SQL = (
+    'UPDATE attendance SET check_out_time = ?, status = ? WHERE id = ('
+    '    SELECT id FROM attendance WHERE student_id = ? AND date = ? AND shift = ? ORDER BY id LIMIT 1) '
+    'AND check_out_time IS NULL'
+)
+
+if SCAN_BATCH_DURABILITY not in DURABILITY_MODES:
+    print(f"✗ Unknown SCAN_BATCH_DURABILITY {SCAN_BATCH_DURABILITY!r}, using 'commit'")
+    SCAN_BATCH_DURABILITY = 'commit'
+
+
+# Process that claimed the batcher (see claim)
+_owner = {'pid': None}
+
+
+def claim():
+    """Declare this process the only one writing its teacher databases, so it may batch"""
+    _owner['pid'] = os.getpid()
+
+
+def claimed():
+    # A forked child doesn't inherit the claim
+    return _owner['pid'] == os.getpid()
+
+
+def check_process(scans_go_to_writer):
+    """
+    Startup check for web servers: SCAN_BATCH_MS in a process that hasn't
+    claimed the batcher raises, unless its scans are written by the writer
+    process (where SCAN_BATCH_MS then applies).
+    """
+    if SCAN_BATCH_MS > 0 and not claimed() and not scans_go_to_writer:
+        raise RuntimeError(
+            'SCAN_BATCH_MS needs a single writing process: set TEACHER_WRITER_ADDRESS and run '
+            'tools/teacher_writer_daemon.py, or unset SCAN_BATCH_MS'
+        )
+
+
+def enabled():
+    return SCAN_BATCH_MS > 0 and claimed() and not consolidated_storage()
+
+
+class _QueuedScan:
+    """A decided check-in or check-out waiting for its batch"""
+    __slots__ = ('kind', 'key', 'now', 'status', 'student', 'done', 'error', 'on_saved')
+
+    def __init__(self, kind, key, now, status, student):
+        self.kind = kind
+        self.key = key  # (student_id, date_str, shift)
+        self.now = now
+        self.status = status
+        self.student = student
+        self.done = threading.Event()
+        self.error = None
+        self.on_saved = None
+
+
+def _write_batch(db_name, batch):
+    """
+    Commit a batch in one transaction.
+
+    Returns:
+        (scans that changed a row, check-ins skipped because the shift
+        already had one)
+    """
+    engine = get_teacher_db_session(db_name).kw['bind']
+    conn = engine.raw_connection()
+    try:
+        version = schema_version(engine.dialect)
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            saved = []
+            skipped = []
+            for scan in batch:
+                student_id, date_str, shift = scan.key
+                day, shift_value = scan_keys(date_str, shift, version)
+                stamp = db_time(scan.now, version)
+                if scan.kind == 'check_in':
+                    if version == SCHEMA_V2:
+                        values = (ATTENDANCE_STATUS_CODES.get(scan.status, scan.status), RECORD_STATUS_CODES['check_in'])
+                    else:
+                        values = (scan.status, 'check_in')
+                    cursor.execute(_CHECK_IN_SQL, (student_id, stamp, stamp) + values
+                                   + (day, shift_value, student_id, day, shift_value))
+                    if cursor.rowcount:
+                        write_check_in_side_tables(cursor, student_id, date_str, shift, scan.status)
+                        saved.append(scan)
+                    else:
+                        skipped.append(scan)
+                else:
+                    record_status = RECORD_STATUS_CODES['check_out'] if version == SCHEMA_V2 else 'check_out'
+                    cursor.execute(_CHECK_OUT_SQL, (stamp, record_status, student_id, day, shift_value))
+                    if cursor.rowcount:
+                        saved.append(scan)
+            conn.commit()
+            return saved, skipped
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    finally:
+        conn.close()
+
+
+class _Writer:
+    """Queue and writer thread for one teacher database"""
+
+    def __init__(self, db_name):
+        self.db_name = db_name
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+        self.flush_lock = threading.Lock()  # One batch at a time, in order
+        self.queue = []
+        self.pending = {}  # key -> latest queued scan for it
+        thread = threading.Thread(target=self._run, name=f'scan-writer-{db_name}', daemon=True)
+        thread.start()
+
+    def enqueue(self, scan):
+        """Queue a decided scan (caller holds self.lock)"""
+        self.queue.append(scan)
+        self.pending[scan.key] = scan
+        if len(self.queue) == 1 or len(self.queue) >= SCAN_BATCH_SIZE:
+            self.wake.notify()
+
+    def _run(self):
+        while True:
+            with self.lock:
+                while not self.queue:
+                    self.wake.wait()
+                # Let the batch fill for up to SCAN_BATCH_MS
+                deadline = time.monotonic() + SCAN_BATCH_MS / 1000
+                while len(self.queue) < SCAN_BATCH_SIZE:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.wake.wait(remaining)
+            self.flush()
+
+    def flush(self):
+        with self.flush_lock:
+            saved = self._commit()
+
+        # Acknowledged early (enqueue durability): finish what waits on the
+        # commit, outside the flush lock so the next batch isn't held up
+        for scan in saved:
+            if scan.on_saved is not None:
+                try:
+                    scan.on_saved(ScanOutcome(scan.kind, scan.status, scan.student))
+                except Exception as e:
+                    print(f"✗ After-save step failed for student {scan.key[0]} in {self.db_name}: {e}")
+
+    def _commit(self):
+        """Write the queued scans (caller holds flush_lock); returns the ones saved"""
+        with self.lock:
+            batch, self.queue = self.queue, []
+        if not batch:
+            return []
+
+        error = None
+        saved = []
+        skipped = []
+        for attempt in range(FLUSH_ATTEMPTS):
+            try:
+                saved, skipped = _write_batch(self.db_name, batch)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                time.sleep(0.05 * (attempt + 1))
+
+        if error is None:
+            for scan in saved:
+                if scan.kind == 'check_in':
+                    attendance_counters.apply_status_change(self.db_name, scan.key[1], scan.key[2], None, scan.status)
+            for scan in skipped:
+                # Written meanwhile by auto-mark, a teacher, a sync or another process
+                print(f"✗ Queued check-in not saved for student {scan.key[0]} in {self.db_name} "
+                      f"({scan.key[1]} {scan.key[2]}): the shift already has an attendance row")
+        else:
+            print(f"✗ Scan batch for {self.db_name} failed, {len(batch)} scans not saved: {error}")
+
+        # Committed (or lost): later scans read the database again
+        with self.lock:
+            for scan in batch:
+                if self.pending.get(scan.key) is scan:
+                    del self.pending[scan.key]
+        not_saved = RuntimeError('Check-in not saved: attendance was already recorded for this shift')
+        for scan in batch:
+            scan.error = not_saved if error is None and scan in skipped else error
+            scan.done.set()
+
+        return saved if error is None else []
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def _get_writer(db_name):
+    writer = _writers.get(db_name)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(db_name)
+            if writer is None:
+                writer = _writers[db_name] = _Writer(db_name)
+    return writer
+
+
+def _lookup(db_name, student_id, date_str, shift):
+    engine = get_teacher_db_session(db_name).kw['bind']
+    conn = engine.raw_connection()
+    try:
+        version = schema_version(engine.dialect)
+        day, shift_value = scan_keys(date_str, shift, version)
+        cursor = conn.cursor()
+        try:
+            return lookup_scan(cursor, version, student_id, day, shift_value)
+        finally:
+            cursor.close()
+    finally:
+        conn.close()
+
+
+def record_scan(teacher, settings, student_id, now, shift, on_saved=None):
+    """
+    Decide a scan and queue its write; same contract as
+    scan_executor.record_scan.
+
+    In enqueue durability, given on_saved, returns at once with a pending
+    outcome and calls on_saved(outcome) from the writer thread once the scan
+    is committed (never, if it isn't saved). Otherwise waits for the commit.
+
+    Raises:
+        LookupError: The teacher database is gone
+        Exception: In commit durability, whatever failed the batch
+    """
+    if not os.path.exists(get_teacher_db_path(teacher.db_name)):
+        raise LookupError('Teacher database not found')
+
+    writer = _get_writer(teacher.db_name)
+    key = (student_id, now.strftime('%Y-%m-%d'), shift)
+    with writer.lock:
+        queued = writer.pending.get(key)
+        if queued is not None:
+            if queued.kind == 'check_out':
+                return ScanOutcome('completed', queued.status, queued.student)
+            scan = _QueuedScan('check_out', key, now, queued.status, queued.student)
+        else:
+            found = _lookup(teacher.db_name, student_id, key[1], shift)
+            if found is None:
+                return None
+            student, attendance_id, status, check_out = found
+            if attendance_id is None:
+                scan = _QueuedScan('check_in', key, now, check_in_status(settings, now, shift), student)
+            elif check_out is None:
+                scan = _QueuedScan('check_out', key, now, status, student)
+            else:
+                return ScanOutcome('completed', status, student)
+        deferred = on_saved is not None and SCAN_BATCH_DURABILITY == 'enqueue'
+        if deferred:
+            scan.on_saved = on_saved
+        writer.enqueue(scan)
+
+    if not deferred:
+        scan.done.wait()
+        if scan.error is not None:
+            raise scan.error
+    return ScanOutcome(scan.kind, scan.status, scan.student, deferred)
+
+
+def flush(db_name):
+    """Commit the scans queued for one teacher database"""
+    writer = _writers.get(db_name)
+    if writer is not None:
+        writer.flush()
+
+
+def flush_all():
+    """Commit every queued scan (shutdown hook; also before non-scan attendance edits)"""
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.flush()
+
+
+atexit.register(flush_all)
@@ -0,0 +1,233 @@
+"""
+Duplicate-scan suppression
+
+A QR code held in front of a camera is read many times a second, and the
+teacher page and every scanner station post each read. Within
+SCAN_DEDUP_SECONDS of a successful scan, further scans of the same student
+for the same day and shift are answered from memory with the first scan's
+result (plus "duplicate": true) instead of reaching the database.
+
+Concurrent duplicates are coalesced too: the first request for a key claims
+it, and others arriving while it is still being recorded wait for its result
+(up to PENDING_WAIT_SECONDS) rather than recording a check-out of their own.
+
+With SCAN_DEDUP_SHARED=1 the window is also kept in a small SQLite file
+(<instance>/scan_dedup.db, or SCAN_DEDUP_DB) so every worker process on the
+host shares it. Set SCAN_DEDUP_SECONDS=0 to turn suppression off.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from db_manager import get_instance_dir
+
+SCAN_DEDUP_SECONDS = float(os.environ.get('SCAN_DEDUP_SECONDS', '5'))
+
+SCAN_DEDUP_SHARED = os.environ.get('SCAN_DEDUP_SHARED', '0').lower() in ('1', 'true', 'yes')
+
+# Longest a duplicate waits for the scan it duplicates to finish
+PENDING_WAIT_SECONDS = 2.0
+
+# Seconds between sweeps of expired rows from the shared table
+SHARED_PRUNE_INTERVAL = 30.0
+
+SHARED_DDL = [
+    'CREATE TABLE IF NOT EXISTS recent_scans (key VARCHAR(100) PRIMARY KEY, expires REAL NOT NULL, body TEXT)',
+    'CREATE INDEX IF NOT EXISTS ix_recent_scans_expires ON recent_scans (expires)',
+]
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # key -> _Entry, oldest first
+_shared = {'path': None, 'pruned_at': 0.0}
+
+
+class _Entry:
+    __slots__ = ('expires', 'result', 'done')
+
+    def __init__(self, expires):
+        self.expires = expires
+        self.result = None
+        self.done = threading.Event()
+
+
+def enabled():
+    return SCAN_DEDUP_SECONDS > 0
+
+
+def scan_key(teacher_id, student_id, date_str, shift):
+    return f'{teacher_id}:{student_id}:{date_str}:{shift}'
+
+
+# ==================== SHARED STORE ====================
+
+def get_shared_db_path():
+    return os.environ.get('SCAN_DEDUP_DB') or os.path.join(get_instance_dir(), 'scan_dedup.db')
+
+
+def _connect():
+    path = get_shared_db_path()
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    if _shared['path'] != path:
+        conn.execute('PRAGMA journal_mode=WAL')
+        for statement in SHARED_DDL:
+            conn.execute(statement)
+        _shared['path'] = path
+    return conn
+
+
+def _shared_claim(key):
+    """
+    Claim key in the shared table.
+
+    Returns (True, None) if claimed, else (False, result) where result is
+    the other worker's JSON body, or None if it never finished in time.
+    """
+    conn = _connect()
+    try:
+        now = time.time()
+        claimed = conn.execute(
+            'INSERT INTO recent_scans (key, expires, body) VALUES (?, ?, NULL) '
+            'ON CONFLICT(key) DO UPDATE SET expires = excluded.expires, body = NULL '
+            'WHERE recent_scans.expires < ?',
+            (key, now + PENDING_WAIT_SECONDS, now)
+        ).rowcount
+        if claimed:
+            return True, None
+        deadline = now + PENDING_WAIT_SECONDS
+        while True:
+            row = conn.execute('SELECT body FROM recent_scans WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return False, None  # Abandoned by its owner
+            if row[0] is not None:
+                return False, row[0]
+            if time.time() > deadline:
+                return False, None
+            time.sleep(0.02)
+    finally:
+        conn.close()
+
+
+def _shared_finish(key, body):
+    conn = _connect()
+    try:
+        now = time.time()
+        conn.execute('UPDATE recent_scans SET expires = ?, body = ? WHERE key = ?',
+                     (now + SCAN_DEDUP_SECONDS, body, key))
+        if now - _shared['pruned_at'] > SHARED_PRUNE_INTERVAL:
+            _shared['pruned_at'] = now
+            conn.execute('DELETE FROM recent_scans WHERE expires < ?', (now,))
+    finally:
+        conn.close()
+
+
+def _shared_abandon(key):
+    conn = _connect()
+    try:
+        conn.execute('DELETE FROM recent_scans WHERE key = ? AND body IS NULL', (key,))
+    finally:
+        conn.close()
+
+
+# ==================== API ====================
+
+def _prune(now):
+    """Drop expired entries (caller holds the lock); they expire in insertion order"""
+    while _entries:
+        key, entry = next(iter(_entries.items()))
+        if entry.expires > now or not entry.done.is_set():
+            break
+        del _entries[key]
+
+
+def begin(key, encode, decode):
+    """
+    Start a scan for key.
+
+    Args:
+        encode/decode: Turn a result into text and back, for the shared store
+
+    Returns:
+        The earlier result if this scan duplicates a recent one, or None
+        once the caller owns the key; the owner must then call finish() or
+        abandon().
+    """
+    deadline = time.monotonic() + PENDING_WAIT_SECONDS
+    while True:
+        now = time.monotonic()
+        with _lock:
+            _prune(now)
+            entry = _entries.get(key)
+            if entry is None or (entry.done.is_set() and entry.expires <= now):
+                _entries.pop(key, None)
+                _entries[key] = _Entry(now + PENDING_WAIT_SECONDS)
+                break
+            if entry.done.is_set():
+                return entry.result
+        # Another request in this process is recording the same scan
+        if not entry.done.wait(max(0.0, deadline - now)) or entry.result is None:
+            if time.monotonic() >= deadline:
+                return None  # Not owned; recorded without suppression
+            continue  # Abandoned - try to claim it ourselves
+        return entry.result
+
+    if SCAN_DEDUP_SHARED:
+        try:
+            claimed, body = _shared_claim(key)
+        except sqlite3.Error as e:
+            print(f"✗ Shared scan dedup unavailable: {e}")
+            return None
+        if not claimed and body is not None:
+            result = decode(body)
+            finish(key, result, encode, share=False)
+            return result
+    return None
+
+
+def finish(key, result, encode, share=True):
+    """Record the result of the scan that owns key"""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            entry = _entries[key] = _Entry(0)
+        entry.result = result
+        entry.expires = time.monotonic() + SCAN_DEDUP_SECONDS
+        _entries.move_to_end(key)
+        entry.done.set()
+    if SCAN_DEDUP_SHARED and share:
+        try:
+            _shared_finish(key, encode(result))
+        except sqlite3.Error as e:
+            print(f"✗ Could not share scan result: {e}")
+
+
+def abandon(key):
+    """Release a key whose scan failed, so the next scan is recorded normally"""
+    with _lock:
+        entry = _entries.pop(key, None)
+    if entry is not None:
+        entry.done.set()
+    if SCAN_DEDUP_SHARED:
+        try:
+            _shared_abandon(key)
+        except sqlite3.Error as e:
+            print(f"✗ Could not release shared scan claim: {e}")
+
+
+def forget_student(teacher_id, student_id):
+    """Drop remembered scans of a student, e.g. after a teacher changes their status"""
+    prefix = f'{teacher_id}:{student_id}:'
+    with _lock:
+        for key in [k for k, entry in _entries.items() if k.startswith(prefix) and entry.done.is_set()]:
+            del _entries[key]
+    if SCAN_DEDUP_SHARED:
+        try:
+            conn = _connect()
+            try:
+                conn.execute('DELETE FROM recent_scans WHERE key LIKE ? AND body IS NOT NULL', (prefix + '%',))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"✗ Could not clear shared scan results: {e}")
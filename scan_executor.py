@@ -0,0 +1,289 @@
+"""
+Fast path for the scan transaction
+
+POST /api/attendance/scan takes the morning rush, so it avoids the ORM:
+
+- the teacher and the admin time settings come from small in-process caches
+  (see init_scan_executor), reloaded after SCAN_CACHE_TTL seconds or as soon
+  as this process commits a change to either
+- the teacher database work is one transaction on a pooled DB-API
+  connection: a single prepared lookup of the student joined to today's
+  attendance row for the shift, then either the check-in insert (with the
+  counter, daily rollup and bitset upserts that go with it) or the
+  check-out update
+
+The outcome rules are the same as the ORM path in app.py (record_scan_orm):
+the first scan of a shift checks in as PRESENT up to the check-in deadline
+and LATE after it, the second checks out keeping that status, and later
+scans report the shift as completed. SCAN_FAST_PATH=0 switches back to the
+ORM path, which is also used in consolidated storage (the SQL here is for
+section files). tools/bench_scan.py compares the two.
+"""
+
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from types import SimpleNamespace
+
+import attendance_counters
+from attendance_bitsets import BITSET_BYTES, CODE_NONE, STATUS_CODES as BITSET_CODES, locate_slot, set_code
+from db_manager import ROLLUP_SHIFT_COLUMNS, consolidated_storage, get_teacher_db_path, get_teacher_db_session
+from db_schema_v2 import (
+    ATTENDANCE_STATUS_CODES,
+    RECORD_STATUS_CODES,
+    SCHEMA_V2,
+    SHIFT_CODES,
+    decode_code,
+    encode_day,
+    encode_epoch,
+    schema_version
+)
+
+SCAN_FAST_PATH = (os.environ.get('SCAN_FAST_PATH', '1').lower() not in ('0', 'false', 'no')
+                  and not consolidated_storage())
+
+# Seconds a cached teacher or settings snapshot is used before re-reading it;
+# bounds how long other workers' changes take to reach this one
+SCAN_CACHE_TTL = float(os.environ.get('SCAN_CACHE_TTL', '30'))
+
+ScanTeacher = namedtuple('ScanTeacher', 'id db_name grade_level section')
+
+# What a scan did: status is 'check_in', 'check_out' or 'completed'; pending
+# if it is queued and not committed yet (see scan_batcher.record_scan)
+ScanOutcome = namedtuple('ScanOutcome', 'status attendance_status student pending', defaults=(False,))
+
+_STATUS_NAMES = {code: name for name, code in ATTENDANCE_STATUS_CODES.items()}
+
+_LOOKUP_SQL = (
+    'SELECT s.full_name, s.guardian_email, s.guardian_name, s.notify_on_checkin, s.notify_on_checkout, '
+    'a.id, a.attendance_status, a.check_out_time '
+    'FROM students s LEFT JOIN attendance a ON a.id = ('
+    '    SELECT id FROM attendance WHERE student_id = s.id AND date = ? AND shift = ? ORDER BY id LIMIT 1) '
+    'WHERE s.id = ?'
+)
+
+_CHECK_IN_SQL = (
+    'INSERT INTO attendance (student_id, timestamp, check_in_time, attendance_status, status, date, shift) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?)'
+)
+
+_CHECK_OUT_SQL = 'UPDATE attendance SET check_out_time = ?, status = ? WHERE id = ?'
+
+_COUNTER_SQL = (
+    'INSERT INTO attendance_counters (date, shift, attendance_status, count) VALUES (?, ?, ?, 1) '
+    'ON CONFLICT(date, shift, attendance_status) DO UPDATE SET count = count + 1'
+)
+
+_ROLLUP_SQL = {
+    shift: (f'INSERT INTO attendance_daily (student_id, date, {column}) VALUES (?, ?, ?) '
+            f'ON CONFLICT(student_id, date) DO UPDATE SET {column} = excluded.{column}')
+    for shift, column in ROLLUP_SHIFT_COLUMNS.items()
+}
+
+_BITSET_SELECT_SQL = 'SELECT bits FROM attendance_bitsets WHERE student_id = ? AND school_year = ?'
+
+_BITSET_UPSERT_SQL = (
+    'INSERT INTO attendance_bitsets (student_id, school_year, bits) VALUES (?, ?, ?) '
+    'ON CONFLICT(student_id, school_year) DO UPDATE SET bits = excluded.bits'
+)
+
+
+# ==================== CACHES ====================
+
+class _TTLCache:
+    """Values loaded on demand and kept for SCAN_CACHE_TTL seconds"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, key, load):
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[1] < SCAN_CACHE_TTL:
+            return entry[0]
+        value = load()
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_teachers = _TTLCache()
+_settings = _TTLCache()
+_loaders = {}
+
+
+def init_scan_executor(load_teacher, load_config):
+    """
+    Args:
+        load_teacher: Callable(teacher_id) returning the Teacher or None
+        load_config: Callable() returning the AdminConfig row (creating it
+            if missing)
+    """
+    _loaders['teacher'] = load_teacher
+    _loaders['config'] = load_config
+
+
+def invalidate():
+    """Forget cached teachers and settings (after a commit that changed them)"""
+    _teachers.clear()
+    _settings.clear()
+
+
+def _snapshot_teacher(teacher_id):
+    teacher = _loaders['teacher'](teacher_id)
+    if teacher is None:
+        return None
+    return ScanTeacher(teacher.id, teacher.db_name, teacher.grade_level, teacher.section)
+
+
+def _snapshot_settings():
+    config = _loaders['config']()
+    settings = SimpleNamespace(**{column.name: getattr(config, column.name) for column in config.__table__.columns})
+    settings.check_in_deadlines = {
+        'morning': datetime.strptime(config.check_in_end_time, '%H:%M').time(),
+        'afternoon': datetime.strptime(config.afternoon_check_in_end_time, '%H:%M').time(),
+    }
+    return settings
+
+
+def get_teacher(teacher_id):
+    """Cached ScanTeacher for an id, or None if there is no such teacher"""
+    return _teachers.get(teacher_id, lambda: _snapshot_teacher(teacher_id))
+
+
+def get_settings():
+    """
+    Cached copy of the admin config: every AdminConfig column as an attribute
+    (so it can stand in for the row, e.g. in select_shift) plus
+    check_in_deadlines, the parsed check-in end time per shift.
+    """
+    return _settings.get('config', _snapshot_settings)
+
+
+# ==================== SCAN ====================
+
+def db_time(now, version):
+    if version == SCHEMA_V2:
+        return encode_epoch(now)
+    # Same text the ORM's DateTime column writes on SQLite
+    return now.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def scan_keys(date_str, shift, version):
+    """The (date, shift) values stored in the attendance table for a schema version"""
+    if version == SCHEMA_V2:
+        return encode_day(date_str), SHIFT_CODES.get(shift, shift)
+    return date_str, shift
+
+
+def check_in_status(settings, now, shift):
+    """PRESENT up to the shift's check-in deadline, LATE after it"""
+    deadline = settings.check_in_deadlines.get(shift, settings.check_in_deadlines['morning'])
+    return 'PRESENT' if now.time() <= deadline else 'LATE'
+
+
+def lookup_scan(cursor, version, student_id, day, shift_value):
+    """
+    Fetch a student and their attendance row for the shift.
+
+    Returns:
+        (student dict, attendance id or None, attendance status, check-out
+        time), or None if the student isn't in this section
+    """
+    row = cursor.execute(_LOOKUP_SQL, (day, shift_value, student_id)).fetchone()
+    if row is None:
+        return None
+    full_name, guardian_email, guardian_name, notify_in, notify_out, attendance_id, status, check_out = row
+    student = {
+        'full_name': full_name,
+        'guardian_email': guardian_email,
+        'guardian_name': guardian_name,
+        'notify_on_checkin': notify_in,
+        'notify_on_checkout': notify_out
+    }
+    if version == SCHEMA_V2 and attendance_id is not None:
+        status = decode_code(status, _STATUS_NAMES)
+    return student, attendance_id, status, check_out
+
+
+def write_check_in_side_tables(cursor, student_id, date_str, shift, status):
+    """Counter, daily rollup and bitset for a first status of the shift (cf. record_attendance_change)"""
+    cursor.execute(_COUNTER_SQL, (date_str, shift, status))
+    rollup = _ROLLUP_SQL.get(shift)
+    if rollup:
+        cursor.execute(rollup, (student_id, date_str, status))
+    located = locate_slot(date_str, shift)
+    if located is None:
+        return
+    school_year, slot = located
+    current = cursor.execute(_BITSET_SELECT_SQL, (student_id, school_year)).fetchone()
+    bits = bytearray(current[0]) if current and current[0] else bytearray(BITSET_BYTES)
+    set_code(bits, slot, BITSET_CODES.get(status, CODE_NONE))
+    cursor.execute(_BITSET_UPSERT_SQL, (student_id, school_year, bytes(bits)))
+
+
+def record_scan(teacher, settings, student_id, now, shift):
+    """
+    Record one scan in the teacher database.
+
+    The main-database section summary is left to the caller, as with
+    record_attendance_change.
+
+    Returns:
+        ScanOutcome, or None if the student isn't in this section
+    """
+    if not os.path.exists(get_teacher_db_path(teacher.db_name)):
+        # Teacher removed by another worker since it was cached
+        raise LookupError('Teacher database not found')
+
+    engine = get_teacher_db_session(teacher.db_name).kw['bind']
+    conn = engine.raw_connection()  # Checkout refreshes the schema version
+    try:
+        version = schema_version(engine.dialect)
+        date_str = now.strftime('%Y-%m-%d')
+        day, shift_value = scan_keys(date_str, shift, version)
+
+        cursor = conn.cursor()
+        try:
+            # Take the write lock first so two quick scans can't both check in
+            cursor.execute('BEGIN IMMEDIATE')
+            found = lookup_scan(cursor, version, student_id, day, shift_value)
+            if found is None:
+                conn.rollback()
+                return None
+            student, attendance_id, status, check_out = found
+            stamp = db_time(now, version)
+
+            if attendance_id is None:
+                status = check_in_status(settings, now, shift)
+                if version == SCHEMA_V2:
+                    values = (ATTENDANCE_STATUS_CODES.get(status, status), RECORD_STATUS_CODES['check_in'])
+                else:
+                    values = (status, 'check_in')
+                cursor.execute(_CHECK_IN_SQL, (student_id, stamp, stamp) + values + (day, shift_value))
+                write_check_in_side_tables(cursor, student_id, date_str, shift, status)
+                conn.commit()
+                attendance_counters.apply_status_change(teacher.db_name, date_str, shift, None, status)
+                return ScanOutcome('check_in', status, student)
+
+            if check_out is None:
+                record_status = RECORD_STATUS_CODES['check_out'] if version == SCHEMA_V2 else 'check_out'
+                cursor.execute(_CHECK_OUT_SQL, (stamp, record_status, attendance_id))
+                conn.commit()
+                return ScanOutcome('check_out', status, student)
+
+            conn.rollback()
+            return ScanOutcome('completed', status, student)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    finally:
+        conn.close()
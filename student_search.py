@@ -0,0 +1,296 @@
+"""
+Full-text student search across every section
+
+Students live in one SQLite database per teacher, so finding one used to
+mean listing every database. This module keeps a single search index next
+to the teacher databases (<instance>/student_search.db, which stays SQLite
+whatever the main database is):
+
+- student_directory: one row per (db_name, student_id) with the searchable
+  and display fields
+- student_fts: an FTS5 index over names, emails and guardian names, kept in
+  step with student_directory by triggers
+
+Every student write calls index_student()/index_students() after it commits,
+deleting a section calls remove_section(), and rebuild_index() re-reads every
+teacher database (at first start, or from POST /api/admin/students/reindex).
+search() is one indexed query ranked with bm25. If this SQLite build has no
+FTS5, search falls back to LIKE over the directory table.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+
+from sqlalchemy import select
+
+from db_manager import get_instance_dir, get_teacher_db_session, TeacherStudent
+
+# bm25 weights for full_name, email, guardian_name
+RANK_WEIGHTS = (10.0, 5.0, 1.0)
+
+SEARCH_MAX_LIMIT = 100
+
+DIRECTORY_FIELDS = ('full_name', 'email', 'guardian_name', 'grade_level', 'section')
+
+SEARCH_DDL = [
+    '''CREATE TABLE IF NOT EXISTS student_directory (
+        id INTEGER PRIMARY KEY,
+        db_name VARCHAR(100) NOT NULL,
+        student_id INTEGER NOT NULL,
+        full_name VARCHAR(200),
+        email VARCHAR(150),
+        guardian_name VARCHAR(200),
+        grade_level VARCHAR(10),
+        section VARCHAR(50),
+        UNIQUE (db_name, student_id)
+    )''',
+    'CREATE INDEX IF NOT EXISTS ix_student_directory_email ON student_directory (email)',
+]
+
+FTS_DDL = [
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS student_fts USING fts5(
+        full_name, email, guardian_name,
+        content='student_directory', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS student_directory_ai AFTER INSERT ON student_directory BEGIN
+        INSERT INTO student_fts (rowid, full_name, email, guardian_name)
+        VALUES (new.id, new.full_name, new.email, new.guardian_name);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS student_directory_ad AFTER DELETE ON student_directory BEGIN
+        INSERT INTO student_fts (student_fts, rowid, full_name, email, guardian_name)
+        VALUES ('delete', old.id, old.full_name, old.email, old.guardian_name);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS student_directory_au AFTER UPDATE ON student_directory BEGIN
+        INSERT INTO student_fts (student_fts, rowid, full_name, email, guardian_name)
+        VALUES ('delete', old.id, old.full_name, old.email, old.guardian_name);
+        INSERT INTO student_fts (rowid, full_name, email, guardian_name)
+        VALUES (new.id, new.full_name, new.email, new.guardian_name);
+    END''',
+]
+
+_UPSERT = (
+    'INSERT INTO student_directory (db_name, student_id, full_name, email, guardian_name, grade_level, section) '
+    'VALUES (:db_name, :student_id, :full_name, :email, :guardian_name, :grade_level, :section) '
+    'ON CONFLICT (db_name, student_id) DO UPDATE SET full_name = excluded.full_name, '
+    'email = excluded.email, guardian_name = excluded.guardian_name, '
+    'grade_level = excluded.grade_level, section = excluded.section'
+)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_init_lock = threading.Lock()
+_state = {'path': None, 'fts': None}
+
+
+def get_search_db_path():
+    return os.environ.get('STUDENT_SEARCH_DB') or os.path.join(get_instance_dir(), 'student_search.db')
+
+
+def _connect():
+    path = get_search_db_path()
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if _state['path'] != path:
+        with _init_lock:
+            if _state['path'] != path:
+                conn.execute('PRAGMA journal_mode=WAL')
+                for statement in SEARCH_DDL:
+                    conn.execute(statement)
+                try:
+                    for statement in FTS_DDL:
+                        conn.execute(statement)
+                    _state['fts'] = True
+                except sqlite3.OperationalError as e:
+                    print(f"✗ FTS5 unavailable, student search will use LIKE: {e}")
+                    _state['fts'] = False
+                _state['path'] = path
+    return conn
+
+
+def fts_available():
+    _connect().close()
+    return _state['fts']
+
+
+def _directory_row(db_name, student):
+    if isinstance(student, dict):
+        get = student.get
+        student_id = student.get('student_id', student.get('id'))
+    else:
+        get = lambda name: getattr(student, name, None)
+        student_id = student.id
+    row = {field: get(field) for field in DIRECTORY_FIELDS}
+    row.update(db_name=db_name, student_id=student_id)
+    return row
+
+
+# ==================== INDEX MAINTENANCE ====================
+
+def index_students(db_name, students):
+    """Add or update students (TeacherStudent objects or dicts with an id)"""
+    rows = [_directory_row(db_name, s) for s in students]
+    if not rows:
+        return 0
+    conn = _connect()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.executemany(_UPSERT, rows)
+        conn.execute('COMMIT')
+    except Exception:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def index_student(db_name, student):
+    """Add or update one student; a failure is logged, never raised to the writer"""
+    try:
+        index_students(db_name, [student])
+    except Exception as e:
+        print(f"✗ Could not index student in {db_name}: {e}")
+
+
+def remove_student(db_name, student_id):
+    conn = _connect()
+    try:
+        conn.execute('DELETE FROM student_directory WHERE db_name = ? AND student_id = ?', (db_name, student_id))
+    finally:
+        conn.close()
+
+
+def remove_section(db_name):
+    """Drop every student of a teacher database from the index"""
+    conn = _connect()
+    try:
+        conn.execute('DELETE FROM student_directory WHERE db_name = ?', (db_name,))
+    finally:
+        conn.close()
+
+
+def _read_section(db_name):
+    Session = get_teacher_db_session(db_name)
+    sess = Session()
+    try:
+        return [
+            dict(row._mapping) for row in sess.execute(select(
+                TeacherStudent.id, TeacherStudent.full_name, TeacherStudent.email,
+                TeacherStudent.guardian_name, TeacherStudent.grade_level, TeacherStudent.section
+            ))
+        ]
+    finally:
+        sess.close()
+
+
+def rebuild_index(db_names, progress=None):
+    """
+    Re-read every listed teacher database and replace the index with it.
+
+    Sections not listed are dropped. Returns the number of students indexed.
+    """
+    sections = [(db_name, _read_section(db_name)) for db_name in db_names]
+
+    conn = _connect()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('DELETE FROM student_directory')
+        total = 0
+        for done, (db_name, students) in enumerate(sections, start=1):
+            conn.executemany(_UPSERT, [_directory_row(db_name, s) for s in students])
+            total += len(students)
+            if progress:
+                progress(done, len(sections))
+        if _state['fts']:
+            conn.execute("INSERT INTO student_fts (student_fts) VALUES ('optimize')")
+        conn.execute('COMMIT')
+    except Exception:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    return total
+
+
+def ensure_index(db_names):
+    """Build the index on first start (when it is empty but sections exist)"""
+    conn = _connect()
+    try:
+        empty = conn.execute('SELECT 1 FROM student_directory LIMIT 1').fetchone() is None
+    finally:
+        conn.close()
+    if empty and db_names:
+        total = rebuild_index(db_names)
+        print(f"✓ Built student search index: {total} students")
+
+
+# ==================== SEARCH ====================
+
+def _fts_query(text):
+    """Turn user input into an FTS5 query: every word must match as a prefix"""
+    tokens = _TOKEN_RE.findall(text)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search(text, limit=20, offset=0, db_names=None, grade=None, section=None):
+    """
+    Find students by name, email or guardian name.
+
+    Args:
+        db_names: Only search these teacher databases (None for all)
+
+    Returns:
+        (hits, total) where hits are dicts with db_name, student_id,
+        full_name, email, guardian_name, grade_level and section, best first
+    """
+    limit = max(1, min(int(limit), SEARCH_MAX_LIMIT))
+    offset = max(0, int(offset))
+
+    filters = []
+    params = []
+    if db_names is not None:
+        if not db_names:
+            return [], 0
+        filters.append(f"d.db_name IN ({', '.join('?' * len(db_names))})")
+        params.extend(db_names)
+    if grade:
+        filters.append('d.grade_level = ?')
+        params.append(str(grade))
+    if section:
+        filters.append('d.section = ? COLLATE NOCASE')
+        params.append(section)
+
+    conn = _connect()
+    try:
+        if _state['fts']:
+            match = _fts_query(text)
+            if not match:
+                return [], 0
+            where = ' AND '.join(['student_fts MATCH ?'] + filters)
+            args = [match] + params
+            source = 'student_fts JOIN student_directory d ON d.id = student_fts.rowid'
+            order = 'bm25(student_fts, {}, {}, {}), d.full_name'.format(*RANK_WEIGHTS)
+        else:
+            tokens = _TOKEN_RE.findall(text)
+            if not tokens:
+                return [], 0
+            like = ['(d.full_name LIKE ? OR d.email LIKE ? OR d.guardian_name LIKE ?)'] * len(tokens)
+            where = ' AND '.join(like + filters)
+            args = [f'%{t}%' for t in tokens for _ in range(3)] + params
+            source = 'student_directory d'
+            order = 'd.full_name'
+
+        total = conn.execute(f'SELECT COUNT(*) FROM {source} WHERE {where}', args).fetchone()[0]
+        rows = conn.execute(
+            f'SELECT d.db_name, d.student_id, d.full_name, d.email, d.guardian_name, d.grade_level, d.section '
+            f'FROM {source} WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?',
+            args + [limit, offset]
+        ).fetchall()
+        return [dict(row) for row in rows], total
+    finally:
+        conn.close()
@@ -0,0 +1,116 @@
+"""
+Bulk teacher and section provisioning
+
+Sets up a school year's sections in one request instead of one
+/api/admin/create-teacher call each:
+
+1. validate_teachers() checks every row: required fields, grade level, and
+   email and grade/section uniqueness within the batch and (with a single
+   query by the caller) against existing teachers.
+2. Passwords are hashed in parallel with roster_import.hash_passwords().
+3. Teacher databases are created on a thread pool with
+   create_teacher_database(); a row whose database can't be created has its
+   partial file removed and its teacher row dropped, so each row either
+   fully succeeds or leaves nothing behind.
+
+Used by POST /api/admin/teachers/bulk.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from db_manager import create_teacher_database, get_teacher_db_name, get_teacher_db_path
+
+TEACHER_COLUMNS = ['full_name', 'email', 'password', 'section', 'grade_level']
+GRADE_LEVELS = ('11', '12')
+
+# Teacher databases created at once
+PROVISION_WORKERS = int(os.environ.get('PROVISION_WORKERS', '8'))
+
+
+def normalize_teacher(raw, index):
+    """Map a request row (same field names as create-teacher) to a plain dict"""
+    raw = raw if isinstance(raw, dict) else {}
+    return {
+        'index': index,
+        'full_name': str(raw.get('fullname') or raw.get('full_name') or '').strip(),
+        'email': str(raw.get('gmail') or raw.get('email') or '').strip(),
+        'password': str(raw.get('password') or ''),
+        'section': str(raw.get('section') or '').strip(),
+        'grade_level': str(raw.get('grade_level') or '').strip()
+    }
+
+
+def validate_teachers(rows, existing_emails, existing_sections):
+    """
+    Check rows against each other and against existing teachers.
+
+    Args:
+        existing_emails: Set of emails already registered
+        existing_sections: Dict mapping (grade_level, section) to the name of
+            the teacher it is assigned to
+
+    Returns:
+        (valid_rows, errors) where errors is a list of {'index', 'email', 'error'}
+    """
+    seen_emails = set()
+    seen_sections = set()
+    valid = []
+    errors = []
+
+    for row in rows:
+        key = (row['grade_level'], row['section'])
+        problem = None
+        if not all(row[c] for c in TEACHER_COLUMNS):
+            problem = 'All fields are required (name, email, password, section, grade level)'
+        elif row['grade_level'] not in GRADE_LEVELS:
+            problem = 'Grade level must be 11 or 12'
+        elif row['email'] in existing_emails:
+            problem = 'Email already registered'
+        elif row['email'] in seen_emails:
+            problem = 'Email appears more than once in the request'
+        elif key in existing_sections:
+            problem = f"Grade {row['grade_level']} - {row['section']} is already assigned to {existing_sections[key]}"
+        elif key in seen_sections:
+            problem = f"Grade {row['grade_level']} - {row['section']} appears more than once in the request"
+
+        if problem:
+            errors.append({'index': row['index'], 'email': row['email'], 'error': problem})
+        else:
+            seen_emails.add(row['email'])
+            seen_sections.add(key)
+            valid.append(row)
+    return valid, errors
+
+
+def _create_database(args):
+    teacher_id, grade_level, section = args
+    db_path = get_teacher_db_path(get_teacher_db_name(teacher_id, grade_level, section))
+    existed = os.path.exists(db_path)
+    try:
+        return create_teacher_database(teacher_id, grade_level, section), None
+    except Exception as e:
+        if not existed:
+            for path in (db_path, f'{db_path}-journal', f'{db_path}-wal', f'{db_path}-shm'):
+                if os.path.exists(path):
+                    os.remove(path)
+        return None, str(e)
+
+
+def create_databases(teachers, workers=None):
+    """
+    Create teacher databases in parallel.
+
+    Args:
+        teachers: List of (teacher_id, grade_level, section)
+
+    Returns:
+        List of (db_name, error) in the same order; db_name is None on failure
+    """
+    if not teachers:
+        return []
+    workers = min(workers or PROVISION_WORKERS, len(teachers))
+    if workers == 1:
+        return [_create_database(t) for t in teachers]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_create_database, teachers))
@@ -0,0 +1,276 @@
+"""
+Read-only query layer for the hot roster listings
+
+/api/students and /api/teacher/students return a few thousand rows at most,
+but building them through the ORM (or even Core with the schema-adaptive
+column types) runs Python code per value: identity map and instrumentation
+for ORM objects, a TypeDecorator processor call per column per row for
+Core. This module skips both:
+
+- SQL for each (schema version, field list) is built once and cached
+- rows come back from the DB-API cursor as plain tuples
+- only columns that need it are converted (v2 codes, epoch seconds, the
+  shared section), with the converter picked once per query rather than
+  checked per value
+- results are dicts of JSON-ready values, handed straight to jsonify
+
+Connections come from the teacher engine's pool, so the schema version
+check in db_manager.configure_teacher_engine still runs on checkout. In
+consolidated storage every query is limited to the section with
+db_manager.section_condition.
+tools/bench_student_listing.py compares this against the ORM and Core paths.
+"""
+
+import threading
+from datetime import datetime
+
+from db_manager import get_teacher_db_session, section_condition
+from db_schema_v2 import (
+    ATTENDANCE_STATUS_CODES,
+    SCHEMA_V2,
+    SHIFT_CODES,
+    decode_code,
+    decode_epoch,
+    encode_day,
+    schema_version
+)
+
+# Response field -> students column
+STUDENT_COLUMNS = {
+    'id': 'id',
+    'name': 'full_name',
+    'full_name': 'full_name',
+    'email': 'email',
+    'section': 'section',
+    'grade_level': 'grade_level',
+    'teacher_id': 'teacher_id',
+    'created_at': 'created_at',
+    'guardian_name': 'guardian_name',
+    'guardian_email': 'guardian_email',
+    'guardian_phone': 'guardian_phone'
+}
+
+_STATUS_NAMES = {code: name for name, code in ATTENDANCE_STATUS_CODES.items()}
+
+_sql_cache = {}
+_sql_cache_lock = threading.Lock()
+
+
+# ==================== VALUE CONVERTERS ====================
+
+def _iso_v1(value):
+    # v1 stores 'YYYY-MM-DD HH:MM:SS[.ffffff]'; isoformat differs by the 'T'
+    # and leaves out a zero fraction
+    if isinstance(value, datetime):
+        return value.isoformat()  # Server databases return real timestamps
+    if not isinstance(value, str):
+        return value
+    if value.endswith('.000000'):
+        value = value[:-7]
+    return value.replace(' ', 'T', 1)
+
+
+def _iso_v2(value):
+    if isinstance(value, int):
+        return decode_epoch(value).isoformat()
+    return _iso_v1(value)
+
+
+def _clock_v1(value):
+    """'YYYY-MM-DD HH:MM...' -> 'HH:MM AM' without parsing a datetime"""
+    if isinstance(value, datetime):
+        return value.strftime('%I:%M %p')
+    if not isinstance(value, str) or len(value) < 16:
+        return None
+    hour = int(value[11:13])
+    return f"{hour % 12 or 12:02d}:{value[14:16]} {'AM' if hour < 12 else 'PM'}"
+
+
+def _clock_v2(value):
+    if isinstance(value, int):
+        return decode_epoch(value).strftime('%I:%M %p')
+    return _clock_v1(value)
+
+
+def _status_v2(value):
+    return decode_code(value, _STATUS_NAMES)
+
+
+def _student_converters(version, meta, columns):
+    """Per-column converter (or None) for a students query"""
+    if version != SCHEMA_V2:
+        return [_iso_v1 if column == 'created_at' else None for column in columns]
+
+    converters = []
+    for column in columns:
+        if column == 'created_at':
+            converters.append(_iso_v2)
+        elif column in ('section', 'grade_level'):
+            default = meta.get(column)
+            converters.append(lambda value, default=default: default if value is None else value)
+        else:
+            converters.append(None)
+    return converters
+
+
+# ==================== QUERY PLUMBING ====================
+
+def _cached_sql(key, build):
+    sql = _sql_cache.get(key)
+    if sql is None:
+        with _sql_cache_lock:
+            sql = _sql_cache.setdefault(key, build())
+    return sql
+
+
+def _paramstyle(sql, dialect):
+    """Swap the '?' placeholders for drivers that use '%s' (psycopg2)"""
+    if dialect.paramstyle in ('format', 'pyformat'):
+        return sql.replace('?', '%s')
+    return sql
+
+
+def _run(db_name, build_sql, key, params):
+    """
+    Run a cached statement on a pooled connection.
+
+    build_sql(version, section) returns the SQL, where section is the
+    condition limiting it to the section; key identifies it within this
+    module. params is a list, or a callable taking the schema version for
+    queries whose parameters are encoded differently on v2.
+    Returns (rows, version, meta).
+    """
+    engine = get_teacher_db_session(db_name).kw['bind']
+    conn = engine.raw_connection()  # Checkout refreshes the schema version
+    try:
+        version = schema_version(engine.dialect)
+        meta = getattr(engine.dialect, 'teacher_schema_meta', {})
+        section = section_condition(db_name)
+        sql = _cached_sql((key, version, section),
+                          lambda: _paramstyle(build_sql(version, section), engine.dialect))
+        if callable(params):
+            params = params(version)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        return rows, version, meta
+    finally:
+        conn.close()
+
+
+def _apply(rows, names, converters):
+    """Turn row tuples into dicts, converting only the columns that need it"""
+    if not any(converters):
+        return [dict(zip(names, row)) for row in rows]
+    indexed = [(i, convert) for i, convert in enumerate(converters) if convert]
+    records = []
+    for row in rows:
+        row = list(row)
+        for i, convert in indexed:
+            row[i] = convert(row[i])
+        records.append(dict(zip(names, row)))
+    return records
+
+
+# ==================== LISTINGS ====================
+
+def list_students(db_name, fields, after_id=None, limit=None):
+    """
+    Students of one teacher database, ordered by id.
+
+    Args:
+        fields: Response field names (keys of STUDENT_COLUMNS); 'id' is
+            always included
+        after_id: Keyset cursor - only students with a larger id
+        limit: Maximum rows (None for all)
+
+    Returns:
+        List of dicts keyed by field name
+    """
+    names = ['id'] + [f for f in fields if f in STUDENT_COLUMNS and f != 'id']
+    columns = tuple(STUDENT_COLUMNS[f] for f in names)
+    has_cursor = after_id is not None
+    has_limit = limit is not None
+
+    def build(version, section):
+        sql = f"SELECT {', '.join(columns)} FROM students WHERE {section}"
+        if has_cursor:
+            sql += ' AND id > ?'
+        sql += ' ORDER BY id'
+        if has_limit:
+            sql += ' LIMIT ?'
+        return sql
+
+    params = []
+    if has_cursor:
+        params.append(after_id)
+    if has_limit:
+        params.append(limit)
+
+    rows, version, meta = _run(db_name, build, ('students', columns, has_cursor, has_limit), params)
+    return _apply(rows, names, _student_converters(version, meta, columns))
+
+
+def _attendance_params(version, date_str, shift):
+    if version == SCHEMA_V2:
+        return [encode_day(date_str), SHIFT_CODES.get(shift, shift)]
+    return [date_str, shift]
+
+
+def shift_attendance(db_name, date_str, shift, student_ids):
+    """
+    Today's attendance for some students in one shift.
+
+    Returns:
+        {student_id: (attendance_status, check_in 'HH:MM AM', check_out)};
+        the latest row wins if a student has several
+    """
+    if not student_ids:
+        return {}
+    student_ids = list(student_ids)
+    placeholders = ', '.join('?' * len(student_ids))
+
+    def build(version, section):
+        return ('SELECT student_id, attendance_status, check_in_time, check_out_time FROM attendance '
+                f'WHERE date = ? AND shift = ? AND student_id IN ({placeholders}) AND {section} ORDER BY id')
+
+    rows, version, meta = _run(
+        db_name, build, ('shift_attendance', len(student_ids)),
+        lambda version: _attendance_params(version, date_str, shift) + student_ids
+    )
+    if version != SCHEMA_V2:
+        return {sid: (status, _clock_v1(cin), _clock_v1(cout)) for sid, status, cin, cout in rows}
+    return {sid: (_status_v2(status), _clock_v2(cin), _clock_v2(cout)) for sid, status, cin, cout in rows}
+
+
+def shift_summary(db_name, date_str, shift, counted_statuses=('PRESENT', 'LATE', 'CUTTING', 'EXCUSED')):
+    """
+    Status counts for a whole section in one shift; students with no row
+    (or an ABSENT row) count as ABSENT.
+    """
+    def build(version, section):
+        return (f'SELECT (SELECT COUNT(*) FROM students WHERE {section}), attendance_status, '
+                'COUNT(DISTINCT student_id) '
+                f'FROM attendance WHERE date = ? AND shift = ? AND {section} GROUP BY attendance_status')
+
+    rows, version, meta = _run(
+        db_name, build, 'shift_summary', lambda version: _attendance_params(version, date_str, shift)
+    )
+
+    if rows:
+        total = rows[0][0]
+    else:
+        total = _run(db_name, lambda version, section: f'SELECT COUNT(*) FROM students WHERE {section}',
+                     'student_count', [])[0][0][0]
+    decode = _status_v2 if version == SCHEMA_V2 else (lambda value: value)
+    counts = {}
+    for _, status, count in rows:
+        counts[decode(status)] = counts.get(decode(status), 0) + count
+
+    summary = {status: counts.get(status, 0) for status in counted_statuses}
+    summary['ABSENT'] = max(total - sum(summary.values()), 0)
+    summary['total'] = total
+    return summary
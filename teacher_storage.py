@@ -0,0 +1,333 @@
+"""
+Consolidated storage for teacher sections (opt-in)
+
+By default every section is its own SQLite file in the instance directory
+(see db_manager), which suits the desktop build. On a cloud deployment that
+directory may be an ephemeral disk, and every cross-section report has to
+open the files one by one. With TEACHER_STORAGE=consolidated all sections
+share one database instead:
+
+- TEACHER_STORAGE_URL, else <instance>/sections.db. It is never the main
+  database by default: that one still has the legacy students and
+  attendance tables. On Postgres the tables are created in a `sections`
+  schema, so TEACHER_STORAGE_URL may name the main server's database.
+- students and attendance carry the section's teacher_id and are indexed
+  on it; attendance_counters is keyed by it too, and the sections table
+  lists the sections created (for reports and tools).
+- attendance_daily and attendance_bitsets are keyed by student id, which is
+  unique across sections here.
+
+get_teacher_db_session(db_name) still returns a sessionmaker per section,
+all bound to one pooled engine. Its sessions only see their section: ORM
+queries get a teacher_id criteria (attendance_daily and attendance_bitsets
+one on their student's teacher_id) and new attendance rows are stamped with
+it; raw SQL adds db_manager.section_condition(). Cross-section reports
+(iter_federated_attendance) run as one query.
+
+Term archives, the v2 schema (TEACHER_DB_SCHEMA is ignored) and the raw
+scan paths (scan_executor, scan_batcher) need section files and are off in
+this mode; scans use the ORM path. tools/migrate_to_consolidated.py copies
+existing section files in.
+"""
+
+import os
+import threading
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, bindparam, create_engine, event, inspect, select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker, with_loader_criteria
+
+from db_manager import (
+    TeacherAttendance,
+    TeacherAttendanceBitset,
+    TeacherAttendanceDaily,
+    TeacherDBBase,
+    TeacherStudent,
+    get_instance_dir,
+    get_section_teacher_id
+)
+from db_schema_v2 import V1_ATTENDANCE_COLUMNS
+
+TEACHER_STORAGE_URL = os.environ.get('TEACHER_STORAGE_URL', '')
+
+TEACHER_STORAGE_POOL_SIZE = int(os.environ.get('TEACHER_STORAGE_POOL_SIZE', '10'))
+
+# Postgres schema holding the section tables
+SCHEMA = 'sections'
+
+_metadata = MetaData()
+
+sections = Table(
+    'sections', _metadata,
+    Column('teacher_id', Integer, primary_key=True),
+    Column('db_name', String(100), nullable=False, unique=True),
+    Column('grade_level', String(10), nullable=True),
+    Column('section', String(50), nullable=True)
+)
+
+attendance_counters = Table(
+    'attendance_counters', _metadata,
+    Column('teacher_id', Integer, primary_key=True),
+    Column('date', String(10), primary_key=True),
+    Column('shift', String(10), primary_key=True),
+    Column('attendance_status', String(20), primary_key=True),
+    Column('count', Integer, nullable=False, default=0)
+)
+
+# Section tables shared with the file layout
+_SHARED_TABLES = [
+    TeacherStudent.__table__,
+    TeacherAttendance.__table__,
+    TeacherAttendanceDaily.__table__,
+    TeacherAttendanceBitset.__table__
+]
+
+# Not declared on the models, where file databases would get them too
+_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS ix_students_teacher ON {schema}students (teacher_id)',
+    'CREATE INDEX IF NOT EXISTS ix_attendance_teacher_day_shift ON {schema}attendance (teacher_id, date, shift)',
+    'CREATE INDEX IF NOT EXISTS ix_attendance_student_day_shift ON {schema}attendance (student_id, date, shift)',
+]
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_storage_url():
+    if TEACHER_STORAGE_URL:
+        # Railway/Heroku use 'postgres://' but SQLAlchemy requires 'postgresql://'
+        if TEACHER_STORAGE_URL.startswith('postgres://'):
+            return TEACHER_STORAGE_URL.replace('postgres://', 'postgresql://', 1)
+        return TEACHER_STORAGE_URL
+    return f"sqlite:///{os.path.join(get_instance_dir(), 'sections.db')}"
+
+
+def get_storage_path():
+    """The SQLite file sections are stored in, or None on a server database"""
+    url = make_url(get_storage_url())
+    return url.database if url.get_backend_name() == 'sqlite' else None
+
+
+def source_schema():
+    """Schema to qualify the section tables with in raw SQL"""
+    return 'main' if get_engine().dialect.name == 'sqlite' else SCHEMA
+
+
+def _create_schema(engine):
+    if engine.dialect.name == 'sqlite':
+        schema = None
+        view = 'CREATE VIEW IF NOT EXISTS attendance_v1 AS '
+    else:
+        # Created in the sections schema explicitly: with the search path
+        # alone, the main database's public.students would count as existing
+        schema = SCHEMA
+        view = f'CREATE OR REPLACE VIEW {SCHEMA}.attendance_v1 AS '
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f'CREATE SCHEMA IF NOT EXISTS {SCHEMA}')
+    prefix = f'{schema}.' if schema else ''
+
+    with engine.begin() as conn:
+        conn = conn.execution_options(schema_translate_map={None: schema})
+        TeacherDBBase.metadata.create_all(conn, tables=_SHARED_TABLES)
+        _metadata.create_all(conn)
+        columns = {c['name'] for c in inspect(conn).get_columns('students', schema=schema)}
+    if 'teacher_id' not in columns:
+        raise RuntimeError(
+            f"{engine.url.render_as_string(hide_password=True)} already has a students table "
+            f"without teacher_id (the main database?); set TEACHER_STORAGE_URL to a separate database"
+        )
+    with engine.begin() as conn:
+        for statement in _INDEXES:
+            conn.exec_driver_sql(statement.format(schema=prefix))
+        # v1-shaped view for raw SQL readers, with the section it belongs to
+        conn.exec_driver_sql(view + f'SELECT {", ".join(V1_ATTENDANCE_COLUMNS)}, teacher_id FROM {prefix}attendance')
+
+
+def get_engine():
+    """The engine (and connection pool) every section shares"""
+    global _engine
+    if _engine is not None:
+        return _engine
+    with _engine_lock:
+        if _engine is None:
+            url = get_storage_url()
+            if url.startswith('sqlite'):
+                engine = create_engine(url, connect_args={'timeout': 30})
+
+                @event.listens_for(engine, 'connect')
+                def set_sqlite_pragmas(dbapi_conn, connection_record):
+                    dbapi_conn.execute('PRAGMA journal_mode=WAL')
+            else:
+                engine = create_engine(
+                    url, pool_size=TEACHER_STORAGE_POOL_SIZE, pool_recycle=300, pool_pre_ping=True
+                )
+
+                @event.listens_for(engine, 'connect')
+                def set_search_path(dbapi_conn, connection_record):
+                    cursor = dbapi_conn.cursor()
+                    cursor.execute(f'SET search_path TO {SCHEMA}, public')
+                    cursor.close()
+                    dbapi_conn.commit()  # SET is undone by a rollback otherwise
+
+            _create_schema(engine)
+            _engine = engine
+            print(f"✓ Consolidated section storage: {engine.url.render_as_string(hide_password=True)}")
+    return _engine
+
+
+# ==================== SECTION SESSIONS ====================
+
+class SectionSession(Session):
+    """Session limited to the section whose teacher_id is in info"""
+
+
+@event.listens_for(SectionSession, 'do_orm_execute')
+def _limit_to_section(state):
+    if state.is_select or state.is_update or state.is_delete:
+        teacher_id = state.session.info['teacher_id']
+        # attendance_daily and attendance_bitsets have no teacher_id; go through the student
+        section_students = select(TeacherStudent.id).where(TeacherStudent.teacher_id == teacher_id)
+        state.statement = state.statement.options(
+            with_loader_criteria(TeacherStudent, TeacherStudent.teacher_id == teacher_id),
+            with_loader_criteria(TeacherAttendance, TeacherAttendance.teacher_id == teacher_id),
+            with_loader_criteria(TeacherAttendanceDaily, TeacherAttendanceDaily.student_id.in_(section_students)),
+            with_loader_criteria(TeacherAttendanceBitset, TeacherAttendanceBitset.student_id.in_(section_students))
+        )
+
+
+@event.listens_for(SectionSession, 'before_flush')
+def _stamp_section(session, flush_context, instances):
+    teacher_id = session.info['teacher_id']
+    for obj in session.new:
+        if isinstance(obj, (TeacherStudent, TeacherAttendance)) and obj.teacher_id is None:
+            obj.teacher_id = teacher_id
+
+
+def section_sessionmaker(db_name):
+    """Sessionmaker for one section on the shared engine"""
+    return sessionmaker(
+        bind=get_engine(), class_=SectionSession, info={'teacher_id': get_section_teacher_id(db_name)}
+    )
+
+
+# ==================== SECTIONS ====================
+
+def create_section(db_name, teacher_id, grade_level, section):
+    """Register a section (its tables are shared, so nothing else is created)"""
+    with get_engine().begin() as conn:
+        exists = conn.execute(
+            sections.select().where(sections.c.teacher_id == teacher_id)
+        ).first()
+        if exists is None:
+            conn.execute(sections.insert().values(
+                teacher_id=teacher_id, db_name=db_name, grade_level=str(grade_level), section=section
+            ))
+        elif exists.db_name != db_name:
+            conn.execute(sections.update().where(sections.c.teacher_id == teacher_id).values(
+                db_name=db_name, grade_level=str(grade_level), section=section
+            ))
+    print(f"Created teacher section: {db_name} (consolidated)")
+    return db_name
+
+
+def delete_section(db_name):
+    """Delete a section's students and attendance; returns whether it was registered"""
+    params = {'teacher_id': get_section_teacher_id(db_name)}
+    students = 'SELECT id FROM students WHERE teacher_id = :teacher_id'
+    with get_engine().begin() as conn:
+        conn.execute(text(f'DELETE FROM attendance_daily WHERE student_id IN ({students})'), params)
+        conn.execute(text(f'DELETE FROM attendance_bitsets WHERE student_id IN ({students})'), params)
+        conn.execute(text('DELETE FROM attendance WHERE teacher_id = :teacher_id'), params)
+        conn.execute(text('DELETE FROM attendance_counters WHERE teacher_id = :teacher_id'), params)
+        conn.execute(text('DELETE FROM students WHERE teacher_id = :teacher_id'), params)
+        deleted = conn.execute(sections.delete().where(sections.c.db_name == db_name)).rowcount
+    if deleted:
+        print(f"Deleted teacher section: {db_name} (consolidated)")
+    return bool(deleted)
+
+
+def list_sections():
+    """Registered sections, shaped like db_manager.list_teacher_databases()"""
+    with get_engine().connect() as conn:
+        rows = conn.execute(sections.select().order_by(sections.c.db_name)).fetchall()
+    return [{'db_name': row.db_name, 'path': None, 'size': None} for row in rows]
+
+
+def find_student_by_email(email, db_names):
+    """
+    Find a student by email among some sections in one query.
+
+    Returns (student, db_name) or (None, None)
+    """
+    by_teacher = {get_section_teacher_id(db_name): db_name for db_name in db_names}
+    sess = Session(bind=get_engine())
+    try:
+        student = sess.query(TeacherStudent).filter(
+            TeacherStudent.email == email,
+            TeacherStudent.teacher_id.in_(list(by_teacher))
+        ).first()
+        return (student, by_teacher[student.teacher_id]) if student else (None, None)
+    finally:
+        sess.close()
+
+
+# ==================== CROSS-SECTION REPORTS ====================
+
+def iter_attendance(sections_list, date_from, date_to, status=None, shift=None, summary=False, fetch_size=500):
+    """
+    Consolidated form of db_manager.iter_federated_attendance: the same rows,
+    from one query over every requested section.
+    """
+    by_teacher = {}
+    for section in sections_list:
+        if section.get('db_name'):
+            by_teacher[get_section_teacher_id(section['db_name'])] = section
+    if not by_teacher:
+        return
+
+    where = ['a.teacher_id IN :teacher_ids', 'a.date BETWEEN :date_from AND :date_to']
+    if status:
+        where.append('a.attendance_status = :status')
+    if shift:
+        where.append('a.shift = :shift')
+    if summary:
+        sql = (
+            'SELECT a.teacher_id, s.grade_level, s.section, a.date, a.shift, a.attendance_status, COUNT(*) '
+            'FROM attendance_v1 a JOIN sections s ON s.teacher_id = a.teacher_id '
+            f'WHERE {" AND ".join(where)} '
+            'GROUP BY a.teacher_id, s.grade_level, s.section, a.date, a.shift, a.attendance_status '
+            'ORDER BY a.date, s.grade_level, s.section, a.shift, a.attendance_status'
+        )
+    else:
+        sql = (
+            'SELECT a.teacher_id, st.id, st.full_name, st.email, a.date, a.shift, '
+            'a.attendance_status, a.check_in_time, a.check_out_time '
+            'FROM attendance_v1 a JOIN students st ON st.id = a.student_id '
+            'JOIN sections s ON s.teacher_id = a.teacher_id '
+            f'WHERE {" AND ".join(where)} '
+            'ORDER BY a.date, s.grade_level, s.section, a.shift, st.full_name'
+        )
+    statement = text(sql).bindparams(bindparam('teacher_ids', expanding=True))
+    params = {'teacher_ids': list(by_teacher), 'date_from': date_from, 'date_to': date_to,
+              'status': status, 'shift': shift}
+
+    with get_engine().connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(statement, params)
+        while True:
+            rows = result.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                section = by_teacher[row[0]]
+                if summary:
+                    yield {
+                        'grade_level': section.get('grade_level'), 'section': section.get('section'),
+                        'date': row[3], 'shift': row[4], 'attendance_status': row[5], 'count': row[6]
+                    }
+                else:
+                    yield {
+                        'grade_level': section.get('grade_level'), 'section': section.get('section'),
+                        'teacher_name': section.get('teacher_name'), 'student_id': row[1],
+                        'full_name': row[2], 'email': row[3], 'date': row[4], 'shift': row[5],
+                        'attendance_status': row[6], 'check_in_time': row[7], 'check_out_time': row[8]
+                    }
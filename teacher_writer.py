@@ -0,0 +1,469 @@
+"""
+Single writer for teacher databases
+
+Gunicorn runs several worker processes, and each one writing the same
+teacher database file contends on SQLite's lock. With TEACHER_WRITER_ADDRESS
+set, workers send the mutations of the hot paths (scans, manual status
+changes and auto-mark) to one writer process listening on that address and
+keep reading the databases directly. The writer runs one mutation at a time
+per teacher database; scans go through scan_batcher when SCAN_BATCH_MS is set
+in its environment, whose writer thread is then the only one for that
+database, and flush() commits its queue before other writes to a section.
+
+The address is an absolute Unix socket path (a local named pipe such as
+\\\\.\\pipe\\qr-attendance-writer on Windows), never a network address:
+requests are pickled, so whoever can connect can run code in the writer.
+Connections are authenticated with TEACHER_WRITER_AUTHKEY, which must be set
+to its own random value; neither end starts without it (check_config).
+Start the writer with tools/teacher_writer_daemon.py.
+If it can't be reached a worker logs it and writes locally, so attendance
+keeps working, only with the old contention.
+
+Per-operation throughput, lock wait and service time are kept by the writer
+and served by GET /api/admin/writer-stats.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Client, Listener
+
+import attendance_bitsets
+import attendance_counters
+import scan_batcher
+import scan_executor
+from db_manager import TeacherAttendance, TeacherStudent, get_teacher_db_session, upsert_daily_rollup
+
+TEACHER_WRITER_ADDRESS = os.environ.get('TEACHER_WRITER_ADDRESS', '')
+
+# Shared by the writer and the workers; no default (see check_config)
+TEACHER_WRITER_AUTHKEY = os.environ.get('TEACHER_WRITER_AUTHKEY', '')
+
+# Shortest TEACHER_WRITER_AUTHKEY accepted
+MIN_AUTHKEY_LENGTH = 32
+
+# Completed requests kept per operation for percentiles and rates
+STATS_WINDOW = 2048
+
+# Seconds of history the per-second rate is computed over
+RATE_SECONDS = 60
+
+
+class WriterUnavailable(Exception):
+    """The writer process could not be reached"""
+
+
+def enabled():
+    return bool(TEACHER_WRITER_ADDRESS)
+
+
+def check_config(address=None):
+    """
+    Refuse a writer address that isn't local, or a missing or reused
+    TEACHER_WRITER_AUTHKEY.
+
+    Raises:
+        ValueError: Saying what to change
+    """
+    address = address or TEACHER_WRITER_ADDRESS
+    if address.startswith('\\\\'):
+        if not address.startswith('\\\\.\\pipe\\'):
+            raise ValueError(f'The writer address must be a local named pipe (\\\\.\\pipe\\...), not {address}')
+    elif not os.path.isabs(address):
+        raise ValueError(f'The writer address must be an absolute Unix socket path, not {address}')
+    if len(TEACHER_WRITER_AUTHKEY) < MIN_AUTHKEY_LENGTH:
+        raise ValueError(f'Set TEACHER_WRITER_AUTHKEY to a random value of at least {MIN_AUTHKEY_LENGTH} characters, '
+                         'the same for the writer and the web workers')
+    if TEACHER_WRITER_AUTHKEY == os.environ.get('FLASK_SECRET_KEY'):
+        raise ValueError('TEACHER_WRITER_AUTHKEY must differ from FLASK_SECRET_KEY')
+
+
+def _authkey(address):
+    check_config(address)
+    return TEACHER_WRITER_AUTHKEY.encode('utf-8')
+
+
+# ==================== MUTATIONS ====================
+
+def _record_scan(teacher, settings, student_id, now, shift, on_saved=None):
+    if scan_batcher.enabled():
+        return scan_batcher.record_scan(teacher, settings, student_id, now, shift, on_saved)
+    return scan_executor.record_scan(teacher, settings, student_id, now, shift)
+
+
+def _set_status(db_name, student_id, date_str, shift, new_status):
+    """
+    Teacher-database half of a manual status change (the section summary in
+    the main database is the caller's).
+
+    Returns:
+        (student dict, previous status or None), or None if the student
+        isn't in this section
+    """
+    # Queued scans first, so they can't land on top of this change
+    scan_batcher.flush(db_name)
+    sess = get_teacher_db_session(db_name)()
+    try:
+        student = sess.query(TeacherStudent).get(student_id)
+        if not student:
+            return None
+
+        attendance = sess.query(TeacherAttendance).filter(
+            TeacherAttendance.student_id == student_id,
+            TeacherAttendance.date == date_str,
+            TeacherAttendance.shift == shift
+        ).first()
+        old_status = attendance.attendance_status if attendance else None
+
+        attendance_counters.record_status_change(sess, db_name, date_str, shift, old_status, new_status)
+        upsert_daily_rollup(sess, student_id, date_str, shift, new_status)
+        attendance_bitsets.update_bitset(sess, student_id, date_str, shift, new_status)
+
+        if not attendance:
+            sess.add(TeacherAttendance(
+                student_id=student_id,
+                status='manual',
+                attendance_status=new_status,
+                date=date_str,
+                shift=shift
+            ))
+        else:
+            attendance.attendance_status = new_status
+        sess.commit()
+
+        return {
+            'full_name': student.full_name,
+            'guardian_email': student.guardian_email,
+            'guardian_name': student.guardian_name
+        }, old_status
+    except Exception:
+        sess.rollback()
+        raise
+    finally:
+        sess.close()
+
+
+def _auto_mark(db_name, date_str, shifts):
+    """
+    Teacher-database half of auto-mark for one section (notifications and the
+    section summary are the caller's).
+
+    Args:
+        shifts: (shift, mark_absent, mark_cutting) for each shift whose
+            check-in or check-out deadline has passed
+
+    Returns:
+        List of (student dict, shift, previous status or None, new status)
+    """
+    # Queued check-ins first, so a student who scanned isn't marked ABSENT
+    scan_batcher.flush(db_name)
+    sess = get_teacher_db_session(db_name)()
+    try:
+        rows = {}
+        for attendance in sess.query(TeacherAttendance).filter(
+            TeacherAttendance.date == date_str
+        ).order_by(TeacherAttendance.id):
+            rows.setdefault((attendance.student_id, attendance.shift), attendance)
+
+        changes = []
+        for student in sess.query(TeacherStudent).all():
+            info = {
+                'full_name': student.full_name,
+                'guardian_email': student.guardian_email,
+                'guardian_name': student.guardian_name
+            }
+            for shift, mark_absent, mark_cutting in shifts:
+                attendance = rows.get((student.id, shift))
+                # ABSENT if the check-in deadline passed with no record for this shift
+                if mark_absent and attendance is None:
+                    sess.add(TeacherAttendance(
+                        student_id=student.id,
+                        status='absent',
+                        attendance_status='ABSENT',
+                        date=date_str,
+                        shift=shift
+                    ))
+                    old_status, new_status = None, 'ABSENT'
+                # CUTTING if checked in but not out by the check-out deadline; EXCUSED stays
+                elif (mark_cutting and attendance and attendance.check_in_time and not attendance.check_out_time
+                        and attendance.attendance_status not in ('CUTTING', 'EXCUSED')):
+                    old_status, new_status = attendance.attendance_status, 'CUTTING'
+                    attendance.attendance_status = new_status
+                else:
+                    continue
+                attendance_counters.record_status_change(sess, db_name, date_str, shift, old_status, new_status)
+                upsert_daily_rollup(sess, student.id, date_str, shift, new_status)
+                attendance_bitsets.update_bitset(sess, student.id, date_str, shift, new_status)
+                changes.append((info, shift, old_status, new_status))
+        sess.commit()
+        return changes
+    except Exception:
+        sess.rollback()
+        raise
+    finally:
+        sess.close()
+
+
+# ==================== CLIENT ====================
+
+_local = threading.local()
+
+
+def _connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _local.conn = Client(TEACHER_WRITER_ADDRESS, authkey=_authkey(TEACHER_WRITER_ADDRESS))
+    return conn
+
+
+def _drop_connection():
+    conn = getattr(_local, 'conn', None)
+    _local.conn = None
+    if conn is not None:
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+
+def _call(operation, *args):
+    """
+    Run an operation in the writer process.
+
+    Raises:
+        WriterUnavailable: It couldn't be sent (nothing was written)
+        Exception: Whatever the operation raised in the writer
+    """
+    # A connection broken by a writer restart fails on send; retry once on a new one
+    for attempt in range(2):
+        try:
+            conn = _connection()
+            conn.send((operation, args))
+            break
+        except (OSError, EOFError) as e:
+            _drop_connection()
+            if attempt:
+                raise WriterUnavailable(str(e))
+    try:
+        ok, value = conn.recv()
+    except (OSError, EOFError):
+        _drop_connection()
+        raise
+    if not ok:
+        raise value
+    return value
+
+
+def record_scan(teacher, settings, student_id, now, shift, on_saved=None):
+    """
+    scan_executor.record_scan, run by the writer process when there is one.
+    on_saved is passed on to a local scan_batcher.record_scan; the writer
+    process always answers once the scan is committed.
+    """
+    if enabled():
+        try:
+            outcome = _call('scan', teacher, settings, student_id, now, shift)
+        except WriterUnavailable as e:
+            print(f"✗ Teacher writer unavailable, writing locally: {e}")
+        else:
+            # The writer updated its own in-memory counters; mirror them here
+            if outcome is not None and outcome.status == 'check_in':
+                attendance_counters.apply_status_change(
+                    teacher.db_name, now.strftime('%Y-%m-%d'), shift, None, outcome.attendance_status
+                )
+            return outcome
+    return _record_scan(teacher, settings, student_id, now, shift, on_saved)
+
+
+def set_status(db_name, student_id, date_str, shift, new_status):
+    """Set a student's status for a shift; see _set_status"""
+    if enabled():
+        try:
+            result = _call('set_status', db_name, student_id, date_str, shift, new_status)
+        except WriterUnavailable as e:
+            print(f"✗ Teacher writer unavailable, writing locally: {e}")
+        else:
+            if result is not None:
+                attendance_counters.apply_status_change(db_name, date_str, shift, result[1], new_status)
+            return result
+    return _set_status(db_name, student_id, date_str, shift, new_status)
+
+
+def auto_mark(db_name, date_str, shifts):
+    """Auto-mark one section's students for a day; see _auto_mark"""
+    if enabled():
+        try:
+            changes = _call('auto_mark', db_name, date_str, shifts)
+        except WriterUnavailable as e:
+            print(f"✗ Teacher writer unavailable, writing locally: {e}")
+        else:
+            for _, shift, old_status, new_status in changes:
+                attendance_counters.apply_status_change(db_name, date_str, shift, old_status, new_status)
+            return changes
+    return _auto_mark(db_name, date_str, shifts)
+
+
+def flush(db_name):
+    """Commit the scans queued for a teacher database, in the writer process when there is one"""
+    if enabled():
+        try:
+            return _call('flush', db_name)
+        except WriterUnavailable as e:
+            print(f"✗ Teacher writer unavailable, flushing locally: {e}")
+    scan_batcher.flush(db_name)
+
+
+def get_stats():
+    """The writer's statistics (see _Stats.snapshot); raises WriterUnavailable if unreachable"""
+    return _call('stats')
+
+
+# ==================== SERVER ====================
+
+class _Stats:
+    """Counts and recent timings per operation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations = {}
+        self.started_at = time.time()
+        self.in_flight = 0
+
+    def begin(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def end(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def record(self, operation, wait, service, failed):
+        with self._lock:
+            entry = self._operations.setdefault(operation, {
+                'count': 0, 'errors': 0, 'recent': deque(maxlen=STATS_WINDOW)
+            })
+            entry['count'] += 1
+            entry['errors'] += failed
+            entry['recent'].append((time.monotonic(), wait, service))
+
+    def snapshot(self):
+        def percentile(values, fraction):
+            return round(values[min(len(values) - 1, int(len(values) * fraction))] * 1000, 3)
+
+        now = time.monotonic()
+        with self._lock:
+            operations = {}
+            for operation, entry in self._operations.items():
+                recent = list(entry['recent'])
+                waits = sorted(r[1] for r in recent)
+                services = sorted(r[2] for r in recent)
+                operations[operation] = {
+                    'count': entry['count'],
+                    'errors': entry['errors'],
+                    'per_second': round(sum(1 for r in recent if now - r[0] <= RATE_SECONDS) / RATE_SECONDS, 2),
+                    'wait_ms_p50': percentile(waits, 0.5),
+                    'wait_ms_p95': percentile(waits, 0.95),
+                    'service_ms_p50': percentile(services, 0.5),
+                    'service_ms_p95': percentile(services, 0.95),
+                }
+            return {
+                'uptime_seconds': round(time.time() - self.started_at),
+                'in_flight': self.in_flight,
+                'batching': scan_batcher.enabled(),
+                'operations': operations
+            }
+
+
+class _Server:
+    def __init__(self):
+        self.stats = _Stats()
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _db_lock(self, db_name):
+        with self._locks_lock:
+            lock = self._locks.get(db_name)
+            if lock is None:
+                lock = self._locks[db_name] = threading.Lock()
+            return lock
+
+    def handle(self, operation, args):
+        if operation == 'stats':
+            return self.stats.snapshot()
+        if operation == 'scan':
+            run, db_name = _record_scan, args[0].db_name
+            # The batcher serializes scans itself; holding the lock would stop batches forming
+            lock = None if scan_batcher.enabled() else self._db_lock(db_name)
+        elif operation == 'set_status':
+            run, lock = _set_status, self._db_lock(args[0])
+        elif operation == 'auto_mark':
+            run, lock = _auto_mark, self._db_lock(args[0])
+        elif operation == 'flush':
+            # Batches are already committed one at a time
+            run, lock = scan_batcher.flush, None
+        else:
+            raise ValueError(f'Unknown operation: {operation}')
+
+        queued_at = time.perf_counter()
+        failed = True
+        self.stats.begin()
+        try:
+            if lock is not None:
+                lock.acquire()
+            started_at = time.perf_counter()
+            try:
+                result = run(*args)
+                failed = False
+                return result
+            finally:
+                if lock is not None:
+                    lock.release()
+                self.stats.record(operation, started_at - queued_at, time.perf_counter() - started_at, failed)
+        finally:
+            self.stats.end()
+
+    def serve_connection(self, conn):
+        try:
+            while True:
+                try:
+                    operation, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = (True, self.handle(operation, args))
+                except Exception as e:
+                    reply = (False, e)
+                conn.send(reply)
+        finally:
+            conn.close()
+
+
+def serve(address=None):
+    """Run the writer until interrupted (see tools/teacher_writer_daemon.py)"""
+    address = address or TEACHER_WRITER_ADDRESS
+    if not address:
+        raise ValueError('No writer address: set TEACHER_WRITER_ADDRESS or pass one')
+    authkey = _authkey(address)
+    if not address.startswith('\\\\') and os.path.exists(address):
+        os.remove(address)  # Stale socket from a previous run
+
+    # The only process writing the teacher databases, so it may batch scans
+    scan_batcher.claim()
+    server = _Server()
+    listener = Listener(address, authkey=authkey)
+    if not address.startswith('\\\\'):
+        os.chmod(address, 0o600)  # This user's processes only
+    print(f"✓ Teacher writer listening on {address}")
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                # Failed handshake (wrong key) or a client that went away
+                print(f"✗ Rejected writer connection: {e}")
+                continue
+            threading.Thread(target=server.serve_connection, args=(conn,), daemon=True).start()
+    finally:
+        listener.close()
+        scan_batcher.flush_all()
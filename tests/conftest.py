@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the app's modules from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import attendance_counters
+import db_manager
+
+
+@pytest.fixture
+def section(tmp_path, monkeypatch):
+    """A v1 teacher database in a temporary instance directory, with students 1 and 2; yields its db_name"""
+    monkeypatch.setattr(db_manager, 'get_instance_dir', lambda: str(tmp_path))
+    db_name = db_manager.create_teacher_database(1, '11', 'Rizal')
+    sess = db_manager.get_teacher_db_session(db_name)()
+    for i in (1, 2):
+        sess.add(db_manager.TeacherStudent(id=i, full_name=f'S {i}', email=f's{i}@example.com', password_hash='x',
+                                           section='Rizal', grade_level='11', teacher_id=1))
+    sess.commit()
+    sess.close()
+    yield db_name
+    attendance_counters.forget_section(db_name)
+    db_manager.reset_teacher_db_session(db_name)
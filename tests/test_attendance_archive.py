@@ -0,0 +1,86 @@
+import os
+import stat
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+import attendance_archive
+from db_manager import (
+    TeacherAttendance,
+    get_archive_dir,
+    get_archived_through,
+    get_teacher_db_path,
+    get_teacher_db_session,
+    iter_history_rows,
+    reset_teacher_db_session
+)
+from db_schema_v2 import migrate_to_v2
+
+TODAY = date(2026, 3, 2)
+HISTORY_SQL = ('SELECT id, student_id, date, shift, attendance_status FROM {src}.attendance_v1 '
+               'WHERE date BETWEEN :date_from AND :date_to')
+
+
+def add_attendance(db_name, student_id, day, status):
+    at = datetime.combine(day, datetime.min.time()).replace(hour=7)
+    sess = get_teacher_db_session(db_name)()
+    sess.add(TeacherAttendance(student_id=student_id, timestamp=at, check_in_time=at, attendance_status=status,
+                               status='check_in', date=day.strftime('%Y-%m-%d'), shift='morning'))
+    sess.commit()
+    sess.close()
+
+
+def history(db_name):
+    return list(iter_history_rows(db_name, '2000-01-01', '2100-12-31', HISTORY_SQL, order_by='id'))
+
+
+def live_dates(db_name):
+    sess = get_teacher_db_session(db_name)()
+    try:
+        return [a.date for a in sess.query(TeacherAttendance).order_by(TeacherAttendance.id)]
+    finally:
+        sess.close()
+
+
+@pytest.mark.parametrize('compress, v2', [(False, False), (True, True)])
+def test_archive_round_trip(section, compress, v2):
+    current_start = attendance_archive.term_bounds(*attendance_archive.term_for(TODAY))[0]
+    closed = attendance_archive.term_for(current_start - timedelta(days=1))
+    closed_first, closed_last = attendance_archive.term_bounds(*closed)
+    add_attendance(section, 1, closed_first + timedelta(days=3), 'PRESENT')
+    add_attendance(section, 2, closed_last - timedelta(days=3), 'LATE')
+    add_attendance(section, 1, TODAY, 'PRESENT')
+    if v2:
+        reset_teacher_db_session(section)
+        migrate_to_v2(get_teacher_db_path(section))
+        reset_teacher_db_session(section)
+    before = history(section)
+    assert len(before) == 3
+
+    key = attendance_archive.term_key(*closed)
+    assert attendance_archive.closed_terms(section, TODAY) == [closed]
+    result = attendance_archive.archive_closed_terms(section, TODAY, compress=compress)
+    assert result == {'db_name': section, 'terms': [key], 'rows': 2}
+
+    # The closed term left the live database, and reads still see all of it
+    assert live_dates(section) == [TODAY.strftime('%Y-%m-%d')]
+    file_name = f'{key}.db.gz' if compress else f'{key}.db'
+    archive_path = os.path.join(get_archive_dir(section), file_name)
+    assert not os.stat(archive_path).st_mode & stat.S_IWUSR
+    assert history(section) == before
+    assert get_archived_through(section) == closed_last.strftime('%Y-%m-%d')
+    assert attendance_archive.closed_terms(section, TODAY) == []
+
+    # A row recorded late for the closed term is merged into its archive
+    add_attendance(section, 2, closed_first + timedelta(days=5), 'EXCUSED')
+    assert attendance_archive.archive_term(section, *closed, compress=compress) == 1
+    assert live_dates(section) == [TODAY.strftime('%Y-%m-%d')]
+    rows = history(section)
+    assert rows[:3] == before and rows[3][4] == 'EXCUSED'
+    sess = get_teacher_db_session(section)()
+    try:
+        assert sess.execute(text('SELECT row_count FROM attendance_archives WHERE term = :term'),
+                            {'term': key}).scalar() == 3
+    finally:
+        sess.close()
@@ -0,0 +1,85 @@
+import time
+from datetime import datetime
+
+import pytest
+
+import delta_sync
+from db_manager import TeacherAttendance, TeacherAttendanceDaily, get_teacher_db_session
+
+DAY = '2026-01-05'
+
+
+def at(clock):
+    return datetime.fromisoformat(f'{DAY}T{clock}')
+
+
+def pushed(student_id, status, check_in=None, check_out=None, changed_at=0):
+    return {
+        'student_id': student_id, 'date': DAY, 'shift': 'morning', 'attendance_status': status,
+        'status': 'check_out' if check_out else 'check_in', 'changed_at': changed_at,
+        'timestamp': check_in, 'check_in_time': check_in, 'check_out_time': check_out
+    }
+
+
+def rows(db_name):
+    sess = get_teacher_db_session(db_name)()
+    try:
+        return {a.student_id: a for a in sess.query(TeacherAttendance).filter(TeacherAttendance.date == DAY)}
+    finally:
+        sess.close()
+
+
+@pytest.fixture
+def checked_in(section):
+    """Student 1 checked in on the server at 07:10"""
+    sess = get_teacher_db_session(section)()
+    sess.add(TeacherAttendance(student_id=1, timestamp=at('07:10'), check_in_time=at('07:10'),
+                               attendance_status='PRESENT', status='check_in', date=DAY, shift='morning'))
+    sess.commit()
+    sess.close()
+    return section
+
+
+def merge(db_name, changes):
+    status_changes = []
+    result = delta_sync.merge_attendance(db_name, changes, lambda *change: status_changes.append(change))
+    return result, status_changes
+
+
+def test_times_merge_and_older_status_loses(checked_in):
+    # The desktop saw the student earlier and checked them out; its status is older than the server's
+    result, status_changes = merge(checked_in, [pushed(1, 'LATE', '2026-01-05T07:05:00', '2026-01-05T16:30:00')])
+    assert result == {'applied': 1, 'skipped': 0}
+    assert status_changes == []
+    row = rows(checked_in)[1]
+    assert (row.check_in_time, row.check_out_time) == (at('07:05'), at('16:30'))
+    assert (row.attendance_status, row.status) == ('PRESENT', 'check_out')
+
+    # Nothing earlier, later or newer: no change
+    result, _ = merge(checked_in, [pushed(1, 'LATE', '2026-01-05T07:20:00', '2026-01-05T16:00:00')])
+    assert result == {'applied': 0, 'skipped': 0}
+
+
+def test_newer_status_wins(checked_in):
+    result, status_changes = merge(checked_in, [pushed(1, 'EXCUSED', changed_at=time.time() + 3600)])
+    assert result == {'applied': 1, 'skipped': 0}
+    assert status_changes == [(DAY, 'morning', 'PRESENT', 'EXCUSED', 1)]
+    assert rows(checked_in)[1].attendance_status == 'EXCUSED'
+    sess = get_teacher_db_session(checked_in)()
+    try:
+        assert sess.get(TeacherAttendanceDaily, (1, DAY)).morning_status == 'EXCUSED'
+    finally:
+        sess.close()
+
+
+def test_new_rows_and_unknown_students(checked_in):
+    result, status_changes = merge(checked_in, [
+        pushed(2, 'LATE', '2026-01-05T08:30:00'),
+        pushed(99, 'PRESENT', '2026-01-05T07:00:00'),
+        # A second push of the same row in one batch is merged into the first
+        pushed(2, 'LATE', '2026-01-05T08:20:00'),
+    ])
+    assert result == {'applied': 2, 'skipped': 1}
+    assert status_changes == [(DAY, 'morning', None, 'LATE', 2)]
+    row = rows(checked_in)[2]
+    assert (row.check_in_time, row.attendance_status) == (at('08:20'), 'LATE')
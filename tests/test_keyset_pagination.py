@@ -0,0 +1,115 @@
+import base64
+from datetime import datetime
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, create_engine, func, insert, select
+
+import keyset_pagination
+from keyset_pagination import PagingError
+
+
+@pytest.mark.parametrize('values', [[12], ['Dela Cruz, Juan', 7], ['2026-01-05', 'morning', 3]])
+def test_cursor_round_trip(values):
+    cursor = keyset_pagination.encode_cursor(values)
+    assert '=' not in cursor
+    assert keyset_pagination.decode_cursor(cursor, len(values)) == values
+
+
+def test_no_cursor():
+    assert keyset_pagination.decode_cursor(None, 1) is None
+    assert keyset_pagination.decode_cursor('', 1) is None
+
+
+@pytest.mark.parametrize('cursor', [
+    'not a cursor!',
+    base64.urlsafe_b64encode(b'[1,').decode('ascii'),
+    base64.urlsafe_b64encode(b'{"id":1}').decode('ascii'),
+    keyset_pagination.encode_cursor([1, 2]),
+])
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(PagingError):
+        keyset_pagination.decode_cursor(cursor, 1)
+
+
+def test_parse_page_args():
+    assert keyset_pagination.parse_page_args({}) == (keyset_pagination.DEFAULT_PAGE_SIZE, None)
+    assert keyset_pagination.parse_page_args({'limit': '0'}) == (1, None)
+    assert keyset_pagination.parse_page_args({'limit': '100000'})[0] == keyset_pagination.MAX_PAGE_SIZE
+    cursor = keyset_pagination.encode_cursor(['a', 1])
+    assert keyset_pagination.parse_page_args({'cursor': cursor}, key_size=2)[1] == ['a', 1]
+    with pytest.raises(PagingError):
+        keyset_pagination.parse_page_args({'limit': 'ten'})
+
+
+def test_parse_fields():
+    available = ['id', 'name', 'email']
+    assert keyset_pagination.parse_fields(None, available, ['id']) == ['id']
+    assert keyset_pagination.parse_fields(' name , id,', available, ['id']) == ['name', 'id']
+    with pytest.raises(PagingError):
+        keyset_pagination.parse_fields('id,password', available, ['id'])
+
+
+@pytest.fixture
+def students():
+    engine = create_engine('sqlite://')
+    table = Table('students', MetaData(), Column('id', Integer, primary_key=True), Column('name', String))
+    table.metadata.create_all(engine)
+    names = ['Cruz', 'Abad', 'Cruz', 'Bautista', 'Abad', 'Santos', 'Cruz']
+    with engine.begin() as conn:
+        conn.execute(insert(table), [{'id': i + 1, 'name': name} for i, name in enumerate(names)])
+    return engine, table
+
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_pages_cover_every_row_once(students, descending):
+    engine, table = students
+    columns = [table.c.name, table.c.id]
+    order = [c.desc() if descending else c for c in columns]
+    with engine.connect() as conn:
+        expected = [tuple(r) for r in conn.execute(select(table.c.name, table.c.id).order_by(*order))]
+        seen, cursor = [], None
+        while True:
+            statement = select(table.c.name, table.c.id).order_by(*order)
+            values = keyset_pagination.decode_cursor(cursor, 2)
+            if values is not None:
+                statement = statement.where(keyset_pagination.after_key(columns, values, descending))
+            rows, cursor = keyset_pagination.finish_page(
+                [tuple(r) for r in conn.execute(statement.limit(4))], 3, lambda row: row)
+            seen.extend(rows)
+            if cursor is None:
+                break
+    assert seen == expected
+
+
+def test_null_keys_page_through_coalesce():
+    # Like /api/attendance: newest first, rows without a timestamp last
+    engine = create_engine('sqlite://')
+    table = Table('attendance', MetaData(), Column('id', Integer, primary_key=True), Column('timestamp', DateTime))
+    table.metadata.create_all(engine)
+    stamps = [datetime(2026, 1, 5, 7, 0), None, datetime(2026, 1, 5, 8, 0), None, datetime(2026, 1, 5, 7, 0), None]
+    with engine.begin() as conn:
+        conn.execute(insert(table), [{'id': i + 1, 'timestamp': t} for i, t in enumerate(stamps)])
+    unknown = datetime(1970, 1, 1)
+    sort_time = func.coalesce(table.c.timestamp, unknown)
+    with engine.connect() as conn:
+        seen, cursor = [], None
+        while True:
+            statement = select(table.c.id, table.c.timestamp).order_by(sort_time.desc(), table.c.id.desc())
+            values = keyset_pagination.decode_cursor(cursor, 2)
+            if values is not None:
+                after = [datetime.fromisoformat(values[0]), values[1]]
+                statement = statement.where(keyset_pagination.after_key([sort_time, table.c.id], after, True))
+            rows, cursor = keyset_pagination.finish_page(
+                [tuple(r) for r in conn.execute(statement.limit(3))], 2,
+                lambda row: ((row[1] or unknown).isoformat(), row[0]))
+            seen.extend(row[0] for row in rows)
+            if cursor is None:
+                break
+    assert seen == [3, 5, 1, 6, 4, 2]
+
+
+def test_finish_page():
+    assert keyset_pagination.finish_page([1, 2], 2, lambda row: [row]) == ([1, 2], None)
+    rows, cursor = keyset_pagination.finish_page([1, 2, 3], 2, lambda row: [row])
+    assert rows == [1, 2]
+    assert keyset_pagination.decode_cursor(cursor, 1) == [2]
@@ -0,0 +1,76 @@
+import pytest
+import qrcode
+
+import qr_payload
+from qr_payload import QRPayloadError
+
+
+def test_round_trip():
+    for student_id, teacher_id in [(0, 0), (1, 2), (123, 45), (36 ** 5 - 1, 36 ** 5 - 1)]:
+        data = qr_payload.encode(student_id, teacher_id)
+        assert qr_payload.is_signed(data)
+        assert qr_payload.decode(data) == (student_id, teacher_id)
+
+
+@pytest.mark.parametrize('student_id, teacher_id', [(36 ** 5 - 1, 36 ** 2 - 1), (36 ** 4 - 1, 36 ** 3 - 1)])
+def test_payload_fits_version_1_alphanumeric(student_id, teacher_id):
+    data = qr_payload.encode(student_id, teacher_id)
+    assert len(data) <= 25
+    assert set(data) <= set('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ.')
+
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L)
+    qr.add_data(data)
+    qr.make(fit=True)
+    assert qr.version == 1
+
+
+def test_lowercase_input_is_accepted():
+    data = qr_payload.encode(42, 7)
+    assert qr_payload.decode(data.lower()) == (42, 7)
+    assert qr_payload.decode(f'  {data}\n') == (42, 7)
+
+
+def test_tampered_signature_is_rejected():
+    data = qr_payload.encode(42, 7)
+    body, signature = data.rsplit('.', 1)
+    flipped = ('B' if signature[0] == 'A' else 'A') + signature[1:]
+    with pytest.raises(QRPayloadError):
+        qr_payload.decode(f'{body}.{flipped}')
+
+
+def test_tampered_ids_are_rejected():
+    signature = qr_payload.encode(42, 7).rsplit('.', 1)[1]
+    with pytest.raises(QRPayloadError):
+        qr_payload.decode(f'S1.{qr_payload._base36(43)}.7.{signature}')
+
+
+@pytest.mark.parametrize('data', ['', 'S1', 'S1.1.2', 'S2.1.2.AAAA', 'S1.1.2.3.4', 'STUDENT_1_2_a@b'])
+def test_malformed_payloads_are_rejected(data):
+    with pytest.raises(QRPayloadError):
+        qr_payload.decode(data)
+
+
+def test_precheck():
+    assert qr_payload.precheck(qr_payload.encode(1, 2))
+    assert qr_payload.precheck('STUDENT_1_2_a@b')
+    assert not qr_payload.precheck('https://example.com')
+
+
+def test_payload_version_must_match_storage():
+    files_code = qr_payload.encode(45, 2)
+    consolidated_code = qr_payload.encode(45, 2, qr_payload.CONSOLIDATED_VERSION)
+    assert consolidated_code.startswith('S2.')
+    assert qr_payload.is_signed(consolidated_code)
+    assert qr_payload.decode(files_code, qr_payload.PAYLOAD_VERSION) == (45, 2)
+    assert qr_payload.decode(consolidated_code, qr_payload.CONSOLIDATED_VERSION) == (45, 2)
+    # Same ids, but they name different students in the other layout
+    with pytest.raises(QRPayloadError):
+        qr_payload.decode(files_code, qr_payload.CONSOLIDATED_VERSION)
+    with pytest.raises(QRPayloadError):
+        qr_payload.decode(consolidated_code, qr_payload.PAYLOAD_VERSION)
+
+
+def test_version_is_covered_by_the_signature():
+    body, signature = qr_payload.encode(45, 2).split('.', 1)
+    with pytest.raises(QRPayloadError):
+        qr_payload.decode(f'S2.{signature}', qr_payload.CONSOLIDATED_VERSION)
@@ -0,0 +1,122 @@
+import threading
+from datetime import datetime, time
+from types import SimpleNamespace
+
+import pytest
+
+import attendance_counters
+import db_manager
+import scan_batcher
+from db_manager import TeacherAttendance, TeacherStudent
+from scan_executor import ScanTeacher
+
+NOW = datetime(2026, 1, 5, 7, 30)
+SETTINGS = SimpleNamespace(check_in_deadlines={'morning': time(8, 0)})
+
+
+@pytest.fixture
+def teacher(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_manager, 'get_instance_dir', lambda: str(tmp_path))
+    monkeypatch.setattr(scan_batcher, 'SCAN_BATCH_MS', 20)
+    monkeypatch.setattr(scan_batcher, 'SCAN_BATCH_DURABILITY', 'commit')
+    monkeypatch.setitem(scan_batcher._owner, 'pid', None)
+    db_name = db_manager.create_teacher_database(1, '11', 'Rizal')
+    sess = db_manager.get_teacher_db_session(db_name)()
+    for i in (1, 2):
+        sess.add(TeacherStudent(id=i, full_name=f'S {i}', email=f's{i}@example.com', password_hash='x',
+                                section='Rizal', grade_level='11', teacher_id=1))
+    sess.commit()
+    sess.close()
+    scan_batcher.claim()
+    yield ScanTeacher(1, db_name, '11', 'Rizal')
+    scan_batcher.flush_all()
+    attendance_counters.forget_section(db_name)
+    db_manager.reset_teacher_db_session(db_name)
+
+
+def attendance(db_name, student_id):
+    sess = db_manager.get_teacher_db_session(db_name)()
+    try:
+        return sess.query(TeacherAttendance).filter_by(student_id=student_id).all()
+    finally:
+        sess.close()
+
+
+def mark_absent(db_name, student_id):
+    sess = db_manager.get_teacher_db_session(db_name)()
+    sess.add(TeacherAttendance(student_id=student_id, status='manual', attendance_status='ABSENT',
+                               date='2026-01-05', shift='morning'))
+    sess.commit()
+    sess.close()
+
+
+def test_enabled_needs_claim(teacher, monkeypatch):
+    assert scan_batcher.enabled()
+    monkeypatch.setitem(scan_batcher._owner, 'pid', None)
+    assert not scan_batcher.enabled()
+    with pytest.raises(RuntimeError):
+        scan_batcher.check_process(False)
+    scan_batcher.check_process(True)
+
+
+def test_commit_durability_waits_for_the_row(teacher):
+    outcome = scan_batcher.record_scan(teacher, SETTINGS, 1, NOW, 'morning')
+    assert (outcome.status, outcome.attendance_status, outcome.pending) == ('check_in', 'PRESENT', False)
+    rows = attendance(teacher.db_name, 1)
+    assert len(rows) == 1 and rows[0].check_out_time is None
+
+    outcome = scan_batcher.record_scan(teacher, SETTINGS, 1, NOW.replace(hour=16), 'morning')
+    assert outcome.status == 'check_out'
+    assert attendance(teacher.db_name, 1)[0].check_out_time is not None
+    assert scan_batcher.record_scan(teacher, SETTINGS, 1, NOW.replace(hour=17), 'morning').status == 'completed'
+    assert scan_batcher.record_scan(teacher, SETTINGS, 99, NOW, 'morning') is None
+
+
+def test_check_out_decided_from_the_queue(teacher, monkeypatch):
+    monkeypatch.setattr(scan_batcher, 'SCAN_BATCH_MS', 60000)
+    monkeypatch.setattr(scan_batcher, 'SCAN_BATCH_DURABILITY', 'enqueue')
+    saved = []
+    first = scan_batcher.record_scan(teacher, SETTINGS, 1, NOW, 'morning', saved.append)
+    second = scan_batcher.record_scan(teacher, SETTINGS, 1, NOW.replace(hour=16), 'morning', saved.append)
+    assert (first.status, second.status) == ('check_in', 'check_out')
+    assert first.pending and second.pending
+    assert scan_batcher.record_scan(teacher, SETTINGS, 1, NOW.replace(hour=17), 'morning').status == 'completed'
+    assert saved == [] and attendance(teacher.db_name, 1) == []
+
+    scan_batcher.flush(teacher.db_name)
+    assert [outcome.status for outcome in saved] == ['check_in', 'check_out']
+    assert attendance(teacher.db_name, 1)[0].check_out_time is not None
+
+
+def test_skipped_check_in_is_not_reported_saved(teacher, monkeypatch):
+    monkeypatch.setattr(scan_batcher, 'SCAN_BATCH_MS', 60000)
+    monkeypatch.setattr(scan_batcher, 'SCAN_BATCH_DURABILITY', 'enqueue')
+    saved = []
+    assert scan_batcher.record_scan(teacher, SETTINGS, 1, NOW, 'morning', saved.append).pending
+    scan_batcher.record_scan(teacher, SETTINGS, 2, NOW, 'morning', saved.append)
+    mark_absent(teacher.db_name, 1)  # Auto-mark got there first
+
+    scan_batcher.flush(teacher.db_name)
+    assert [outcome.student['full_name'] for outcome in saved] == ['S 2']
+    assert [row.attendance_status for row in attendance(teacher.db_name, 1)] == ['ABSENT']
+
+
+def test_skipped_check_in_raises_in_commit_durability(teacher, monkeypatch):
+    monkeypatch.setattr(scan_batcher, 'SCAN_BATCH_MS', 60000)
+    errors = []
+
+    def scan():
+        try:
+            scan_batcher.record_scan(teacher, SETTINGS, 1, NOW, 'morning', errors.append)
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=scan)
+    thread.start()
+    writer = scan_batcher._get_writer(teacher.db_name)
+    while not writer.pending:
+        thread.join(0.01)
+    mark_absent(teacher.db_name, 1)
+    scan_batcher.flush(teacher.db_name)
+    thread.join()
+    assert len(errors) == 1 and isinstance(errors[0], RuntimeError)
@@ -0,0 +1,94 @@
+import json
+import threading
+import time
+
+import pytest
+
+import scan_dedup
+
+KEY = scan_dedup.scan_key(1, 2, '2026-01-05', 'morning')
+RESULT = {'status': 'check_in', 'student_name': 'S 0'}
+
+
+@pytest.fixture(autouse=True)
+def fresh_window(monkeypatch):
+    monkeypatch.setattr(scan_dedup, 'SCAN_DEDUP_SECONDS', 5.0)
+    monkeypatch.setattr(scan_dedup, 'SCAN_DEDUP_SHARED', False)
+    monkeypatch.setattr(scan_dedup, 'PENDING_WAIT_SECONDS', 1.0)
+    scan_dedup._entries.clear()
+    yield
+    scan_dedup._entries.clear()
+
+
+def begin(key=KEY):
+    return scan_dedup.begin(key, json.dumps, json.loads)
+
+
+def finish(result=RESULT, key=KEY):
+    scan_dedup.finish(key, result, json.dumps)
+
+
+def test_duplicate_gets_first_result():
+    assert begin() is None
+    finish()
+    assert begin() == RESULT
+    assert begin(scan_dedup.scan_key(1, 2, '2026-01-05', 'afternoon')) is None
+
+
+def test_abandon_releases_key():
+    assert begin() is None
+    scan_dedup.abandon(KEY)
+    assert begin() is None
+
+
+def test_window_expires(monkeypatch):
+    monkeypatch.setattr(scan_dedup, 'SCAN_DEDUP_SECONDS', 0.05)
+    assert begin() is None
+    finish()
+    assert begin() == RESULT
+    time.sleep(0.1)
+    assert begin() is None
+    assert list(scan_dedup._entries) == [KEY]
+
+
+def test_concurrent_duplicate_waits_for_owner():
+    assert begin() is None
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(begin()))
+    waiter.start()
+    time.sleep(0.05)
+    assert waiter.is_alive()
+    finish()
+    waiter.join(2)
+    assert results == [RESULT]
+
+
+def test_concurrent_duplicate_takes_over_abandoned_key():
+    assert begin() is None
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(begin()))
+    waiter.start()
+    time.sleep(0.05)
+    scan_dedup.abandon(KEY)
+    waiter.join(2)
+    assert results == [None]
+    finish()
+    assert begin() == RESULT
+
+
+def test_forget_student():
+    assert begin() is None
+    finish()
+    scan_dedup.forget_student(1, 2)
+    assert begin() is None
+
+
+def test_shared_window_spans_processes(monkeypatch, tmp_path):
+    monkeypatch.setenv('SCAN_DEDUP_DB', str(tmp_path / 'scan_dedup.db'))
+    monkeypatch.setattr(scan_dedup, 'SCAN_DEDUP_SHARED', True)
+    monkeypatch.setitem(scan_dedup._shared, 'path', None)
+    assert begin() is None
+    finish()
+    # Another worker has nothing in memory but finds the result on disk
+    scan_dedup._entries.clear()
+    assert begin() == RESULT
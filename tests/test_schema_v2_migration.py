@@ -0,0 +1,135 @@
+import os
+import runpy
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import db_schema_v2
+from db_manager import (
+    TeacherAttendance,
+    TeacherStudent,
+    get_teacher_db_path,
+    get_teacher_db_session,
+    get_teacher_schema_version,
+    reset_teacher_db_session
+)
+from db_schema_v2 import SCHEMA_V1, SCHEMA_V2, migrate_to_v2
+
+TOOL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools', 'migrate_teacher_db_v2.py')
+
+
+def add_attendance(db_name, rows):
+    sess = get_teacher_db_session(db_name)()
+    for student_id, date_str, shift, status, hour in rows:
+        at = datetime.fromisoformat(f'{date_str}T{hour:02d}:15:00')
+        sess.add(TeacherAttendance(student_id=student_id, timestamp=at, check_in_time=at, attendance_status=status,
+                                   status='check_in', date=date_str, shift=shift))
+    sess.commit()
+    sess.close()
+
+
+def snapshot(db_name):
+    """Students and attendance as the ORM reads them, whatever the schema"""
+    sess = get_teacher_db_session(db_name)()
+    try:
+        students = [(s.id, s.full_name, s.section, s.grade_level) for s in sess.query(TeacherStudent).order_by('id')]
+        attendance = [(a.id, a.student_id, a.date, a.shift, a.attendance_status, a.status, a.check_in_time)
+                      for a in sess.query(TeacherAttendance).order_by('id')]
+        return students, attendance
+    finally:
+        sess.close()
+
+
+@pytest.fixture
+def history(section):
+    add_attendance(section, [
+        (1, '2026-01-05', 'morning', 'PRESENT', 7),
+        (2, '2026-01-05', 'morning', 'LATE', 8),
+        (1, '2026-01-05', 'afternoon', 'PRESENT', 13),
+        (2, '2026-01-06', 'morning', 'ABSENT', 9),
+        (1, '2026-01-06', 'morning', 'EXCUSED', 7),
+    ])
+    return section
+
+
+def test_rows_read_the_same_after_migration(history):
+    before = snapshot(history)
+    reset_teacher_db_session(history)
+    result = migrate_to_v2(get_teacher_db_path(history), batch_size=2)
+    assert result == {'students': 2, 'attendance': 5, 'already_v2': False}
+
+    reset_teacher_db_session(history)
+    assert get_teacher_schema_version(history) == SCHEMA_V2
+    assert snapshot(history) == before
+
+    conn = sqlite3.connect(get_teacher_db_path(history))
+    try:
+        # Stored compact, read through the v1 view as before
+        assert conn.execute('SELECT date, shift, attendance_status FROM attendance WHERE id = 1').fetchone() == (
+            db_schema_v2.encode_day('2026-01-05'), 1, 1)
+        assert conn.execute('SELECT date, shift, attendance_status FROM attendance_v1 WHERE id = 1').fetchone() == (
+            '2026-01-05', 'morning', 'PRESENT')
+        assert conn.execute('SELECT COUNT(*) FROM attendance_v1_backup').fetchone()[0] == 5
+    finally:
+        conn.close()
+    assert migrate_to_v2(get_teacher_db_path(history))['already_v2']
+
+
+def test_writes_during_the_copy_are_carried_over(history, monkeypatch):
+    reset_teacher_db_session(history)
+    path = get_teacher_db_path(history)
+    verify_rows = db_schema_v2._verify_rows
+
+    def verify_then_write(conn, table, target, meta, ids=None):
+        verify_rows(conn, table, target, meta, ids)
+        if table == 'attendance' and ids is None:
+            # Bulk copy done, swap not yet: the app keeps writing through its own connection
+            other = sqlite3.connect(path)
+            with other:
+                other.execute("UPDATE students SET full_name = 'S 1 renamed' WHERE id = 1")
+                other.execute("UPDATE attendance SET attendance_status = 'CUTTING' WHERE id = 2")
+                other.execute('DELETE FROM attendance WHERE id = 4')
+                other.execute(
+                    "INSERT INTO attendance (id, student_id, timestamp, check_in_time, attendance_status, status, "
+                    "date, shift) VALUES (6, 2, '2026-01-06 13:05:00.000000', '2026-01-06 13:05:00.000000', "
+                    "'PRESENT', 'check_in', '2026-01-06', 'afternoon')"
+                )
+            other.close()
+
+    monkeypatch.setattr(db_schema_v2, '_verify_rows', verify_then_write)
+    result = migrate_to_v2(path, batch_size=2)
+    assert (result['students'], result['attendance']) == (2, 5)
+
+    reset_teacher_db_session(history)
+    students, attendance = snapshot(history)
+    assert students[0][1] == 'S 1 renamed'
+    assert [(a[0], a[4]) for a in attendance] == [(1, 'PRESENT'), (2, 'CUTTING'), (3, 'PRESENT'), (5, 'EXCUSED'),
+                                                  (6, 'PRESENT')]
+    assert attendance[-1][1:4] == (2, '2026-01-06', 'afternoon')
+
+
+def test_tool_converts_named_databases(history, monkeypatch):
+    before = snapshot(history)
+    monkeypatch.setattr('sys.argv', [TOOL, history, '--drop-backup'])
+    with pytest.raises(SystemExit) as exit_info:
+        runpy.run_path(TOOL, run_name='__main__')
+    assert exit_info.value.code == 0
+
+    reset_teacher_db_session(history)
+    assert get_teacher_schema_version(history) == SCHEMA_V2
+    assert snapshot(history) == before
+    conn = sqlite3.connect(get_teacher_db_path(history))
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+    assert 'attendance_v1_backup' not in tables
+
+
+def test_tool_reports_missing_database(section, monkeypatch):
+    monkeypatch.setattr('sys.argv', [TOOL, 'teacher_9_11_nowhere'])
+    with pytest.raises(SystemExit) as exit_info:
+        runpy.run_path(TOOL, run_name='__main__')
+    assert exit_info.value.code == 1
+    assert get_teacher_schema_version(section) == SCHEMA_V1
@@ -16,6 +16,8 @@ except ImportError as e:
     input("Press Enter to exit...")
     sys.exit(1)
 
+from qr_payload import precheck
+
 # Flask API endpoint
 API_URL = "http://localhost:5000/api/attendance/scan"
 # Scanner secret must match SCANNER_SECRET in server (default 'dev-scanner')
@@ -70,8 +72,12 @@ def scan_qr_webcam(camera_index=0):
             # Process QR code if detected
             if data:
                 current_time = time.time()
+                # Skip codes that aren't attendance codes (or fail their signature) without a request
+                if not precheck(data):
+                    cv2.putText(frame, "Not an attendance QR code", (10, 60),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
                 # Prevent duplicate scans
-                if data != last_scanned_qr or (current_time - last_scan_time) > scan_cooldown:
+                elif data != last_scanned_qr or (current_time - last_scan_time) > scan_cooldown:
                     last_scanned_qr = data
                     last_scan_time = current_time
                     
@@ -0,0 +1,57 @@
+"""
+Move attendance from closed terms into per-term archive databases.
+
+Each teacher database keeps only the current term; earlier terms go to
+dist/instance/archive/<db_name>/<school_year>-t<term>.db (see
+attendance_archive.py) and the live database is vacuumed.
+
+Run: python tools/archive_terms.py --all --compress
+     python tools/archive_terms.py teacher_2_12_rizal --as-of 2026-01-05
+"""
+import argparse
+import os
+import sys
+from datetime import date
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE)
+
+from db_manager import get_teacher_db_path, list_teacher_databases
+import attendance_archive
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive closed terms of teacher databases')
+    parser.add_argument('db_names', nargs='*', help='Teacher database names (without .db)')
+    parser.add_argument('--all', action='store_true', help='Archive every teacher database')
+    parser.add_argument('--compress', action='store_true', help='Gzip the archive files')
+    parser.add_argument('--as-of', help='Treat this date (YYYY-MM-DD) as today')
+    args = parser.parse_args()
+
+    db_names = [d['db_name'] for d in list_teacher_databases()] if args.all else args.db_names
+    if not db_names:
+        parser.error('give database names or --all')
+    today = date.fromisoformat(args.as_of) if args.as_of else None
+
+    failed = 0
+    for db_name in db_names:
+        path = get_teacher_db_path(db_name)
+        if not os.path.exists(path):
+            print(f'✗ {db_name}: not found')
+            failed += 1
+            continue
+        try:
+            before = os.path.getsize(path)
+            result = attendance_archive.archive_closed_terms(db_name, today=today, compress=args.compress)
+            after = os.path.getsize(path)
+            terms = ', '.join(result['terms']) or 'nothing to archive'
+            print(f"✓ {db_name}: {result['rows']} rows ({terms}; {before // 1024} KB -> {after // 1024} KB)")
+        except Exception as e:
+            print(f'✗ {db_name}: {e}')
+            failed += 1
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Back up the main database and every teacher database without stopping the app.
+
+Uses SQLite's online backup API in small page steps (see db_backup.py).
+Unchanged databases are hard-linked from the previous snapshot, and old
+snapshots are pruned to the retention policy.
+
+Run: python tools/backup_databases.py --publish
+     python tools/backup_databases.py --list
+"""
+import argparse
+import os
+import sys
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE)
+
+from app import get_main_db_path
+import db_backup
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Online backup of all attendance databases')
+    parser.add_argument('--publish', action='store_true', help='Publish the new snapshot for reporting exports')
+    parser.add_argument('--list', action='store_true', help='List snapshots and exit')
+    parser.add_argument('--keep-last', type=int, help=f'Recent snapshots to keep (default {db_backup.BACKUP_KEEP_LAST})')
+    parser.add_argument('--keep-daily', type=int, help=f'Days to keep one snapshot for (default {db_backup.BACKUP_KEEP_DAILY})')
+    args = parser.parse_args()
+
+    if args.list:
+        published = db_backup.get_reporting_snapshot()
+        for snapshot_id in db_backup.list_snapshots():
+            print(f"{snapshot_id}{'  (reporting)' if snapshot_id == published else ''}")
+        return
+
+    result = db_backup.run_backup(get_main_db_path(), publish=args.publish,
+                                  keep_last=args.keep_last, keep_daily=args.keep_daily)
+    if result is None:
+        print('✗ Another backup is already running')
+        sys.exit(1)
+    print(f"✓ Snapshot {result['snapshot']} in {db_backup.get_backup_dir()}: "
+          f"{result['copied']} copied ({result['pages']} pages), {result['linked']} unchanged")
+    if result['skipped']:
+        print(f"✗ Busy, kept from the previous snapshot or left out: {', '.join(result['skipped'])}")
+    if result['pruned']:
+        print(f"✓ Pruned {len(result['pruned'])} old snapshot(s)")
+
+
+if __name__ == '__main__':
+    main()
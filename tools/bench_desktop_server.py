@@ -0,0 +1,168 @@
+"""
+Compare request latency of the desktop build's embedded servers (desktop_server.py).
+
+Creates a throwaway teacher and section (see bench_scan.py) and, for each
+server backend, serves the app on a local port while scanner threads post
+scans at a steady rate and poller threads fetch the home page and the
+section's change feed the way the window's timers do. Reports requests per
+second and latency percentiles per request kind. Each server is warmed up
+with --warmup seconds of the same load first; without it whichever server
+runs first pays for the cold caches. The clients run in the same process as
+the server, so absolute numbers are pessimistic; compare the rows with each
+other. The teacher is removed afterwards.
+
+Run: python tools/bench_desktop_server.py
+     python tools/bench_desktop_server.py --backends waitress --threads 4,8,16 --scanners 8 --duration 20
+"""
+import argparse
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE)
+
+import requests
+
+import scan_batcher
+
+# One process, like the desktop app (see desktop_main.py)
+scan_batcher.claim()
+
+from app import SCANNER_SECRET, SectionDailySummary, app, db
+import attendance_counters
+import qr_payload
+import scan_dedup
+from bench_scan import create_section
+from db_manager import delete_teacher_database
+from desktop_server import BACKENDS, EmbeddedServer, waitress
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_load(base_url, teacher, student_ids, args, duration):
+    """Scanner and poller threads for duration seconds; returns {kind: [latency ms]}"""
+    latencies = {'scan': [], 'page': [], 'feed': []}
+    errors = []
+    stop = threading.Event()
+    headers = {'X-Scanner-Secret': SCANNER_SECRET}
+
+    def timed(kind, call):
+        start = time.perf_counter()
+        try:
+            response = call()
+            if response.status_code >= 500:
+                errors.append(f'{kind}: HTTP {response.status_code}')
+        except requests.RequestException as e:
+            errors.append(f'{kind}: {e}')
+            return
+        latencies[kind].append((time.perf_counter() - start) * 1000)
+
+    def scanner(ids):
+        http = requests.Session()
+        index = 0
+        while not stop.is_set():
+            qr_data = qr_payload.encode(ids[index % len(ids)], teacher.id)
+            timed('scan', lambda: http.post(base_url + '/api/attendance/scan', json={'qr_data': qr_data},
+                                            headers=headers))
+            index += 1
+            stop.wait(args.scan_interval / 1000)
+
+    def poller():
+        http = requests.Session()
+        feed_url = f'{base_url}/api/changes?db_name={teacher.db_name}&limit=50'
+        while not stop.is_set():
+            timed('page', lambda: http.get(base_url + '/'))
+            timed('feed', lambda: http.get(feed_url, headers=headers))
+            stop.wait(args.poll_interval / 1000)
+
+    workers = [threading.Thread(target=scanner, args=(student_ids[i::args.scanners],))
+               for i in range(args.scanners)]
+    workers += [threading.Thread(target=poller) for _ in range(args.pollers)]
+    for thread in workers:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in workers:
+        thread.join()
+    if errors:
+        print(f'  ✗ {len(errors)} failed requests, e.g. {errors[0]}')
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the desktop embedded server under scanner load')
+    parser.add_argument('--backends', default=','.join(BACKENDS), help='Backends to try (default waitress,werkzeug)')
+    parser.add_argument('--threads', default='8', help='waitress thread counts to try (default 8)')
+    parser.add_argument('--scanners', type=int, default=4, help='Concurrent scanner threads (default 4)')
+    parser.add_argument('--scan-interval', type=float, default=20, help='Pause between scans per scanner, ms (default 20)')
+    parser.add_argument('--pollers', type=int, default=2, help='Concurrent polling threads (default 2)')
+    parser.add_argument('--poll-interval', type=float, default=100, help='Pause between polls, ms (default 100)')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per configuration (default 10)')
+    parser.add_argument('--warmup', type=float, default=3, help='Unmeasured seconds before each run (default 3)')
+    parser.add_argument('--students', type=int, default=400, help='Students in the section (default 400)')
+    args = parser.parse_args()
+
+    configs = []
+    for backend in [b for b in args.backends.split(',') if b]:
+        if backend not in BACKENDS:
+            parser.error(f'unknown backend {backend}')
+        if backend == 'waitress' and waitress is None:
+            print('✗ waitress is not installed, skipped (pip install waitress)')
+            continue
+        if backend == 'waitress':
+            configs += [(f'waitress/{n}', backend, int(n)) for n in args.threads.split(',') if n]
+        else:
+            configs.append(('werkzeug', backend, None))
+
+    # Werkzeug logs every request to the console; that would be measured too
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    saved_dedup = scan_dedup.SCAN_DEDUP_SECONDS
+    with app.app_context():
+        teacher = create_section(args.students, 0)
+        db_name = teacher.db_name
+        try:
+            # Every scan should reach the database
+            scan_dedup.SCAN_DEDUP_SECONDS = 0
+            student_ids = list(range(1, args.students + 1))
+            print(f'{args.scanners} scanners every {args.scan_interval:g} ms, {args.pollers} pollers every '
+                  f'{args.poll_interval:g} ms, {args.duration:g}s per run')
+            print(f"{'server':<14}{'request':<8}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+            for name, backend, threads in configs:
+                port = free_port()
+                server = EmbeddedServer(app, host='127.0.0.1', port=port, threads=threads, backend=backend)
+                server.start()
+                try:
+                    run_load(f'http://127.0.0.1:{port}', teacher, student_ids, args, args.warmup)
+                    latencies = run_load(f'http://127.0.0.1:{port}', teacher, student_ids, args, args.duration)
+                finally:
+                    server.stop()
+                for kind, values in latencies.items():
+                    if not values:
+                        continue
+                    print(f'{name:<14}{kind:<8}{len(values) / args.duration:>8.0f}{percentile(values, 0.5):>9.1f}'
+                          f'{percentile(values, 0.95):>9.1f}{percentile(values, 0.99):>9.1f}{max(values):>9.1f}')
+        finally:
+            scan_dedup.SCAN_DEDUP_SECONDS = saved_dedup
+            scan_batcher.flush_all()
+            SectionDailySummary.query.filter_by(teacher_id=teacher.id).delete()
+            db.session.delete(teacher)
+            db.session.commit()
+            attendance_counters.forget_section(db_name)
+            delete_teacher_database(db_name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Measure per-scan latency of POST /api/attendance/scan, ORM path vs fast path.
+
+Creates a throwaway teacher and section in the configured databases, gives
+every student some days of past attendance, then sends each student's
+check-in and check-out scan through the Flask test client, once with the
+ORM path (SCAN_FAST_PATH=0) and once with scan_executor. The teacher, its
+database and its section summaries are removed afterwards.
+
+Run: python tools/bench_scan.py
+     python tools/bench_scan.py --students 500 --history 120 --v2
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE)
+
+from app import SCANNER_SECRET, SectionDailySummary, Teacher, app, db
+import attendance_counters
+import scan_executor
+from db_manager import (
+    TeacherAttendance,
+    TeacherStudent,
+    create_teacher_database,
+    delete_teacher_database,
+    get_philippine_time,
+    get_teacher_db_path,
+    get_teacher_db_session,
+    reset_teacher_db_session
+)
+from db_schema_v2 import migrate_to_v2
+
+
+def create_section(students, history):
+    """Create the bench teacher and database; returns the Teacher"""
+    teacher = Teacher(
+        full_name='Scan Benchmark',
+        email=f'bench-scan-{os.getpid()}@teacher',
+        password_hash='x',
+        section=f'Bench {os.getpid()}',
+        grade_level='12'
+    )
+    db.session.add(teacher)
+    db.session.commit()
+    teacher.db_name = create_teacher_database(teacher.id, teacher.grade_level, teacher.section)
+    db.session.commit()
+
+    sess = get_teacher_db_session(teacher.db_name)()
+    try:
+        created = get_philippine_time()
+        sess.bulk_insert_mappings(TeacherStudent, [{
+            'id': i,
+            'full_name': f'Student {i:05d}',
+            'email': f'bench-scan-{i}@example.com',
+            'password_hash': 'x',
+            'grade_level': teacher.grade_level,
+            'section': teacher.section,
+            'teacher_id': teacher.id,
+            'created_at': created
+        } for i in range(1, students + 1)])
+        today = created.date()
+        rows = []
+        for days_ago in range(1, history + 1):
+            day = today - timedelta(days=days_ago)
+            stamp = created - timedelta(days=days_ago)
+            for student_id in range(1, students + 1):
+                for shift in ('morning', 'afternoon'):
+                    rows.append({
+                        'student_id': student_id,
+                        'timestamp': stamp,
+                        'check_in_time': stamp,
+                        'check_out_time': stamp,
+                        'attendance_status': 'PRESENT',
+                        'status': 'check_out',
+                        'date': day.strftime('%Y-%m-%d'),
+                        'shift': shift
+                    })
+        sess.bulk_insert_mappings(TeacherAttendance, rows)
+        sess.commit()
+    finally:
+        sess.close()
+    return teacher
+
+
+def run_scans(client, teacher, student_ids):
+    """Check every student in, then out; returns (check-in times, check-out times) in ms"""
+    headers = {'X-Scanner-Secret': SCANNER_SECRET}
+    timings = {'check_in': [], 'check_out': []}
+    for expected in ('check_in', 'check_out'):
+        for student_id in student_ids:
+            qr_data = f'STUDENT_{student_id}_{teacher.id}_bench-scan-{student_id}@example.com'
+            start = time.perf_counter()
+            response = client.post('/api/attendance/scan', json={'qr_data': qr_data}, headers=headers)
+            elapsed = (time.perf_counter() - start) * 1000
+            body = response.get_json()
+            if response.status_code != 201 or body.get('status') != expected:
+                raise RuntimeError(f'Unexpected scan result for student {student_id}: {body}')
+            timings[expected].append(elapsed)
+    return timings['check_in'], timings['check_out']
+
+
+def describe(times):
+    times = sorted(times)
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    return f'{statistics.median(times):>10.2f}{p95:>10.2f}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the attendance scan endpoint')
+    parser.add_argument('--students', type=int, default=300, help='Students scanned per path (default 300)')
+    parser.add_argument('--history', type=int, default=60, help='Days of past attendance per student (default 60)')
+    parser.add_argument('--v2', action='store_true', help='Convert the section database to the v2 schema first')
+    args = parser.parse_args()
+
+    with app.app_context():
+        teacher = create_section(args.students * 2, args.history)
+        db_name = teacher.db_name
+        try:
+            if args.v2:
+                reset_teacher_db_session(db_name)
+                migrate_to_v2(get_teacher_db_path(db_name), drop_backup=True)
+
+            client = app.test_client()
+            half = args.students
+            print(f"{args.students} students per path, {args.history} days of history, "
+                  f"schema {'v2' if args.v2 else 'v1'}; latency in ms")
+            print(f"{'path':<8}{'in p50':>10}{'in p95':>10}{'out p50':>10}{'out p95':>10}")
+            fast_path = scan_executor.SCAN_FAST_PATH
+            try:
+                for name, fast, ids in (('orm', False, range(1, half + 1)),
+                                        ('fast', True, range(half + 1, 2 * half + 1))):
+                    scan_executor.SCAN_FAST_PATH = fast
+                    check_ins, check_outs = run_scans(client, teacher, list(ids))
+                    print(f'{name:<8}{describe(check_ins)}{describe(check_outs)}')
+            finally:
+                scan_executor.SCAN_FAST_PATH = fast_path
+        finally:
+            SectionDailySummary.query.filter_by(teacher_id=teacher.id).delete()
+            db.session.delete(teacher)
+            db.session.commit()
+            attendance_counters.forget_section(db_name)
+            delete_teacher_database(db_name)
+
+
+if __name__ == '__main__':
+    main()
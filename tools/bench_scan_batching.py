@@ -0,0 +1,115 @@
+"""
+Measure scan throughput with and without group commit (scan_batcher.py).
+
+Creates a throwaway teacher and section (see bench_scan.py), then for each
+configuration sends check-in scans for a fresh slice of students from
+several threads at once and reports scans per second. Rows are counted
+after each run to check nothing queued was lost. The teacher is removed
+afterwards.
+
+Run: python tools/bench_scan_batching.py
+     python tools/bench_scan_batching.py --threads 16 --batch-sizes 1,16,64 --durability commit
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE)
+
+import scan_batcher
+
+# The only process writing the throwaway section, so it may batch
+scan_batcher.claim()
+
+from app import SCANNER_SECRET, SectionDailySummary, app, db
+import attendance_counters
+import scan_dedup
+from bench_scan import create_section
+from db_manager import TeacherAttendance, delete_teacher_database, get_philippine_time, get_teacher_db_session
+
+
+def run_check_ins(teacher, student_ids, threads):
+    """Check the students in from several threads; returns elapsed seconds"""
+    headers = {'X-Scanner-Secret': SCANNER_SECRET}
+    failures = []
+
+    def worker(ids):
+        client = app.test_client()
+        for student_id in ids:
+            qr_data = f'STUDENT_{student_id}_{teacher.id}_bench-scan-{student_id}@example.com'
+            response = client.post('/api/attendance/scan', json={'qr_data': qr_data}, headers=headers)
+            if response.status_code != 201 or response.get_json().get('status') != 'check_in':
+                failures.append((student_id, response.get_json()))
+
+    workers = [threading.Thread(target=worker, args=(student_ids[i::threads],)) for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    scan_batcher.flush_all()
+    elapsed = time.perf_counter() - start
+    if failures:
+        raise RuntimeError(f'{len(failures)} scans failed, e.g. {failures[0]}')
+    return elapsed
+
+
+def count_check_ins(db_name, student_ids):
+    sess = get_teacher_db_session(db_name)()
+    try:
+        today = get_philippine_time().strftime('%Y-%m-%d')
+        return sess.query(TeacherAttendance).filter(
+            TeacherAttendance.student_id.in_(student_ids),
+            TeacherAttendance.date == today
+        ).count()
+    finally:
+        sess.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark scan throughput with group commit')
+    parser.add_argument('--students', type=int, default=400, help='Scans per configuration (default 400)')
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent scanning threads (default 8)')
+    parser.add_argument('--batch-sizes', default='1,8,32,128', help='SCAN_BATCH_SIZE values to try (default 1,8,32,128)')
+    parser.add_argument('--batch-ms', type=float, default=5, help='SCAN_BATCH_MS for the batched runs (default 5)')
+    parser.add_argument('--durability', choices=scan_batcher.DURABILITY_MODES, default=scan_batcher.SCAN_BATCH_DURABILITY)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.batch_sizes.split(',') if size]
+    configs = [('off', 0, 1)] + [(f'batch {size}', args.batch_ms, size) for size in sizes]
+
+    saved = (scan_batcher.SCAN_BATCH_MS, scan_batcher.SCAN_BATCH_SIZE,
+             scan_batcher.SCAN_BATCH_DURABILITY, scan_dedup.SCAN_DEDUP_SECONDS)
+    with app.app_context():
+        teacher = create_section(args.students * len(configs), 0)
+        db_name = teacher.db_name
+        try:
+            scan_batcher.SCAN_BATCH_DURABILITY = args.durability
+            scan_dedup.SCAN_DEDUP_SECONDS = 0
+            print(f'{args.students} check-ins per run, {args.threads} threads, '
+                  f'durability {args.durability}, batch window {args.batch_ms:g} ms')
+            print(f"{'mode':<12}{'seconds':>10}{'scans/s':>10}")
+            for index, (name, batch_ms, batch_size) in enumerate(configs):
+                scan_batcher.SCAN_BATCH_MS = batch_ms
+                scan_batcher.SCAN_BATCH_SIZE = batch_size
+                ids = list(range(index * args.students + 1, (index + 1) * args.students + 1))
+                elapsed = run_check_ins(teacher, ids, args.threads)
+                saved_rows = count_check_ins(db_name, ids)
+                mark = '✓' if saved_rows == len(ids) else f'✗ {saved_rows}/{len(ids)} saved'
+                print(f'{name:<12}{elapsed:>10.2f}{len(ids) / elapsed:>10.0f}  {mark}')
+        finally:
+            (scan_batcher.SCAN_BATCH_MS, scan_batcher.SCAN_BATCH_SIZE,
+             scan_batcher.SCAN_BATCH_DURABILITY, scan_dedup.SCAN_DEDUP_SECONDS) = saved
+            scan_batcher.flush_all()
+            SectionDailySummary.query.filter_by(teacher_id=teacher.id).delete()
+            db.session.delete(teacher)
+            db.session.commit()
+            attendance_counters.forget_section(db_name)
+            delete_teacher_database(db_name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Compare the ways of building a student listing from a teacher database.
+
+Creates a throwaway teacher database with one section of students, then
+times building the /api/students rows (every column) and serialising them
+to JSON through:
+
+- orm:           session.query(TeacherStudent), one object per row
+- core:          select() of labelled columns (schema-adaptive types)
+- teacher_reads: the plain-tuple read path the endpoints use
+
+Reports the median time and the peak memory allocated while building one
+listing. The database is deleted afterwards.
+
+Run: python tools/bench_student_listing.py
+     python tools/bench_student_listing.py --students 5000 --v2
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE)
+
+from sqlalchemy import select
+
+import teacher_reads
+from db_manager import (
+    TeacherStudent,
+    delete_teacher_database,
+    get_philippine_time,
+    get_teacher_db_path,
+    get_teacher_db_session,
+    reset_teacher_db_session
+)
+from db_schema_v2 import migrate_to_v2
+
+FIELDS = ['id', 'name', 'email', 'section', 'grade_level', 'teacher_id', 'created_at']
+
+COLUMNS = {
+    'id': TeacherStudent.id,
+    'name': TeacherStudent.full_name,
+    'email': TeacherStudent.email,
+    'section': TeacherStudent.section,
+    'grade_level': TeacherStudent.grade_level,
+    'teacher_id': TeacherStudent.teacher_id,
+    'created_at': TeacherStudent.created_at
+}
+
+
+def _format(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def build_orm(db_name):
+    sess = get_teacher_db_session(db_name)()
+    try:
+        return [{
+            'id': s.id,
+            'name': s.full_name,
+            'email': s.email,
+            'section': s.section,
+            'grade_level': s.grade_level,
+            'teacher_id': s.teacher_id,
+            'created_at': _format(s.created_at)
+        } for s in sess.query(TeacherStudent).order_by(TeacherStudent.id)]
+    finally:
+        sess.close()
+
+
+def build_core(db_name):
+    sess = get_teacher_db_session(db_name)()
+    try:
+        statement = select(*[COLUMNS[f].label(f) for f in FIELDS]).order_by(TeacherStudent.id)
+        return [{key: _format(value) for key, value in row._mapping.items()} for row in sess.execute(statement)]
+    finally:
+        sess.close()
+
+
+def build_teacher_reads(db_name):
+    return teacher_reads.list_students(db_name, FIELDS)
+
+
+def create_section(db_name, count):
+    Session = get_teacher_db_session(db_name)
+    sess = Session()
+    try:
+        now = get_philippine_time()
+        sess.bulk_insert_mappings(TeacherStudent, [{
+            'full_name': f'Student {i:05d}',
+            'email': f'bench{i}@example.com',
+            'password_hash': 'x',
+            'grade_level': '12',
+            'section': 'Bench',
+            'teacher_id': 1,
+            'guardian_name': f'Guardian {i}',
+            'created_at': now
+        } for i in range(count)])
+        sess.commit()
+    finally:
+        sess.close()
+
+
+def measure(build, db_name, runs):
+    build(db_name)  # Warm caches and the connection pool
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        json.dumps(build(db_name))
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    json.dumps(build(db_name))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark student listing read paths')
+    parser.add_argument('--students', type=int, default=2000, help='Students in the section (default 2000)')
+    parser.add_argument('--runs', type=int, default=30, help='Timed runs per path (default 30)')
+    parser.add_argument('--v2', action='store_true', help='Convert the database to the v2 schema first')
+    args = parser.parse_args()
+
+    db_name = f'bench_listing_{os.getpid()}'
+    try:
+        create_section(db_name, args.students)
+        if args.v2:
+            reset_teacher_db_session(db_name)
+            migrate_to_v2(get_teacher_db_path(db_name), drop_backup=True)
+
+        reference = build_orm(db_name)
+        print(f"{args.students} students, schema {'v2' if args.v2 else 'v1'}, median of {args.runs} runs")
+        print(f"{'path':<15}{'median ms':>12}{'peak KiB':>12}")
+        for name, build in (('orm', build_orm), ('core', build_core), ('teacher_reads', build_teacher_reads)):
+            if build(db_name) != reference:
+                print(f'✗ {name}: rows differ from the ORM listing')
+                continue
+            median, peak = measure(build, db_name, args.runs)
+            print(f'{name:<15}{median * 1000:>12.2f}{peak / 1024:>12.0f}')
+    finally:
+        delete_teacher_database(db_name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Export attendance from every teacher database as CSV or JSON Lines.
+
+Rows are streamed straight to the output file, so exporting a whole school
+year uses no more memory than exporting a day.
+
+Run: python tools/export_attendance.py --from 2025-06-01 --to 2026-03-31 --format csv -o attendance.csv
+"""
+import argparse
+import os
+import sys
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE)
+
+from app import app, get_report_sections, get_philippine_time
+import attendance_export
+
+
+def main():
+    today_str = get_philippine_time().date().strftime('%Y-%m-%d')
+
+    parser = argparse.ArgumentParser(description='Stream attendance records to CSV or JSON Lines')
+    parser.add_argument('--from', dest='date_from', default=today_str, help='First date (YYYY-MM-DD, default today)')
+    parser.add_argument('--to', dest='date_to', help='Last date (YYYY-MM-DD, default same as --from)')
+    parser.add_argument('--grade', help='Only export this grade level (11 or 12)')
+    parser.add_argument('--section', help='Only export this section')
+    parser.add_argument('--format', choices=sorted(attendance_export.EXPORT_FORMATS), default='csv')
+    parser.add_argument('--snapshot', action='store_true',
+                        help='Read the published reporting snapshot instead of the live databases')
+    parser.add_argument('-o', '--output', help='Output file (default stdout)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        sections = get_report_sections(args.grade, args.section)
+
+    rows = attendance_export.iter_attendance(sections, args.date_from, args.date_to or args.date_from,
+                                             snapshot=args.snapshot)
+
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for chunk in attendance_export.iter_export(rows, args.format):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+            print(f'Export written to {args.output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
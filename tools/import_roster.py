@@ -0,0 +1,66 @@
+"""
+Import students from a CSV roster.
+
+Columns: full_name, email, grade_level, section, and optionally password,
+guardian_name, guardian_email, guardian_phone. Students without a password
+get a one-time set-password token (see POST /api/student/set-password).
+
+Run: python tools/import_roster.py roster.csv --dry-run
+     python tools/import_roster.py roster.csv --skip-invalid --tokens-out tokens.csv
+"""
+import argparse
+import csv
+import os
+import sys
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE)
+
+from app import app, run_roster_import
+import roster_import
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk-create students from a CSV roster')
+    parser.add_argument('roster', help='Roster CSV file')
+    parser.add_argument('--dry-run', action='store_true', help='Validate only, create nothing')
+    parser.add_argument('--skip-invalid', action='store_true', help='Import the valid rows even if some are invalid')
+    parser.add_argument('--tokens-out', help='Write set-password tokens to this CSV (default stdout)')
+    args = parser.parse_args()
+
+    with open(args.roster, encoding='utf-8-sig') as f:
+        text = f.read()
+
+    with app.app_context():
+        try:
+            result = run_roster_import(text, dry_run=args.dry_run, skip_invalid=args.skip_invalid)
+        except roster_import.RosterError as e:
+            print(f'✗ {e}', file=sys.stderr)
+            for error in e.errors:
+                print(f"  line {error['line']} ({error['email']}): {error['error']}", file=sys.stderr)
+            sys.exit(1)
+
+    for error in result['errors']:
+        print(f"✗ line {error['line']} ({error['email']}): {error['error']}", file=sys.stderr)
+
+    if args.dry_run:
+        print(f"✓ {result['valid']} of {result['rows']} rows are valid", file=sys.stderr)
+        return
+
+    if result['tokens']:
+        out = open(args.tokens_out, 'w', newline='', encoding='utf-8') if args.tokens_out else sys.stdout
+        try:
+            writer = csv.DictWriter(out, fieldnames=['email', 'token'])
+            writer.writeheader()
+            writer.writerows(result['tokens'])
+        finally:
+            if args.tokens_out:
+                out.close()
+
+    print(f"✓ Imported {result['created']} of {result['rows']} students; rendering QR codes...", file=sys.stderr)
+    roster_import.wait_for_qr_generation()
+    print('✓ Done', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Convert teacher databases to the compact v2 schema (see db_schema_v2.py).
+
+Safe to run while the app is serving scans: rows are copied in small
+batches and the tables are swapped in one short exclusive transaction.
+The v1 tables are kept as *_v1_backup unless --drop-backup is given.
+
+Run: python tools/migrate_teacher_db_v2.py --all
+     python tools/migrate_teacher_db_v2.py teacher_2_12_rizal --drop-backup
+"""
+import argparse
+import os
+import sys
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE)
+
+from db_manager import (
+    get_teacher_db_path,
+    get_teacher_db_session,
+    list_teacher_databases,
+    reset_teacher_db_session
+)
+from db_schema_v2 import migrate_to_v2
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert teacher databases to the v2 schema')
+    parser.add_argument('db_names', nargs='*', help='Teacher database names (without .db)')
+    parser.add_argument('--all', action='store_true', help='Convert every teacher database')
+    parser.add_argument('--drop-backup', action='store_true', help='Drop the v1 tables and VACUUM afterwards')
+    args = parser.parse_args()
+
+    db_names = [d['db_name'] for d in list_teacher_databases()] if args.all else args.db_names
+    if not db_names:
+        parser.error('give database names or --all')
+
+    failed = 0
+    for db_name in db_names:
+        path = get_teacher_db_path(db_name)
+        if not os.path.exists(path):
+            print(f'✗ {db_name}: not found')
+            failed += 1
+            continue
+        try:
+            # Bring v1 databases up to date (missing columns, views) before copying
+            get_teacher_db_session(db_name)
+            reset_teacher_db_session(db_name)
+            before = os.path.getsize(path)
+            result = migrate_to_v2(path, drop_backup=args.drop_backup)
+            if result['already_v2']:
+                print(f'✓ {db_name}: already v2')
+                continue
+            after = os.path.getsize(path)
+            print(f"✓ {db_name}: {result['students']} students, {result['attendance']} attendance rows "
+                  f"({before // 1024} KB -> {after // 1024} KB)")
+        except Exception as e:
+            print(f'✗ {db_name}: {e}')
+            failed += 1
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Copy per-teacher database files into consolidated storage (see teacher_storage.py).
+
+Run with the environment the app will use, TEACHER_STORAGE=consolidated
+included. Each section file in the instance directory that a teacher owns is
+copied: its students, then their attendance, then the daily rollups and
+bitsets are rebuilt. Files are read, never changed beyond the views the app
+also creates, so the files build keeps working if you switch back.
+
+Students get new ids in the shared table, so codes printed before the move
+must not be honoured: in consolidated storage signed codes are issued as
+payload version S2 and S1 codes are refused, as are legacy STUDENT_ codes
+(see qr_payload.py). Stored codes are left empty to be drawn again on next
+view, and sections need their codes reprinted. Term archives are not
+copied. A section that already has students in consolidated storage is
+skipped.
+
+Run: TEACHER_STORAGE=consolidated python tools/migrate_to_consolidated.py --all
+     TEACHER_STORAGE=consolidated python tools/migrate_to_consolidated.py teacher_2_12_rizal
+"""
+import argparse
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE)
+
+from sqlalchemy import func, select
+
+import attendance_bitsets
+import teacher_storage
+from app import Teacher, app
+from db_manager import (
+    TeacherAttendance,
+    TeacherStudent,
+    consolidated_storage,
+    create_teacher_database,
+    get_instance_dir,
+    get_section_teacher_id,
+    get_teacher_db_path,
+    rebuild_daily_rollups
+)
+from db_schema_v2 import SCHEMA_V1, SCHEMA_V2, V1_ATTENDANCE_COLUMNS, V1_STUDENT_COLUMNS, read_schema_meta, v1_view_ddl
+
+# Attendance rows inserted per statement
+COPY_BATCH_SIZE = 1000
+
+
+def _datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def section_files():
+    instance_dir = get_instance_dir()
+    return sorted(name[:-3] for name in os.listdir(instance_dir)
+                  if name.startswith('teacher_') and name.endswith('.db'))
+
+
+def open_section_file(db_name):
+    """Connection to a section file with its v1 views in place"""
+    conn = sqlite3.connect(get_teacher_db_path(db_name), timeout=30)
+    meta = read_schema_meta(conn)
+    version = SCHEMA_V2 if meta.get('schema_version') == str(SCHEMA_V2) else SCHEMA_V1
+    for statement in v1_view_ddl(version):
+        conn.execute(statement)
+    conn.commit()
+    return conn
+
+
+def copy_section(db_name, teacher):
+    """Copy one section file; returns (students, attendance rows)"""
+    engine = teacher_storage.get_engine()
+    teacher_id = get_section_teacher_id(db_name)
+    with engine.connect() as conn:
+        existing = conn.execute(
+            select(func.count()).select_from(TeacherStudent.__table__).where(TeacherStudent.teacher_id == teacher_id)
+        ).scalar()
+    if existing:
+        raise RuntimeError(f'{existing} students already in consolidated storage')
+
+    create_teacher_database(teacher.id, teacher.grade_level, teacher.section)
+    source = open_section_file(db_name)
+    try:
+        new_ids = {}
+        with engine.begin() as conn:
+            for row in source.execute(f'SELECT {", ".join(V1_STUDENT_COLUMNS)} FROM students_v1 ORDER BY id'):
+                values = dict(zip(V1_STUDENT_COLUMNS, row))
+                old_id = values.pop('id')
+                values.update(teacher_id=teacher_id, qr_code=None, created_at=_datetime(values['created_at']))
+                new_ids[old_id] = conn.execute(TeacherStudent.__table__.insert().values(**values)).inserted_primary_key[0]
+
+            copied = 0
+            dates = []
+            cursor = source.execute(
+                f'SELECT {", ".join(V1_ATTENDANCE_COLUMNS)} FROM attendance_v1 ORDER BY id'
+            )
+            while True:
+                rows = cursor.fetchmany(COPY_BATCH_SIZE)
+                if not rows:
+                    break
+                batch = []
+                for row in rows:
+                    values = dict(zip(V1_ATTENDANCE_COLUMNS, row))
+                    values.pop('id')
+                    values['student_id'] = new_ids.get(values['student_id'])
+                    if values['student_id'] is None:
+                        continue  # Row of a student deleted without their attendance
+                    for column in ('timestamp', 'check_in_time', 'check_out_time'):
+                        values[column] = _datetime(values[column])
+                    values['teacher_id'] = teacher_id
+                    if values['date']:
+                        dates.append(values['date'])
+                    batch.append(values)
+                if batch:
+                    conn.execute(TeacherAttendance.__table__.insert(), batch)
+                    copied += len(batch)
+    finally:
+        source.close()
+
+    if dates:
+        rebuild_daily_rollups(db_name, min(dates), max(dates))
+        first_year = attendance_bitsets.school_year_for(datetime.fromisoformat(min(dates)).date())
+        last_year = attendance_bitsets.school_year_for(datetime.fromisoformat(max(dates)).date())
+        for school_year in range(first_year, last_year + 1):
+            attendance_bitsets.rebuild_section_bitsets(db_name, school_year)
+    return len(new_ids), copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Copy teacher database files into consolidated storage')
+    parser.add_argument('db_names', nargs='*', help='Teacher database names (without .db)')
+    parser.add_argument('--all', action='store_true', help='Copy every teacher database file')
+    args = parser.parse_args()
+
+    if not consolidated_storage():
+        parser.error('set TEACHER_STORAGE=consolidated (and TEACHER_STORAGE_URL)')
+    db_names = section_files() if args.all else args.db_names
+    if not db_names:
+        parser.error('give database names or --all')
+
+    failed = 0
+    with app.app_context():
+        for db_name in db_names:
+            if not os.path.exists(get_teacher_db_path(db_name)):
+                print(f'✗ {db_name}: not found')
+                failed += 1
+                continue
+            teacher = Teacher.query.filter_by(db_name=db_name).first()
+            if teacher is None:
+                print(f'✗ {db_name}: no teacher owns it, skipped')
+                failed += 1
+                continue
+            try:
+                students, rows = copy_section(db_name, teacher)
+                print(f'✓ {db_name}: {students} students, {rows} attendance rows')
+            except Exception as e:
+                print(f'✗ {db_name}: {e}')
+                failed += 1
+            if os.path.isdir(os.path.join(get_instance_dir(), 'archive', db_name)):
+                print(f'  {db_name} has term archives; they were not copied')
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Replace students' stored QR codes with signed compact ones (see qr_payload.py).
+
+By default stored codes are cleared and re-rendered the next time a
+student or teacher opens them; --render draws them all now. Old printed
+codes keep working unless QR_REQUIRE_SIGNED=1.
+
+Run: python tools/reissue_qr_codes.py --all
+     python tools/reissue_qr_codes.py teacher_2_12_rizal --render
+"""
+import argparse
+import os
+import sys
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE)
+
+from db_manager import (
+    TeacherStudent,
+    consolidated_storage,
+    get_teacher_db_path,
+    get_teacher_db_session,
+    list_teacher_databases
+)
+
+RENDER_BATCH_SIZE = 50
+
+
+def reissue(db_name, render):
+    sess = get_teacher_db_session(db_name)()
+    try:
+        if not render:
+            count = sess.query(TeacherStudent).update({TeacherStudent.qr_code: None}, synchronize_session=False)
+            sess.commit()
+            return count
+        count = 0
+        last_id = 0
+        while True:
+            students = sess.query(TeacherStudent).filter(TeacherStudent.id > last_id) \
+                .order_by(TeacherStudent.id).limit(RENDER_BATCH_SIZE).all()
+            if not students:
+                return count
+            for student in students:
+                student.generate_qr_code()
+            sess.commit()
+            count += len(students)
+            last_id = students[-1].id
+    finally:
+        sess.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reissue student QR codes as signed compact payloads')
+    parser.add_argument('db_names', nargs='*', help='Teacher database names (without .db)')
+    parser.add_argument('--all', action='store_true', help='Every teacher database')
+    parser.add_argument('--render', action='store_true', help='Render the new codes now instead of on next view')
+    args = parser.parse_args()
+
+    db_names = [d['db_name'] for d in list_teacher_databases()] if args.all else args.db_names
+    if not db_names:
+        parser.error('give database names or --all')
+
+    failed = 0
+    for db_name in db_names:
+        if not consolidated_storage() and not os.path.exists(get_teacher_db_path(db_name)):
+            print(f'✗ {db_name}: not found')
+            failed += 1
+            continue
+        try:
+            count = reissue(db_name, args.render)
+            print(f"✓ {db_name}: {count} codes {'rendered' if args.render else 'cleared'}")
+        except Exception as e:
+            print(f'✗ {db_name}: {e}')
+            failed += 1
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
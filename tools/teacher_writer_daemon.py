@@ -0,0 +1,57 @@
+"""
+Run the single writer for teacher databases (see teacher_writer.py).
+
+Start it on the same host as the web workers, with the same environment,
+and give the workers the same TEACHER_WRITER_ADDRESS and
+TEACHER_WRITER_AUTHKEY. It doesn't import the
+Flask app; it only needs the teacher databases.
+
+Run: TEACHER_WRITER_ADDRESS=/tmp/qr-attendance-writer.sock TEACHER_WRITER_AUTHKEY=... python tools/teacher_writer_daemon.py
+     python tools/teacher_writer_daemon.py --address /run/qr-attendance/writer.sock
+     python tools/teacher_writer_daemon.py --stats
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE)
+
+import teacher_writer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Single writer for teacher databases')
+    parser.add_argument('--address', help='Unix socket path or named pipe (default TEACHER_WRITER_ADDRESS)')
+    parser.add_argument('--stats', action='store_true', help="Print a running writer's statistics and exit")
+    args = parser.parse_args()
+
+    if args.address:
+        teacher_writer.TEACHER_WRITER_ADDRESS = args.address
+    if not teacher_writer.TEACHER_WRITER_ADDRESS:
+        parser.error('give --address or set TEACHER_WRITER_ADDRESS')
+    try:
+        teacher_writer.check_config()
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.stats:
+        try:
+            print(json.dumps(teacher_writer.get_stats(), indent=2))
+        except teacher_writer.WriterUnavailable as e:
+            print(f'✗ Writer not reachable: {e}')
+            sys.exit(1)
+        return
+
+    # Stop cleanly on SIGTERM too, so queued scans are flushed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        teacher_writer.serve()
+    except (KeyboardInterrupt, SystemExit):
+        print('✓ Teacher writer stopped')
+
+
+if __name__ == '__main__':
+    main()